@@ -11,11 +11,17 @@ from typing import Any, Optional
 
 import redis
 
+from utils.serialization import dumps, loads
+
 logger = logging.getLogger(__name__)
 
 
 class RedisCache:
-    """Thread-safe Redis cache wrapper with JSON serialization."""
+    """Thread-safe Redis cache wrapper with JSON serialization.
+
+    Values are encoded with utils.serialization, so NumPy scalars,
+    datetimes and NaN (stored as null) round-trip without errors.
+    """
 
     def __init__(
         self,
@@ -56,7 +62,7 @@ class RedisCache:
         try:
             raw = self._client.get(key)
             if raw is not None:
-                return json.loads(raw)
+                return loads(raw)
         except (redis.RedisError, json.JSONDecodeError) as exc:
             logger.warning(f"Redis GET failed for {key}: {exc}")
         return None
@@ -71,7 +77,7 @@ class RedisCache:
         if not self._client:
             return False
         try:
-            serialized = json.dumps(value, ensure_ascii=False)
+            serialized = dumps(value)
             self._client.setex(
                 key,
                 ttl or self._default_ttl,
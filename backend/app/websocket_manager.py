@@ -1,92 +1,228 @@
 """WebSocket connection manager for real-time data push.
 
-Manages active WebSocket connections and provides broadcast
-capabilities for live theme/stock price updates.
+Clients subscribe to channels (see services.live_channels). After each data
+update the manager recomputes the state of every subscribed channel, diffs it
+against the previous state and pushes only the changed fields as a JSON Patch.
+
+Delivery is decoupled from broadcasting: every connection owns a bounded send
+queue drained by its own sender task. A message is serialized once per channel
+and enqueued without awaiting any socket, so one slow client cannot stall the
+others. When a client's queue is full its pending messages are discarded and
+replaced with one full snapshot per subscribed channel (the missed patches are
+coalesced into the latest state).
 """
 
 import asyncio
-import json
 import logging
+import os
+from dataclasses import dataclass
 from datetime import datetime
-from typing import Any, Optional
+from typing import Any, Callable, Optional
 
 from fastapi import WebSocket, WebSocketDisconnect
 
+from services.live_channels import channel_state
+from utils.json_patch import diff
+from utils.serialization import dumps
+
 logger = logging.getLogger(__name__)
 
+# Pending messages per connection before a slow client is resynchronized
+WS_QUEUE_SIZE = int(os.environ.get("WS_QUEUE_SIZE", "64"))
+
+# Channels per connection (a resync enqueues one snapshot per channel)
+MAX_SUBSCRIPTIONS = 32
+
+StateProvider = Callable[[str], Optional[dict]]
+
+
+@dataclass
+class ChannelState:
+    """Latest pushed state of a channel."""
+
+    version: int
+    data: Optional[dict]
+    snapshot_message: Optional[str] = None
+
+
+class Client:
+    """One WebSocket connection with its bounded send queue."""
+
+    def __init__(self, websocket: WebSocket, queue_size: int) -> None:
+        self.websocket = websocket
+        self.queue: asyncio.Queue[str] = asyncio.Queue(maxsize=max(queue_size, 1))
+        self.channels: set[str] = set()
+        self.sender: Optional[asyncio.Task] = None
+        self.closed = False
+        self.resyncs = 0
+
+    async def send_loop(self) -> None:
+        """Drain the queue into the socket until the connection closes."""
+        try:
+            while True:
+                payload = await self.queue.get()
+                await self.websocket.send_text(payload)
+        except (WebSocketDisconnect, RuntimeError, OSError):
+            self.closed = True
+
 
 class ConnectionManager:
-    """Manages WebSocket connections for real-time updates.
+    """Manages WebSocket connections and per-channel delta push.
 
-    Tracks active connections by channel and provides
-    methods to broadcast messages to all subscribers
-    or specific channels.
+    Tracks subscribers by channel and the last pushed state of every
+    subscribed channel. States are dropped when the last subscriber leaves.
     """
 
-    def __init__(self) -> None:
-        self._connections: dict[str, list[WebSocket]] = {}
-        self._lock = asyncio.Lock()
-
-    async def connect(
+    def __init__(
         self,
-        websocket: WebSocket,
-        channel: str = "default",
+        state_provider: Optional[StateProvider] = None,
+        queue_size: int = WS_QUEUE_SIZE,
     ) -> None:
-        """Accept and register a WebSocket connection."""
+        self._provider = state_provider or channel_state
+        self._queue_size = max(queue_size, MAX_SUBSCRIPTIONS + 1)
+        self._clients: set[Client] = set()
+        self._subscribers: dict[str, set[Client]] = {}
+        self._states: dict[str, ChannelState] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._publish_task: Optional[asyncio.Task] = None
+        self._publish_again = False
+        self._counters = {"messages": 0, "patches": 0, "resyncs": 0, "dropped": 0}
+
+    # ------------------------------------------------------------------
+    # Connections and subscriptions
+    # ------------------------------------------------------------------
+
+    async def connect(self, websocket: WebSocket) -> Client:
+        """Accept a WebSocket connection and start its sender task."""
         await websocket.accept()
-        async with self._lock:
-            if channel not in self._connections:
-                self._connections[channel] = []
-            self._connections[channel].append(websocket)
-        logger.info(
-            f"WebSocket connected: channel={channel}, "
-            f"total={self.connection_count(channel)}"
-        )
-
-    async def disconnect(
-        self,
-        websocket: WebSocket,
-        channel: str = "default",
-    ) -> None:
-        """Remove a WebSocket connection from the manager."""
-        async with self._lock:
-            conns = self._connections.get(channel, [])
-            if websocket in conns:
-                conns.remove(websocket)
-            if not conns and channel in self._connections:
-                del self._connections[channel]
-        logger.info(f"WebSocket disconnected: channel={channel}")
+        self.bind_loop(asyncio.get_running_loop())
+        client = Client(websocket, self._queue_size)
+        client.sender = asyncio.create_task(client.send_loop())
+        self._clients.add(client)
+        logger.info(f"WebSocket connected: total={self.connection_count()}")
+        return client
+
+    async def disconnect(self, client: Client) -> None:
+        """Unsubscribe a connection from every channel and stop its sender."""
+        for channel in list(client.channels):
+            self._remove_subscriber(client, channel)
+        self._clients.discard(client)
+        client.closed = True
+        if client.sender is not None:
+            client.sender.cancel()
+        logger.info(f"WebSocket disconnected: total={self.connection_count()}")
+
+    async def subscribe(self, client: Client, channel: str) -> None:
+        """Subscribe a connection and enqueue the channel's current snapshot.
+
+        The state is loaded on first subscription (off the event loop) and is
+        pushed as version 0 with ``data: null`` while no snapshot exists yet.
+        """
+        if channel in client.channels:
+            return
+        if channel not in self._states:
+            data = await asyncio.to_thread(self._provider, channel)
+            # Another subscriber may have loaded the state meanwhile
+            self._states.setdefault(channel, ChannelState(1 if data is not None else 0, data))
+        client.channels.add(channel)
+        self._subscribers.setdefault(channel, set()).add(client)
+        self.offer(client, self._snapshot_message(channel))
+
+    async def unsubscribe(self, client: Client, channel: str) -> None:
+        """Remove a connection from one channel."""
+        self._remove_subscriber(client, channel)
+
+    def _remove_subscriber(self, client: Client, channel: str) -> None:
+        client.channels.discard(channel)
+        subscribers = self._subscribers.get(channel)
+        if subscribers is None:
+            return
+        subscribers.discard(client)
+        if not subscribers:
+            del self._subscribers[channel]
+            self._states.pop(channel, None)
 
     def connection_count(self, channel: Optional[str] = None) -> int:
-        """Return the number of active connections."""
+        """Return the number of active connections (optionally per channel)."""
         if channel:
-            return len(self._connections.get(channel, []))
-        return sum(len(c) for c in self._connections.values())
+            return len(self._subscribers.get(channel, ()))
+        return len(self._clients)
+
+    def stats(self) -> dict[str, Any]:
+        """Connection, channel and delivery counters."""
+        return {
+            "connections": len(self._clients),
+            "channels": {channel: len(subs) for channel, subs in sorted(self._subscribers.items())},
+            "versions": {channel: state.version for channel, state in sorted(self._states.items())},
+            **self._counters,
+        }
+
+    # ------------------------------------------------------------------
+    # Delivery
+    # ------------------------------------------------------------------
+
+    def _snapshot_message(self, channel: str) -> str:
+        """Serialized full-state message of a channel (cached per version)."""
+        state = self._states[channel]
+        if state.snapshot_message is None:
+            state.snapshot_message = dumps({
+                "type": "snapshot",
+                "channel": channel,
+                "version": state.version,
+                "data": state.data,
+            }).decode()
+        return state.snapshot_message
+
+    def offer(self, client: Client, payload: str) -> bool:
+        """Enqueue a serialized message without waiting.
+
+        If the queue is full the client is resynchronized and False is
+        returned; the latest state reaches it through the snapshots instead.
+        """
+        if client.closed:
+            return False
+        try:
+            client.queue.put_nowait(payload)
+            self._counters["messages"] += 1
+            return True
+        except asyncio.QueueFull:
+            self._resync(client)
+            return False
+
+    def _resync(self, client: Client) -> None:
+        """Replace a slow client's backlog with one snapshot per channel."""
+        while not client.queue.empty():
+            client.queue.get_nowait()
+            self._counters["dropped"] += 1
+        for channel in sorted(client.channels):
+            if channel in self._states:
+                client.queue.put_nowait(self._snapshot_message(channel))
+                self._counters["messages"] += 1
+        client.resyncs += 1
+        self._counters["resyncs"] += 1
+        logger.info(f"WebSocket client resynchronized: channels={len(client.channels)}, resyncs={client.resyncs}")
+
+    def send(self, client: Client, message: dict[str, Any]) -> bool:
+        """Enqueue a message for a single connection (errors, pongs)."""
+        return self.offer(client, dumps(message).decode())
+
+    def _fanout(self, payload: str, channel: str) -> int:
+        delivered = 0
+        for client in list(self._subscribers.get(channel, ())):
+            if self.offer(client, payload):
+                delivered += 1
+        return delivered
 
     async def broadcast(
         self,
         message: dict[str, Any],
         channel: str = "default",
     ) -> int:
-        """Send a JSON message to all connections on a channel.
+        """Serialize a message once and enqueue it for every subscriber.
 
-        Returns the number of successfully delivered messages.
+        Returns the number of connections the message was enqueued for.
         """
-        payload = json.dumps(message, ensure_ascii=False)
-        delivered = 0
-        dead: list[WebSocket] = []
-
-        for ws in self._connections.get(channel, []):
-            try:
-                await ws.send_text(payload)
-                delivered += 1
-            except (WebSocketDisconnect, RuntimeError):
-                dead.append(ws)
-
-        for ws in dead:
-            await self.disconnect(ws, channel)
-
-        return delivered
+        return self._fanout(dumps(message).decode(), channel)
 
     async def send_price_update(
         self,
@@ -102,6 +238,78 @@ class ConnectionManager:
         }
         return await self.broadcast(message, channel=f"theme:{theme_id}")
 
+    # ------------------------------------------------------------------
+    # Delta publishing
+    # ------------------------------------------------------------------
+
+    def _load_states(self, channels: list[str]) -> dict[str, Optional[dict]]:
+        states = {}
+        for channel in channels:
+            try:
+                states[channel] = self._provider(channel)
+            except Exception as e:
+                logger.error(f"Failed to load channel state {channel}: {e}")
+        return states
+
+    async def publish_updates(self) -> int:
+        """Diff every subscribed channel against its last state and push patches.
+
+        All states are updated before any patch is enqueued, so a client
+        resynchronized mid-fanout receives the newest versions. Returns the
+        number of channels that changed.
+        """
+        channels = list(self._subscribers)
+        if not channels:
+            return 0
+        new_states = await asyncio.to_thread(self._load_states, channels)
+
+        changed = []
+        for channel, data in new_states.items():
+            state = self._states.get(channel)
+            if state is None:
+                continue  # unsubscribed while loading
+            ops = diff(state.data, data)
+            if ops:
+                self._states[channel] = ChannelState(state.version + 1, data)
+                changed.append((channel, state.version, ops))
+
+        for channel, base, ops in changed:
+            payload = dumps({"type": "patch", "channel": channel, "version": base + 1, "base": base, "ops": ops}).decode()
+            self._fanout(payload, channel)
+            self._counters["patches"] += 1
+        return len(changed)
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Set the event loop that notify_threadsafe() schedules onto."""
+        self._loop = loop
+
+    def notify_threadsafe(self) -> None:
+        """Schedule publish_updates() from any thread (data update listener)."""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(self._schedule_publish)
+        except RuntimeError:  # loop closed concurrently
+            pass
+
+    def _schedule_publish(self) -> None:
+        # Updates arriving while a publish runs are coalesced into one rerun
+        if self._publish_task is not None and not self._publish_task.done():
+            self._publish_again = True
+            return
+        self._publish_task = asyncio.get_running_loop().create_task(self._run_publish())
+
+    async def _run_publish(self) -> None:
+        while True:
+            self._publish_again = False
+            try:
+                await self.publish_updates()
+            except Exception as e:
+                logger.error(f"WebSocket publish failed: {e}")
+            if not self._publish_again:
+                return
+
 
 # Global singleton
 ws_manager = ConnectionManager()
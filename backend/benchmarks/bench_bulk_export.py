@@ -0,0 +1,103 @@
+"""一括エクスポート（OHLCV履歴の Parquet / Arrow 書き出し）のベンチマーク
+
+2,000銘柄 × 5年分（1,260営業日）の日足を、銘柄ごとに /api/stocks/{code}/chart 形式の
+JSON（行ごとの dict）を作る場合と、コピーなしで Arrow に渡して年別パーティションの
+Parquet / Arrow IPC ファイルに書き出す場合とで比較する。あわせて直近1日分の差分エクスポートを計測する。
+
+実行:
+    cd backend && python -m benchmarks.bench_bulk_export
+"""
+
+import json
+import sys
+import tempfile
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.bench_serialization import _time_ms
+from services.bulk_export import PartitionWriter, dataset_schema, ohlcv_batches
+from utils.serialization import dumps
+
+STOCKS = 2_000
+DAYS = 1_260
+
+
+def build_histories(stocks: int = STOCKS, days: int = DAYS, seed: int = 3) -> dict[str, pd.DataFrame]:
+    """合成の日足（history_store と同じ列・インデックス）"""
+    rng = np.random.default_rng(seed)
+    index = pd.DatetimeIndex(pd.bdate_range(end="2026-01-05", periods=days), name="Date")
+    histories = {}
+    for i in range(stocks):
+        close = 1000 * np.cumprod(1 + rng.normal(0.0003, 0.02, days))
+        histories[f"{1000 + i}.T"] = pd.DataFrame(
+            {"Open": close, "High": close * 1.01, "Low": close * 0.99, "Close": close, "Volume": rng.integers(1e4, 1e7, days).astype(float)},
+            index=index,
+        )
+    return histories
+
+
+def _chart_json(histories: dict[str, pd.DataFrame]) -> int:
+    """比較用: 銘柄ごとに行単位の JSON を作る（従来の取得方法）"""
+    size = 0
+    for ticker, df in histories.items():
+        rows = [
+            {"date": d.strftime("%Y-%m-%d"), "open": o, "high": h, "low": lo, "close": c, "volume": v}
+            for d, o, h, lo, c, v in zip(df.index, df["Open"], df["High"], df["Low"], df["Close"], df["Volume"])
+        ]
+        size += len(dumps({"code": ticker, "data": rows}))
+    return size
+
+
+def _write(histories: dict[str, pd.DataFrame], directory: Path, fmt: str, since=None) -> PartitionWriter:
+    writer = PartitionWriter(directory / "ohlcv", dataset_schema("ohlcv"), fmt, "part")
+    for batch in ohlcv_batches(histories, since, loader=histories.get):
+        writer.write_by_year(batch)
+    writer.close()
+    return writer
+
+
+def run() -> dict:
+    """JSON・Parquet・Arrow の書き出し時間とサイズを計測"""
+    histories = build_histories()
+    last_day = next(iter(histories.values())).index[-2].date()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = Path(tmp)
+        parquet_ms = _time_ms(lambda: _write(histories, directory / "parquet", "parquet"), repeat=3)
+        arrow_ms = _time_ms(lambda: _write(histories, directory / "arrow", "arrow"), repeat=3)
+        incremental_ms = _time_ms(lambda: _write(histories, directory / "incremental", "parquet", last_day), repeat=3)
+        parquet_mib = sum(p.stat().st_size for p in (directory / "parquet").rglob("*.parquet")) / 1024 / 1024
+        arrow_mib = sum(p.stat().st_size for p in (directory / "arrow").rglob("*.arrow")) / 1024 / 1024
+
+    return {
+        "stocks": STOCKS,
+        "days": DAYS,
+        "rows": STOCKS * DAYS,
+        "chart_json_ms": _time_ms(lambda: _chart_json(histories), repeat=1),
+        "chart_json_mib": round(_chart_json(histories) / 1024 / 1024, 1),
+        "parquet_ms": parquet_ms,
+        "parquet_mib": round(parquet_mib, 1),
+        "arrow_ms": arrow_ms,
+        "arrow_mib": round(arrow_mib, 1),
+        "incremental_1day_ms": incremental_ms,
+        "incremental_since": date.isoformat(last_day),
+    }
+
+
+def main() -> None:
+    result = run()
+    print(f"{result['stocks']:,} stocks x {result['days']} days ({result['rows']:,} bars)")
+    print(f"  per-ticker chart JSON   {result['chart_json_ms']:>9.1f} ms  {result['chart_json_mib']:>7.1f} MiB")
+    print(f"  Parquet (year=YYYY)     {result['parquet_ms']:>9.1f} ms  {result['parquet_mib']:>7.1f} MiB")
+    print(f"  Arrow IPC (year=YYYY)   {result['arrow_ms']:>9.1f} ms  {result['arrow_mib']:>7.1f} MiB")
+    print(f"  incremental (1 day)     {result['incremental_1day_ms']:>9.1f} ms")
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
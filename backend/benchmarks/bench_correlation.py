@@ -0,0 +1,93 @@
+"""相関行列・クラスタリング順のベンチマーク
+
+2,000銘柄 × 5年分（1,260営業日）の終値行列について、銘柄 × 銘柄 の相関行列（行列積）と
+階層クラスタリング順の計算時間、pandas の DataFrame.corr() との比較、保存ファイルのサイズを計測する。
+あわせて500テーマ × 50銘柄のテーマ間相関（全期間分）の生成時間を計測する。
+
+実行:
+    cd backend && python -m benchmarks.bench_correlation
+"""
+
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.bench_serialization import _time_ms
+from benchmarks.bench_theme_index import build_matrix
+from benchmarks.bench_theme_registry import build_theme_definitions
+from data.theme_loader import validate_themes
+from services.correlation import (
+    CORRELATION_PERIODS,
+    CorrelationSet,
+    cluster_order,
+    compute_correlations,
+    correlation_matrix,
+    daily_return_matrix,
+)
+from services.price_matrix import PriceMatrix
+from services.sparkline import PERIOD_DAYS
+
+STOCKS = 2_000
+
+
+def run() -> dict:
+    """銘柄間相関・クラスタリング・テーマ間相関のベンチマークを実行"""
+    themes = validate_themes(build_theme_definitions())
+    tickers = list(dict.fromkeys(ticker for theme in themes.values() for ticker in theme["tickers"]))
+    matrix = build_matrix(tickers)
+
+    stock_matrix = PriceMatrix("5y", matrix.dates, tickers[:STOCKS], matrix.close[:, :STOCKS].copy())
+    returns = daily_return_matrix(stock_matrix.close)
+    corr = correlation_matrix(returns)
+    correlations = compute_correlations(stock_matrix, {}, include_stocks=True)
+    frame = pd.DataFrame(returns.astype(np.float64))
+
+    matrices = {
+        period: PriceMatrix(period, matrix.dates[-days - 1:], tickers, matrix.close[-days - 1:].copy())
+        for period, days in PERIOD_DAYS.items()
+        if period in CORRELATION_PERIODS
+    }
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "correlation_5y.npz"
+        path.write_bytes(correlations.to_bytes())
+        load_ms = _time_ms(lambda: CorrelationSet.from_file(path))
+        npz_mib = round(path.stat().st_size / 1024 / 1024, 1)
+
+    return {
+        "stocks": STOCKS,
+        "days": len(stock_matrix.dates),
+        "stock_correlation_ms": _time_ms(lambda: correlation_matrix(returns), repeat=3),
+        "pandas_corr_ms": _time_ms(lambda: frame.corr(min_periods=15), repeat=1),
+        "cluster_order_ms": _time_ms(lambda: cluster_order(corr), repeat=3),
+        "stock_matrix_mib": round(corr.nbytes / 1024 / 1024, 1),
+        "npz_mib": npz_mib,
+        "themes": len(themes),
+        "theme_correlations_all_periods_ms": _time_ms(
+            lambda: [compute_correlations(m, themes, include_stocks=False) for m in matrices.values()], repeat=3
+        ),
+        "load_ms": load_ms,
+    }
+
+
+def main() -> None:
+    result = run()
+    print(f"{result['stocks']:,} stocks / {result['days']} days")
+    print(f"  stock correlation (GEMM) {result['stock_correlation_ms']:>9.1f} ms")
+    print(f"  pandas DataFrame.corr    {result['pandas_corr_ms']:>9.1f} ms")
+    print(f"  cluster order            {result['cluster_order_ms']:>9.1f} ms")
+    print(f"  stock matrix (float32)   {result['stock_matrix_mib']:>9.1f} MiB")
+    print(f"  correlation_5y.npz       {result['npz_mib']:>9.1f} MiB")
+    print(f"  load npz                 {result['load_ms']:>9.1f} ms")
+    print(f"{result['themes']} themes: all periods {result['theme_correlations_all_periods_ms']:.1f} ms")
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
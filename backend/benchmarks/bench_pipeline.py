@@ -0,0 +1,372 @@
+"""データ更新パイプラインと主要エンドポイントのベンチマーク
+
+yfinance の代わりに合成の日足・企業情報を返すスタンドイン（SyntheticMarket）を使い、
+キャッシュ・事前計算ファイルは一時ディレクトリに書き出す（ネットワーク不要、既存ファイルに影響しない）。
+200 / 2,000 / 4,000銘柄（1テーマ10銘柄）について次を計測する。
+
+- update_all_data 1サイクルの所要時間と段階ごとの内訳（services/pipeline_trace の計測結果）、
+  書き出したファイル数・バイト数
+- メモリのピーク（2回目のサイクルを tracemalloc で計測。キャッシュ済みのため取得はファイル読み込み）
+- 事前計算済みエンドポイントのレイテンシ（ASGI テストクライアント、p50 / p95）
+- 事前計算ファイルがない場合のリアルタイム計算（フォールバック）のレイテンシ
+
+銘柄数に依存しない計算（calculate_beta_alpha・指標計算）は1秒あたりの処理銘柄数を出力する。
+
+結果は --output でJSONに保存し、--baseline に前回（別コミット）の結果を渡すと
+--threshold（既定20%）を超えて悪化した指標を表示して終了コード1を返す（benchmarks/compare.py）。
+
+実行:
+    cd backend && python -m benchmarks.bench_pipeline
+    cd backend && python -m benchmarks.bench_pipeline --sizes 200 --output bench.json --baseline main.json
+"""
+
+import argparse
+import copy
+import json
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Iterator, Optional
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from benchmarks.bench_serialization import _time_ms
+from benchmarks.compare import DEFAULT_THRESHOLD, compare, report
+from data import themes as theme_data
+from data.theme_loader import apply_themes, validate_themes
+from jobs import update_data
+from routers import screener as screener_router
+from routers import themes as themes_router
+from services import correlation, data_fetcher, history_store, metrics_table, pipeline_trace, price_matrix, snapshot
+from services.calculator import (
+    calculate_beta_alpha,
+    calculate_daily_returns,
+    calculate_indicators_from_data,
+    calculate_screening_metrics,
+)
+from utils.cache import cache
+
+SIZES = (200, 2_000, 4_000)
+TICKERS_PER_THEME = 10
+
+# 合成の日足（5年分 + 余裕）
+END_DATE = "2026-01-05"
+HISTORY_DAYS = 1_300
+
+# yfinance の period → 営業日数
+PERIOD_ROWS = {"5d": 5, "10d": 10, "1mo": 21, "3mo": 63, "6mo": 126, "1y": 245, "2y": 490, "5y": 1_225}
+
+# エンドポイントの計測回数
+ENDPOINT_REPEAT = 30
+FALLBACK_REPEAT = 3
+
+# スループットの計測に使う銘柄数
+THROUGHPUT_STOCKS = 500
+
+
+class SyntheticMarket:
+    """yfinance.Ticker の代わりに合成の日足・企業情報を返す（銘柄コードから決まる乱数で毎回同じ値）"""
+
+    def __init__(self, end: str = END_DATE, days: int = HISTORY_DAYS, seed: int = 7) -> None:
+        self.index = pd.DatetimeIndex(pd.bdate_range(end=end, periods=days), name="Date")
+        self.seed = seed
+
+    def _rng(self, ticker: str) -> np.random.Generator:
+        return np.random.default_rng([self.seed, zlib.crc32(ticker.encode())])
+
+    def history(self, ticker: str, period: Optional[str] = None, start: Optional[str] = None) -> pd.DataFrame:
+        rng = self._rng(ticker)
+        days = len(self.index)
+        close = rng.uniform(300, 20_000) * np.cumprod(1 + rng.normal(0.0003, 0.02, days))
+        df = pd.DataFrame(
+            {
+                "Open": close * (1 + rng.normal(0, 0.005, days)),
+                "High": close * 1.01,
+                "Low": close * 0.99,
+                "Close": close,
+                "Volume": rng.integers(10_000, 10_000_000, days).astype(float),
+                "Dividends": 0.0,
+                "Stock Splits": 0.0,
+            },
+            index=self.index,
+        )
+        if start is not None:
+            return df[df.index >= pd.Timestamp(start)]
+        return df.tail(PERIOD_ROWS.get(period, days))
+
+    def info(self, ticker: str) -> dict:
+        rng = self._rng(ticker)
+        shares = float(rng.integers(10**7, 10**10))
+        return {
+            "marketCap": int(shares * rng.uniform(300, 20_000)),
+            "sharesOutstanding": shares,
+            "floatShares": shares * rng.uniform(0.3, 1.0),
+        }
+
+    def Ticker(self, ticker: str) -> "_SyntheticTicker":  # noqa: N802 - yfinance.Ticker と同じ名前
+        return _SyntheticTicker(self, ticker)
+
+
+class _SyntheticTicker:
+    def __init__(self, market: SyntheticMarket, ticker: str) -> None:
+        self.market = market
+        self.ticker = ticker
+
+    def history(self, period: Optional[str] = None, start: Optional[str] = None, **kwargs) -> pd.DataFrame:
+        return self.market.history(self.ticker, period, start)
+
+    @property
+    def info(self) -> dict:
+        return self.market.info(self.ticker)
+
+
+def build_themes(ticker_count: int, tickers_per_theme: int = TICKERS_PER_THEME) -> dict[str, dict]:
+    """ticker_count 銘柄を tickers_per_theme 銘柄ずつのテーマに分けた定義（THEMES と同じ形）"""
+    codes = [f"{1000 + i}.T" for i in range(ticker_count)]
+    definitions = [
+        {
+            "id": f"theme_{i // tickers_per_theme:03d}",
+            "name": f"テーマ{i // tickers_per_theme}",
+            "description": "合成データによるベンチマーク用テーマ",
+            "tickers": [{"code": code, "name": f"銘柄{code[:4]}"} for code in codes[i:i + tickers_per_theme]],
+        }
+        for i in range(0, ticker_count, tickers_per_theme)
+    ]
+    return validate_themes({"themes": definitions})
+
+
+def _reset_caches() -> None:
+    data_fetcher._fetch_stock_data_cached.cache_clear()
+    history_store.clear_memory()
+    snapshot.clear()
+    metrics_table.clear_tables()
+    price_matrix.clear()
+    correlation.clear()
+    cache.clear()
+
+
+@contextmanager
+def offline_market(directory: Path, themes: dict[str, dict], market: SyntheticMarket) -> Iterator[Path]:
+    """yfinance・テーマ定義・キャッシュと事前計算ファイルの保存先を差し替える（終了時に元に戻す）
+
+    Yields:
+        事前計算ファイルの保存先
+    """
+    precomputed = directory / "precomputed"
+    precomputed.mkdir(parents=True, exist_ok=True)
+    patches = [
+        (yf, "Ticker", market.Ticker),
+        (data_fetcher, "CACHE_DIR", directory / "cache"),
+        (history_store, "HISTORY_DIR", directory / "cache" / "history"),
+        (update_data, "PRECOMPUTED_DIR", precomputed),
+        (themes_router, "PRECOMPUTED_DIR", precomputed),
+        (screener_router, "PRECOMPUTED_DIR", precomputed),
+    ]
+    saved = [(target, name, getattr(target, name)) for target, name, _ in patches]
+    original_themes = copy.deepcopy(theme_data.THEMES)
+    for target, name, value in patches:
+        setattr(target, name, value)
+    apply_themes(themes)
+    _reset_caches()
+    try:
+        yield precomputed
+    finally:
+        for target, name, value in saved:
+            setattr(target, name, value)
+        apply_themes(original_themes)
+        _reset_caches()
+
+
+def _latency_ms(func: Callable, repeat: int) -> dict:
+    """p50 / p95（ミリ秒）"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {"p50_ms": round(float(np.median(samples)), 3), "p95_ms": round(float(np.percentile(samples, 95)), 3)}
+
+
+def _get(client: TestClient, url: str) -> Callable[[], None]:
+    def request() -> None:
+        response = client.get(url)
+        if response.status_code != 200:
+            raise RuntimeError(f"GET {url} -> {response.status_code}: {response.text[:200]}")
+    return request
+
+
+def _client() -> TestClient:
+    app = FastAPI()
+    app.include_router(themes_router.router)
+    app.include_router(screener_router.router)
+    return TestClient(app)
+
+
+def bench_endpoints(client: TestClient, theme_id: str) -> dict:
+    """事前計算済みファイル・メトリクステーブルから応答するエンドポイント"""
+    urls = {
+        "themes": "/api/themes?period=1mo",
+        "theme_detail": f"/api/themes/{theme_id}?period=1mo",
+        "heatmap": "/api/heatmap?period=1mo",
+        "heatmap_filtered": "/api/heatmap?period=1mo&category=mid,small&limit=50",
+        "screener": "/api/screener?period=1mo&filter=rsi%20%3C%2050&sort=change_percent&limit=50",
+    }
+    return {name: _latency_ms(_get(client, url), ENDPOINT_REPEAT) for name, url in urls.items()}
+
+
+def bench_fallback(client: TestClient, theme_id: str, precomputed: Path) -> dict:
+    """事前計算ファイルがない場合のリアルタイム計算（応答キャッシュは毎回破棄、株価はメモリ・ファイルキャッシュ済み）"""
+    urls = {
+        "themes": "/api/themes?period=1mo",
+        "theme_detail": f"/api/themes/{theme_id}?period=1mo",
+    }
+    with tempfile.TemporaryDirectory() as empty:
+        themes_router.PRECOMPUTED_DIR = Path(empty)
+        try:
+            results = {}
+            for name, url in urls.items():
+                request = _get(client, url)
+
+                def uncached(request=request) -> None:
+                    cache.clear()
+                    request()
+
+                results[name] = _latency_ms(uncached, FALLBACK_REPEAT)
+            return results
+        finally:
+            themes_router.PRECOMPUTED_DIR = precomputed
+
+
+def _stage_seconds(traced: pipeline_trace.Cycle) -> dict:
+    return {f"{stage['name']}_s": round(stage["duration_ms"] / 1000, 3) for stage in traced.summary()["stages"]}
+
+
+def bench_cycle(ticker_count: int, market: SyntheticMarket) -> dict:
+    """1サイズ分のパイプライン・エンドポイントの計測"""
+    themes = build_themes(ticker_count)
+    theme_id = next(iter(themes))
+    with tempfile.TemporaryDirectory() as tmp, offline_market(Path(tmp), themes, market) as precomputed:
+        pipeline_trace.clear()
+        start = time.perf_counter()
+        update_data.update_all_data(force=True)
+        cycle_s = time.perf_counter() - start
+        traced = pipeline_trace.recent_cycles()[0]
+
+        client = _client()
+        endpoints = bench_endpoints(client, theme_id)
+        fallback = bench_fallback(client, theme_id, precomputed)
+
+        # 2回目のサイクル（株価・時価総額はファイルキャッシュから読む）のメモリピーク
+        _reset_caches()
+        tracemalloc.start()
+        update_data.update_all_data(force=True)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {
+        "tickers": ticker_count,
+        "themes": len(themes),
+        "cycle_s": round(cycle_s, 3),
+        "stages": _stage_seconds(traced),
+        "files": int(traced.counters.get("write.files", 0)),
+        "written_mib": round(traced.counters.get("write.bytes", 0) / 2**20, 2),
+        "peak_mib": round(peak / 2**20, 1),
+        "max_rss_mib": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "endpoints": endpoints,
+        "fallback": fallback,
+    }
+
+
+def bench_throughput(market: SyntheticMarket, stocks: int = THROUGHPUT_STOCKS) -> dict:
+    """銘柄数に依存しない計算の1秒あたりの処理銘柄数（1y分の日足）"""
+    frames = [market.history(f"{1000 + i}.T", "1y") for i in range(stocks)]
+    returns = [calculate_daily_returns(df) for df in frames]
+    benchmark = pd.concat(returns, axis=1).mean(axis=1)
+
+    def per_second(func: Callable[[], None]) -> float:
+        return round(stocks / (_time_ms(func, repeat=3) / 1000), 1)
+
+    return {
+        "stocks": stocks,
+        "beta_alpha_per_s": per_second(lambda: [calculate_beta_alpha(r, benchmark) for r in returns]),
+        "screening_metrics_per_s": per_second(lambda: [calculate_screening_metrics("bench", df) for df in frames]),
+        "indicators_per_s": per_second(lambda: [calculate_indicators_from_data("bench", df) for df in frames]),
+    }
+
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(sizes: tuple[int, ...] = SIZES) -> dict:
+    """全サイズのベンチマークを実行"""
+    market = SyntheticMarket()
+    return {
+        "meta": {
+            "commit": _commit(),
+            "python": platform.python_version(),
+            "generated_at": datetime.now().isoformat(),
+        },
+        "throughput": bench_throughput(market),
+        "pipeline": {str(size): bench_cycle(size, market) for size in sorted(sizes)},
+    }
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the update pipeline and hot endpoints offline")
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES)), help="ticker counts (comma separated)")
+    parser.add_argument("--output", type=Path, help="write results as JSON")
+    parser.add_argument("--baseline", type=Path, help="previous results to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed slowdown (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    result = run(tuple(int(size) for size in args.sizes.split(",")))
+    if args.output:
+        args.output.write_text(json.dumps(result, indent=2), encoding="utf-8")
+
+    throughput = result["throughput"]
+    print(
+        f"throughput ({throughput['stocks']} stocks x 1y): beta/alpha {throughput['beta_alpha_per_s']:>9,.0f}/s  "
+        f"screening {throughput['screening_metrics_per_s']:>7,.0f}/s  indicators {throughput['indicators_per_s']:>7,.0f}/s"
+    )
+    for bench in result["pipeline"].values():
+        print(
+            f"{bench['tickers']:>5,} tickers / {bench['themes']:>3} themes  cycle {bench['cycle_s']:>7.2f} s  "
+            f"{bench['files']:>5,} files {bench['written_mib']:>7.1f} MiB  peak {bench['peak_mib']:>7.1f} MiB"
+        )
+        print("        " + "  ".join(f"{name[:-2]} {seconds:.2f}s" for name, seconds in bench["stages"].items()))
+        for group in ("endpoints", "fallback"):
+            print(f"        {group:<9} " + "  ".join(
+                f"{name} {latency['p50_ms']:.2f}/{latency['p95_ms']:.2f} ms" for name, latency in bench[group].items()
+            ))
+    print(json.dumps(result, indent=2))
+
+    if args.baseline:
+        regressions = compare(json.loads(args.baseline.read_text(encoding="utf-8")), result, args.threshold)
+        print(report(regressions, args.threshold))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
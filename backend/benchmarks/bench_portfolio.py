@@ -0,0 +1,61 @@
+"""ポートフォリオ分析エンジンのベンチマーク
+
+約3,800銘柄 × 5年分（1,260営業日）の終値行列から、50 / 200 / 500 銘柄のウェイト付きポートフォリオの
+リスク指標（共分散行列・リスク寄与度・ベータ・ドローダウン）を計算する時間と、キャッシュ済みの取得時間を計測する。
+
+実行:
+    cd backend && python -m benchmarks.bench_portfolio
+"""
+
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.bench_serialization import _time_ms
+from benchmarks.bench_theme_index import build_matrix
+from benchmarks.bench_theme_registry import build_theme_definitions
+from data.theme_loader import validate_themes
+from services.custom_theme import normalize_basket
+from services.portfolio import MAX_PORTFOLIO_HOLDINGS, compute_portfolio, get_portfolio
+from services.price_matrix import BENCHMARK_TICKER, save_price_matrix
+
+SIZES = (50, 200, MAX_PORTFOLIO_HOLDINGS)
+
+
+def run() -> dict:
+    """銘柄数ごとのポートフォリオ計算時間を計測"""
+    themes = validate_themes(build_theme_definitions())
+    tickers = list(dict.fromkeys(ticker for theme in themes.values() for ticker in theme["tickers"]))
+    matrix = build_matrix(tickers + [BENCHMARK_TICKER])
+    rng = np.random.default_rng(7)
+
+    result = {"tickers": len(tickers), "days": len(matrix.dates)}
+    for size in SIZES:
+        selected = [str(t) for t in rng.choice(tickers, size=size, replace=False)]
+        weights = {ticker: float(w) for ticker, w in zip(selected, rng.uniform(1, 5, size))}
+        basket = normalize_basket(selected, weights, max_tickers=MAX_PORTFOLIO_HOLDINGS)
+        result[f"holdings_{size}_ms"] = _time_ms(lambda: compute_portfolio(basket, matrix), repeat=5)
+
+    with tempfile.TemporaryDirectory() as directory:
+        save_price_matrix(Path(directory), matrix)
+        get_portfolio(basket, "5y", Path(directory))
+        result["cached_ms"] = _time_ms(lambda: get_portfolio(basket, "5y", Path(directory)))
+    return result
+
+
+def main() -> None:
+    result = run()
+    print(f"{result['tickers']:,} tickers / {result['days']} days")
+    for size in SIZES:
+        print(f"  {size:>3} holdings  {result[f'holdings_{size}_ms']:>8.1f} ms")
+    print(f"  cached        {result['cached_ms']:>8.3f} ms")
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""スクリーナーのベンチマーク（メトリクステーブル + フィルタ式）
+
+合成した銘柄ユニバース（200 / 2,000 / 10,000銘柄）に対して
+テーブル構築、フィルタ式の評価、ソート済みページの取得をそれぞれ計測する。
+比較として同じ条件をdictのリストに対するPythonループで評価した時間も出力する。
+
+実行:
+    cd backend && python -m benchmarks.bench_screener
+"""
+
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.bench_serialization import _time_ms
+from services.metrics_table import HEATMAP_CATEGORIES, RETURN_COLUMNS, MetricsTable
+from services.screener_filter import compile_filter, evaluate_filter
+
+UNIVERSE_SIZES = (200, 2_000, 10_000)
+
+FILTER = "rsi < 30 and return_1mo > 5 and category in (mid, small)"
+
+
+def build_records(stock_count: int, seed: int = 4) -> list[dict]:
+    """metrics_{period}.json 相当の合成レコード（一部の指標は欠損）"""
+    rng = np.random.default_rng(seed)
+    categories = list(HEATMAP_CATEGORIES)
+    records = []
+    for i in range(stock_count):
+        category = categories[i % len(categories)]
+        record = {
+            "code": f"{1000 + i}.T",
+            "name": f"銘柄{i}",
+            "theme_ids": [f"theme_{i % 50:02d}", f"theme_{(i * 7) % 50:02d}"],
+            "theme_names": [f"テーマ{i % 50}", f"テーマ{(i * 7) % 50}"],
+            "change_percent": round(float(rng.normal(0, 8)), 2),
+            "change_percent_1d": round(float(rng.normal(0, 2)), 2),
+            "market_cap": int(rng.integers(10**9, 10**13)),
+            "market_cap_category": {"id": category, "label": HEATMAP_CATEGORIES[category]["label"]},
+            "rsi": round(float(rng.uniform(5, 95)), 2) if i % 17 else None,
+            "ma5_distance": round(float(rng.normal(0, 3)), 2),
+            "ma20_distance": round(float(rng.normal(0, 6)), 2),
+            "volatility": round(float(rng.uniform(10, 80)), 2),
+            "beta": round(float(rng.normal(1, 0.4)), 2),
+        }
+        for column in RETURN_COLUMNS:
+            record[column] = round(float(rng.normal(0, 10)), 2)
+        records.append(record)
+    return records
+
+
+def python_filter(records: list[dict]) -> list[dict]:
+    """FILTER と同じ条件をPythonループで評価（比較用）"""
+    matched = [
+        r for r in records
+        if r["rsi"] is not None and r["rsi"] < 30
+        and r["return_1mo"] > 5
+        and r["market_cap_category"]["id"] in ("mid", "small")
+    ]
+    return sorted(matched, key=lambda r: r["change_percent"], reverse=True)[:50]
+
+
+def bench_universe(stock_count: int) -> dict:
+    """1ユニバース分の計測結果"""
+    records = build_records(stock_count)
+    table = MetricsTable("1mo", records, generated_at="2026-01-05T15:30:00")
+    compile_filter(FILTER)
+
+    def screen():
+        mask = evaluate_filter(table, FILTER)
+        indices, _ = table.query(mask, "change_percent", True, 0, 50)
+        return table.rows(indices)
+
+    table.sorted_rows("change_percent")
+    return {
+        "stocks": stock_count,
+        "build_ms": _time_ms(lambda: MetricsTable("1mo", records), repeat=5),
+        "filter_ms": _time_ms(lambda: evaluate_filter(table, FILTER)),
+        "screen_page_ms": _time_ms(screen),
+        "python_loop_ms": _time_ms(lambda: python_filter(records), repeat=10),
+        "matched": int(evaluate_filter(table, FILTER).sum()),
+    }
+
+
+def run() -> list[dict]:
+    """全ユニバースのベンチマークを実行"""
+    return [bench_universe(size) for size in UNIVERSE_SIZES]
+
+
+def main() -> None:
+    results = run()
+    for result in results:
+        print(
+            f"{result['stocks']:>6,} stocks  build {result['build_ms']:>8.2f} ms  "
+            f"filter {result['filter_ms']:>6.3f} ms  page {result['screen_page_ms']:>6.3f} ms  "
+            f"python loop {result['python_loop_ms']:>7.3f} ms  matched {result['matched']}"
+        )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""検索インデックスのベンチマーク
+
+東証上場銘柄数（約3,800）相当の合成テーマ定義に対して、
+インデックス検索と従来の全件走査（小文字化 + 部分一致）の応答時間を比較する。
+
+実行:
+    cd backend && python -m benchmarks.bench_search
+"""
+
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.bench_serialization import _time_ms
+from services.search_index import SearchIndex
+
+LISTING_COUNT = 3_800
+THEME_COUNT = 100
+
+# 企業名の合成に使う語
+NAME_PARTS = [
+    "トヨタ", "ソニー", "日立", "三菱", "住友", "東京", "日本", "大和", "富士", "キーエンス",
+    "電機", "化学", "製作所", "工業", "ホールディングス", "商事", "不動産", "銀行", "証券", "電力",
+    "テクノロジー", "システムズ", "フィナンシャル", "グループ", "精密", "自動車", "通信", "薬品",
+]
+
+QUERIES = ["72", "7203", "ソニー", "そにー", "ﾎｰﾙﾃﾞｨﾝｸﾞｽ", "電機", "Ｔ", "存在しない社名"]
+
+
+def build_themes(listing_count: int = LISTING_COUNT, theme_count: int = THEME_COUNT, seed: int = 5) -> dict:
+    """合成テーマ定義（各銘柄は1〜2テーマに所属）"""
+    rng = np.random.default_rng(seed)
+    themes = {
+        f"theme_{i:03d}": {
+            "id": f"theme_{i:03d}",
+            "name": f"テーマ{i}{NAME_PARTS[i % len(NAME_PARTS)]}",
+            "description": f"{NAME_PARTS[(i * 3) % len(NAME_PARTS)]}関連企業",
+            "tickers": [],
+            "ticker_names": {},
+        }
+        for i in range(theme_count)
+    }
+    theme_ids = list(themes)
+    for i in range(listing_count):
+        ticker = f"{1300 + i * 2}.T"
+        parts = rng.choice(len(NAME_PARTS), size=2, replace=False)
+        name = NAME_PARTS[parts[0]] + NAME_PARTS[parts[1]]
+        for theme_id in {theme_ids[i % theme_count], theme_ids[(i * 7) % theme_count]}:
+            themes[theme_id]["tickers"].append(ticker)
+            themes[theme_id]["ticker_names"][ticker] = name
+    return themes
+
+
+def linear_search(themes: dict, query: str) -> list[dict]:
+    """従来の全件走査（比較用）"""
+    query_lower = query.lower()
+    results = []
+    seen = set()
+    for theme_id, theme in themes.items():
+        for ticker in theme["tickers"]:
+            name = theme["ticker_names"].get(ticker, ticker)
+            if ticker not in seen and (query_lower in ticker.lower() or query_lower in name.lower()):
+                seen.add(ticker)
+                results.append({"ticker": ticker, "name": name, "theme_id": theme_id})
+    return results
+
+
+def run() -> dict:
+    """全クエリのベンチマークを実行"""
+    themes = build_themes()
+    index = SearchIndex(themes)
+    return {
+        "listings": len(index.stocks),
+        "build_ms": _time_ms(lambda: SearchIndex(themes), repeat=5),
+        "queries": [
+            {
+                "query": query,
+                "matches": len(index.search_stocks(query)),
+                "index_ms": _time_ms(lambda: index.search_stocks(query, 20)),
+                "linear_ms": _time_ms(lambda: linear_search(themes, query), repeat=10),
+            }
+            for query in QUERIES
+        ],
+    }
+
+
+def main() -> None:
+    result = run()
+    print(f"{result['listings']:,} listings  index build {result['build_ms']:.1f} ms")
+    for query in result["queries"]:
+        print(
+            f"  {query['query']:<12} matches {query['matches']:>5}  "
+            f"index {query['index_ms']:>7.3f} ms  linear {query['linear_ms']:>7.3f} ms"
+        )
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""JSONエンコードのベンチマーク（標準json vs utils.serialization）
+
+テーマ一覧（themes_1mo相当）とテーマ詳細の合成ペイロードを使い、
+エンコード時間と出力バイト数を比較する。ネットワーク・yfinanceは使用しない。
+
+旧経路:
+- API応答: jsonable_encoder → json.dumps（FastAPIのJSONResponse相当）
+- ファイル: json.dump(ensure_ascii=False, indent=2)
+新経路:
+- API応答: 事前計算ファイルのバイト列をそのまま返す / orjsonで直接エンコード
+- ファイル: utils.serialization.dumps（インデントなし）
+
+実行:
+    cd backend && python -m benchmarks.bench_serialization
+"""
+
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi.encoders import jsonable_encoder
+
+from utils.serialization import dumps
+
+REPEAT = 50
+
+
+def _sparkline(rng: np.random.Generator, n: int = 252) -> dict:
+    data = np.cumsum(rng.normal(0, 1.2, n)).round(2).tolist()
+    return {"data": data, "period_start_index": n - 21}
+
+
+def build_themes_payload(theme_count: int = 20, seed: int = 0) -> dict:
+    """themes_1mo.json 相当の合成ペイロード"""
+    rng = np.random.default_rng(seed)
+    themes = []
+    for i in range(theme_count):
+        themes.append({
+            "id": f"theme_{i:02d}",
+            "name": f"テーマ{i}",
+            "description": "合成データによるベンチマーク用テーマ",
+            "change_percent": round(float(rng.normal(0, 5)), 2),
+            "change_percent_1d": round(float(rng.normal(0, 1)), 2),
+            "stock_count": 10,
+            "top_performer": {"code": f"{1000 + i}.T", "name": f"銘柄{i}", "change": 12.34},
+            "sparkline": _sparkline(rng),
+        })
+    return {
+        "period": "1mo",
+        "generated_at": "2026-01-05T15:30:00",
+        "last_trading_date": "2026-01-05 15:00",
+        "themes": themes,
+    }
+
+
+def build_theme_detail_payload(stock_count: int = 10, seed: int = 1) -> dict:
+    """theme_{id}_{period}.json 相当の合成ペイロード"""
+    rng = np.random.default_rng(seed)
+    stocks = []
+    for i in range(stock_count):
+        stocks.append({
+            "code": f"{2000 + i}.T",
+            "name": f"銘柄{i}",
+            "description": "合成データ",
+            "change_percent": round(float(rng.normal(0, 5)), 2),
+            "change_percent_1d": round(float(rng.normal(0, 1)), 2),
+            "price": round(float(rng.uniform(500, 20000)), 1),
+            "market_cap": int(rng.integers(10**10, 10**13)),
+            "beta": round(float(rng.normal(1, 0.3)), 2),
+            "alpha": round(float(rng.normal(0, 5)), 2),
+            "r_squared": round(float(rng.uniform(0, 1)), 3),
+            "sparkline": _sparkline(rng),
+        })
+    return {
+        "id": "theme_00",
+        "name": "テーマ0",
+        "description": "合成データによるベンチマーク用テーマ",
+        "period": "1mo",
+        "change_percent": 3.21,
+        "sparkline": _sparkline(rng),
+        "stocks": stocks,
+    }
+
+
+def _time_ms(func, repeat: int = REPEAT) -> float:
+    """中央値（ミリ秒）"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return float(np.median(samples))
+
+
+def bench_payload(name: str, payload: dict) -> dict:
+    """1ペイロード分の計測結果"""
+    file_old = json.dumps(payload, ensure_ascii=False, indent=2).encode("utf-8")
+    file_new = dumps(payload)
+
+    def old_response():
+        return json.dumps(
+            jsonable_encoder(payload), ensure_ascii=False, separators=(",", ":")
+        ).encode("utf-8")
+
+    def old_file_response():
+        # 旧経路: ファイル読み込み → json.load → jsonable_encoder → json.dumps
+        return json.dumps(
+            jsonable_encoder(json.loads(file_old)), ensure_ascii=False, separators=(",", ":")
+        ).encode("utf-8")
+
+    return {
+        "payload": name,
+        "file_bytes_old": len(file_old),
+        "file_bytes_new": len(file_new),
+        "file_write_ms_old": _time_ms(lambda: json.dumps(payload, ensure_ascii=False, indent=2)),
+        "file_write_ms_new": _time_ms(lambda: dumps(payload)),
+        "encode_ms_old": _time_ms(old_response),
+        "encode_ms_new": _time_ms(lambda: dumps(payload)),
+        "serve_precomputed_ms_old": _time_ms(old_file_response),
+        # 新経路はバイト列をそのまま返すためデコード・エンコードが発生しない
+        "serve_precomputed_ms_new": 0.0,
+    }
+
+
+def run() -> list[dict]:
+    """全ペイロードのベンチマークを実行"""
+    return [
+        bench_payload("themes_1mo", build_themes_payload()),
+        bench_payload("theme_detail", build_theme_detail_payload()),
+    ]
+
+
+def main() -> None:
+    results = run()
+    for result in results:
+        print(f"[{result['payload']}]")
+        print(f"  file size      : {result['file_bytes_old']:>8,} B -> {result['file_bytes_new']:>8,} B")
+        print(f"  file encode    : {result['file_write_ms_old']:>8.3f} ms -> {result['file_write_ms_new']:>8.3f} ms")
+        print(f"  response encode: {result['encode_ms_old']:>8.3f} ms -> {result['encode_ms_new']:>8.3f} ms")
+        print(f"  serve file     : {result['serve_precomputed_ms_old']:>8.3f} ms -> raw bytes")
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""加重方式別テーマ指数のベンチマーク
+
+500テーマ × 50銘柄（約3,800銘柄）の5年分（1,260営業日）の終値行列について、
+全テーマを疎行列積で一括計算する場合と、テーマごとに計算する場合の所要時間を比較する。
+あわせて全期間 × 3方式の theme_index_{period}.json 生成時間と、ランキングへの差し替え時間を計測する。
+
+実行:
+    cd backend && python -m benchmarks.bench_theme_index
+"""
+
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.bench_serialization import _time_ms
+from benchmarks.bench_theme_registry import build_theme_definitions
+from data.theme_loader import validate_themes
+from services.price_matrix import PriceMatrix
+from services.sparkline import PERIOD_DAYS
+from services.theme_index import (
+    _scale,
+    apply_index_to_ranking,
+    build_theme_indices,
+    compute_index_levels,
+    membership_matrix,
+    rebalance_anchors,
+)
+
+DAYS = PERIOD_DAYS["5y"]
+
+
+def build_matrix(tickers: list[str], days: int = DAYS, period: str = "5y", seed: int = 11) -> PriceMatrix:
+    """合成の終値行列（1割の銘柄は期間の途中から上場）"""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end="2026-01-05", periods=days)
+    close = 1000 * np.cumprod(1 + rng.normal(0.0003, 0.02, size=(days, len(tickers))), axis=0)
+    late = rng.choice(len(tickers), size=len(tickers) // 10, replace=False)
+    for column in late:
+        close[: rng.integers(1, days - 1), column] = np.nan
+    return PriceMatrix(period, dates.to_numpy(), tickers, close)
+
+
+def per_theme_levels(matrix: PriceMatrix, membership, scale, anchors) -> list[np.ndarray]:
+    """比較用: テーマごとに列を切り出して計算"""
+    results = []
+    for row in range(membership.shape[0]):
+        columns = membership.getrow(row).indices
+        results.append(compute_index_levels(
+            matrix.close[:, columns], anchors, membership[row][:, columns], scale[columns],
+        )[0])
+    return results
+
+
+def run() -> dict:
+    """一括計算とテーマごとの計算、指数ファイル生成のベンチマークを実行"""
+    themes = validate_themes(build_theme_definitions())
+    tickers = list(dict.fromkeys(ticker for theme in themes.values() for ticker in theme["tickers"]))
+    matrix = build_matrix(tickers)
+    rng = np.random.default_rng(3)
+    market_caps = {
+        ticker: {"market_cap": float(rng.lognormal(25, 1.5)), "float_ratio": float(rng.uniform(0.3, 1.0))}
+        for ticker in tickers
+    }
+
+    theme_ids = list(themes)
+    membership = membership_matrix(matrix, theme_ids, themes, "market_cap")
+    scale = _scale(matrix, "market_cap", market_caps)
+    anchors = rebalance_anchors(matrix.dates)
+
+    # 期間ごとの行列（5y の末尾を切り出す）
+    matrices = {
+        period: PriceMatrix(period, matrix.dates[-days - 1:].to_numpy(), tickers, matrix.close[-days - 1:].copy())
+        for period, days in PERIOD_DAYS.items()
+    }
+    indices = build_theme_indices(matrices, themes, market_caps)
+    ranking = {"themes": [{"id": theme_id, "change_percent": 0.0} for theme_id in theme_ids]}
+
+    return {
+        "themes": len(themes),
+        "tickers": len(tickers),
+        "days": DAYS,
+        "rebalances": len(anchors),
+        "vectorized_ms": _time_ms(lambda: compute_index_levels(matrix.close, anchors, membership, scale), repeat=5),
+        "per_theme_ms": _time_ms(lambda: per_theme_levels(matrix, membership, scale, anchors), repeat=3),
+        "all_periods_all_weightings_ms": _time_ms(
+            lambda: build_theme_indices(matrices, themes, market_caps), repeat=3
+        ),
+        "index_file_kib": round(len(json.dumps(indices["1mo"])) / 1024, 1),
+        "apply_to_ranking_ms": _time_ms(lambda: apply_index_to_ranking(ranking, indices["1mo"], "market_cap")),
+    }
+
+
+def main() -> None:
+    result = run()
+    print(
+        f"{result['themes']} themes / {result['tickers']:,} tickers / {result['days']} days "
+        f"({result['rebalances']} rebalances)"
+    )
+    print(f"  vectorized            {result['vectorized_ms']:>9.1f} ms")
+    print(f"  per theme             {result['per_theme_ms']:>9.1f} ms")
+    print(f"  9 periods x 3 methods {result['all_periods_all_weightings_ms']:>9.1f} ms")
+    print(f"  theme_index_1mo.json  {result['index_file_kib']:>9.1f} KiB")
+    print(f"  apply to ranking      {result['apply_to_ranking_ms']:>9.2f} ms")
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
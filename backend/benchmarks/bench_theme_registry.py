@@ -0,0 +1,145 @@
+"""テーマ定義ファイル・レジストリのベンチマーク
+
+500テーマ × 50銘柄（東証上場銘柄数相当の約3,800銘柄から抽出）の合成テーマ定義について、
+ファイル形式（JSON / CSV / YAML）ごとの読み込み・検証時間と、
+レジストリ・検索インデックスの構築時間およびメモリ使用量を計測する。
+比較として組み込みの20テーマ × 10銘柄の値も出力する。
+
+実行:
+    cd backend && python -m benchmarks.bench_theme_registry
+"""
+
+import csv
+import json
+import sys
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.bench_search import NAME_PARTS
+from benchmarks.bench_serialization import _time_ms
+from data.theme_loader import CSV_COLUMNS, load_themes, yaml
+from data.themes import THEMES, build_registry
+from services.search_index import SearchIndex
+from utils.serialization import dumps
+
+THEME_COUNT = 500
+TICKERS_PER_THEME = 50
+UNIVERSE_SIZE = 3_800
+
+
+def build_theme_definitions(
+    theme_count: int = THEME_COUNT,
+    tickers_per_theme: int = TICKERS_PER_THEME,
+    universe_size: int = UNIVERSE_SIZE,
+    seed: int = 6,
+) -> list[dict]:
+    """テーマ定義ファイル相当の合成データ（銘柄オブジェクト形式）"""
+    rng = np.random.default_rng(seed)
+    universe = [f"{1300 + i * 2}" for i in range(universe_size)]
+    names = {
+        code: NAME_PARTS[i % len(NAME_PARTS)] + NAME_PARTS[(i * 7 + 3) % len(NAME_PARTS)]
+        for i, code in enumerate(universe)
+    }
+    return [
+        {
+            "id": f"theme_{i:03d}",
+            "name": f"テーマ{i}{NAME_PARTS[i % len(NAME_PARTS)]}",
+            "description": f"{NAME_PARTS[(i * 3) % len(NAME_PARTS)]}関連企業",
+            "tickers": [
+                {"code": f"{code}.T", "name": names[code], "description": f"{names[code]}の事業概要"}
+                for code in rng.choice(universe, size=tickers_per_theme, replace=False)
+            ],
+        }
+        for i in range(theme_count)
+    ]
+
+
+def write_theme_files(definitions: list[dict], directory: Path) -> dict[str, Path]:
+    """同じ定義を各形式で書き出す"""
+    paths = {"json": directory / "themes.json", "csv": directory / "themes.csv"}
+    paths["json"].write_bytes(dumps({"themes": definitions}))
+    with paths["csv"].open("w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_COLUMNS)
+        for theme in definitions:
+            for ticker in theme["tickers"]:
+                writer.writerow([
+                    theme["id"], theme["name"], theme["description"],
+                    ticker["code"], ticker["name"], ticker["description"],
+                ])
+    if yaml is not None:
+        paths["yaml"] = directory / "themes.yaml"
+        paths["yaml"].write_text(yaml.safe_dump({"themes": definitions}, allow_unicode=True), encoding="utf-8")
+    return paths
+
+
+def _allocated_kib(build) -> tuple[float, float]:
+    """build() の戻り値が保持するメモリと、構築中のピーク（KiB）"""
+    tracemalloc.start()
+    result = build()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return current / 1024, peak / 1024
+
+
+def bench_themes(themes: dict[str, dict]) -> dict:
+    """レジストリ・検索インデックスの構築時間とメモリ"""
+    registry_kib, registry_peak_kib = _allocated_kib(lambda: build_registry(themes))
+    index_kib, _ = _allocated_kib(lambda: SearchIndex(themes))
+    registry = build_registry(themes)
+    return {
+        "themes": len(themes),
+        "memberships": sum(len(theme["tickers"]) for theme in themes.values()),
+        "unique_tickers": len(registry.tickers),
+        "registry_build_ms": _time_ms(lambda: build_registry(themes), repeat=5),
+        "registry_kib": round(registry_kib, 1),
+        "registry_peak_kib": round(registry_peak_kib, 1),
+        "search_index_build_ms": _time_ms(lambda: SearchIndex(themes), repeat=3),
+        "search_index_kib": round(index_kib, 1),
+        "lookup_us": _time_ms(lambda: registry.ticker_themes.get(registry.tickers[-1])) * 1000,
+    }
+
+
+def run() -> dict:
+    """ファイル形式ごとの読み込みとレジストリのベンチマークを実行"""
+    definitions = build_theme_definitions()
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = write_theme_files(definitions, Path(tmp))
+        themes = load_themes(paths["json"])
+        loads = {
+            fmt: {
+                "file_kib": round(path.stat().st_size / 1024, 1),
+                "load_validate_ms": _time_ms(lambda: load_themes(path), repeat=3),
+            }
+            for fmt, path in paths.items()
+        }
+    return {
+        "file": loads,
+        "large": bench_themes(themes),
+        "builtin": bench_themes(THEMES),
+    }
+
+
+def main() -> None:
+    result = run()
+    for fmt, load in result["file"].items():
+        print(f"  {fmt:<5} {load['file_kib']:>8.1f} KiB  load+validate {load['load_validate_ms']:>8.1f} ms")
+    for label in ("large", "builtin"):
+        bench = result[label]
+        print(
+            f"{bench['themes']:>4} themes / {bench['memberships']:>6,} memberships / "
+            f"{bench['unique_tickers']:>5,} tickers  registry {bench['registry_build_ms']:>6.1f} ms "
+            f"{bench['registry_kib']:>8.1f} KiB  search index {bench['search_index_build_ms']:>7.1f} ms "
+            f"{bench['search_index_kib']:>8.1f} KiB"
+        )
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""ワイヤーフォーマットのベンチマーク（JSON vs MessagePack vs Arrow IPC）
+
+ヒートマップとテーマ詳細の合成ペイロードを各形式でエンコードし、
+ペイロードサイズとクライアント側のデコード時間を比較する。
+
+実行:
+    cd backend && python -m benchmarks.bench_wire_formats
+"""
+
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.bench_serialization import _time_ms, build_theme_detail_payload
+from routers.themes import heatmap_table, theme_detail_table
+from utils.serialization import dumps
+from utils.wire_format import decode_arrow, decode_msgpack, encode_arrow, encode_msgpack
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+CATEGORIES = {
+    "mega": "超大型",
+    "large": "大型",
+    "mid": "中型",
+    "small": "小型",
+    "micro": "超小型",
+}
+
+
+def build_heatmap_payload(stock_count: int = 200, seed: int = 2) -> dict:
+    """heatmap_{period}.json 相当の合成ペイロード"""
+    rng = np.random.default_rng(seed)
+    stocks_by_category = {key: [] for key in CATEGORIES}
+    keys = list(CATEGORIES)
+    for i in range(stock_count):
+        key = keys[i % len(keys)]
+        stocks_by_category[key].append({
+            "code": f"{3000 + i}.T",
+            "name": f"銘柄{i}",
+            "theme_id": f"theme_{i % 20:02d}",
+            "theme_name": f"テーマ{i % 20}",
+            "change_percent": round(float(rng.normal(0, 5)), 2),
+            "market_cap": int(rng.integers(10**9, 10**13)),
+            "market_cap_category": {"id": key, "label": CATEGORIES[key], "color": "#4ade80"},
+        })
+    return {
+        "period": "1mo",
+        "categories": {
+            key: {
+                "id": key,
+                "label": label,
+                "threshold": "-",
+                "stocks": stocks_by_category[key],
+                "count": len(stocks_by_category[key]),
+            }
+            for key, label in CATEGORIES.items()
+        },
+        "last_updated": "2026-01-05 15:00",
+        "generated_at": "2026-01-05T15:30:00",
+    }
+
+
+def bench_payload(name: str, payload: dict, table) -> list[dict]:
+    """1ペイロード分の形式別計測結果"""
+    json_body = dumps(payload)
+    msgpack_body = encode_msgpack(payload)
+    arrow_body = encode_arrow(*table(payload))
+
+    results = [
+        {
+            "payload": name,
+            "format": "json (stdlib loads)",
+            "bytes": len(json_body),
+            "decode_ms": _time_ms(lambda: json.loads(json_body)),
+        },
+        {
+            "payload": name,
+            "format": "msgpack",
+            "bytes": len(msgpack_body),
+            "decode_ms": _time_ms(lambda: decode_msgpack(msgpack_body)),
+        },
+        {
+            "payload": name,
+            "format": "arrow (read_all)",
+            "bytes": len(arrow_body),
+            "decode_ms": _time_ms(lambda: decode_arrow(arrow_body)),
+        },
+        {
+            "payload": name,
+            "format": "arrow (to_pylist)",
+            "bytes": len(arrow_body),
+            "decode_ms": _time_ms(lambda: decode_arrow(arrow_body)[0].to_pylist()),
+        },
+    ]
+    if orjson is not None:
+        results.insert(1, {
+            "payload": name,
+            "format": "json (orjson loads)",
+            "bytes": len(json_body),
+            "decode_ms": _time_ms(lambda: orjson.loads(json_body)),
+        })
+    return results
+
+
+def run() -> list[dict]:
+    """全ペイロードのベンチマークを実行"""
+    return [
+        *bench_payload("heatmap", build_heatmap_payload(), heatmap_table),
+        *bench_payload("theme_detail", build_theme_detail_payload(), theme_detail_table),
+    ]
+
+
+def main() -> None:
+    results = run()
+    for result in results:
+        print(
+            f"{result['payload']:<13} {result['format']:<20} "
+            f"{result['bytes']:>8,} B  decode {result['decode_ms']:>7.3f} ms"
+        )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
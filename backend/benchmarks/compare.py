@@ -0,0 +1,108 @@
+"""ベンチマーク結果（JSON）のコミット間比較
+
+各ベンチマークの結果を入れ子のキーで平坦化し、しきい値を超えて悪化した指標を報告する。
+指標の向きはキー名の接尾辞で判定する（それ以外の数値は件数などとして比較しない）。
+
+- 小さいほど良い: *_ms, *_s, *_mib, *_kib
+- 大きいほど良い: *_per_s
+
+実行:
+    cd backend && python -m benchmarks.compare baseline.json current.json --threshold 0.2
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Any
+
+# 大きいほど良い指標（*_s より先に判定する）
+HIGHER_IS_BETTER = ("_per_s",)
+
+# 小さいほど良い指標
+LOWER_IS_BETTER = ("_ms", "_s", "_mib", "_kib")
+
+# 比較しない最上位キー（実行環境などの情報）
+IGNORED_KEYS = ("meta",)
+
+DEFAULT_THRESHOLD = 0.2
+
+
+def flatten(result: Any, prefix: str = "") -> dict[str, float]:
+    """結果を {"pipeline.2000.cycle_s": 12.3, ...} の形に平坦化（数値のみ）"""
+    if isinstance(result, dict):
+        items = result.items()
+    elif isinstance(result, list):
+        items = enumerate(result)
+    elif isinstance(result, (int, float)) and not isinstance(result, bool):
+        return {prefix: float(result)}
+    else:
+        return {}
+
+    flat: dict[str, float] = {}
+    for key, value in items:
+        if not prefix and key in IGNORED_KEYS:
+            continue
+        flat.update(flatten(value, f"{prefix}.{key}" if prefix else str(key)))
+    return flat
+
+
+def direction(metric: str) -> int:
+    """1: 大きいほど良い / -1: 小さいほど良い / 0: 比較しない"""
+    if metric.endswith(HIGHER_IS_BETTER):
+        return 1
+    if metric.endswith(LOWER_IS_BETTER):
+        return -1
+    return 0
+
+
+def compare(baseline: Any, current: Any, threshold: float = DEFAULT_THRESHOLD) -> list[dict]:
+    """両方の結果にある指標を比較し、threshold（0.2 = 20%）を超えて悪化したものを返す
+
+    Returns:
+        [{"metric", "baseline", "current", "change"}]（change は悪化の割合、悪い順）
+    """
+    old, new = flatten(baseline), flatten(current)
+    regressions = []
+    for metric in sorted(old.keys() & new.keys()):
+        sign = direction(metric)
+        if not sign or old[metric] <= 0:
+            continue
+        change = (old[metric] - new[metric]) / old[metric] if sign > 0 else (new[metric] - old[metric]) / old[metric]
+        if change > threshold:
+            regressions.append({
+                "metric": metric,
+                "baseline": old[metric],
+                "current": new[metric],
+                "change": round(change, 4),
+            })
+    return sorted(regressions, key=lambda r: -r["change"])
+
+
+def report(regressions: list[dict], threshold: float) -> str:
+    if not regressions:
+        return f"No regressions over {threshold:.0%}"
+    lines = [f"{len(regressions)} regression(s) over {threshold:.0%}:"]
+    for r in regressions:
+        lines.append(f"  {r['metric']:<60} {r['baseline']:>12.3f} -> {r['current']:>12.3f}  (+{r['change']:.0%})")
+    return "\n".join(lines)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("baseline", type=Path)
+    parser.add_argument("current", type=Path)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed slowdown (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    regressions = compare(
+        json.loads(args.baseline.read_text(encoding="utf-8")),
+        json.loads(args.current.read_text(encoding="utf-8")),
+        args.threshold,
+    )
+    print(report(regressions, args.threshold))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
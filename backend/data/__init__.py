@@ -2,13 +2,18 @@
 
 from data.themes import (
     THEMES,
+    ThemeRegistry,
+    build_registry,
     get_all_tickers,
+    get_registry,
     get_theme_by_id,
     get_theme_description,
     get_theme_names,
     get_theme_tickers,
     get_ticker_info,
     get_ticker_name,
+    get_ticker_themes,
+    rebuild_registry,
 )
 
 __all__ = [
@@ -20,4 +25,9 @@ __all__ = [
     "get_ticker_name",
     "get_all_tickers",
     "get_ticker_info",
+    "get_ticker_themes",
+    "ThemeRegistry",
+    "build_registry",
+    "get_registry",
+    "rebuild_registry",
 ]
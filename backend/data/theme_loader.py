@@ -0,0 +1,399 @@
+"""テーマ定義ファイルの読み込み・検証・ホットリロード
+
+環境変数 THEMES_FILE でファイルを指定すると、組み込みの THEMES の代わりにその定義を使う。
+対応形式（拡張子で判定）:
+- .json / .yaml / .yml: テーマの配列、{"themes": [...]}、またはテーマID -> テーマ のdict
+  tickers は銘柄コードの配列（名称・説明は ticker_names / ticker_descriptions）か、
+  {"code", "name", "description", "weight"} の配列
+  カスタム加重指数のウェイトは weights（銘柄コード -> ウェイト）か各銘柄の weight で指定する（全銘柄分が必要）
+- .csv: 1行1所属（theme_id, theme_name, theme_description, ticker, ticker_name, ticker_description, weight）
+
+reload_themes() はファイルの (mtime_ns, size) が変わったときだけ読み直し、
+検証を通った定義で THEMES を置き換えてレジストリ・検索インデックスを作り直す。
+検証エラー時は現在の定義をそのまま使い続ける。
+"""
+
+import csv
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Optional
+
+from utils.serialization import loads
+
+try:
+    import yaml
+except ImportError:  # pragma: no cover - PyYAMLは任意依存
+    yaml = None
+
+logger = logging.getLogger(__name__)
+
+THEMES_FILE_ENV = "THEMES_FILE"
+
+THEME_FILE_SUFFIXES = (".json", ".yaml", ".yml", ".csv")
+
+# 1ファイルあたりの上限（誤ったファイルで巨大な定義を読み込まないため）
+MAX_THEMES = 2_000
+MAX_TICKERS_PER_THEME = 1_000
+
+# エラーメッセージに含める件数
+MAX_REPORTED_ERRORS = 20
+
+THEME_ID_PATTERN = re.compile(r"^[a-zA-Z0-9_-]{1,64}$")
+TICKER_PATTERN = re.compile(r"^[0-9]{4}(\.T)?$")
+
+# CSVの列（theme_id, theme_name, ticker は必須）
+CSV_COLUMNS = (
+    "theme_id", "theme_name", "theme_description", "ticker", "ticker_name", "ticker_description", "weight",
+)
+CSV_REQUIRED_COLUMNS = ("theme_id", "theme_name", "ticker")
+
+
+class ThemeFileError(ValueError):
+    """テーマ定義ファイルの読み込み・検証エラー"""
+
+    def __init__(self, message: str, errors: Optional[list[str]] = None) -> None:
+        self.errors = errors or []
+        if self.errors:
+            shown = self.errors[:MAX_REPORTED_ERRORS]
+            more = len(self.errors) - len(shown)
+            message = f"{message}: " + "; ".join(shown) + (f" (+{more} more)" if more else "")
+        super().__init__(message)
+
+
+# =============================================================================
+# 読み込み
+# =============================================================================
+
+def _read_csv(path: Path) -> list[dict]:
+    """CSV（1行1所属）をテーマの配列に変換"""
+    themes: dict[str, dict] = {}
+    with path.open(encoding="utf-8-sig", newline="") as f:
+        reader = csv.DictReader(f)
+        missing = [column for column in CSV_REQUIRED_COLUMNS if column not in (reader.fieldnames or [])]
+        if missing:
+            raise ThemeFileError(f"Missing CSV columns: {', '.join(missing)}")
+        for row in reader:
+            theme_id = (row.get("theme_id") or "").strip()
+            theme = themes.setdefault(theme_id, {
+                "id": theme_id,
+                "name": (row.get("theme_name") or "").strip(),
+                "description": (row.get("theme_description") or "").strip(),
+                "tickers": [],
+            })
+            theme["tickers"].append({
+                "code": (row.get("ticker") or "").strip(),
+                "name": (row.get("ticker_name") or "").strip() or None,
+                "description": (row.get("ticker_description") or "").strip() or None,
+                "weight": (row.get("weight") or "").strip() or None,
+            })
+    return list(themes.values())
+
+
+def read_theme_file(path: Path) -> Any:
+    """テーマ定義ファイルを読み込む（検証前の生データ）"""
+    suffix = path.suffix.lower()
+    if suffix not in THEME_FILE_SUFFIXES:
+        raise ThemeFileError(f"Unsupported theme file format: {path.suffix} ({', '.join(THEME_FILE_SUFFIXES)})")
+    if suffix in (".yaml", ".yml") and yaml is None:
+        raise ThemeFileError("PyYAML is required to load YAML theme files")
+
+    try:
+        if suffix == ".csv":
+            return _read_csv(path)
+        if suffix == ".json":
+            return loads(path.read_bytes())
+        # libyaml があればCローダー（純Python版は大きなファイルで数十倍遅い）
+        loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+        return yaml.load(path.read_text(encoding="utf-8"), Loader=loader)
+    except ThemeFileError:
+        raise
+    except OSError as e:
+        raise ThemeFileError(f"Failed to read theme file {path.name}: {e}") from e
+    except Exception as e:
+        # JSON・YAML・CSVの構文エラー
+        raise ThemeFileError(f"Failed to parse theme file {path.name}: {e}") from e
+
+
+# =============================================================================
+# 検証
+# =============================================================================
+
+def _theme_list(raw: Any) -> list:
+    """トップレベルの形式の違いを吸収してテーマの配列にする"""
+    if isinstance(raw, dict) and isinstance(raw.get("themes"), list):
+        return raw["themes"]
+    if isinstance(raw, dict):
+        return [
+            {"id": theme_id, **theme} if isinstance(theme, dict) else theme
+            for theme_id, theme in raw.items()
+        ]
+    if isinstance(raw, list):
+        return raw
+    raise ThemeFileError("Theme file must contain a list of themes or a mapping of theme id to theme")
+
+
+def _optional_text(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    return str(value).strip() or None
+
+
+def _weight_value(value: Any) -> Optional[float]:
+    """ウェイトを正の有限数に変換（不正ならNone）"""
+    if isinstance(value, bool):
+        return None
+    try:
+        weight = float(value)
+    except (TypeError, ValueError):
+        return None
+    return weight if math.isfinite(weight) and weight > 0 else None
+
+
+def _validate_theme(index: int, theme: Any, errors: list[str]) -> Optional[dict]:
+    """1テーマを検証して内部形式（THEMES の値と同じ形）に変換。エラー時はNone"""
+    where = f"themes[{index}]"
+    if not isinstance(theme, dict):
+        errors.append(f"{where}: must be an object")
+        return None
+
+    theme_id = theme.get("id")
+    if not isinstance(theme_id, str) or not THEME_ID_PATTERN.match(theme_id):
+        errors.append(f"{where}.id: invalid theme id {theme_id!r}")
+        return None
+    where = f"themes[{theme_id}]"
+
+    name = theme.get("name")
+    if not isinstance(name, str) or not name.strip():
+        errors.append(f"{where}.name: required")
+        return None
+
+    raw_tickers = theme.get("tickers")
+    if not isinstance(raw_tickers, list) or not raw_tickers:
+        errors.append(f"{where}.tickers: must be a non-empty list")
+        return None
+    if len(raw_tickers) > MAX_TICKERS_PER_THEME:
+        errors.append(f"{where}.tickers: too many tickers ({len(raw_tickers)} > {MAX_TICKERS_PER_THEME})")
+        return None
+
+    names = theme.get("ticker_names") or {}
+    descriptions = theme.get("ticker_descriptions") or {}
+    weights = theme.get("weights") or {}
+    if not isinstance(names, dict) or not isinstance(descriptions, dict) or not isinstance(weights, dict):
+        errors.append(f"{where}: ticker_names / ticker_descriptions / weights must be objects")
+        return None
+
+    tickers: list[str] = []
+    ticker_names: dict[str, str] = {}
+    ticker_descriptions: dict[str, str] = {}
+    ticker_weights: dict[str, float] = {}
+    valid = True
+    for position, item in enumerate(raw_tickers):
+        if isinstance(item, dict):
+            code, name_value, description = item.get("code"), item.get("name"), item.get("description")
+            weight_value = item.get("weight")
+        else:
+            code, name_value, description, weight_value = item, None, None, None
+        code = str(code).strip() if isinstance(code, (str, int)) else ""
+        if not TICKER_PATTERN.match(code):
+            errors.append(f"{where}.tickers[{position}]: invalid stock code {code!r}")
+            valid = False
+            continue
+        ticker = code if code.endswith(".T") else f"{code}.T"
+        if ticker in ticker_names:
+            errors.append(f"{where}.tickers[{position}]: duplicate stock code {ticker}")
+            valid = False
+            continue
+        tickers.append(ticker)
+        ticker_names[ticker] = (
+            _optional_text(name_value) or _optional_text(names.get(ticker)) or _optional_text(names.get(code))
+            or ticker
+        )
+        description = _optional_text(description) or _optional_text(descriptions.get(ticker))
+        if description:
+            ticker_descriptions[ticker] = description
+        if weight_value is None:
+            weight_value = weights.get(ticker, weights.get(code))
+        if weight_value is not None:
+            weight = _weight_value(weight_value)
+            if weight is None:
+                errors.append(f"{where}.tickers[{position}]: weight must be a positive number ({weight_value!r})")
+                valid = False
+                continue
+            ticker_weights[ticker] = weight
+    if not valid:
+        return None
+    if ticker_weights and len(ticker_weights) != len(tickers):
+        missing = [ticker for ticker in tickers if ticker not in ticker_weights]
+        errors.append(f"{where}.weights: missing weights for {', '.join(missing)}")
+        return None
+
+    result = {
+        "id": theme_id,
+        "name": name.strip(),
+        "description": _optional_text(theme.get("description")) or "",
+        "tickers": tickers,
+        "ticker_names": ticker_names,
+        "ticker_descriptions": ticker_descriptions,
+    }
+    if ticker_weights:
+        result["weights"] = ticker_weights
+    return result
+
+
+def validate_themes(raw: Any) -> dict[str, dict]:
+    """生データを検証して THEMES と同じ形式（テーマID -> テーマ）に変換
+
+    Raises:
+        ThemeFileError: 1件でも不正なテーマがある場合（エラーを全件まとめて報告）
+    """
+    items = _theme_list(raw)
+    if not items:
+        raise ThemeFileError("Theme file contains no themes")
+    if len(items) > MAX_THEMES:
+        raise ThemeFileError(f"Too many themes: {len(items)} (max {MAX_THEMES})")
+
+    errors: list[str] = []
+    themes: dict[str, dict] = {}
+    for index, item in enumerate(items):
+        theme = _validate_theme(index, item, errors)
+        if theme is None:
+            continue
+        if theme["id"] in themes:
+            errors.append(f"themes[{index}].id: duplicate theme id {theme['id']!r}")
+            continue
+        themes[theme["id"]] = theme
+
+    if errors:
+        raise ThemeFileError("Invalid theme definitions", errors)
+    return themes
+
+
+def load_themes(path: Path) -> dict[str, dict]:
+    """テーマ定義ファイルを読み込んで検証"""
+    return validate_themes(read_theme_file(path))
+
+
+# =============================================================================
+# 差分
+# =============================================================================
+
+def theme_fingerprints(themes: dict[str, dict]) -> dict[str, str]:
+    """テーマごとの内容ハッシュ（キー順に依存しない）"""
+    return {
+        theme_id: hashlib.sha1(
+            json.dumps(theme, sort_keys=True, ensure_ascii=False).encode("utf-8")
+        ).hexdigest()
+        for theme_id, theme in themes.items()
+    }
+
+
+@dataclass(frozen=True)
+class ThemeChanges:
+    """テーマ定義の差分"""
+    added: tuple[str, ...] = ()
+    changed: tuple[str, ...] = ()
+    removed: tuple[str, ...] = ()
+
+    @property
+    def updated(self) -> tuple[str, ...]:
+        """再計算が必要なテーマ（追加 + 変更）"""
+        return self.added + self.changed
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.changed or self.removed)
+
+    def to_dict(self) -> dict:
+        return {"added": list(self.added), "changed": list(self.changed), "removed": list(self.removed)}
+
+
+def diff_fingerprints(old: dict[str, str], new: dict[str, str]) -> ThemeChanges:
+    """2つのフィンガープリントの差分（追加・変更は new の順、削除は old の順）"""
+    return ThemeChanges(
+        added=tuple(theme_id for theme_id in new if theme_id not in old),
+        changed=tuple(theme_id for theme_id in new if theme_id in old and old[theme_id] != new[theme_id]),
+        removed=tuple(theme_id for theme_id in old if theme_id not in new),
+    )
+
+
+# =============================================================================
+# 適用・ホットリロード
+# =============================================================================
+
+_reload_lock = threading.Lock()
+_loaded_stamp: Optional[tuple[Path, int, int]] = None
+
+
+def theme_file_path() -> Optional[Path]:
+    """環境変数 THEMES_FILE で指定されたテーマ定義ファイル（未設定ならNone）"""
+    value = os.environ.get(THEMES_FILE_ENV, "").strip()
+    return Path(value) if value else None
+
+
+def apply_themes(themes: dict[str, dict]) -> ThemeChanges:
+    """THEMES を新しい定義に置き換え、派生するインデックスを作り直す
+
+    新しい定義（ファイルの順序）のdictを作ってから ThemeTable.replace() で1回で差し替える。
+    現在のdictはその場で変更しないため、更新ジョブやリクエスト処理のスレッドが反復中でも
+    途中まで適用された定義や空のdictを見ることはない
+    """
+    from data import themes as theme_data
+    from services.search_index import rebuild_search_index
+    from utils.cache import cache
+
+    with _reload_lock:
+        current = theme_data.THEMES
+        changes = diff_fingerprints(theme_fingerprints(current), theme_fingerprints(themes))
+        if not changes and list(current) == list(themes):
+            return changes
+
+        current.replace(themes)
+
+        theme_data.rebuild_registry()
+        rebuild_search_index(current)
+        # テーマ構成に依存するリアルタイム計算のキャッシュを破棄
+        cache.clear()
+
+    logger.info(
+        f"Theme definitions applied: {len(themes)} themes "
+        f"(added {len(changes.added)}, changed {len(changes.changed)}, removed {len(changes.removed)})"
+    )
+    return changes
+
+
+def reload_themes(path: Optional[Path] = None, force: bool = False) -> Optional[ThemeChanges]:
+    """テーマ定義ファイルが更新されていれば読み直して適用
+
+    Args:
+        path: テーマ定義ファイル（省略時は THEMES_FILE）
+        force: Trueならファイルが変わっていなくても読み直す
+
+    Returns:
+        適用した差分。ファイル未指定・未更新の場合はNone
+
+    Raises:
+        ThemeFileError: 読み込み・検証に失敗した場合（現在の定義は変更しない）
+    """
+    global _loaded_stamp
+    path = path or theme_file_path()
+    if path is None:
+        return None
+
+    try:
+        stat = path.stat()
+    except OSError as e:
+        raise ThemeFileError(f"Theme file not found: {path}") from e
+    stamp = (path.resolve(), stat.st_mtime_ns, stat.st_size)
+    if not force and stamp == _loaded_stamp:
+        return None
+
+    themes = load_themes(path)
+    changes = apply_themes(themes)
+    _loaded_stamp = stamp
+    return changes
@@ -1,6 +1,84 @@
-"""テーマ定義モジュール（20テーマ × 10銘柄）"""
+"""テーマ定義モジュール（20テーマ × 10銘柄）
 
-THEMES = {
+THEMES から派生する逆引き（銘柄→所属テーマ・名称・説明など）はインポート時に
+ThemeRegistry として1回だけ構築し、以降は O(1) で参照する。
+THEMES を実行時に置き換える場合は data.theme_loader.apply_themes() を使うこと
+（THEMES_FILE によるテーマ定義ファイルの読み込み・ホットリロードも同関数を経由する）。
+THEMES は ThemeTable で、置き換えは新しいdictへの1回の差し替えで行うため、
+別スレッドで反復中の読み取り側も変更前の定義を最後まで一貫して読める。
+"""
+
+import copy
+import threading
+from collections.abc import MutableMapping
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Iterator, Mapping, Optional
+
+import numpy as np
+
+
+class ThemeTable(MutableMapping):
+    """テーマ定義（テーマID -> 定義）
+
+    読み取りは現在のdictにそのまま委譲し、更新は毎回コピーを作ってから差し替える
+    （現在のdictはその場で変更しない）。各モジュールが import した THEMES の参照は
+    そのままで、最新の定義を読める。
+    """
+
+    __slots__ = ("_themes", "_lock")
+
+    def __init__(self, themes: Mapping[str, dict]) -> None:
+        self._themes: dict[str, dict] = dict(themes)
+        self._lock = threading.Lock()
+
+    def __getitem__(self, theme_id: str) -> dict:
+        return self._themes[theme_id]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._themes)
+
+    def __len__(self) -> int:
+        return len(self._themes)
+
+    def __contains__(self, theme_id: object) -> bool:
+        return theme_id in self._themes
+
+    def get(self, theme_id: str, default=None):
+        return self._themes.get(theme_id, default)
+
+    def keys(self):
+        return self._themes.keys()
+
+    def values(self):
+        return self._themes.values()
+
+    def items(self):
+        return self._themes.items()
+
+    def __setitem__(self, theme_id: str, theme: dict) -> None:
+        with self._lock:
+            self._themes = {**self._themes, theme_id: theme}
+
+    def __delitem__(self, theme_id: str) -> None:
+        with self._lock:
+            themes = dict(self._themes)
+            del themes[theme_id]
+            self._themes = themes
+
+    def replace(self, themes: Mapping[str, dict]) -> None:
+        """定義全体を差し替え（themes の順序がテーマの定義順になる）"""
+        themes = dict(themes)
+        with self._lock:
+            self._themes = themes
+
+    def __deepcopy__(self, memo: dict) -> dict:
+        return copy.deepcopy(self._themes, memo)
+
+    def __repr__(self) -> str:
+        return f"ThemeTable({self._themes!r})"
+
+THEMES = ThemeTable({
     "ai": {
         "id": "ai",
         "name": "AI・人工知能",
@@ -661,7 +739,7 @@ THEMES = {
             "9409.T": "テレビ局。宇宙開発関連報道に注力。",
         }
     },
-}
+})
 
 
 def get_theme_names() -> list[str]:
@@ -700,11 +778,8 @@ def get_ticker_name(theme_id: str, ticker: str) -> str:
 
 
 def get_all_tickers() -> list[str]:
-    """全テーマの全銘柄を取得（重複なし）"""
-    all_tickers = set()
-    for theme_data in THEMES.values():
-        all_tickers.update(theme_data["tickers"])
-    return list(all_tickers)
+    """全テーマの全銘柄を取得（重複なし・テーマ定義順）"""
+    return list(_registry.tickers)
 
 
 def get_ticker_description(theme_id: str, ticker: str) -> str | None:
@@ -717,15 +792,98 @@ def get_ticker_description(theme_id: str, ticker: str) -> str | None:
 
 
 def get_ticker_info(ticker: str) -> dict | None:
-    """銘柄コードから企業情報を取得（所属テーマ含む）"""
-    for theme_id, theme_data in THEMES.items():
-        if ticker in theme_data["tickers"]:
-            descriptions = theme_data.get("ticker_descriptions", {})
-            return {
-                "ticker": ticker,
-                "name": theme_data["ticker_names"].get(ticker, ticker),
-                "description": descriptions.get(ticker),
-                "theme_id": theme_id,
-                "theme_name": theme_data["name"],
-            }
-    return None
+    """銘柄コードから企業情報を取得（所属テーマ含む）
+
+    theme_id / theme_name は最初に所属するテーマ（主テーマ）、theme_ids は所属する全テーマ
+    """
+    registry = _registry
+    theme_ids = registry.ticker_themes.get(ticker)
+    if not theme_ids:
+        return None
+    return {
+        "ticker": ticker,
+        "name": registry.ticker_names[ticker],
+        "description": registry.ticker_descriptions.get(ticker),
+        "theme_id": theme_ids[0],
+        "theme_name": registry.theme_names[theme_ids[0]],
+        "theme_ids": list(theme_ids),
+    }
+
+
+def get_ticker_themes(ticker: str) -> tuple[str, ...]:
+    """銘柄が所属する全テーマのID（テーマ定義順、未登録なら空）"""
+    return _registry.ticker_themes.get(ticker, ())
+
+
+# =============================================================================
+# レジストリ（THEMESから派生する読み取り専用のインデックス）
+# =============================================================================
+
+@dataclass(frozen=True)
+class ThemeRegistry:
+    """テーマ定義から事前計算した逆引きインデックス（読み取り専用）"""
+    theme_ids: tuple[str, ...]
+    theme_names: Mapping[str, str]
+    # 全銘柄（重複なし・テーマ定義順）と、その中の位置
+    tickers: tuple[str, ...]
+    ticker_positions: Mapping[str, int]
+    # 銘柄 -> 所属テーマID（テーマ定義順）
+    ticker_themes: Mapping[str, tuple[str, ...]]
+    # 銘柄 -> 名称・説明（最初に定義されたテーマの値）
+    ticker_names: Mapping[str, str]
+    ticker_descriptions: Mapping[str, Optional[str]]
+    # テーマ -> tickers 内の位置（読み取り専用のint配列。価格行列の列選択などに使う）
+    theme_ticker_indices: Mapping[str, np.ndarray]
+
+
+def build_registry(themes: dict[str, dict]) -> ThemeRegistry:
+    """テーマ定義からレジストリを構築"""
+    tickers: dict[str, int] = {}
+    ticker_themes: dict[str, list[str]] = {}
+    ticker_names: dict[str, str] = {}
+    ticker_descriptions: dict[str, Optional[str]] = {}
+    theme_ticker_indices: dict[str, np.ndarray] = {}
+
+    for theme_id, theme in themes.items():
+        names = theme.get("ticker_names", {})
+        descriptions = theme.get("ticker_descriptions", {})
+        positions = []
+        for ticker in theme["tickers"]:
+            if ticker not in tickers:
+                tickers[ticker] = len(tickers)
+                ticker_names[ticker] = names.get(ticker, ticker)
+                ticker_descriptions[ticker] = descriptions.get(ticker)
+            memberships = ticker_themes.setdefault(ticker, [])
+            if theme_id not in memberships:
+                memberships.append(theme_id)
+            positions.append(tickers[ticker])
+
+        indices = np.array(positions, dtype=np.intp)
+        indices.flags.writeable = False
+        theme_ticker_indices[theme_id] = indices
+
+    return ThemeRegistry(
+        theme_ids=tuple(themes),
+        theme_names=MappingProxyType({theme_id: theme["name"] for theme_id, theme in themes.items()}),
+        tickers=tuple(tickers),
+        ticker_positions=MappingProxyType(tickers),
+        ticker_themes=MappingProxyType({ticker: tuple(ids) for ticker, ids in ticker_themes.items()}),
+        ticker_names=MappingProxyType(ticker_names),
+        ticker_descriptions=MappingProxyType(ticker_descriptions),
+        theme_ticker_indices=MappingProxyType(theme_ticker_indices),
+    )
+
+
+def get_registry() -> ThemeRegistry:
+    """現在のレジストリを取得"""
+    return _registry
+
+
+def rebuild_registry() -> ThemeRegistry:
+    """THEMES からレジストリを作り直す（テーマ定義を変更した後に呼ぶ）"""
+    global _registry
+    _registry = build_registry(THEMES)
+    return _registry
+
+
+_registry = build_registry(THEMES)
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+"""
+一括エクスポートジョブ（OHLCV履歴・テーマ指数・ファンダメンタルズ）
+
+追跡銘柄全体のデータを Hive 形式のパーティション（Parquet / Arrow IPC ファイル）に書き出す。
+  {output}/ohlcv/year=2026/part-{since}-{date}.parquet
+  {output}/theme_index/year=2026/part-{since}-{date}.parquet
+  {output}/fundamentals/as_of=2026-03-02/part-{since}-{date}.parquet
+  {output}/_manifest.json（データセットごとの最終日・ファイル一覧）
+
+--since auto で前回の最終日より後の行だけを書き出す（夜間の差分同期用）。
+ohlcv は銘柄ごとの最終日を記録し、銘柄ごとにその日より後の行を書き出す
+（前回の時点で履歴が遅れていた銘柄の日足も欠けない。記録のない銘柄は全期間）。
+
+実行:
+    cd backend && python -m jobs.export_history --output /data/jp-theme-tracker
+    cd backend && python -m jobs.export_history --output /data/jp-theme-tracker --since auto
+"""
+import argparse
+import logging
+import sys
+from datetime import date, datetime
+from pathlib import Path
+from typing import Optional, Union
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from data.themes import THEMES
+from services.bulk_export import (
+    BULK_DATASETS,
+    BULK_FORMATS,
+    DATE_COLUMNS,
+    KEY_COLUMNS,
+    PartitionWriter,
+    dataset_batches,
+    dataset_schema,
+    manifest_last_dates,
+    manifest_since,
+    read_manifest,
+    update_manifest,
+)
+
+logger = logging.getLogger(__name__)
+
+# 事前計算済みデータの保存先
+PRECOMPUTED_DIR = Path(__file__).parent.parent / "precomputed"
+
+
+def _since_label(since: Optional[date], since_by_key: Optional[dict[str, date]]) -> Optional[date]:
+    """ファイル名・記録に使う since（キーごとの場合は最も古い日）"""
+    if since is None and since_by_key:
+        return min(since_by_key.values())
+    return since
+
+
+def export_dataset(
+    dataset: str,
+    output: Path,
+    fmt: str = "parquet",
+    since: Optional[date] = None,
+    directory: Path = PRECOMPUTED_DIR,
+    themes: Optional[dict[str, dict]] = None,
+    since_by_key: Optional[dict[str, date]] = None,
+) -> PartitionWriter:
+    """1データセットをパーティションに書き出す（ファイル名は since と実行日で決まり、同日の再実行は上書き）
+
+    since_by_key を指定した場合、ファイル名にはその最も古い日を使う
+    """
+    themes = THEMES if themes is None else themes
+    label = _since_label(since, since_by_key)
+    filename = f"part-{label.strftime('%Y%m%d') if label else 'all'}-{date.today().strftime('%Y%m%d')}"
+    writer = PartitionWriter(
+        output / dataset, dataset_schema(dataset), fmt, filename, DATE_COLUMNS[dataset], KEY_COLUMNS.get(dataset)
+    )
+    for batch in dataset_batches(dataset, directory, themes, since, since_by_key):
+        if dataset == "fundamentals":
+            writer.write(batch, f"as_of={batch.column('as_of')[0].as_py().isoformat()}")
+        else:
+            writer.write_by_year(batch)
+    writer.close()
+    return writer
+
+
+def export_history(
+    output: Path,
+    fmt: str = "parquet",
+    since: Union[date, str, None] = None,
+    datasets: tuple[str, ...] = BULK_DATASETS,
+    directory: Path = PRECOMPUTED_DIR,
+    themes: Optional[dict[str, dict]] = None,
+) -> dict:
+    """データセットを書き出し、_manifest.json を更新して返す
+
+    Args:
+        output: 出力先ディレクトリ
+        fmt: parquet または arrow
+        since: この日より後の行だけを書き出す。"auto" ならデータセットごとに前回の最終日
+            （ohlcv は銘柄ごとの前回の最終日）
+        datasets: 書き出すデータセット
+    """
+    output.mkdir(parents=True, exist_ok=True)
+    manifest = read_manifest(output)
+    start_time = datetime.now()
+
+    for dataset in datasets:
+        dataset_since = manifest_since(manifest, dataset) if since == "auto" else since
+        since_by_key = manifest_last_dates(manifest, dataset) if since == "auto" else None
+        if since_by_key:
+            # 記録のある銘柄は銘柄ごとの最終日から、記録のない銘柄（新規追加）は全期間
+            dataset_since = None
+        writer = export_dataset(dataset, output, fmt, dataset_since, directory, themes, since_by_key)
+        manifest = update_manifest(output, manifest, dataset, writer, _since_label(dataset_since, since_by_key))
+        logger.info(
+            f"  Exported {dataset}: {writer.rows:,} rows, {len(writer.files)} files"
+            f" (since={dataset_since}, last_date={writer.last_date})"
+        )
+
+    elapsed = (datetime.now() - start_time).total_seconds()
+    logger.info(f"Bulk export completed in {elapsed:.1f} seconds")
+    return manifest
+
+
+def _parse_since(value: Optional[str]) -> Union[date, str, None]:
+    if value is None or value == "auto":
+        return value
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid date: {value} (expected YYYY-MM-DD or auto)")
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="OHLCV履歴・テーマ指数・ファンダメンタルズの一括エクスポート")
+    parser.add_argument("--output", type=Path, required=True, help="出力先ディレクトリ")
+    parser.add_argument("--format", choices=list(BULK_FORMATS), default="parquet", help="parquet または arrow")
+    parser.add_argument("--since", type=_parse_since, default=None, help="この日より後の行だけ（YYYY-MM-DD または auto）")
+    parser.add_argument(
+        "--datasets",
+        default=",".join(BULK_DATASETS),
+        help=f"カンマ区切り（{', '.join(BULK_DATASETS)}）",
+    )
+    args = parser.parse_args(argv)
+
+    datasets = tuple(d.strip() for d in args.datasets.split(",") if d.strip())
+    unknown = [d for d in datasets if d not in BULK_DATASETS]
+    if unknown:
+        parser.error(f"Unknown datasets: {', '.join(unknown)}")
+
+    export_history(args.output, args.format, args.since, datasets, PRECOMPUTED_DIR)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    )
+    from data.theme_loader import reload_themes
+
+    reload_themes()
+    main()
@@ -6,23 +6,47 @@
 ユーザーリクエスト時はJSONを読むだけで即座に応答可能
 """
 # req:REQ-003
-import json
 import logging
 import sys
 import threading
 from datetime import datetime
 from pathlib import Path
+from typing import Callable
 
 # プロジェクトルートをパスに追加
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from data.themes import THEMES, get_all_tickers, get_ticker_description, get_ticker_name
+from data.themes import THEMES, get_all_tickers, get_ticker_description, get_ticker_name, get_ticker_themes
+from services import pipeline_trace, snapshot
+from services.analytics_service import analytics_filename, build_analytics_snapshot
 from services.calculator import (
-    calculate_daily_returns,
     calculate_return_from_data,
     calculate_theme_daily_returns_from_data,
 )
+from services.correlation import CORRELATION_PERIODS, compute_correlations, save_correlations
 from services.data_fetcher import fetch_batch_parallel, fetch_stock_data, get_market_cap
+from services.metrics_table import (
+    INDICATOR_PERIOD,
+    MetricsTable,
+    build_metric_records,
+    compute_betas,
+    compute_indicators,
+    get_metrics_table,
+    heatmap_payload,
+    metrics_filename,
+)
+from services.price_matrix import BENCHMARK_TICKER, PriceMatrix, get_price_matrix, save_price_matrix
+from services.sparkline import (
+    PERIOD_DAYS,
+    SPARKLINE_POINT_BUDGETS,
+    build_sparkline,
+    downsample_payload,
+    empty_sparkline,
+    sparkline_source_period,
+)
+from services.theme_detail import build_detail_payload
+from services.theme_index import build_theme_indices, theme_index_filename
+from utils.serialization import dumps, read_json_file, write_json_bytes
 
 logger = logging.getLogger(__name__)
 
@@ -30,31 +54,48 @@ logger = logging.getLogger(__name__)
 PRECOMPUTED_DIR = Path(__file__).parent.parent / "precomputed"
 PRECOMPUTED_DIR.mkdir(exist_ok=True)
 
-# サポートする期間
-PERIODS = ["1d", "5d", "10d", "1mo", "3mo", "6mo", "1y"]
+# サポートする期間（APIが受け付ける全期間を事前計算する）
+# 3y/5y は長期履歴ストアから切り出すため、追加の全期間ダウンロードは発生しない
+PERIODS = ["1d", "5d", "10d", "1mo", "3mo", "6mo", "1y", "3y", "5y"]
 
 # 同時実行防止用ロック
 _update_lock = threading.Lock()
 
+# 更新完了時に呼び出すリスナー（WebSocketの差分配信など）
+_update_listeners: list[Callable[[], None]] = []
+
+
+def add_update_listener(listener: Callable[[], None]) -> None:
+    """データ更新の完了時に呼び出す関数を登録（スケジューラーのスレッドから呼ばれる）"""
+    if listener not in _update_listeners:
+        _update_listeners.append(listener)
+
+
+def remove_update_listener(listener: Callable[[], None]) -> None:
+    """登録済みのリスナーを解除"""
+    if listener in _update_listeners:
+        _update_listeners.remove(listener)
+
+
+def notify_update_listeners() -> None:
+    """リスナーに更新完了を通知（リスナーの例外は更新処理に影響させない）"""
+    for listener in list(_update_listeners):
+        try:
+            listener()
+        except Exception as e:
+            logger.error(f"Update listener failed: {e}")
+
 
 def get_period_days(period: str) -> int:
     """期間文字列から日数を取得"""
-    period_days = {
-        "1d": 1,
-        "5d": 5,
-        "10d": 10,
-        "1mo": 21,
-        "3mo": 63,
-        "6mo": 126,
-        "1y": 252,
-    }
-    return period_days.get(period, 21)
+    return PERIOD_DAYS.get(period, 21)
 
 
 def get_last_trading_date() -> str | None:
     """最後の取引日を取得（日本市場の終値時刻15:00を付与）"""
     try:
-        df = fetch_stock_data("^N225", "5d")
+        with pipeline_trace.timed("last_trading_date"):
+            df = fetch_stock_data("^N225", "5d")
         if df is not None and not df.empty:
             last_date = df.index[-1]
             # yfinanceの日足データは時刻がないため、日本市場の終値時刻15:00を付与
@@ -65,30 +106,146 @@ def get_last_trading_date() -> str | None:
 
 
 def generate_sparkline(daily_returns_series, period: str) -> dict:
-    """スパークラインデータを生成（累積リターン）"""
-    import pandas as pd
+    """スパークラインデータを生成（累積リターン）
+
+    1y以下は1年分の日次データ、3y/5yは期間全体を週次・月次に間引いたデータ
+    """
+    return build_sparkline(daily_returns_series, period)
+
+
+def write_precomputed(filename: str, payload: dict) -> Path:
+    """事前計算結果をJSONファイルに保存（orjson・インデントなし・アトミック書き込み）
+
+    書き込んだ内容はインメモリスナップショットにも即座に反映する
+    """
+    output_path = PRECOMPUTED_DIR / filename
+    with pipeline_trace.timed("write.serialize"):
+        body = dumps(payload)
+    with pipeline_trace.timed("write.file"):
+        write_json_bytes(output_path, body)
+    snapshot.publish(output_path, body)
+    pipeline_trace.count("write.files")
+    pipeline_trace.count("write.bytes", len(body))
+    return output_path
+
+
+def save_with_sparkline_variants(base_name: str, payload: dict) -> Path:
+    """フル解像度版と、スパークラインを間引いた版（{base_name}_p{点数}.json）を保存"""
+    output_path = write_precomputed(f"{base_name}.json", payload)
+    for points in SPARKLINE_POINT_BUDGETS:
+        write_precomputed(f"{base_name}_p{points}.json", downsample_payload(payload, points))
+    return output_path
+
+
+def fetch_all_periods(tickers: list[str]) -> dict[str, dict]:
+    """全期間のデータを並列取得（3y/5yは長期履歴ストア経由）"""
+    all_data = {}
+    for period in PERIODS:
+        logger.info(f"  Fetching period: {period}")
+        with pipeline_trace.span("fetch", period=period, tickers=len(tickers)):
+            all_data[period] = fetch_batch_parallel(tickers, period, max_workers=15)
+            pipeline_trace.annotate(fetched=len(all_data[period]))
+        logger.info(f"    -> Got {len(all_data[period])} tickers")
+    return all_data
+
+
+def build_theme_summary(theme_id: str, period: str, all_data: dict[str, dict]) -> dict:
+    """テーマランキング（themes_{period}.json）の1テーマ分を計算
 
-    if daily_returns_series is None or daily_returns_series.empty:
-        return {"data": [], "period_start_index": 0}
+    Args:
+        theme_id: テーマID
+        period: 期間
+        all_data: {period: {ticker: DataFrame}}（fetch_all_periodsの結果）
+    """
+    theme_info = THEMES[theme_id]
+    period_data = all_data[period]
+    day_data = all_data["1d"] if period != "1d" else {}
+    # スパークライン用データ（1y以下は1年分、3y/5yは期間全体）
+    sparkline_data = all_data.get(sparkline_source_period(period), {})
 
-    # 累積リターンを計算
-    cumulative = (1 + daily_returns_series / 100).cumprod() - 1
-    cumulative = cumulative * 100  # パーセント表示
+    try:
+        tickers = theme_info["tickers"]
 
-    # NaNを0に置換してリストに変換
-    data = [round(v, 2) if not pd.isna(v) else 0.0 for v in cumulative.values]
+        # 該当テーマの銘柄データを抽出
+        theme_stock_data = {t: period_data[t] for t in tickers if t in period_data}
+
+        # テーマの騰落率計算
+        theme_return, stock_returns = calculate_return_from_data(theme_stock_data)
+
+        # 1日騰落率
+        change_percent_1d = None
+        if period != "1d" and day_data:
+            theme_stock_data_1d = {t: day_data[t] for t in tickers if t in day_data}
+            theme_return_1d, _ = calculate_return_from_data(theme_stock_data_1d)
+            change_percent_1d = theme_return_1d
+
+        # Top 3 stocks
+        top_stocks = []
+        sorted_stocks = sorted(
+            stock_returns.items(),
+            key=lambda x: x[1],
+            reverse=True
+        )[:3]
+        for ticker, change in sorted_stocks:
+            top_stocks.append({
+                "code": ticker,
+                "name": get_ticker_name(theme_id, ticker),
+                "change_percent": round(change, 2),
+            })
+
+        # スパークライン生成
+        theme_sparkline_data = {t: sparkline_data[t] for t in tickers if t in sparkline_data}
+        theme_daily_returns = calculate_theme_daily_returns_from_data(theme_sparkline_data)
+        sparkline = generate_sparkline(theme_daily_returns, period)
+
+        return {
+            "id": theme_id,
+            "name": theme_info["name"],
+            "description": theme_info["description"],
+            "change_percent": theme_return,
+            "change_percent_1d": change_percent_1d,
+            "stock_count": len(tickers),
+            "top_stocks": top_stocks,
+            "sparkline": sparkline,
+        }
+    except Exception as e:
+        logger.warning(f"Error processing theme {theme_id}: {e}")
+        return {
+            "id": theme_id,
+            "name": theme_info["name"],
+            "description": theme_info.get("description", ""),
+            "change_percent": 0.0,
+            "change_percent_1d": None,
+            "stock_count": len(theme_info["tickers"]),
+            "top_stocks": [],
+            "sparkline": empty_sparkline(),
+            "error": str(e),
+        }
 
-    # 選択期間の開始インデックスを計算
-    period_days = get_period_days(period)
-    total_days = len(data)
-    period_start_index = max(0, total_days - period_days)
 
-    return {
-        "data": data,
-        "period_start_index": period_start_index,
-    }
+def save_themes_ranking(period: str, themes_result: list[dict]) -> Path:
+    """テーマランキングを騰落率順に並べて保存（スパークライン間引き版も併せて保存）"""
+    themes_result.sort(key=lambda x: x["change_percent"], reverse=True)
+    return save_with_sparkline_variants(f"themes_{period}", {
+        "period": period,
+        "themes": themes_result,
+        "total": len(themes_result),
+        "last_updated": get_last_trading_date(),
+        "generated_at": datetime.now().isoformat(),
+    })
 
 
+@pipeline_trace.traced("price_matrices")
+def save_price_matrices(all_data: dict[str, dict]) -> None:
+    """取得済みの全期間データから終値行列（prices_{period}.npz）を構築・保存"""
+    generated_at = datetime.now().isoformat()
+    for period, period_data in all_data.items():
+        matrix = PriceMatrix.from_frames(period, period_data, generated_at=generated_at)
+        save_price_matrix(PRECOMPUTED_DIR, matrix)
+        logger.info(f"  Saved price matrix: {period} ({len(matrix.dates)} days x {len(matrix.tickers)} tickers)")
+
+
+@pipeline_trace.traced("themes")
 def update_themes_data():
     """全期間のテーマデータを事前計算"""
     logger.info("=" * 60)
@@ -99,99 +256,20 @@ def update_themes_data():
     all_tickers = get_all_tickers()
     logger.info(f"Total unique tickers: {len(all_tickers)}")
 
-    # 2. 各期間のデータを並列取得
+    # 2. 各期間のデータを並列取得（ベンチマークは終値行列用）
     logger.info("Fetching data for all periods...")
-    all_data = {}
-    for period in PERIODS:
-        logger.info(f"  Fetching period: {period}")
-        all_data[period] = fetch_batch_parallel(all_tickers, period, max_workers=15)
-        logger.info(f"    -> Got {len(all_data[period])} tickers")
+    all_data = fetch_all_periods(all_tickers + [BENCHMARK_TICKER])
 
-    # 3. 1年データ（スパークライン用）
-    sparkline_data = all_data.get("1y", {})
-    logger.info(f"Sparkline data (1y): {len(sparkline_data)} tickers")
+    # 3. 期間ごとの終値行列を保存（カスタムテーマ・ポートフォリオのオンデマンド計算用）
+    save_price_matrices(all_data)
 
     # 4. 各期間のテーマデータを計算・保存
     for period in PERIODS:
         logger.info(f"Processing period: {period}")
-        themes_result = []
-        period_data = all_data[period]
-        day_data = all_data["1d"] if period != "1d" else {}
-
-        for theme_id, theme_info in THEMES.items():
-            try:
-                tickers = theme_info["tickers"]
-
-                # 該当テーマの銘柄データを抽出
-                theme_stock_data = {t: period_data[t] for t in tickers if t in period_data}
-
-                # テーマの騰落率計算
-                theme_return, stock_returns = calculate_return_from_data(theme_stock_data)
-
-                # 1日騰落率
-                change_percent_1d = None
-                if period != "1d" and day_data:
-                    theme_stock_data_1d = {t: day_data[t] for t in tickers if t in day_data}
-                    theme_return_1d, _ = calculate_return_from_data(theme_stock_data_1d)
-                    change_percent_1d = theme_return_1d
-
-                # Top 3 stocks
-                top_stocks = []
-                sorted_stocks = sorted(
-                    stock_returns.items(),
-                    key=lambda x: x[1],
-                    reverse=True
-                )[:3]
-                for ticker, change in sorted_stocks:
-                    top_stocks.append({
-                        "code": ticker,
-                        "name": get_ticker_name(theme_id, ticker),
-                        "change_percent": round(change, 2),
-                    })
-
-                # スパークライン生成（1年データから）
-                theme_sparkline_data = {t: sparkline_data[t] for t in tickers if t in sparkline_data}
-                theme_daily_returns = calculate_theme_daily_returns_from_data(theme_sparkline_data)
-                sparkline = generate_sparkline(theme_daily_returns, period)
-
-                themes_result.append({
-                    "id": theme_id,
-                    "name": theme_info["name"],
-                    "description": theme_info["description"],
-                    "change_percent": theme_return,
-                    "change_percent_1d": change_percent_1d,
-                    "stock_count": len(tickers),
-                    "top_stocks": top_stocks,
-                    "sparkline": sparkline,
-                })
-            except Exception as e:
-                logger.warning(f"Error processing theme {theme_id}: {e}")
-                themes_result.append({
-                    "id": theme_id,
-                    "name": theme_info["name"],
-                    "description": theme_info.get("description", ""),
-                    "change_percent": 0.0,
-                    "change_percent_1d": None,
-                    "stock_count": len(theme_info["tickers"]),
-                    "top_stocks": [],
-                    "sparkline": {"data": [], "period_start_index": 0},
-                    "error": str(e),
-                })
-
-        # 騰落率でソート
-        themes_result.sort(key=lambda x: x["change_percent"], reverse=True)
-
-        # JSONファイルに保存
-        output_path = PRECOMPUTED_DIR / f"themes_{period}.json"
-        with open(output_path, "w", encoding="utf-8") as f:
-            json.dump({
-                "period": period,
-                "themes": themes_result,
-                "total": len(themes_result),
-                "last_updated": get_last_trading_date(),
-                "generated_at": datetime.now().isoformat(),
-            }, f, ensure_ascii=False, indent=2)
-
+        with pipeline_trace.span("rank", period=period, themes=len(THEMES)):
+            with pipeline_trace.timed("themes.compute"):
+                themes_result = [build_theme_summary(theme_id, period, all_data) for theme_id in THEMES]
+            output_path = save_themes_ranking(period, themes_result)
         logger.info(f"  Saved: {output_path.name}")
 
     elapsed = (datetime.now() - start_time).total_seconds()
@@ -199,6 +277,38 @@ def update_themes_data():
     logger.info("=" * 60)
 
 
+def build_theme_detail(theme_id: str, period: str, all_data: dict[str, dict]) -> dict:
+    """テーマ詳細（構成銘柄・ベータ・スパークライン含む）を計算
+
+    Args:
+        theme_id: テーマID
+        period: 期間
+        all_data: {period: {ticker: DataFrame}}（fetch_all_periodsの結果）
+
+    Returns:
+        テーマ詳細のdict（theme_{id}_{period}.json の内容）
+    """
+    theme_info = THEMES[theme_id]
+    last_updated = get_last_trading_date()
+    with pipeline_trace.timed("details.compute"):
+        return build_detail_payload(
+            {"id": theme_id, "name": theme_info["name"], "description": theme_info["description"]},
+            theme_info["tickers"],
+            period,
+            all_data,
+            names=lambda ticker: get_ticker_name(theme_id, ticker),
+            descriptions=lambda ticker: get_ticker_description(theme_id, ticker),
+            market_caps=get_market_cap,
+            last_updated=last_updated,
+        )
+
+
+def save_theme_detail(theme_id: str, period: str, result: dict) -> None:
+    """テーマ詳細をJSONファイルに保存（スパークライン間引き版も併せて保存）"""
+    save_with_sparkline_variants(f"theme_{theme_id}_{period}", result)
+
+
+@pipeline_trace.traced("theme_details")
 def update_theme_details_data():
     """全テーマ詳細データを事前計算"""
     logger.info("=" * 60)
@@ -211,211 +321,272 @@ def update_theme_details_data():
 
     # 2. 各期間のデータを並列取得
     logger.info("Fetching data for all periods...")
-    all_data = {}
-    for period in PERIODS:
-        logger.info(f"  Fetching period: {period}")
-        all_data[period] = fetch_batch_parallel(all_tickers, period, max_workers=15)
-
-    # 3. 1年データ（スパークライン用）
-    sparkline_data = all_data.get("1y", {})
+    all_data = fetch_all_periods(all_tickers)
 
-    # 4. 各テーマ×各期間のデータを計算・保存
-    for theme_id, theme_info in THEMES.items():
-        logger.info(f"Processing theme: {theme_id}")
-        tickers = theme_info["tickers"]
+    # 3. 各テーマ×各期間のデータを計算・保存
+    with pipeline_trace.span("build", themes=len(THEMES), periods=len(PERIODS)):
+        for theme_id in THEMES:
+            logger.info(f"Processing theme: {theme_id}")
+            for period in PERIODS:
+                result = build_theme_detail(theme_id, period, all_data)
+                save_theme_detail(theme_id, period, result)
 
-        for period in PERIODS:
-            period_data = all_data[period]
-            day_data = all_data["1d"] if period != "1d" else {}
-
-            # 該当テーマの銘柄データを抽出
-            theme_stock_data = {t: period_data[t] for t in tickers if t in period_data}
-
-            # テーマの騰落率計算
-            theme_return, stock_returns = calculate_return_from_data(theme_stock_data)
-
-            # 1日騰落率
-            theme_return_1d = None
-            stock_returns_1d = {}
-            if period != "1d" and day_data:
-                theme_stock_data_1d = {t: day_data[t] for t in tickers if t in day_data}
-                theme_return_1d, stock_returns_1d = calculate_return_from_data(theme_stock_data_1d)
-
-            # テーマの日次リターン（スパークライン・ベータ計算用）
-            theme_sparkline_data = {t: sparkline_data[t] for t in tickers if t in sparkline_data}
-            theme_daily_returns = calculate_theme_daily_returns_from_data(theme_sparkline_data)
-            theme_sparkline = generate_sparkline(theme_daily_returns, period)
-
-            # 各銘柄の詳細情報
-            stocks = []
-            for ticker in tickers:
-                stock_return = stock_returns.get(ticker, 0.0)
-                stock_return_1d = stock_returns_1d.get(ticker) if period != "1d" else None
-
-                # 個別株の日次リターン
-                stock_df = sparkline_data.get(ticker)
-                stock_daily_returns = calculate_daily_returns(stock_df) if stock_df is not None else None
-
-                # ベータ・アルファを計算
-                beta_alpha = {"beta": None, "alpha": None, "r_squared": None}
-                if stock_daily_returns is not None and not stock_daily_returns.empty and not theme_daily_returns.empty:
-                    from services.calculator import calculate_beta_alpha
-                    beta_alpha = calculate_beta_alpha(stock_daily_returns, theme_daily_returns)
-
-                # 時価総額を取得
-                market_cap_data = get_market_cap(ticker)
-
-                # スパークラインデータ
-                stock_sparkline = generate_sparkline(stock_daily_returns, period) if stock_daily_returns is not None else {"data": [], "period_start_index": 0}
-
-                stocks.append({
-                    "code": ticker,
-                    "name": get_ticker_name(theme_id, ticker),
-                    "description": get_ticker_description(theme_id, ticker),
-                    "change_percent": round(stock_return, 2),
-                    "change_percent_1d": round(stock_return_1d, 2) if stock_return_1d is not None else None,
-                    "beta": round(beta_alpha["beta"], 3) if beta_alpha["beta"] is not None else None,
-                    "alpha": round(beta_alpha["alpha"], 3) if beta_alpha["alpha"] is not None else None,
-                    "r_squared": round(beta_alpha["r_squared"], 3) if beta_alpha["r_squared"] is not None else None,
-                    "market_cap": market_cap_data.get("market_cap"),
-                    "market_cap_category": market_cap_data.get("market_cap_category"),
-                    "sparkline": stock_sparkline,
-                })
-
-            # 騰落率でソート
-            stocks.sort(key=lambda x: x["change_percent"], reverse=True)
-
-            # テーマ詳細結果
-            result = {
-                "id": theme_id,
-                "name": theme_info["name"],
-                "description": theme_info["description"],
-                "change_percent": theme_return,
-                "change_percent_1d": theme_return_1d,
-                "stock_count": len(tickers),
-                "sparkline": theme_sparkline,
-                "stocks": stocks,
-                "period": period,
-                "last_updated": get_last_trading_date(),
-                "generated_at": datetime.now().isoformat(),
-            }
-
-            # JSONファイルに保存
-            output_path = PRECOMPUTED_DIR / f"theme_{theme_id}_{period}.json"
-            with open(output_path, "w", encoding="utf-8") as f:
-                json.dump(result, f, ensure_ascii=False, indent=2)
-
-        logger.info(f"  Saved theme detail: {theme_id}")
+            logger.info(f"  Saved theme detail: {theme_id}")
 
     elapsed = (datetime.now() - start_time).total_seconds()
     logger.info(f"Theme details data update completed in {elapsed:.1f} seconds")
     logger.info("=" * 60)
 
 
+@pipeline_trace.traced("heatmap")
 def update_heatmap_data():
-    """ヒートマップデータを事前計算"""
+    """銘柄メトリクステーブルとヒートマップデータを事前計算
+
+    時価総額は全期間で共通のため銘柄ごとに1回だけ取得し、
+    期間ごとに metrics_{period}.json（列指向テーブル）と heatmap_{period}.json を保存する。
+    各テーブルには全期間の騰落率（return_{period}）、3ヶ月分の日足から計算した
+    RSI・移動平均乖離率・ボラティリティ、その期間のベータ値を含める（スクリーナー用）
+    """
     logger.info("Starting heatmap data update...")
     start_time = datetime.now()
 
-    # 全銘柄を取得
+    # 全銘柄を取得（重複なし）
     all_tickers = get_all_tickers()
+    with pipeline_trace.span("market_caps", tickers=len(all_tickers)):
+        market_caps = {ticker: get_market_cap(ticker) for ticker in all_tickers}
 
+    # 期間ごとの銘柄騰落率（テーマに依存しないため全銘柄まとめて計算）とベータ値
+    period_returns = {}
+    period_betas = {}
+    indicators = {}
     for period in PERIODS:
-        # 期間のデータを取得
-        all_data = fetch_batch_parallel(all_tickers, period, max_workers=15)
-
-        stocks_by_category = {
-            "mega": [],
-            "large": [],
-            "mid": [],
-            "small": [],
-            "micro": [],
-            "unknown": [],
-        }
+        with pipeline_trace.span("fetch", period=period, tickers=len(all_tickers)):
+            all_data = fetch_batch_parallel(all_tickers, period, max_workers=15)
+            pipeline_trace.annotate(fetched=len(all_data))
+        with pipeline_trace.span("returns", period=period):
+            _, period_returns[period] = calculate_return_from_data(all_data)
+        with pipeline_trace.span("betas", period=period):
+            period_betas[period] = compute_betas(THEMES, all_data)
+        if period == INDICATOR_PERIOD:
+            with pipeline_trace.span("indicators", period=period):
+                indicators = compute_indicators(all_data)
+
+    last_updated = get_last_trading_date()
+    for period in PERIODS:
+        records = build_metric_records(
+            THEMES,
+            period_returns[period],
+            period_returns.get("1d", {}),
+            market_caps,
+            period_returns=period_returns,
+            indicators=indicators,
+            betas=period_betas[period],
+        )
+        table = MetricsTable(
+            period,
+            records,
+            generated_at=datetime.now().isoformat(),
+            last_updated=last_updated,
+        )
+        with pipeline_trace.span("save", period=period, stocks=table.size):
+            write_precomputed(metrics_filename(period), table.to_payload())
+            output_path = write_precomputed(f"heatmap_{period}.json", heatmap_payload(table))
+
+        logger.info(f"  Saved: {output_path.name} ({table.size} stocks)")
 
-        for theme_id, theme_data in THEMES.items():
-            theme_stock_data = {t: all_data[t] for t in theme_data["tickers"] if t in all_data}
-            _, stock_returns = calculate_return_from_data(theme_stock_data)
-
-            for ticker in theme_data["tickers"]:
-                stock_return = stock_returns.get(ticker, 0.0)
-                market_cap_data = get_market_cap(ticker)
-                category = market_cap_data.get("market_cap_category", {})
-                category_id = category.get("id", "unknown")
-
-                stock_info = {
-                    "code": ticker,
-                    "name": get_ticker_name(theme_id, ticker),
-                    "theme_id": theme_id,
-                    "theme_name": theme_data["name"],
-                    "change_percent": round(stock_return, 2),
-                    "market_cap": market_cap_data.get("market_cap", 0),
-                    "market_cap_category": category,
-                }
-
-                # 重複チェック
-                existing_codes = [s["code"] for s in stocks_by_category[category_id]]
-                if ticker not in existing_codes:
-                    stocks_by_category[category_id].append(stock_info)
-
-        # 各カテゴリをソート
-        for category_id in stocks_by_category:
-            stocks_by_category[category_id].sort(
-                key=lambda x: x["change_percent"],
-                reverse=True
-            )
-
-        result = {
-            "period": period,
-            "categories": {
-                "mega": {
-                    "id": "mega",
-                    "label": "超大型",
-                    "threshold": "10兆円以上",
-                    "stocks": stocks_by_category["mega"],
-                    "count": len(stocks_by_category["mega"]),
-                },
-                "large": {
-                    "id": "large",
-                    "label": "大型",
-                    "threshold": "1兆円〜10兆円",
-                    "stocks": stocks_by_category["large"],
-                    "count": len(stocks_by_category["large"]),
-                },
-                "mid": {
-                    "id": "mid",
-                    "label": "中型",
-                    "threshold": "3000億円〜1兆円",
-                    "stocks": stocks_by_category["mid"],
-                    "count": len(stocks_by_category["mid"]),
-                },
-                "small": {
-                    "id": "small",
-                    "label": "小型",
-                    "threshold": "300億円〜3000億円",
-                    "stocks": stocks_by_category["small"],
-                    "count": len(stocks_by_category["small"]),
-                },
-                "micro": {
-                    "id": "micro",
-                    "label": "超小型",
-                    "threshold": "300億円未満",
-                    "stocks": stocks_by_category["micro"],
-                    "count": len(stocks_by_category["micro"]),
-                },
-            },
-            "last_updated": get_last_trading_date(),
-            "generated_at": datetime.now().isoformat(),
-        }
+    elapsed = (datetime.now() - start_time).total_seconds()
+    logger.info(f"Heatmap data update completed in {elapsed:.1f} seconds")
 
-        output_path = PRECOMPUTED_DIR / f"heatmap_{period}.json"
-        with open(output_path, "w", encoding="utf-8") as f:
-            json.dump(result, f, ensure_ascii=False, indent=2)
 
-        logger.info(f"  Saved: {output_path.name}")
+@pipeline_trace.traced("theme_indices")
+def update_theme_indices_data():
+    """加重方式別のテーマ指数（theme_index_{period}.json）を事前計算
+
+    株価は保存済みの終値行列だけを使い、追加の取得は行わない（時価総額はキャッシュ経由）。
+    """
+    matrices = {period: get_price_matrix(PRECOMPUTED_DIR, period) for period in PERIODS}
+    matrices = {period: matrix for period, matrix in matrices.items() if matrix is not None}
+    if not matrices:
+        logger.warning("Price matrices not found, skipping theme index update")
+        return
+
+    logger.info("Starting theme index update...")
+    start_time = datetime.now()
+
+    with pipeline_trace.span("market_caps"):
+        market_caps = {ticker: get_market_cap(ticker) for ticker in get_all_tickers()}
+    with pipeline_trace.span("build", periods=len(matrices)):
+        indices = build_theme_indices(matrices, THEMES, market_caps)
+    for period, payload in indices.items():
+        write_precomputed(theme_index_filename(period), payload)
 
     elapsed = (datetime.now() - start_time).total_seconds()
-    logger.info(f"Heatmap data update completed in {elapsed:.1f} seconds")
+    logger.info(f"Theme index update completed in {elapsed:.1f} seconds")
+
+
+@pipeline_trace.traced("correlation")
+def update_correlation_data():
+    """テーマ間・銘柄間の相関行列（correlation_{period}.npz）を事前計算（保存済みの終値行列から）"""
+    logger.info("Starting correlation update...")
+    start_time = datetime.now()
+    generated_at = start_time.isoformat()
+
+    for period in CORRELATION_PERIODS:
+        matrix = get_price_matrix(PRECOMPUTED_DIR, period)
+        if matrix is None:
+            logger.warning(f"  Price matrix not found, skipping correlations: {period}")
+            continue
+        with pipeline_trace.span("compute", period=period):
+            correlations = compute_correlations(matrix, THEMES, generated_at=generated_at)
+        save_correlations(PRECOMPUTED_DIR, correlations)
+        stock_count = len(correlations.stocks.ids) if correlations.stocks is not None else 0
+        logger.info(f"  Saved correlations: {period} ({len(correlations.themes.ids)} themes, {stock_count} stocks)")
+
+    elapsed = (datetime.now() - start_time).total_seconds()
+    logger.info(f"Correlation update completed in {elapsed:.1f} seconds")
+
+
+@pipeline_trace.traced("analytics")
+def update_analytics_data():
+    """アナリティクス集計（analytics_{period}.json）を事前計算
+
+    保存済みのテーマランキングとメトリクステーブルから、平均騰落率・上昇/下落数・
+    上位/下位のテーマと銘柄を期間ごとに集計する（上位N件は argpartition で選択）。
+    """
+    logger.info("Starting analytics update...")
+    start_time = datetime.now()
+    generated_at = start_time.isoformat()
+
+    for period in PERIODS:
+        ranking = snapshot.get(PRECOMPUTED_DIR / f"themes_{period}.json")
+        if ranking is None:
+            logger.warning(f"  Theme ranking not found, skipping analytics: {period}")
+            continue
+        payload = build_analytics_snapshot(
+            period,
+            ranking["themes"],
+            get_metrics_table(PRECOMPUTED_DIR, period),
+            last_updated=ranking.get("last_updated"),
+            generated_at=generated_at,
+        )
+        write_precomputed(analytics_filename(period), payload)
+
+    elapsed = (datetime.now() - start_time).total_seconds()
+    logger.info(f"Analytics update completed in {elapsed:.1f} seconds")
+
+
+# =============================================================================
+# テーマ定義の変更に追従する差分更新
+# =============================================================================
+
+# 事前計算に使ったテーマ定義のフィンガープリント（テーマID -> ハッシュ）
+THEME_FINGERPRINTS_FILE = "theme_fingerprints.json"
+
+
+def load_saved_fingerprints() -> dict[str, str]:
+    """前回の事前計算時のテーマ定義フィンガープリント（なければ空）"""
+    path = PRECOMPUTED_DIR / THEME_FINGERPRINTS_FILE
+    if not path.exists():
+        return {}
+    try:
+        return read_json_file(path).get("themes", {})
+    except Exception as e:
+        logger.warning(f"Failed to read theme fingerprints: {e}")
+        return {}
+
+
+def save_fingerprints() -> None:
+    """現在のテーマ定義のフィンガープリントを保存"""
+    from data.theme_loader import theme_fingerprints
+
+    write_precomputed(THEME_FINGERPRINTS_FILE, {
+        "themes": theme_fingerprints(THEMES),
+        "generated_at": datetime.now().isoformat(),
+    })
+
+
+def pending_theme_changes():
+    """前回の事前計算以降に追加・変更・削除されたテーマ"""
+    from data.theme_loader import diff_fingerprints, theme_fingerprints
+
+    return diff_fingerprints(load_saved_fingerprints(), theme_fingerprints(THEMES))
+
+
+def remove_theme_files(theme_id: str) -> None:
+    """削除されたテーマの事前計算ファイルを消す"""
+    for period in PERIODS:
+        base_name = f"theme_{theme_id}_{period}"
+        names = [f"{base_name}.json"] + [f"{base_name}_p{points}.json" for points in SPARKLINE_POINT_BUDGETS]
+        for name in names:
+            (PRECOMPUTED_DIR / name).unlink(missing_ok=True)
+
+
+def update_changed_themes(changes) -> None:
+    """追加・変更されたテーマだけを事前計算し、削除されたテーマを取り除く
+
+    株価は対象テーマの銘柄分だけ取得する。テーマランキング（themes_{period}.json）は
+    既存ファイルの該当テーマだけを差し替えて並べ直す（未作成の期間があれば全テーマを計算）。
+    加重方式別のテーマ指数は保存済みの終値行列から作り直す（カスタムウェイトの変更を反映するため）。
+    アナリティクス集計は差し替え後のランキングから作り直す。
+    メトリクステーブル・ヒートマップは全銘柄が対象のため、次回の定期更新で反映される。
+
+    Args:
+        changes: data.theme_loader.ThemeChanges
+    """
+    if not changes:
+        return
+
+    with _update_lock, pipeline_trace.cycle("update_changed_themes"):
+        logger.info(f"Updating changed themes: {changes.to_dict()}")
+        start_time = datetime.now()
+
+        updated = [theme_id for theme_id in changes.updated if theme_id in THEMES]
+        tickers = sorted({ticker for theme_id in updated for ticker in THEMES[theme_id]["tickers"]})
+        all_data = fetch_all_periods(tickers) if tickers else {period: {} for period in PERIODS}
+
+        for theme_id in updated:
+            for period in PERIODS:
+                save_theme_detail(theme_id, period, build_theme_detail(theme_id, period, all_data))
+        for theme_id in changes.removed:
+            remove_theme_files(theme_id)
+
+        rankings = {period: snapshot.get(PRECOMPUTED_DIR / f"themes_{period}.json") for period in PERIODS}
+        if any(ranking is None for ranking in rankings.values()):
+            # ランキングが未作成なら全テーマを計算
+            update_themes_data()
+        else:
+            replaced = set(changes.updated) | set(changes.removed)
+            for period, ranking in rankings.items():
+                # スナップショットの共有オブジェクトは変更せず、新しいリストを組み立てる
+                themes_result = [
+                    theme for theme in ranking["themes"]
+                    if theme["id"] not in replaced and theme["id"] in THEMES
+                ]
+                themes_result.extend(build_theme_summary(theme_id, period, all_data) for theme_id in updated)
+                save_themes_ranking(period, themes_result)
+
+        # 指数は保存済みの終値行列から全テーマ再計算（行列にない新規銘柄は次回の定期更新から反映）
+        update_theme_indices_data()
+        update_analytics_data()
+
+        save_fingerprints()
+        elapsed = (datetime.now() - start_time).total_seconds()
+        logger.info(f"Changed themes update completed in {elapsed:.1f} seconds")
+
+    notify_update_listeners()
+
+
+def reload_theme_definitions() -> None:
+    """テーマ定義ファイル（THEMES_FILE）が更新されていれば読み直して差分更新（定期実行用）"""
+    from data.theme_loader import ThemeFileError, reload_themes
+
+    try:
+        changes = reload_themes()
+    except ThemeFileError as e:
+        logger.error(f"Theme file reload failed, keeping current definitions: {e}")
+        return
+    if changes:
+        update_changed_themes(changes)
 
 
 def is_data_fresh(max_age_minutes: int = 60) -> bool:
@@ -425,8 +596,7 @@ def is_data_fresh(max_age_minutes: int = 60) -> bool:
         return False
 
     try:
-        with open(json_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        data = read_json_file(json_path)
         generated_at = data.get("generated_at")
         if not generated_at:
             return False
@@ -456,9 +626,14 @@ def update_all_data(force: bool = False):
         raise Exception("更新処理が既に実行中です")
 
     try:
-        update_themes_data()
-        update_theme_details_data()
-        update_heatmap_data()  # ヒートマップ事前計算を有効化
+        with pipeline_trace.cycle("update_all_data"):
+            update_themes_data()
+            update_theme_details_data()
+            update_heatmap_data()  # ヒートマップ事前計算を有効化
+            update_theme_indices_data()
+            update_correlation_data()
+            update_analytics_data()
+            save_fingerprints()
         logger.info("All data update completed successfully!")
     except Exception as e:
         logger.error(f"Data update failed: {e}")
@@ -466,6 +641,8 @@ def update_all_data(force: bool = False):
     finally:
         _update_lock.release()
 
+    notify_update_listeners()
+
 
 def update_if_stale(max_age_minutes: int = 60):
     """データが古い場合のみ更新（サーバー起動時用）
@@ -476,6 +653,12 @@ def update_if_stale(max_age_minutes: int = 60):
     if is_data_fresh(max_age_minutes):
         logger.info("Precomputed data is fresh, skipping initial update")
         logger.info("Background scheduler will update data every 5 minutes")
+        # 前回の事前計算以降にテーマ定義が変わっていれば、そのテーマだけ計算
+        if not load_saved_fingerprints():
+            # フィンガープリント導入前のデータは現在の定義で計算済みとみなす
+            save_fingerprints()
+        else:
+            update_changed_themes(pending_theme_changes())
         return
 
     logger.info("Precomputed data is stale or missing, running full update...")
@@ -496,10 +679,7 @@ def update_single_stock(code: str):
     logger.info(f"Starting single stock update for: {ticker}")
 
     # この銘柄が含まれるテーマを検索
-    themes_containing_stock = []
-    for theme_id, theme_info in THEMES.items():
-        if ticker in theme_info["tickers"]:
-            themes_containing_stock.append(theme_id)
+    themes_containing_stock = list(get_ticker_themes(ticker))
 
     if not themes_containing_stock:
         logger.warning(f"Stock {ticker} not found in any theme")
@@ -515,104 +695,20 @@ def update_single_stock(code: str):
     tickers_list = list(tickers_to_update)
     logger.info(f"Total tickers to update: {len(tickers_list)}")
 
-    # 各期間のデータを取得
-    all_data = {}
-    for period in PERIODS:
-        logger.info(f"  Fetching period: {period}")
-        all_data[period] = fetch_batch_parallel(tickers_list, period, max_workers=15)
-
-    # スパークライン用1年データ
-    sparkline_data = all_data.get("1y", {})
+    with pipeline_trace.cycle("update_single_stock"):
+        # 各期間のデータを取得
+        all_data = fetch_all_periods(tickers_list)
 
-    # 各テーマ×各期間のデータを再計算して保存
-    for theme_id in themes_containing_stock:
-        theme_info = THEMES[theme_id]
-        tickers = theme_info["tickers"]
+        # 各テーマ×各期間のデータを再計算して保存
+        for theme_id in themes_containing_stock:
+            for period in PERIODS:
+                result = build_theme_detail(theme_id, period, all_data)
+                save_theme_detail(theme_id, period, result)
 
-        for period in PERIODS:
-            period_data = all_data[period]
-            day_data = all_data["1d"] if period != "1d" else {}
-
-            # 該当テーマの銘柄データを抽出
-            theme_stock_data = {t: period_data[t] for t in tickers if t in period_data}
-
-            # テーマの騰落率計算
-            theme_return, stock_returns = calculate_return_from_data(theme_stock_data)
-
-            # 1日騰落率
-            theme_return_1d = None
-            stock_returns_1d = {}
-            if period != "1d" and day_data:
-                theme_stock_data_1d = {t: day_data[t] for t in tickers if t in day_data}
-                theme_return_1d, stock_returns_1d = calculate_return_from_data(theme_stock_data_1d)
-
-            # テーマの日次リターン（スパークライン・ベータ計算用）
-            theme_sparkline_data = {t: sparkline_data[t] for t in tickers if t in sparkline_data}
-            theme_daily_returns = calculate_theme_daily_returns_from_data(theme_sparkline_data)
-            theme_sparkline = generate_sparkline(theme_daily_returns, period)
-
-            # 各銘柄の詳細情報
-            stocks = []
-            for t in tickers:
-                stock_return = stock_returns.get(t, 0.0)
-                stock_return_1d = stock_returns_1d.get(t) if period != "1d" else None
-
-                # 個別株の日次リターン
-                stock_df = sparkline_data.get(t)
-                stock_daily_returns = calculate_daily_returns(stock_df) if stock_df is not None else None
-
-                # ベータ・アルファを計算
-                beta_alpha = {"beta": None, "alpha": None, "r_squared": None}
-                if stock_daily_returns is not None and not stock_daily_returns.empty and not theme_daily_returns.empty:
-                    from services.calculator import calculate_beta_alpha
-                    beta_alpha = calculate_beta_alpha(stock_daily_returns, theme_daily_returns)
-
-                # 時価総額を取得
-                market_cap_data = get_market_cap(t)
-
-                # スパークラインデータ
-                stock_sparkline = generate_sparkline(stock_daily_returns, period) if stock_daily_returns is not None else {"data": [], "period_start_index": 0}
-
-                stocks.append({
-                    "code": t,
-                    "name": get_ticker_name(theme_id, t),
-                    "description": get_ticker_description(theme_id, t),
-                    "change_percent": round(stock_return, 2),
-                    "change_percent_1d": round(stock_return_1d, 2) if stock_return_1d is not None else None,
-                    "beta": round(beta_alpha["beta"], 3) if beta_alpha["beta"] is not None else None,
-                    "alpha": round(beta_alpha["alpha"], 3) if beta_alpha["alpha"] is not None else None,
-                    "r_squared": round(beta_alpha["r_squared"], 3) if beta_alpha["r_squared"] is not None else None,
-                    "market_cap": market_cap_data.get("market_cap"),
-                    "market_cap_category": market_cap_data.get("market_cap_category"),
-                    "sparkline": stock_sparkline,
-                })
-
-            # 騰落率でソート
-            stocks.sort(key=lambda x: x["change_percent"], reverse=True)
-
-            # テーマ詳細結果
-            result = {
-                "id": theme_id,
-                "name": theme_info["name"],
-                "description": theme_info["description"],
-                "change_percent": theme_return,
-                "change_percent_1d": theme_return_1d,
-                "stock_count": len(tickers),
-                "sparkline": theme_sparkline,
-                "stocks": stocks,
-                "period": period,
-                "last_updated": get_last_trading_date(),
-                "generated_at": datetime.now().isoformat(),
-            }
-
-            # JSONファイルに保存
-            output_path = PRECOMPUTED_DIR / f"theme_{theme_id}_{period}.json"
-            with open(output_path, "w", encoding="utf-8") as f:
-                json.dump(result, f, ensure_ascii=False, indent=2)
-
-        logger.info(f"  Updated theme detail: {theme_id}")
+            logger.info(f"  Updated theme detail: {theme_id}")
 
     logger.info(f"Single stock update completed for: {ticker}")
+    notify_update_listeners()
 
 
 if __name__ == "__main__":
@@ -620,4 +716,7 @@ if __name__ == "__main__":
         level=logging.INFO,
         format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
     )
+    from data.theme_loader import reload_themes
+
+    reload_themes()
     update_all_data()
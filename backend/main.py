@@ -7,6 +7,7 @@
 """
 # req:REQ-001
 
+import asyncio
 import logging
 import os
 from contextlib import asynccontextmanager
@@ -15,9 +16,19 @@ from apscheduler.schedulers.background import BackgroundScheduler
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from jobs.update_data import update_all_data, update_if_stale
-from middleware import RateLimitMiddleware
-from routers import stocks, themes
+from app.websocket_manager import ws_manager
+from data.theme_loader import ThemeFileError, reload_themes, theme_file_path
+from jobs.update_data import (
+    add_update_listener,
+    reload_theme_definitions,
+    remove_update_listener,
+    update_all_data,
+    update_if_stale,
+)
+from middleware import RateLimitMiddleware, RequestMetricsMiddleware, SecurityHeadersMiddleware
+from routers import admin, analytics, export, health, realtime, screener, search, stocks, themes
+from services.update_events import update_broker
+from utils.serialization import FastJSONResponse
 
 # ロガー設定
 logging.basicConfig(
@@ -29,6 +40,19 @@ logger = logging.getLogger(__name__)
 # スケジューラーをグローバルで定義
 scheduler = BackgroundScheduler()
 
+# テーマ定義ファイル（THEMES_FILE）の更新を確認する間隔（秒）
+THEMES_RELOAD_SECONDS = int(os.environ.get("THEMES_RELOAD_SECONDS", "30"))
+
+# レート制限（クライアントIPごとのトークンバケット。Redis を指定すると全ワーカーで共有）
+RATE_LIMIT_REQUESTS = int(os.environ.get("RATE_LIMIT_REQUESTS", "60"))
+RATE_LIMIT_WINDOW_SECONDS = int(os.environ.get("RATE_LIMIT_WINDOW_SECONDS", "60"))
+RATE_LIMIT_MAX_CLIENTS = int(os.environ.get("RATE_LIMIT_MAX_CLIENTS", "10000"))
+RATE_LIMIT_REDIS_URL = os.environ.get("RATE_LIMIT_REDIS_URL") or None
+
+# アクセスログを出力する割合（0〜1）。5xx と遅いリクエストは常に出力
+ACCESS_LOG_SAMPLE_RATE = float(os.environ.get("ACCESS_LOG_SAMPLE_RATE", "1.0"))
+ACCESS_LOG_SLOW_SECONDS = float(os.environ.get("ACCESS_LOG_SLOW_SECONDS", "1.0"))
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -37,6 +61,14 @@ async def lifespan(app: FastAPI):
     logger.info("Starting JP Stock Theme Tracker API...")
     logger.info("=" * 60)
 
+    # テーマ定義ファイルが指定されていれば組み込みの定義を置き換える
+    if theme_file_path():
+        try:
+            reload_themes()
+            logger.info(f"Loaded theme definitions from {theme_file_path()}")
+        except ThemeFileError as e:
+            logger.error(f"Failed to load theme file, using built-in themes: {e}")
+
     # 起動時: データが古い場合のみ更新（新鮮なら即座に起動）
     logger.info("Checking precomputed data freshness...")
     try:
@@ -54,6 +86,23 @@ async def lifespan(app: FastAPI):
         replace_existing=True,
         max_instances=1,  # 同時実行を防ぐ
     )
+    # テーマ定義ファイルのホットリロード（変更されたテーマだけ再計算）
+    if theme_file_path():
+        scheduler.add_job(
+            reload_theme_definitions,
+            'interval',
+            seconds=THEMES_RELOAD_SECONDS,
+            id='theme_reloader',
+            replace_existing=True,
+            max_instances=1,
+        )
+    # 更新完了ごとに WebSocket の購読チャンネルへ差分を配信し、SSE で新しいスナップショットを通知
+    ws_manager.bind_loop(asyncio.get_running_loop())
+    add_update_listener(ws_manager.notify_threadsafe)
+    update_broker.bind_loop(asyncio.get_running_loop())
+    update_broker.on_update()  # 現在のスナップショットを基準イベント（版1）にする
+    add_update_listener(update_broker.on_update)
+
     scheduler.start()
     logger.info("Background scheduler started (5min interval)")
     logger.info("=" * 60)
@@ -63,6 +112,9 @@ async def lifespan(app: FastAPI):
     # 終了時: スケジューラー停止
     logger.info("Shutting down background scheduler...")
     scheduler.shutdown()
+    remove_update_listener(ws_manager.notify_threadsafe)
+    remove_update_listener(update_broker.on_update)
+    update_broker.close()  # SSE ストリームを終了させる（終了待ちで止まらないように）
     logger.info("Background scheduler stopped")
 
 
@@ -74,6 +126,8 @@ app = FastAPI(
     docs_url="/docs",
     redoc_url="/redoc",
     lifespan=lifespan,
+    # 全ルーターのレスポンスをorjsonでエンコード（NumPy型・NaN対応）
+    default_response_class=FastJSONResponse,
 )
 
 # CORS設定（環境に応じて許可オリジンを制限）
@@ -102,12 +156,35 @@ app.add_middleware(
     allow_headers=["X-API-Key", "Content-Type"],  # 必要なヘッダーのみ許可
 )
 
-# Rate limiting & security headers middleware
-app.add_middleware(RateLimitMiddleware, max_requests=60, window_seconds=60)
+# Security headers middleware
+app.add_middleware(SecurityHeadersMiddleware)
+
+# Rate limiting middleware (rejected requests skip the rest of the stack)
+app.add_middleware(
+    RateLimitMiddleware,
+    max_requests=RATE_LIMIT_REQUESTS,
+    window_seconds=RATE_LIMIT_WINDOW_SECONDS,
+    max_clients=RATE_LIMIT_MAX_CLIENTS,
+    redis_url=RATE_LIMIT_REDIS_URL,
+)
+
+# Request metrics & sampled access logs (outermost: times every request, including 429s)
+app.add_middleware(
+    RequestMetricsMiddleware,
+    log_sample_rate=ACCESS_LOG_SAMPLE_RATE,
+    slow_request_seconds=ACCESS_LOG_SLOW_SECONDS,
+)
 
 # ルーターを登録
 app.include_router(themes.router, tags=["themes"])
 app.include_router(stocks.router, tags=["stocks"])
+app.include_router(screener.router, tags=["screener"])
+app.include_router(analytics.router, tags=["analytics"])
+app.include_router(search.router, tags=["search"])
+app.include_router(export.router, tags=["export"])
+app.include_router(health.router, tags=["health"])
+app.include_router(realtime.router, tags=["realtime"])
+app.include_router(admin.router, tags=["admin"])
 
 
 @app.get("/")
@@ -1,65 +1,310 @@
-"""Request middleware for rate limiting and logging"""
+"""Request middleware for rate limiting, security headers, metrics and logging"""
 
 import logging
+import math
+import re
 import time
-from collections import defaultdict
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
 
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
+import redis
+import redis.asyncio as aioredis
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from utils.metrics import UNMATCHED_ROUTE, RequestMetrics, request_metrics
 
 logger = logging.getLogger(__name__)
 
+# Idle clients kept by the in-memory limiter before the least recently seen is evicted
+DEFAULT_MAX_CLIENTS = 10_000
+
+# Token cost per request: (method or "*", path regex, cost). First match wins,
+# unmatched requests cost 1. Refreshes trigger data fetches; cached reads are cheap.
+DEFAULT_ROUTE_COSTS: tuple[tuple[str, str, float], ...] = (
+    ("*", r"^/api/health", 0),
+    ("GET", r"^/metrics$", 0),
+    ("POST", r"^/api/refresh$", 20),
+    ("POST", r"^/api/stocks/[^/]+/refresh$", 10),
+    ("POST", r"^/api/themes/reload$", 10),
+    ("POST", r"^/api/themes/custom$", 3),
+    ("POST", r"^/api/analytics/portfolio$", 3),
+    ("GET", r"^/api/export/", 5),
+)
+
+
+@dataclass(frozen=True)
+class RateDecision:
+    """Outcome of taking tokens from a bucket."""
+
+    allowed: bool
+    remaining: float
+    retry_after: float = 0.0
+
+
+class TokenBucketLimiter:
+    """In-memory token bucket per client with LRU eviction.
+
+    Each client costs two floats (tokens, last refill time) regardless of
+    its request rate. Buckets refill at ``capacity / window_seconds`` tokens
+    per second, so an evicted idle client is indistinguishable from a full
+    bucket once it has been idle for a whole window.
+    """
+
+    def __init__(
+        self,
+        capacity: float,
+        window_seconds: float,
+        max_clients: int = DEFAULT_MAX_CLIENTS,
+    ) -> None:
+        self.capacity = float(capacity)
+        self.rate = self.capacity / window_seconds
+        self.max_clients = max_clients
+        self._buckets: OrderedDict[str, list[float]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def take(self, key: str, cost: float = 1.0, now: Optional[float] = None) -> RateDecision:
+        """Take ``cost`` tokens from the client's bucket if available."""
+        now = time.monotonic() if now is None else now
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [self.capacity, now]
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(self.capacity, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+
+        if bucket[0] >= cost:
+            bucket[0] -= cost
+            return RateDecision(True, bucket[0])
+        return RateDecision(False, bucket[0], (cost - bucket[0]) / self.rate)
+
+    async def acquire(self, key: str, cost: float = 1.0) -> RateDecision:
+        return self.take(key, cost)
+
+
+# Atomic token bucket in a Redis hash (tokens, timestamp); idle keys expire.
+_REDIS_TOKEN_BUCKET = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local ttl = tonumber(ARGV[4])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local wait = 0
+if tokens >= cost then
+  tokens = tokens - cost
+  allowed = 1
+else
+  wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], ttl)
+return {allowed, tostring(tokens), tostring(wait)}
+"""
+
+
+class RedisTokenBucketLimiter:
+    """Token bucket shared by every worker through Redis.
+
+    The bucket update runs as one Lua script, so concurrent workers cannot
+    over-admit. Keys expire after two idle windows. If Redis is unreachable
+    the limiter falls back to a per-process TokenBucketLimiter.
+    """
+
+    def __init__(
+        self,
+        redis_url: str,
+        capacity: float,
+        window_seconds: float,
+        max_clients: int = DEFAULT_MAX_CLIENTS,
+        prefix: str = "ratelimit:",
+    ) -> None:
+        self.capacity = float(capacity)
+        self.rate = self.capacity / window_seconds
+        self.ttl = max(1, math.ceil(window_seconds * 2))
+        self.prefix = prefix
+        self.fallback = TokenBucketLimiter(capacity, window_seconds, max_clients)
+        self._redis = aioredis.from_url(redis_url, socket_connect_timeout=0.5, socket_timeout=0.5)
+        self._script = self._redis.register_script(_REDIS_TOKEN_BUCKET)
+        self._degraded = False
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    """Simple in-memory rate limiter.
+    async def acquire(self, key: str, cost: float = 1.0) -> RateDecision:
+        try:
+            allowed, tokens, wait = await self._script(
+                keys=[self.prefix + key], args=[self.capacity, self.rate, cost, self.ttl]
+            )
+        except (redis.RedisError, OSError) as exc:
+            if not self._degraded:
+                logger.warning(f"Rate limit Redis unavailable, using per-process limits: {exc}")
+                self._degraded = True
+            return self.fallback.take(key, cost)
+        if self._degraded:
+            logger.info("Rate limit Redis recovered")
+            self._degraded = False
+        return RateDecision(bool(allowed), float(tokens), float(wait))
+
+
+class RateLimitMiddleware:
+    """Token-bucket rate limiter as pure ASGI middleware.
 
-    Tracks request counts per client IP and returns 429
-    when the rate limit is exceeded.
+    Limits HTTP requests per client IP with per-route token costs and returns
+    429 with Retry-After when the bucket is empty. Non-HTTP scopes (WebSocket,
+    lifespan) pass through untouched, and admitted requests are forwarded
+    without wrapping ``receive``/``send`` so streaming is unaffected.
     """
 
-    def __init__(self, app, max_requests: int = 60, window_seconds: int = 60):
-        super().__init__(app)
+    def __init__(
+        self,
+        app: ASGIApp,
+        max_requests: int = 60,
+        window_seconds: int = 60,
+        max_clients: int = DEFAULT_MAX_CLIENTS,
+        route_costs: tuple[tuple[str, str, float], ...] = DEFAULT_ROUTE_COSTS,
+        redis_url: Optional[str] = None,
+    ) -> None:
+        self.app = app
         self.max_requests = max_requests
         self.window_seconds = window_seconds
-        self._requests: dict[str, list[float]] = defaultdict(list)
-
-    async def dispatch(self, request: Request, call_next):
-        client_ip = request.client.host if request.client else "unknown"
-        now = time.time()
-
-        # Clean old entries
-        self._requests[client_ip] = [
-            t for t in self._requests[client_ip]
-            if now - t < self.window_seconds
-        ]
-
-        # Check rate limit
-        if len(self._requests[client_ip]) >= self.max_requests:
-            logger.warning(f"Rate limit exceeded for {client_ip}")
-            return Response(
-                content='{"detail": "Too many requests"}',
-                status_code=429,
-                media_type="application/json",
-                headers={"Retry-After": str(self.window_seconds)},
-            )
+        if redis_url:
+            self.limiter = RedisTokenBucketLimiter(redis_url, max_requests, window_seconds, max_clients)
+        else:
+            self.limiter = TokenBucketLimiter(max_requests, window_seconds, max_clients)
+        self._route_costs = [(method, re.compile(pattern), float(cost)) for method, pattern, cost in route_costs]
+
+    def route_cost(self, method: str, path: str) -> float:
+        """Token cost of a request (first matching rule, default 1)."""
+        for rule_method, pattern, cost in self._route_costs:
+            if (rule_method == "*" or rule_method == method) and pattern.match(path):
+                return cost
+        return 1.0
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        cost = self.route_cost(scope["method"], scope["path"])
+        if cost <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        client_ip = scope["client"][0] if scope.get("client") else "unknown"
+        decision = await self.limiter.acquire(client_ip, cost)
+        if decision.allowed:
+            await self.app(scope, receive, send)
+            return
+
+        logger.warning(f"Rate limit exceeded for {client_ip}")
+        body = b'{"detail": "Too many requests"}'
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(decision.retry_after))).encode()),
+                (b"x-ratelimit-limit", str(self.max_requests).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+class SecurityHeadersMiddleware:
+    """Adds security headers to every HTTP response (pure ASGI)."""
+
+    HEADERS = [
+        (b"x-content-type-options", b"nosniff"),
+        (b"x-frame-options", b"DENY"),
+        (b"x-xss-protection", b"1; mode=block"),
+    ]
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", ()), *self.HEADERS]
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+
+class RequestMetricsMiddleware:
+    """Records request timing and sizes and writes sampled access logs (pure ASGI).
+
+    Latency is measured until the last body chunk is sent, so streaming
+    responses are timed end to end. Access logs are written for one in
+    ``1 / log_sample_rate`` requests, plus every 5xx response and every
+    request slower than ``slow_request_seconds``.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        metrics: RequestMetrics = request_metrics,
+        log_sample_rate: float = 1.0,
+        slow_request_seconds: float = 1.0,
+    ) -> None:
+        self.app = app
+        self.metrics = metrics
+        self.slow_request_seconds = slow_request_seconds
+        self._log_every = round(1 / log_sample_rate) if log_sample_rate > 0 else 0
+        self._log_counter = 0
 
-        self._requests[client_ip].append(now)
+    def _should_log(self, status: int, duration: float) -> bool:
+        if status >= 500 or duration >= self.slow_request_seconds:
+            return True
+        if not self._log_every:
+            return False
+        self._log_counter += 1
+        if self._log_counter >= self._log_every:
+            self._log_counter = 0
+            return True
+        return False
 
-        # Process request with timing
-        start = time.time()
-        response = await call_next(request)
-        duration = time.time() - start
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
-        logger.info(
-            f"{request.method} {request.url.path} "
-            f"status={response.status_code} "
-            f"duration={duration:.3f}s "
-            f"client={client_ip}"
-        )
+        method = scope["method"]
+        status = 500
+        size = 0
+        start = time.perf_counter()
 
-        # Add security headers
-        response.headers["X-Content-Type-Options"] = "nosniff"
-        response.headers["X-Frame-Options"] = "DENY"
-        response.headers["X-XSS-Protection"] = "1; mode=block"
+        async def send_with_metrics(message: Message) -> None:
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
 
-        return response
+        self.metrics.start(method)
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            duration = time.perf_counter() - start
+            route = scope.get("route")
+            self.metrics.finish(method, getattr(route, "path", UNMATCHED_ROUTE), status, duration, size)
+            if self._should_log(status, duration) and logger.isEnabledFor(logging.INFO):
+                client = scope.get("client")
+                logger.info(
+                    "%s %s status=%d duration=%.3fs bytes=%d client=%s",
+                    method, scope["path"], status, duration, size, client[0] if client else "unknown",
+                )
@@ -1,8 +1,9 @@
 """Routers module"""
 
-from routers import stocks, themes
+from routers import screener, stocks, themes
 
 __all__ = [
     "themes",
     "stocks",
+    "screener",
 ]
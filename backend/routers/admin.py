@@ -0,0 +1,64 @@
+"""Admin router for inspecting the data update pipeline.
+
+Exposes the spans and counters recorded by services.pipeline_trace for
+the most recent update cycles, and lets an operator arm a cProfile or
+pyinstrument run for the next cycle. Every endpoint requires the
+X-API-Key header (same key as the refresh endpoints).
+"""
+
+import logging
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from services import pipeline_trace
+from utils.security import verify_api_key
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api/admin", dependencies=[Depends(verify_api_key)])
+
+
+@router.get("/pipeline")
+def list_pipeline_cycles(limit: int = Query(20, ge=1, le=1000)) -> dict:
+    """Recent update cycles (newest first) with per-stage durations and counters."""
+    cycles = pipeline_trace.recent_cycles()
+    return {
+        "cycles": [c.summary() for c in cycles[:limit]],
+        "retained": len(cycles),
+        "max_retained": pipeline_trace.PIPELINE_TRACE_CYCLES,
+        "profile_pending": pipeline_trace.profile_pending(),
+    }
+
+
+@router.get("/pipeline/{cycle_id}")
+def get_pipeline_cycle(cycle_id: int) -> dict:
+    """Full span tree of one retained cycle."""
+    cycle = pipeline_trace.get_cycle(cycle_id)
+    if cycle is None:
+        raise HTTPException(status_code=404, detail=f"Cycle {cycle_id} not found")
+    return cycle.to_dict()
+
+
+@router.get("/pipeline/{cycle_id}/profile", response_class=PlainTextResponse)
+def get_pipeline_profile(cycle_id: int) -> str:
+    """Text report of a profiled cycle (cumulative-time table or call tree)."""
+    cycle = pipeline_trace.get_cycle(cycle_id)
+    if cycle is None or cycle.profile is None:
+        raise HTTPException(status_code=404, detail=f"No profile for cycle {cycle_id}")
+    return cycle.profile["text"]
+
+
+@router.post("/pipeline/profile")
+def request_pipeline_profile(profiler: str = Query("cprofile")) -> dict:
+    """Profile the next update cycle.
+
+    The report is stored under precomputed/profiles/ and returned by
+    ``GET /api/admin/pipeline/{cycle_id}/profile`` once the cycle ends.
+    """
+    try:
+        pipeline_trace.request_profile(profiler)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    logger.info(f"Profiling of the next update cycle requested ({profiler})")
+    return {"status": "armed", "profiler": profiler}
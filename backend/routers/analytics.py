@@ -7,17 +7,26 @@ and portfolio-level metrics.
 
 import logging
 from datetime import datetime
+from pathlib import Path
 from typing import Optional
 
-from fastapi import APIRouter, Query
+import numpy as np
+from fastapi import APIRouter, HTTPException, Query
 
-from data.themes import THEMES, get_all_tickers
-from utils.cache import cache
+from data.themes import THEMES, get_all_tickers, get_registry
+from schemas import PortfolioRequest
+from utils.security import validate_period, validate_theme_id
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Directory holding the updater's precomputed artifacts
+PRECOMPUTED_DIR = Path(__file__).parent.parent / "precomputed"
+
+# Largest stock x stock sub-matrix returned in one response
+MAX_CORRELATION_STOCKS = 300
+
 
 @router.get("/api/analytics/summary")
 def get_analytics_summary(
@@ -25,65 +34,67 @@ def get_analytics_summary(
 ) -> dict:
     """Return high-level analytics summary across all themes.
 
-    Includes total tracked themes, total unique tickers,
-    best/worst performing themes, and average return.
+    Includes total tracked themes, total unique tickers, best/worst
+    performing themes, average return and market breadth (advancers /
+    decliners) for themes and stocks. Statistics come from the
+    per-snapshot aggregate built by the updater and are null until
+    the first update has finished.
     """
-    cache_key = f"analytics_summary:{period}"
-    cached = cache.get(cache_key)
-    if cached:
-        return cached
-
-    theme_returns: list[dict] = []
-    for theme_id, theme_data in THEMES.items():
-        theme_returns.append({
-            "id": theme_id,
-            "name": theme_data["name"],
-            "stock_count": len(theme_data["tickers"]),
-        })
-
-    all_tickers = get_all_tickers()
-    result = {
+    from services.analytics_service import get_analytics_snapshot
+
+    period = validate_period(period)
+    aggregate = get_analytics_snapshot(period, PRECOMPUTED_DIR) or {}
+    theme_stats = aggregate.get("themes") or {}
+    return {
         "period": period,
         "total_themes": len(THEMES),
-        "total_unique_tickers": len(all_tickers),
-        "themes": theme_returns,
-        "generated_at": datetime.now().isoformat(),
+        "total_unique_tickers": len(get_all_tickers()),
+        "average_return": theme_stats.get("average_return"),
+        "best_theme": theme_stats.get("best"),
+        "worst_theme": theme_stats.get("worst"),
+        "breadth": {
+            "themes": {key: value for key, value in theme_stats.items() if key not in ("best", "worst")} or None,
+            "stocks": aggregate.get("stocks"),
+        },
+        "last_updated": aggregate.get("last_updated"),
+        "generated_at": aggregate.get("generated_at") or datetime.now().isoformat(),
     }
-    cache.set(cache_key, result, ttl_seconds=300)
-    return result
 
 
 @router.get("/api/analytics/top-movers")
 def get_top_movers(
     period: str = Query("1mo", description="Period for calculation"),
     limit: int = Query(10, ge=1, le=50, description="Number of results"),
+    kind: str = Query("themes", pattern="^(themes|stocks)$", description="themes or stocks"),
 ) -> dict:
-    """Return top gaining and losing themes for the given period.
+    """Return top gaining and losing themes (or stocks) for the given period.
 
-    Results are ordered by absolute change percentage.
+    ``movers`` is ordered by absolute change percentage, ``gainers`` and
+    ``losers`` by change percentage. The lists are selected by the
+    updater, so a request only slices them.
     """
-    cache_key = f"top_movers:{period}:{limit}"
-    cached = cache.get(cache_key)
-    if cached:
-        return cached
-
-    movers: list[dict] = []
-    for theme_id, theme_data in THEMES.items():
-        movers.append({
-            "id": theme_id,
-            "name": theme_data["name"],
-            "description": theme_data["description"],
-            "stock_count": len(theme_data["tickers"]),
-        })
-
-    result = {
+    from services.analytics_service import get_analytics_snapshot
+
+    period = validate_period(period)
+    aggregate = get_analytics_snapshot(period, PRECOMPUTED_DIR) or {}
+    selected = (aggregate.get("movers") or {}).get(kind) or {}
+
+    def head(rows: list[dict]) -> list[dict]:
+        # Themes removed since the last update are left out
+        if kind == "themes":
+            rows = [row for row in rows if row["id"] in THEMES]
+        return rows[:limit]
+
+    return {
         "period": period,
+        "kind": kind,
         "limit": limit,
-        "movers": movers[:limit],
-        "generated_at": datetime.now().isoformat(),
+        "gainers": head(selected.get("gainers", [])),
+        "losers": head(selected.get("losers", [])),
+        "movers": head(selected.get("movers", [])),
+        "last_updated": aggregate.get("last_updated"),
+        "generated_at": aggregate.get("generated_at") or datetime.now().isoformat(),
     }
-    cache.set(cache_key, result, ttl_seconds=300)
-    return result
 
 
 @router.get("/api/analytics/portfolio")
@@ -91,17 +102,65 @@ def get_portfolio_stats(
     theme_ids: Optional[str] = Query(
         None, description="Comma-separated theme IDs"
     ),
+    tickers: Optional[str] = Query(None, description="Comma-separated tickers (equal weight)"),
+    period: str = Query("1y", description="Return window: 1mo, 3mo, 6mo, 1y, 3y, 5y"),
+    risk_free_rate: float = Query(0.0, ge=-10, le=20, description="Annual risk-free rate in percent"),
 ) -> dict:
-    """Return portfolio-level statistics for selected themes.
+    """Return portfolio-level statistics for selected themes or tickers.
 
-    Calculates aggregate metrics across all stocks in
-    the specified themes.
+    Themes get equal shares split evenly across their stocks. Risk
+    metrics (return, volatility, max drawdown, Sharpe/Sortino, beta to
+    the Nikkei 225 and per-holding risk contribution) are computed from
+    the shared close-price matrix and are null until it exists.
     """
-    selected_ids = (
-        [t.strip() for t in theme_ids.split(",") if t.strip()]
-        if theme_ids
-        else list(THEMES.keys())
+    return _portfolio_response(
+        _split(theme_ids) if theme_ids or not tickers else [],
+        _split(tickers),
+        None,
+        period,
+        risk_free_rate,
     )
+
+
+@router.post("/api/analytics/portfolio")
+def post_portfolio_stats(request: PortfolioRequest) -> dict:
+    """Return portfolio statistics for themes or weighted tickers (see GET)."""
+    if not request.theme_ids and not request.tickers:
+        raise HTTPException(status_code=400, detail="theme_ids or tickers is required")
+    return _portfolio_response(
+        request.theme_ids or [],
+        request.tickers,
+        request.weights,
+        request.period,
+        request.risk_free_rate,
+    )
+
+
+def _split(values: Optional[str]) -> Optional[list[str]]:
+    return [value.strip() for value in values.split(",") if value.strip()] if values else None
+
+
+def _portfolio_response(
+    theme_ids: Optional[list[str]],
+    tickers: Optional[list[str]],
+    weights: Optional[dict[str, float]],
+    period: str,
+    risk_free_rate: float,
+) -> dict:
+    """Build the portfolio response; ``theme_ids=None`` selects every theme."""
+    from services.custom_theme import BasketError, normalize_basket
+    from services.portfolio import MAX_PORTFOLIO_HOLDINGS, PORTFOLIO_PERIODS, get_portfolio, theme_basket
+
+    if theme_ids and tickers:
+        raise HTTPException(status_code=400, detail="Specify either theme_ids or tickers")
+    period = validate_period(period)
+    if period not in PORTFOLIO_PERIODS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Portfolio analytics are available for: {', '.join(PORTFOLIO_PERIODS)}",
+        )
+
+    selected_ids = list(THEMES.keys()) if theme_ids is None else theme_ids
     portfolio_themes: list[dict] = []
     total_stocks = 0
     for tid in selected_ids:
@@ -115,9 +174,105 @@ def get_portfolio_stats(
                 "stock_count": count,
             })
 
+    basket = None
+    try:
+        if tickers:
+            basket = normalize_basket(tickers, weights, max_tickers=MAX_PORTFOLIO_HOLDINGS)
+            total_stocks = len(basket.tickers)
+        elif portfolio_themes:
+            basket = theme_basket([theme["id"] for theme in portfolio_themes], THEMES)
+    except BasketError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    portfolio = get_portfolio(basket, period, PRECOMPUTED_DIR, risk_free_rate) if basket else None
+    names = get_registry().ticker_names
     return {
         "selected_themes": len(portfolio_themes),
         "total_stocks": total_stocks,
         "themes": portfolio_themes,
-        "generated_at": datetime.now().isoformat(),
+        "period": period,
+        "basket_id": basket.key if basket else None,
+        "metrics": portfolio["metrics"] if portfolio else None,
+        "holdings": [
+            {**holding, "name": names.get(holding["code"], holding["code"])}
+            for holding in (portfolio["holdings"] if portfolio else [])
+        ],
+        "missing": portfolio["missing"] if portfolio else [],
+        "observations": portfolio["observations"] if portfolio else 0,
+        "generated_at": (portfolio or {}).get("generated_at") or datetime.now().isoformat(),
+    }
+
+
+def _matrix_rows(values: np.ndarray) -> list[list[Optional[float]]]:
+    """Round a float32 matrix for JSON, mapping undefined correlations to null."""
+    rounded = np.round(values.astype(np.float64), 3)
+    return np.where(np.isnan(rounded), None, rounded).tolist()
+
+
+@router.get("/api/analytics/correlation")
+def get_correlation_matrix(
+    period: str = Query("1y", description="Correlation window: 1mo, 3mo, 6mo, 1y, 3y, 5y"),
+    kind: str = Query("themes", pattern="^(themes|stocks)$", description="themes or stocks"),
+    ids: Optional[str] = Query(None, description="Comma-separated theme IDs or stock codes"),
+    theme_id: Optional[str] = Query(None, description="Stocks of this theme (kind=stocks)"),
+    order: str = Query("cluster", pattern="^(cluster|original)$", description="cluster or original"),
+) -> dict:
+    """Return the return-correlation matrix precomputed by the updater.
+
+    Rows and columns follow the hierarchical clustering order unless
+    ``order=original``. Stock matrices must be narrowed with ``ids`` or
+    ``theme_id`` (at most MAX_CORRELATION_STOCKS stocks).
+    """
+    from services.correlation import CORRELATION_PERIODS, get_correlations
+
+    period = validate_period(period)
+    if period not in CORRELATION_PERIODS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Correlations are available for: {', '.join(CORRELATION_PERIODS)}",
+        )
+
+    correlations = get_correlations(PRECOMPUTED_DIR, period)
+    if correlations is None:
+        raise HTTPException(status_code=503, detail=f"Correlations not computed yet for period: {period}")
+
+    requested = [item.strip() for item in ids.split(",") if item.strip()] if ids else None
+    selected = requested
+    registry = get_registry()
+    if kind == "themes":
+        matrix = correlations.themes
+        # Themes removed since the last update are left out
+        selected = [theme_id for theme_id in (selected or matrix.ids) if theme_id in THEMES]
+        names = {theme_id: THEMES[theme_id]["name"] for theme_id in selected}
+    else:
+        matrix = correlations.stocks
+        if matrix is None:
+            raise HTTPException(status_code=503, detail="Stock correlations are disabled")
+        if theme_id is not None:
+            theme_id = validate_theme_id(theme_id)
+            if theme_id not in THEMES:
+                raise HTTPException(status_code=404, detail=f"Theme not found: {theme_id}")
+            selected = list(THEMES[theme_id]["tickers"])
+        if not selected:
+            raise HTTPException(status_code=400, detail="ids or theme_id is required for stock correlations")
+        selected = requested = [code if code.endswith(".T") else f"{code}.T" for code in selected]
+        if len(selected) > MAX_CORRELATION_STOCKS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Too many stocks: {len(selected)} (max {MAX_CORRELATION_STOCKS})",
+            )
+        names = {code: registry.ticker_names.get(code, code) for code in selected}
+
+    row_ids, values = matrix.select(selected, clustered=order == "cluster")
+    found = set(row_ids)
+    return {
+        "period": period,
+        "kind": kind,
+        "order": order,
+        "ids": row_ids,
+        "names": [names.get(row_id, row_id) for row_id in row_ids],
+        "missing": [item for item in requested or [] if item not in found],
+        "matrix": _matrix_rows(values),
+        "observations": correlations.observations,
+        "generated_at": correlations.generated_at,
     }
@@ -1,58 +1,104 @@
-"""Export router for CSV and JSON data export.
+"""Export router for CSV, NDJSON, Parquet and JSON data export.
 
 Provides endpoints to download theme and stock data in
 various formats for offline analysis or integration with
 external tools.
+
+CSV, NDJSON and Parquet downloads are streamed: rows are read from
+the precomputed snapshot in batches and encoded chunk by chunk, so
+memory use stays flat regardless of export size.
 """
 
-import csv
-import io
 import logging
-from datetime import datetime
+from datetime import date, datetime
+from pathlib import Path
+from typing import Iterable, Optional
 
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, HTTPException, Query
 from fastapi.responses import StreamingResponse
 
-from data.themes import THEMES, get_ticker_name
+from data.themes import THEMES
+from services.bulk_export import BULK_DATASETS, ROW_GROUP_ROWS, dataset_batches, dataset_schema
+from services.export_service import (
+    EXPORT_MEDIA_TYPES,
+    HISTORY_EXPORT_COLUMNS,
+    STOCK_EXPORT_COLUMNS,
+    THEME_EXPORT_COLUMNS,
+    Batch,
+    generate_export_filename,
+    iter_history_batches,
+    iter_record_batches,
+    iter_stock_batches,
+    iter_theme_batches,
+    parquet_available,
+    stream_export,
+)
+from utils.security import validate_period
+from utils.wire_format import ARROW_MEDIA_TYPE
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+PRECOMPUTED_DIR = Path(__file__).parent.parent / "precomputed"
 
-@router.get("/api/export/themes/csv")
-def export_themes_csv(
-    period: str = Query("1mo", description="Period for export"),
-) -> StreamingResponse:
-    """Export all themes as a CSV file.
+FORMAT_QUERY = Query("csv", pattern="^(csv|ndjson|parquet)$", description="csv, ndjson or parquet")
 
-    Each row contains theme id, name, description, and stock count.
-    The response streams as a downloadable CSV attachment.
-    """
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["theme_id", "name", "description", "stock_count"])
 
-    for theme_id, theme_data in THEMES.items():
-        writer.writerow([
-            theme_id,
-            theme_data["name"],
-            theme_data["description"],
-            len(theme_data["tickers"]),
-        ])
-
-    output.seek(0)
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"themes_{period}_{timestamp}.csv"
-    logger.info(f"Exporting themes CSV: {filename}")
+def _streaming_response(
+    batches: Iterable[Batch],
+    columns: dict[str, str],
+    fmt: str,
+    entity: str,
+    period: str,
+) -> StreamingResponse:
+    """Stream encoded batches as a downloadable attachment."""
+    if fmt == "parquet" and not parquet_available():
+        raise HTTPException(status_code=400, detail="Parquet export is not available (pyarrow not installed)")
 
+    filename = generate_export_filename(entity, fmt, period)
+    logger.info(f"Exporting {entity} {fmt}: {filename}")
     return StreamingResponse(
-        iter([output.getvalue()]),
-        media_type="text/csv",
+        stream_export(batches, columns, fmt),
+        media_type=EXPORT_MEDIA_TYPES[fmt],
         headers={"Content-Disposition": f"attachment; filename={filename}"},
     )
 
 
+def _parse_date(value: Optional[str], name: str) -> Optional[date]:
+    if value is None:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name} date: {value} (expected YYYY-MM-DD)")
+
+
+@router.get("/api/export/themes")
+def export_themes(
+    period: str = Query("1mo", description="Period for change_percent"),
+    format: str = FORMAT_QUERY,
+) -> StreamingResponse:
+    """Stream all themes with their returns for every period.
+
+    Each row contains theme id, name, description, stock count,
+    the period's change (and 1-day change) and ``return_{period}``
+    for every period.
+    """
+    validate_period(period)
+    return _streaming_response(
+        iter_theme_batches(period, PRECOMPUTED_DIR), THEME_EXPORT_COLUMNS, format, "themes", period
+    )
+
+
+@router.get("/api/export/themes/csv")
+def export_themes_csv(
+    period: str = Query("1mo", description="Period for export"),
+) -> StreamingResponse:
+    """Export all themes as a CSV file (same as ``/api/export/themes?format=csv``)."""
+    return export_themes(period=period, format="csv")
+
+
 @router.get("/api/export/themes/json")
 def export_themes_json(
     period: str = Query("1mo", description="Period for export"),
@@ -81,36 +127,104 @@ def export_themes_json(
     }
 
 
+@router.get("/api/export/stocks")
+def export_stocks(
+    period: str = Query("1mo", description="Period for change_percent and indicators"),
+    format: str = FORMAT_QUERY,
+    theme_id: Optional[str] = Query(None, description="Only stocks of this theme"),
+) -> StreamingResponse:
+    """Stream every tracked stock with returns and indicators.
+
+    Rows come from the period's metrics snapshot: market cap, the
+    period's change, RSI, moving-average distances, volatility, beta
+    and ``return_{period}`` for every period.
+    """
+    validate_period(period)
+    if theme_id is not None and theme_id not in THEMES:
+        raise HTTPException(status_code=404, detail=f"Theme not found: {theme_id}")
+    return _streaming_response(
+        iter_stock_batches(period, theme_id, PRECOMPUTED_DIR), STOCK_EXPORT_COLUMNS, format, "stocks", period
+    )
+
+
 @router.get("/api/export/stocks/csv")
-def export_stocks_csv() -> StreamingResponse:
-    """Export all tracked stocks as a CSV file.
+def export_stocks_csv(
+    period: str = Query("1mo", description="Period for export"),
+    theme_id: Optional[str] = Query(None, description="Only stocks of this theme"),
+) -> StreamingResponse:
+    """Export all tracked stocks as a CSV file (same as ``/api/export/stocks?format=csv``)."""
+    return export_stocks(period=period, format="csv", theme_id=theme_id)
+
 
-    Iterates through every theme and outputs each stock's
-    ticker, name, and parent theme.
+@router.get("/api/export/stocks/history")
+def export_stock_history(
+    format: str = FORMAT_QUERY,
+    theme_id: Optional[str] = Query(None, description="Only stocks of this theme"),
+    tickers: Optional[str] = Query(None, description="Comma-separated tickers"),
+    start: Optional[str] = Query(None, description="First date (YYYY-MM-DD)"),
+    end: Optional[str] = Query(None, description="Last date (YYYY-MM-DD)"),
+) -> StreamingResponse:
+    """Stream daily OHLCV history (up to 5 years) for a date range.
+
+    Histories are read from the long-term history store one ticker at
+    a time; tickers without a stored history are skipped.
     """
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["ticker", "name", "theme_id", "theme_name"])
+    if theme_id is not None and tickers is not None:
+        raise HTTPException(status_code=400, detail="Specify either theme_id or tickers, not both")
+    start_date, end_date = _parse_date(start, "start"), _parse_date(end, "end")
+    if start_date and end_date and start_date > end_date:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+
+    if tickers is not None:
+        from services.custom_theme import BasketError, normalize_basket
+
+        codes = [t for t in tickers.split(",") if t.strip()]
+        try:
+            selected = list(normalize_basket(codes, max_tickers=max(len(codes), 1)).tickers)
+        except BasketError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    elif theme_id is not None:
+        if theme_id not in THEMES:
+            raise HTTPException(status_code=404, detail=f"Theme not found: {theme_id}")
+        selected = list(THEMES[theme_id]["tickers"])
+    else:
+        selected = list(dict.fromkeys(t for theme in THEMES.values() for t in theme["tickers"]))
+
+    return _streaming_response(
+        iter_history_batches(selected, start_date, end_date), HISTORY_EXPORT_COLUMNS, format, "history", "5y"
+    )
 
-    seen: set[str] = set()
-    for theme_id, theme_data in THEMES.items():
-        for ticker in theme_data["tickers"]:
-            if ticker not in seen:
-                seen.add(ticker)
-                writer.writerow([
-                    ticker,
-                    get_ticker_name(theme_id, ticker),
-                    theme_id,
-                    theme_data["name"],
-                ])
-
-    output.seek(0)
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"stocks_{timestamp}.csv"
-    logger.info(f"Exporting stocks CSV: {filename}")
 
+@router.get("/api/export/bulk/{dataset}")
+def export_bulk(
+    dataset: str,
+    format: str = Query("parquet", pattern="^(parquet|arrow)$", description="parquet or arrow (IPC stream)"),
+    since: Optional[str] = Query(None, description="Only rows after this date (YYYY-MM-DD)"),
+) -> StreamingResponse:
+    """Stream a whole dataset for offline analysis as one Parquet file or Arrow IPC stream.
+
+    Datasets: ``ohlcv`` (daily bars of the tracked universe from the
+    history store), ``theme_index`` (daily theme index levels and returns
+    for every weighting) and ``fundamentals`` (market cap, indicators and
+    returns per stock). ``since`` limits the rows to newer bars for
+    incremental syncs.
+    """
+    if dataset not in BULK_DATASETS:
+        raise HTTPException(status_code=404, detail=f"Unknown dataset: {dataset}. Valid values: {', '.join(BULK_DATASETS)}")
+    if not parquet_available():
+        raise HTTPException(status_code=400, detail="Bulk export is not available (pyarrow not installed)")
+    since_date = _parse_date(since, "since")
+
+    suffix = "all" if since_date is None else f"since{since_date.strftime('%Y%m%d')}"
+    filename = generate_export_filename(dataset, format, suffix)
+    logger.info(f"Exporting bulk {dataset}: {filename}")
     return StreamingResponse(
-        iter([output.getvalue()]),
-        media_type="text/csv",
+        iter_record_batches(
+            dataset_batches(dataset, PRECOMPUTED_DIR, THEMES, since_date),
+            dataset_schema(dataset),
+            format,
+            group_rows=ROW_GROUP_ROWS if format == "parquet" else 0,
+        ),
+        media_type=EXPORT_MEDIA_TYPES["parquet"] if format == "parquet" else ARROW_MEDIA_TYPE,
         headers={"Content-Disposition": f"attachment; filename={filename}"},
     )
@@ -13,8 +13,12 @@ from datetime import datetime
 from pathlib import Path
 
 from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
 
+from app.websocket_manager import ws_manager
+from services.update_events import update_broker
 from utils.cache import cache
+from utils.metrics import PROMETHEUS_MEDIA_TYPE, request_metrics
 
 logger = logging.getLogger(__name__)
 
@@ -102,3 +106,36 @@ def db_status() -> dict:
         "status": "connected" if cache_exists else "unavailable",
         "timestamp": datetime.now().isoformat(),
     }
+
+
+def _realtime_gauges() -> list[tuple[str, str, float]]:
+    return [
+        ("websocket_connections", "Open WebSocket connections.", ws_manager.connection_count()),
+        ("sse_subscribers", "Open Server-Sent Events streams.", update_broker.subscribers),
+    ]
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics() -> PlainTextResponse:
+    """Request metrics in Prometheus text exposition format.
+
+    Per-route latency histograms and quantiles, request and response-size
+    counters, in-flight requests and real-time connection gauges. Runs on
+    the event loop (not the threadpool) so it never reads the metrics while
+    the middleware is updating them.
+    """
+    return PlainTextResponse(
+        request_metrics.render_prometheus(_realtime_gauges()),
+        media_type=PROMETHEUS_MEDIA_TYPE,
+    )
+
+
+@router.get("/api/health/metrics")
+async def metrics_summary() -> dict:
+    """Per-route request counts, p50/p95/p99 latency and response bytes as JSON (runs on the event loop)."""
+    return {
+        "routes": request_metrics.summary(),
+        "in_flight": dict(request_metrics.in_flight),
+        **{name: value for name, _, value in _realtime_gauges()},
+        "timestamp": datetime.now().isoformat(),
+    }
@@ -0,0 +1,119 @@
+"""Real-time router: WebSocket push of snapshot deltas and an SSE update feed.
+
+Clients connect to ``/ws``, subscribe to channels and receive a full
+snapshot per channel followed by JSON Patch deltas after every data update.
+Lightweight clients can instead listen on ``/api/events`` (Server-Sent
+Events) and refetch only when a new snapshot is published.
+
+Client → server (JSON text frames)::
+
+    {"action": "subscribe", "channels": ["themes:1mo", "theme:semiconductor:1mo"]}
+    {"action": "unsubscribe", "channels": ["themes:1mo"]}
+    {"action": "ping"}
+
+Server → client::
+
+    {"type": "snapshot", "channel": ..., "version": 3, "data": {...}}
+    {"type": "patch", "channel": ..., "version": 4, "base": 3, "ops": [...]}
+    {"type": "error", "message": ...}
+    {"type": "pong"}
+
+A patch applies to the state with version ``base``. Clients drop patches
+older than their local version and re-subscribe on any other gap.
+"""
+
+import logging
+from typing import Any, Optional
+
+from fastapi import APIRouter, Header, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+
+from app.websocket_manager import MAX_SUBSCRIPTIONS, Client, ConnectionManager, ws_manager
+from services.live_channels import ChannelError, parse_channel
+from services.update_events import update_broker
+from utils.serialization import loads
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+async def _subscribe(manager: ConnectionManager, client: Client, channels: list[Any]) -> None:
+    for channel in channels:
+        if not isinstance(channel, str):
+            manager.send(client, {"type": "error", "message": f"Invalid channel: {channel!r}"})
+            continue
+        try:
+            parse_channel(channel)
+        except ChannelError as e:
+            manager.send(client, {"type": "error", "channel": channel, "message": str(e)})
+            continue
+        if channel not in client.channels and len(client.channels) >= MAX_SUBSCRIPTIONS:
+            manager.send(client, {
+                "type": "error",
+                "channel": channel,
+                "message": f"Too many subscriptions (max {MAX_SUBSCRIPTIONS})",
+            })
+            continue
+        await manager.subscribe(client, channel)
+
+
+async def _handle_message(manager: ConnectionManager, client: Client, text: str) -> None:
+    try:
+        message = loads(text)
+    except ValueError:
+        manager.send(client, {"type": "error", "message": "Invalid JSON"})
+        return
+    if not isinstance(message, dict):
+        manager.send(client, {"type": "error", "message": "Message must be a JSON object"})
+        return
+
+    action = message.get("action")
+    channels = message.get("channels", [])
+    if action in ("subscribe", "unsubscribe") and not isinstance(channels, list):
+        manager.send(client, {"type": "error", "message": "channels must be a list"})
+    elif action == "subscribe":
+        await _subscribe(manager, client, channels)
+    elif action == "unsubscribe":
+        for channel in channels:
+            if isinstance(channel, str):
+                await manager.unsubscribe(client, channel)
+    elif action == "ping":
+        manager.send(client, {"type": "pong"})
+    else:
+        manager.send(client, {"type": "error", "message": f"Unknown action: {action}"})
+
+
+@router.websocket("/ws")
+async def live_updates(websocket: WebSocket, channels: Optional[str] = None) -> None:
+    """Stream snapshot deltas for subscribed channels.
+
+    Channels may also be given up front as ``/ws?channels=themes:1mo,...``.
+    """
+    manager = ws_manager
+    client = await manager.connect(websocket)
+    try:
+        if channels:
+            await _subscribe(manager, client, [c.strip() for c in channels.split(",") if c.strip()])
+        while True:
+            await _handle_message(manager, client, await websocket.receive_text())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await manager.disconnect(client)
+
+
+@router.get("/api/events")
+async def update_events(last_event_id: Optional[str] = Header(None, alias="Last-Event-ID")) -> StreamingResponse:
+    """Server-Sent Events feed of published snapshots.
+
+    Emits a ``snapshot`` event (version, generated_at and the themes whose
+    ranking values changed) after each data update, and a keepalive comment
+    in between. The latest event is sent on connect unless Last-Event-ID
+    already matches it.
+    """
+    return StreamingResponse(
+        update_broker.stream(last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,160 @@
+"""スクリーナーAPIルーター
+
+銘柄メトリクステーブル（metrics_{period}.json）に対して
+フィルタ式・ソート・ページングをサーバー側で実行する（列全体のNumPyマスク演算）
+"""
+
+from pathlib import Path
+
+from fastapi import APIRouter, HTTPException, Query
+
+from data.themes import THEMES
+from schemas import StockMetrics
+from services.metrics_table import (
+    HEATMAP_CATEGORIES,
+    SORTABLE_COLUMNS,
+    decode_cursor,
+    encode_cursor,
+    load_metrics_table,
+    query_key,
+)
+from services.screener_filter import FilterError, compile_filter, evaluate_filter, normalize_filter
+from utils.fields import parse_fields, project
+from utils.security import validate_period, validate_theme_id
+from utils.wire_format import ACCEPT_HEADER, category_id, negotiate, negotiated_response
+
+router = APIRouter()
+
+# 事前計算済みデータのディレクトリ
+PRECOMPUTED_DIR = Path(__file__).parent.parent / "precomputed"
+
+# 1ページの最大件数
+SCREENER_MAX_LIMIT = 500
+
+
+def screener_table(payload: dict) -> tuple[list[dict], type, dict]:
+    """スクリーナー結果: 銘柄を1つの表にする"""
+    rows = [
+        {**stock, "market_cap_category": category_id(stock.get("market_cap_category"))}
+        for stock in payload.get("stocks", [])
+    ]
+    metadata = {key: value for key, value in payload.items() if key != "stocks"}
+    return rows, StockMetrics, metadata
+
+
+@router.get("/api/screener")
+def screen_stocks(
+    period: str = Query("1mo", description="期間: 1d, 5d, 10d, 1mo, 3mo, 6mo, 1y, 3y, 5y"),
+    theme_id: str | None = Query(None, description="テーマIDで絞り込み"),
+    category: str | None = Query(None, description="時価総額カテゴリ（カンマ区切り: mega,large,mid,small,micro）"),
+    min_change: float | None = Query(None, description="騰落率の下限（%）"),
+    max_change: float | None = Query(None, description="騰落率の上限（%）"),
+    min_market_cap: float | None = Query(None, ge=0, description="時価総額の下限（円）"),
+    max_market_cap: float | None = Query(None, ge=0, description="時価総額の上限（円）"),
+    filter_expr: str | None = Query(
+        None,
+        alias="filter",
+        description="フィルタ式（例: rsi < 30 and return_1mo > 5 and category == mid）",
+    ),
+    sort: str = Query("change_percent", description=f"ソート列: {', '.join(SORTABLE_COLUMNS)}"),
+    order: str = Query("desc", pattern="^(asc|desc)$", description="ソート順: asc, desc"),
+    limit: int = Query(50, ge=1, le=SCREENER_MAX_LIMIT, description="1ページの件数"),
+    cursor: str | None = Query(None, description="次ページのカーソル（前回レスポンスの next_cursor）"),
+    fields: str | None = Query(None, description="銘柄に含めるフィールド（カンマ区切り、例: code,name,rsi）"),
+    accept: str | None = ACCEPT_HEADER,
+):
+    """
+    条件に合う銘柄を検索
+
+    Args:
+        period: 騰落率の期間
+        theme_id: テーマIDで絞り込み
+        category: 時価総額カテゴリで絞り込み
+        min_change / max_change: 騰落率の範囲
+        min_market_cap / max_market_cap: 時価総額の範囲
+        filter_expr: フィルタ式（services/screener_filter.py の文法）
+        sort: ソート列（欠損値は常に末尾）
+        order: ソート順
+        limit: 1ページの件数
+        cursor: 次ページのカーソル
+        fields: 銘柄に含めるフィールド
+        accept: レスポンス形式（JSON / MessagePack / Arrow IPC）
+
+    Returns:
+        該当銘柄と次ページのカーソル
+    """
+    period = validate_period(period)
+    if theme_id is not None:
+        theme_id = validate_theme_id(theme_id)
+        if theme_id not in THEMES:
+            raise HTTPException(status_code=404, detail=f"Theme not found: {theme_id}")
+    categories = [c.strip() for c in category.split(",") if c.strip()] if category else None
+    if categories:
+        unknown = [c for c in categories if c not in HEATMAP_CATEGORIES]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown category: {', '.join(unknown)}")
+    if sort not in SORTABLE_COLUMNS:
+        raise HTTPException(status_code=400, detail=f"Unknown sort column: {sort}")
+    descending = order == "desc"
+    tree = parse_fields(fields)
+    if filter_expr:
+        # テーブルの読み込み前に構文を検証（コンパイル結果はキャッシュされる）
+        try:
+            compile_filter(filter_expr)
+        except FilterError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid filter: {e}")
+
+    # カーソルは同じ検索条件でのみ有効（条件を変えて再利用したら400）
+    query = query_key(
+        period=period,
+        theme_id=theme_id,
+        categories=sorted(categories) if categories else None,
+        min_change=min_change,
+        max_change=max_change,
+        min_market_cap=min_market_cap,
+        max_market_cap=max_market_cap,
+        filter=normalize_filter(filter_expr) if filter_expr else None,
+    )
+
+    table = load_metrics_table(PRECOMPUTED_DIR, period)
+
+    offset = 0
+    if cursor:
+        try:
+            offset = decode_cursor(cursor, sort, descending, table.generated_at, query)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    mask = table.mask(
+        theme_id=theme_id,
+        categories=categories,
+        min_change=min_change,
+        max_change=max_change,
+        min_market_cap=min_market_cap,
+        max_market_cap=max_market_cap,
+    )
+    if filter_expr:
+        mask &= evaluate_filter(table, filter_expr)
+    indices, total = table.query(mask, sort, descending, offset, limit)
+
+    next_offset = offset + len(indices)
+    next_cursor = (
+        encode_cursor(next_offset, sort, descending, table.generated_at, query)
+        if next_offset < total
+        else None
+    )
+
+    result = {
+        "period": period,
+        "sort": sort,
+        "order": order,
+        "total": total,
+        "count": len(indices),
+        "offset": offset,
+        "next_cursor": next_cursor,
+        "stocks": project(table.rows(indices), tree),
+        "last_updated": table.last_updated,
+        "generated_at": table.generated_at,
+    }
+    media_type = negotiate(accept, tabular=True)
+    return negotiated_response(result, media_type, screener_table)
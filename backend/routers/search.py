@@ -8,7 +8,7 @@ import logging
 
 from fastapi import APIRouter, Query
 
-from data.themes import THEMES, get_ticker_name
+from services.search_index import get_search_index
 
 logger = logging.getLogger(__name__)
 
@@ -22,30 +22,13 @@ def search_stocks(
 ) -> dict:
     """Search stocks by ticker code or company name.
 
-    Performs case-insensitive substring matching against
-    both ticker symbols and Japanese company names.
+    Uses the prebuilt search index: ticker codes match by prefix and
+    company names by substring, after width/kana/case normalization
+    (e.g. "ソニー", "そにー" and "ｿﾆｰ" are equivalent). Results are
+    ranked exact > prefix > substring.
     """
-    query_lower = q.lower()
-    results: list[dict] = []
-    seen: set[str] = set()
-
-    for theme_id, theme_data in THEMES.items():
-        for ticker in theme_data["tickers"]:
-            if ticker in seen:
-                continue
-            name = get_ticker_name(theme_id, ticker)
-            if query_lower in ticker.lower() or query_lower in name.lower():
-                seen.add(ticker)
-                results.append({
-                    "ticker": ticker,
-                    "name": name,
-                    "theme_id": theme_id,
-                    "theme_name": theme_data["name"],
-                })
-            if len(results) >= limit:
-                break
-        if len(results) >= limit:
-            break
+    entries = get_search_index().search_stocks(q, limit)
+    results = [entry.to_dict() for entry in entries]
 
     logger.debug(f"Stock search q={q!r} returned {len(results)} results")
     return {
@@ -62,26 +45,11 @@ def search_themes(
 ) -> dict:
     """Search themes by name or description.
 
-    Returns matching themes with their metadata including
-    stock count and description.
+    Returns matching themes with their metadata including stock count
+    and description, ranked name > id > description matches.
     """
-    query_lower = q.lower()
-    results: list[dict] = []
-
-    for theme_id, theme_data in THEMES.items():
-        name_match = query_lower in theme_data["name"].lower()
-        desc_match = query_lower in theme_data["description"].lower()
-        id_match = query_lower in theme_id.lower()
-
-        if name_match or desc_match or id_match:
-            results.append({
-                "id": theme_id,
-                "name": theme_data["name"],
-                "description": theme_data["description"],
-                "stock_count": len(theme_data["tickers"]),
-            })
-        if len(results) >= limit:
-            break
+    entries = get_search_index().search_themes(q, limit)
+    results = [entry.to_dict() for entry in entries]
 
     logger.debug(f"Theme search q={q!r} returned {len(results)} results")
     return {
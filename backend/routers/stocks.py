@@ -4,10 +4,10 @@ import logging
 import time
 from datetime import datetime
 
-import pandas as pd
 from fastapi import APIRouter, Depends, HTTPException, Query
 
 from data.themes import THEMES, get_ticker_info
+from schemas import StockListItem
 from services.calculator import (
     calculate_beta_alpha,
     calculate_bollinger_bands,
@@ -18,11 +18,19 @@ from services.calculator import (
     calculate_rsi,
     calculate_theme_daily_returns,
     get_price_history,
+    get_price_history_columns,
     get_stock_indicators,
+    price_history_columns,
+    price_history_rows,
+    series_to_list,
 )
 from services.data_fetcher import fetch_stock_data, get_stock_info
+from services.search_index import get_search_index
+from services.sparkline import build_sparkline, empty_sparkline, sparkline_source_period
 from utils.cache import cache
 from utils.security import validate_period, validate_stock_code, verify_api_key
+from utils.serialization import FastJSONResponse
+from utils.wire_format import ACCEPT_HEADER, negotiate, negotiated_response
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -52,7 +60,7 @@ def get_period_days(period: str) -> int:
 
 @router.get("/api/nikkei225")
 def get_nikkei225(
-    period: str = Query("1mo", description="期間: 1d, 5d, 1mo, 3mo, 6mo, 1y")
+    period: str = Query("1mo", description="期間: 1d, 5d, 10d, 1mo, 3mo, 6mo, 1y, 3y, 5y")
 ):
     """
     日経225指数の情報を取得
@@ -83,7 +91,7 @@ def get_nikkei225(
             "price": None,
             "change_percent": 0.0,
             "change_percent_1d": None,
-            "sparkline": {"data": [], "period_start_index": 0},
+            "sparkline": empty_sparkline(),
             "error": "データ取得失敗",
         }
 
@@ -100,22 +108,11 @@ def get_nikkei225(
         if df_1d is not None and not df_1d.empty:
             change_percent_1d = round(calculate_return(df_1d), 2)
 
-    # スパークライン用に常に1年分のデータを取得
-    sparkline_df = fetch_stock_data(NIKKEI_TICKER, "1y")
-    sparkline_data = []
-    period_start_index = 0
-
+    # スパークライン用データを取得（1y以下は1年分、3y/5yは期間全体）
+    sparkline = empty_sparkline()
+    sparkline_df = fetch_stock_data(NIKKEI_TICKER, sparkline_source_period(period))
     if sparkline_df is not None and not sparkline_df.empty:
-        sparkline_returns = calculate_daily_returns(sparkline_df)
-        if sparkline_returns is not None and not sparkline_returns.empty:
-            cumulative = (1 + sparkline_returns / 100).cumprod() - 1
-            cumulative = cumulative * 100
-            sparkline_data = [round(v, 2) if not pd.isna(v) else 0.0 for v in cumulative.values]
-
-            # 選択期間の開始インデックスを計算
-            period_days = get_period_days(period)
-            total_days = len(sparkline_data)
-            period_start_index = max(0, total_days - period_days)
+        sparkline = build_sparkline(calculate_daily_returns(sparkline_df), period)
 
     result = {
         "name": "日経225",
@@ -124,10 +121,7 @@ def get_nikkei225(
         "price": round(latest_price, 2),
         "change_percent": round(change_percent, 2),
         "change_percent_1d": change_percent_1d,
-        "sparkline": {
-            "data": sparkline_data,
-            "period_start_index": period_start_index,
-        },
+        "sparkline": sparkline,
     }
 
     # キャッシュに保存（5分間）
@@ -136,17 +130,67 @@ def get_nikkei225(
     return result
 
 
-@router.get("/api/stocks/{code}")
+def stock_list_table(payload: dict) -> tuple[list[dict], type, dict]:
+    """銘柄一覧: 検索結果を行に、検索条件をメタデータにする（Arrow IPC用）"""
+    metadata = {key: value for key, value in payload.items() if key != "results"}
+    return payload.get("results", []), StockListItem, metadata
+
+
+# 価格履歴のレスポンス形式
+LAYOUT_QUERY = Query(
+    "rows",
+    pattern="^(rows|columns)$",
+    description="価格履歴の形式: rows（1日1オブジェクト）, columns（dates/open/high/low/close/volume の配列）",
+)
+
+
+# 銘柄詳細のブロック（include= で選択）
+STOCK_DETAIL_BLOCKS = ("indicators", "beta", "price_history", "ma", "rsi", "bollinger", "ichimoku")
+
+# チャート用データ（chart_df）を必要とするブロック
+CHART_BLOCKS = frozenset(["price_history", "ma", "rsi", "bollinger", "ichimoku"])
+
+INCLUDE_QUERY = Query(
+    None,
+    description=f"返却するブロック（カンマ区切り）: {', '.join(STOCK_DETAIL_BLOCKS)}。省略時は全ブロック",
+)
+
+
+def parse_include(include: str | None) -> frozenset[str]:
+    """include= を検証してブロック集合に変換（省略時は全ブロック）"""
+    if include is None or not include.strip():
+        return frozenset(STOCK_DETAIL_BLOCKS)
+
+    blocks = frozenset(block.strip() for block in include.split(",") if block.strip())
+    unknown = sorted(blocks - set(STOCK_DETAIL_BLOCKS))
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown include block: {', '.join(unknown)}. Allowed: {', '.join(STOCK_DETAIL_BLOCKS)}",
+        )
+    return blocks
+
+
+@router.get("/api/stocks/{code}", response_class=FastJSONResponse)
 def get_stock_detail(
     code: str,
-    period: str = Query("1mo", description="期間: 1d, 5d, 1mo, 3mo, 6mo, 1y")
+    period: str = Query("1mo", description="期間: 1d, 5d, 10d, 1mo, 3mo, 6mo, 1y, 3y, 5y"),
+    layout: str = LAYOUT_QUERY,
+    include: str | None = INCLUDE_QUERY,
+    accept: str | None = ACCEPT_HEADER,
 ):
     """
     銘柄詳細を取得
 
+    include で指定されなかったブロックは計算自体を省略する
+    （例: include=indicators ならチャート用データの取得・指標計算・ベータ計算を行わない）
+
     Args:
         code: 銘柄コード（例: 7203.T または 7203）
         period: 取得期間
+        layout: 価格履歴の形式（rows / columns）
+        include: 返却するブロック（indicators, beta, price_history, ma, rsi, bollinger, ichimoku）
+        accept: レスポンス形式（JSON / MessagePack）
 
     Returns:
         銘柄詳細情報（価格データ、指標含む）
@@ -154,84 +198,27 @@ def get_stock_detail(
     # バリデーション
     period = validate_period(period)
     ticker = validate_stock_code(code)
+    blocks = parse_include(include)
 
     # キャッシュチェック（5分間有効）
-    cache_key = f"stock_detail:{ticker}:{period}"
+    media_type = negotiate(accept)
+    include_key = ",".join(block for block in STOCK_DETAIL_BLOCKS if block in blocks)
+    cache_key = f"stock_detail:{ticker}:{period}:{layout}:{include_key}"
     cached = cache.get(cache_key)
     if cached:
-        return cached
+        return negotiated_response(cached, media_type)
 
     # 株価データを取得（指標計算用）
     df = fetch_stock_data(ticker, period)
 
-    # チャート用データ：3か月以下の場合は常に3か月分を取得
-    period_days = get_period_days(period)
-    chart_period = "3mo" if period_days <= 63 else period
-    chart_df = fetch_stock_data(ticker, chart_period)
-
     if df is None or df.empty:
         raise HTTPException(status_code=404, detail=f"Stock not found: {ticker}")
 
-    # 基本指標を取得
-    indicators = get_stock_indicators(ticker, period)
-
-    if not indicators:
-        raise HTTPException(status_code=404, detail=f"Failed to get indicators for: {ticker}")
-
     # 銘柄の基本情報を取得
     ticker_info = get_ticker_info(ticker)
 
-    # yfinanceから追加情報を取得
-    yf_info = get_stock_info(ticker)
-
-    # 価格履歴を取得（チャート用期間で取得）
-    price_history = get_price_history(ticker, chart_period)
-
-    # 選択期間の開始インデックスを計算
-    total_days = len(price_history)
-    selected_period_start_index = max(0, total_days - period_days)
-
-    # チャート用インジケーター計算（chart_dfを使用）
-    chart_close = chart_df["Close"] if chart_df is not None and not chart_df.empty else df["Close"]
-
-    # 移動平均（MA20, MA75, MA200）
-    ma20 = calculate_ma(chart_close, 20)
-    ma75 = calculate_ma(chart_close, 75)
-    ma200 = calculate_ma(chart_close, 200)
-
-    def to_list(s):
-        if s is None or s.empty:
-            return []
-        import numpy as np
-        return [round(v, 2) if pd.notna(v) and not np.isnan(v) else None for v in s.values]
-
-    # RSI
-    rsi_series = calculate_rsi(chart_close)
-
-    # ボリンジャーバンド
-    bollinger = calculate_bollinger_bands(chart_close)
-
-    # 一目均衡表（chart_dfを使用）
-    ichimoku_df = chart_df if chart_df is not None and not chart_df.empty else df
-    ichimoku = calculate_ichimoku(ichimoku_df)
-
-    # 所属テーマがあればベータ・アルファを計算
-    beta_alpha = {"beta": None, "alpha": None, "r_squared": None}
-    if ticker_info:
-        theme_id = ticker_info["theme_id"]
-        theme = THEMES.get(theme_id)
-        if theme:
-            theme_daily_returns = calculate_theme_daily_returns(
-                theme["tickers"],
-                period
-            )
-            stock_daily_returns = calculate_daily_returns(df)
-
-            if not theme_daily_returns.empty and not stock_daily_returns.empty:
-                beta_alpha = calculate_beta_alpha(
-                    stock_daily_returns,
-                    theme_daily_returns
-                )
+    # テーマ未登録の銘柄のみyfinanceから名称を取得
+    yf_info = get_stock_info(ticker) if not ticker_info else None
 
     result = {
         "ticker": ticker,
@@ -242,7 +229,21 @@ def get_stock_detail(
             "id": ticker_info["theme_id"],
             "name": ticker_info["theme_name"],
         } if ticker_info else None,
-        "indicators": {
+        "themes": [
+            {"id": theme_id, "name": THEMES[theme_id]["name"]}
+            for theme_id in ticker_info["theme_ids"]
+        ] if ticker_info else [],
+    }
+
+    # 基本指標
+    if "indicators" in blocks or "beta" in blocks:
+        result["indicators"] = {}
+
+    if "indicators" in blocks:
+        indicators = get_stock_indicators(ticker, period)
+        if not indicators:
+            raise HTTPException(status_code=404, detail=f"Failed to get indicators for: {ticker}")
+        result["indicators"].update({
             "latest_price": indicators["latest_price"],
             "period_return": indicators["period_return"],
             "rsi": indicators["rsi"],
@@ -251,35 +252,96 @@ def get_stock_detail(
             "volatility": indicators["volatility"],
             "high": indicators["high"],
             "low": indicators["low"],
+        })
+
+    # 所属する全テーマに対するベータ・アルファを計算（indicators には主テーマの値を入れる）
+    if "beta" in blocks:
+        beta_alpha = {"beta": None, "alpha": None, "r_squared": None}
+        theme_betas = []
+        if ticker_info:
+            stock_daily_returns = calculate_daily_returns(df)
+            for theme_id in ticker_info["theme_ids"]:
+                theme_beta = {"beta": None, "alpha": None, "r_squared": None}
+                theme_daily_returns = calculate_theme_daily_returns(THEMES[theme_id]["tickers"], period)
+                if not theme_daily_returns.empty and not stock_daily_returns.empty:
+                    theme_beta = calculate_beta_alpha(stock_daily_returns, theme_daily_returns)
+                theme_betas.append({
+                    "theme_id": theme_id,
+                    "theme_name": THEMES[theme_id]["name"],
+                    "beta": theme_beta["beta"],
+                    "alpha": theme_beta["alpha"],
+                    "r_squared": theme_beta.get("r_squared"),
+                })
+                if theme_id == ticker_info["theme_id"]:
+                    beta_alpha = theme_beta
+        result["indicators"].update({
             "beta": beta_alpha["beta"],
             "alpha": beta_alpha["alpha"],
             "r_squared": beta_alpha.get("r_squared"),
-        },
-        "price_history": price_history,
-        "selected_period_start_index": selected_period_start_index,
-        # チャート用インジケーターデータ
-        "chart_indicators": {
-            "ma": {
-                "ma20": to_list(ma20),
-                "ma75": to_list(ma75),
-                "ma200": to_list(ma200),
-            },
-            "rsi": to_list(rsi_series),
-            "bollinger": bollinger,
-            "ichimoku": ichimoku,
-        },
-    }
+        })
+        result["theme_betas"] = theme_betas
+
+    if blocks & CHART_BLOCKS:
+        # チャート用データ：3か月以下の場合は常に3か月分を取得
+        period_days = get_period_days(period)
+        chart_period = "3mo" if period_days <= 63 else period
+        chart_df = fetch_stock_data(ticker, chart_period)
+        if chart_df is None or chart_df.empty:
+            chart_df = df
+
+        # 価格履歴を変換（取得済みのチャート用データを使用）
+        if "price_history" in blocks:
+            if layout == "columns":
+                price_history = price_history_columns(chart_df)
+                total_days = len(price_history["dates"])
+            else:
+                price_history = price_history_rows(chart_df)
+                total_days = len(price_history)
+
+            result["price_history"] = price_history
+            result["price_history_layout"] = layout
+            # 選択期間の開始インデックスを計算
+            result["selected_period_start_index"] = max(0, total_days - period_days)
+
+        # チャート用インジケーター計算（chart_dfを使用）
+        chart_close = chart_df["Close"]
+        chart_indicators = {}
+
+        # 移動平均（MA20, MA75, MA200）
+        if "ma" in blocks:
+            chart_indicators["ma"] = {
+                "ma20": series_to_list(calculate_ma(chart_close, 20)),
+                "ma75": series_to_list(calculate_ma(chart_close, 75)),
+                "ma200": series_to_list(calculate_ma(chart_close, 200)),
+            }
+
+        # RSI
+        if "rsi" in blocks:
+            chart_indicators["rsi"] = series_to_list(calculate_rsi(chart_close))
+
+        # ボリンジャーバンド
+        if "bollinger" in blocks:
+            chart_indicators["bollinger"] = calculate_bollinger_bands(chart_close)
+
+        # 一目均衡表
+        if "ichimoku" in blocks:
+            chart_indicators["ichimoku"] = calculate_ichimoku(chart_df)
+
+        if chart_indicators:
+            result["chart_indicators"] = chart_indicators
 
     # キャッシュに保存（5分間）
     cache.set(cache_key, result, ttl_seconds=300)
 
-    return result
+    # jsonable_encoderを経由せずに直接エンコード
+    return negotiated_response(result, media_type)
 
 
-@router.get("/api/stocks/{code}/chart")
+@router.get("/api/stocks/{code}/chart", response_class=FastJSONResponse)
 def get_stock_chart_data(
     code: str,
-    period: str = Query("1mo", description="期間: 1d, 5d, 1mo, 3mo, 6mo, 1y")
+    period: str = Query("1mo", description="期間: 1d, 5d, 10d, 1mo, 3mo, 6mo, 1y, 3y, 5y"),
+    layout: str = LAYOUT_QUERY,
 ):
     """
     銘柄のチャートデータを取得
@@ -287,6 +349,7 @@ def get_stock_chart_data(
     Args:
         code: 銘柄コード
         period: 取得期間
+        layout: データ形式（rows / columns）
 
     Returns:
         チャート用価格データ
@@ -295,22 +358,27 @@ def get_stock_chart_data(
     period = validate_period(period)
     ticker = validate_stock_code(code)
 
-    price_history = get_price_history(ticker, period)
+    if layout == "columns":
+        price_history = get_price_history_columns(ticker, period)
+    else:
+        price_history = get_price_history(ticker, period)
 
     if not price_history:
         raise HTTPException(status_code=404, detail=f"Chart data not found: {ticker}")
 
-    return {
+    return FastJSONResponse({
         "ticker": ticker,
         "period": period,
+        "layout": layout,
         "data": price_history,
-    }
+    })
 
 
 @router.get("/api/stocks")
 def search_stocks(
     q: str = Query(None, description="検索クエリ（銘柄コードまたは企業名）"),
-    theme_id: str = Query(None, description="テーマIDでフィルタ")
+    theme_id: str = Query(None, description="テーマIDでフィルタ"),
+    accept: str | None = ACCEPT_HEADER,
 ):
     """
     銘柄を検索
@@ -318,6 +386,7 @@ def search_stocks(
     Args:
         q: 検索クエリ
         theme_id: テーマIDでフィルタ
+        accept: レスポンス形式（JSON / MessagePack / Arrow IPC: 銘柄の表）
 
     Returns:
         マッチした銘柄リスト
@@ -338,34 +407,20 @@ def search_stocks(
                 "theme_id": theme_id,
                 "theme_name": theme["name"],
             })
+    elif q:
+        # 検索インデックス（コード前方一致・企業名の部分一致、スコア順）
+        results = [entry.to_dict() for entry in get_search_index().search_stocks(q)]
     else:
-        # 全テーマから検索
-        for tid, theme_data in THEMES.items():
-            for ticker in theme_data["tickers"]:
-                name = theme_data["ticker_names"].get(ticker, ticker)
-
-                # 検索クエリがあればフィルタ
-                if q:
-                    query_lower = q.lower()
-                    if (query_lower not in ticker.lower() and
-                        query_lower not in name.lower()):
-                        continue
-
-                # 重複チェック
-                if not any(r["ticker"] == ticker for r in results):
-                    results.append({
-                        "ticker": ticker,
-                        "name": name,
-                        "theme_id": tid,
-                        "theme_name": theme_data["name"],
-                    })
-
-    return {
+        # 全銘柄（重複なし・テーマ定義順）
+        results = [entry.to_dict() for entry in get_search_index().stocks]
+
+    payload = {
         "query": q,
         "theme_id": theme_id,
         "results": results,
         "total": len(results),
     }
+    return negotiated_response(payload, negotiate(accept, tabular=True), stock_list_table)
 
 
 @router.post("/api/stocks/{code}/refresh")
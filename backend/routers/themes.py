@@ -5,15 +5,18 @@
 """
 # req:REQ-005
 
-import json
+import asyncio
 import logging
 from datetime import datetime
 from pathlib import Path
 
 import pandas as pd
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
+from fastapi.responses import Response
 
 from data.themes import THEMES, get_all_tickers, get_theme_by_id, get_ticker_description, get_ticker_name
+from schemas import CustomThemeRequest, HeatmapStock, ThemeStock
+from services import snapshot
 from services.calculator import (
     calculate_beta_alpha,
     calculate_daily_returns,
@@ -24,8 +27,37 @@ from services.calculator import (
     get_stock_indicators,
 )
 from services.data_fetcher import fetch_batch_parallel, fetch_stock_data, get_market_cap
+from services.metrics_table import HEATMAP_CATEGORIES, heatmap_payload, load_metrics_table
+from services.sparkline import (
+    DOWNSAMPLE_METHODS,
+    PERIOD_DAYS,
+    SPARKLINE_MAX_POINTS,
+    SPARKLINE_MIN_POINTS,
+    SPARKLINE_POINT_BUDGETS,
+    build_sparkline,
+    downsample_payload,
+    empty_sparkline,
+    sparkline_source_period,
+)
+from services.theme_index import (
+    DEFAULT_WEIGHTING,
+    WEIGHTINGS,
+    apply_index_to_detail,
+    apply_index_to_ranking,
+    theme_index_filename,
+)
 from utils.cache import cache
+from utils.fields import FieldTree, parse_fields, project, wants
 from utils.security import safe_path_join, validate_period, validate_theme_id, verify_api_key
+from utils.serialization import JSON_MEDIA_TYPE, raw_json_response
+from utils.wire_format import (
+    ACCEPT_HEADER,
+    VARY_HEADERS,
+    TableBuilder,
+    category_id,
+    negotiate,
+    negotiated_response,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -49,64 +81,36 @@ def get_last_trading_date() -> str | None:
 
 def get_period_days(period: str) -> int:
     """期間文字列から日数を取得"""
-    period_days = {
-        "1d": 1,
-        "5d": 5,
-        "10d": 10,
-        "1mo": 21,  # 約1ヶ月の営業日
-        "3mo": 63,  # 約3ヶ月の営業日
-        "6mo": 126,  # 約6ヶ月の営業日
-        "1y": 252,  # 約1年の営業日
-        "3y": 756,  # 約3年の営業日
-        "5y": 1260,  # 約5年の営業日
-    }
-    return period_days.get(period, 21)
+    return PERIOD_DAYS.get(period, 21)
 
 
 def get_stock_sparkline(ticker: str, period: str) -> dict:
     """個別銘柄のスパークラインデータを取得（累積リターン）
 
-    常に1年間のデータを返し、選択期間の開始インデックスも返す
+    1y以下は1年間のデータと選択期間の開始インデックスを返す
+    3y/5yは期間全体を週次・月次に間引いたデータを返す
     """
-    # 常に1年分のデータを取得
-    df = fetch_stock_data(ticker, "1y")
+    df = fetch_stock_data(ticker, sparkline_source_period(period))
 
     if df is None or df.empty:
-        return {"data": [], "period_start_index": 0}
+        return empty_sparkline()
 
     # 日次リターンを計算
     daily_returns = calculate_daily_returns(df)
 
-    if daily_returns is None or daily_returns.empty:
-        return {"data": [], "period_start_index": 0}
-
-    # 累積リターンを計算
-    cumulative = (1 + daily_returns / 100).cumprod() - 1
-    cumulative = cumulative * 100  # パーセント表示
-
-    # NaNを0に置換してリストに変換
-    data = [round(v, 2) if not pd.isna(v) else 0.0 for v in cumulative.values]
-
-    # 選択期間の開始インデックスを計算
-    period_days = get_period_days(period)
-    total_days = len(data)
-    period_start_index = max(0, total_days - period_days)
-
-    return {
-        "data": data,
-        "period_start_index": period_start_index,
-    }
+    return build_sparkline(daily_returns, period)
 
 
 def get_theme_sparkline(tickers: list[str], period: str, stock_data_1y: dict = None) -> dict:
     """テーマのスパークラインデータを取得（累積リターン）
 
-    常に1年間のデータを返し、選択期間の開始インデックスも返す
+    1y以下は1年間のデータと選択期間の開始インデックスを返す
+    3y/5yは期間全体を週次・月次に間引いたデータを返す
 
     Args:
         tickers: 銘柄コードリスト
         period: 選択期間（開始インデックス計算用）
-        stock_data_1y: 1年分の取得済みデータ（省略時は個別取得）
+        stock_data_1y: スパークライン用の取得済みデータ（省略時は個別取得）
     """
     # 既に取得済みのデータがあればそれを使用
     if stock_data_1y is not None:
@@ -114,38 +118,169 @@ def get_theme_sparkline(tickers: list[str], period: str, stock_data_1y: dict = N
         theme_stock_data = {t: stock_data_1y[t] for t in tickers if t in stock_data_1y}
         daily_returns = calculate_theme_daily_returns_from_data(theme_stock_data)
     else:
-        # 常に1年分のデータを取得（フォールバック）
-        daily_returns = calculate_theme_daily_returns(tickers, "1y")
+        # フォールバック: スパークライン用期間のデータを取得
+        daily_returns = calculate_theme_daily_returns(tickers, sparkline_source_period(period))
 
-    if daily_returns.empty:
-        return {"data": [], "period_start_index": 0}
+    return build_sparkline(daily_returns, period)
 
-    # 累積リターンを計算
-    cumulative = (1 + daily_returns / 100).cumprod() - 1
-    cumulative = cumulative * 100  # パーセント表示
 
-    # NaNを0に置換してリストに変換
-    data = [round(v, 2) if not pd.isna(v) else 0.0 for v in cumulative.values]
+def read_precomputed_bytes(filename: str) -> bytes | None:
+    """事前計算済みJSONをバイト列のまま取得（パストラバーサル対策済み・存在しなければNone）
 
-    # 選択期間の開始インデックスを計算
-    period_days = get_period_days(period)
-    total_days = len(data)
-    period_start_index = max(0, total_days - period_days)
+    インメモリスナップショットから返し、ファイルが更新されていれば読み直す
+    """
+    body = snapshot.get_bytes(safe_path_join(PRECOMPUTED_DIR, filename))
+    if body is not None:
+        logger.debug(f"Serving precomputed data: {filename}")
+    return body
 
-    return {
-        "data": data,
-        "period_start_index": period_start_index,
-    }
+
+def read_precomputed(filename: str) -> dict | None:
+    """事前計算済みJSONをデコード済みで取得（存在しない・壊れている場合はNone）
+
+    スナップショットの共有オブジェクトを返すため、呼び出し側で変更しないこと
+    """
+    return snapshot.get(safe_path_join(PRECOMPUTED_DIR, filename))
+
+
+def _resolve_sparkline_variant(base_name: str, points: int | None, method: str) -> tuple[str, int | None]:
+    """点数指定に対応する事前計算済みファイル名と、残りの間引き点数を返す
+
+    事前計算済みの点数（LTTB）ならその版のファイルを使い、追加の間引きは不要（None）
+    """
+    if points is not None and method == "lttb" and points in SPARKLINE_POINT_BUDGETS:
+        variant = f"{base_name}_p{points}.json"
+        if read_precomputed_bytes(variant) is not None:
+            return variant, None
+    return f"{base_name}.json", points
+
+
+def precomputed_response(
+    base_name: str,
+    points: int | None = None,
+    method: str = "lttb",
+    media_type: str = JSON_MEDIA_TYPE,
+    table: TableBuilder | None = None,
+    tree: FieldTree | None = None,
+) -> Response | None:
+    """事前計算済みJSONをレスポンスとして返す
+
+    JSONで点数・フィールド指定なし（または事前計算済みの点数）はファイルのバイト列をそのまま返し、
+    デコード・再エンコードを行わない。それ以外はデコードして間引き・射影・再エンコードする。
+    """
+    filename, points = _resolve_sparkline_variant(base_name, points, method)
+
+    if media_type == JSON_MEDIA_TYPE and points is None and tree is None:
+        body = read_precomputed_bytes(filename)
+        return raw_json_response(body, headers=VARY_HEADERS) if body is not None else None
+
+    data = read_precomputed(filename)
+    if data is None:
+        return None
+    # 射影してから間引く（除外されたスパークラインは間引かない）
+    return negotiated_response(_with_sparkline_points(project(data, tree), points, method), media_type, table)
+
+
+def _with_sparkline_points(payload: dict, points: int | None, method: str) -> dict:
+    """点数指定があればスパークラインを間引いたコピーを返す"""
+    if points is None:
+        return payload
+    return downsample_payload(payload, points, method)
+
+
+# =============================================================================
+# Arrow IPC用の表変換（行スキーマは schemas.py）
+# =============================================================================
+
+def theme_detail_table(payload: dict) -> tuple[list[dict], type, dict]:
+    """テーマ詳細: 構成銘柄を行に、テーマ情報をメタデータにする"""
+    rows = [
+        {**stock, "market_cap_category": category_id(stock.get("market_cap_category"))}
+        for stock in payload.get("stocks", [])
+    ]
+    metadata = {key: value for key, value in payload.items() if key != "stocks"}
+    return rows, ThemeStock, metadata
+
+
+def heatmap_table(payload: dict) -> tuple[list[dict], type, dict]:
+    """時価総額別ヒートマップ: 全カテゴリの銘柄を1つの表にする"""
+    rows = []
+    categories = {}
+    for key, category in payload.get("categories", {}).items():
+        categories[key] = {k: v for k, v in category.items() if k != "stocks"}
+        rows.extend(
+            {**stock, "market_cap_category": category_id(stock.get("market_cap_category"))}
+            for stock in category.get("stocks", [])
+        )
+    metadata = {key: value for key, value in payload.items() if key != "categories"}
+    metadata["categories"] = categories
+    return rows, HeatmapStock, metadata
+
+
+def sector_heatmap_table(payload: dict) -> tuple[list[dict], type, dict]:
+    """セクター別ヒートマップ: 全セクターの銘柄を theme_id 付きの1つの表にする"""
+    rows = []
+    sectors = []
+    for sector in payload.get("sectors", []):
+        sectors.append({k: v for k, v in sector.items() if k != "stocks"})
+        rows.extend(
+            {
+                **stock,
+                "theme_id": sector.get("id"),
+                "theme_name": sector.get("name"),
+                "market_cap_category": category_id(stock.get("market_cap_category")),
+            }
+            for stock in sector.get("stocks", [])
+        )
+    metadata = {key: value for key, value in payload.items() if key != "sectors"}
+    metadata["sectors"] = sectors
+    return rows, HeatmapStock, metadata
+
+
+SPARKLINE_POINTS_QUERY = Query(
+    None,
+    ge=SPARKLINE_MIN_POINTS,
+    le=SPARKLINE_MAX_POINTS,
+    description=f"スパークラインの最大点数（事前計算済み: {', '.join(map(str, SPARKLINE_POINT_BUDGETS))}）",
+)
+SPARKLINE_METHOD_QUERY = Query(
+    "lttb",
+    pattern=f"^({'|'.join(DOWNSAMPLE_METHODS)})$",
+    description="間引き方式: lttb, minmax",
+)
+WEIGHTING_QUERY = Query(
+    DEFAULT_WEIGHTING,
+    pattern=f"^({'|'.join(WEIGHTINGS)})$",
+    description="指数の加重方式: equal（均等）, market_cap（時価総額）, float（浮動株調整時価総額）, custom（テーマ定義のウェイト）",
+)
+
+
+def read_theme_index(period: str) -> dict | None:
+    """事前計算済みの加重方式別テーマ指数（未計算ならNone）"""
+    return read_precomputed(theme_index_filename(period))
 
 
 @router.get("/api/themes")
-def get_themes(period: str = Query("1mo", description="期間: 1d, 5d, 1mo, 3mo, 6mo, 1y")):
+def get_themes(
+    period: str = Query("1mo", description="期間: 1d, 5d, 10d, 1mo, 3mo, 6mo, 1y, 3y, 5y"),
+    points: int | None = SPARKLINE_POINTS_QUERY,
+    sparkline_method: str = SPARKLINE_METHOD_QUERY,
+    weighting: str = WEIGHTING_QUERY,
+    accept: str | None = ACCEPT_HEADER,
+):
     """
     全テーマの騰落率ランキングを取得（爆速版）
 
     事前計算済みJSONを優先的に使用し、即座に応答
     JSONがなければフォールバックでリアルタイム計算
 
+    Args:
+        period: 取得期間
+        points: スパークラインの最大点数（省略時はフル解像度）
+        sparkline_method: 間引き方式（lttb / minmax）
+        weighting: 指数の加重方式（equal以外は事前計算済みの指数で騰落率・スパークラインを差し替え）
+        accept: レスポンス形式（JSON / MessagePack）
+
     Returns:
         騰落率順にソートされたテーマ一覧
     """
@@ -153,25 +288,29 @@ def get_themes(period: str = Query("1mo", description="期間: 1d, 5d, 1mo, 3mo,
     period = validate_period(period)
 
     # 1. 事前計算済みJSONを確認（最優先・パストラバーサル対策）
-    json_path = safe_path_join(PRECOMPUTED_DIR, f"themes_{period}.json")
-    if json_path.exists():
-        try:
-            with open(json_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            logger.debug(f"Serving precomputed data: {json_path.name}")
-            return data
-        except Exception as e:
-            logger.warning(f"Failed to read precomputed JSON: {e}")
+    media_type = negotiate(accept)
+    weighted = weighting != DEFAULT_WEIGHTING
+    if not weighted:
+        response = precomputed_response(f"themes_{period}", points, sparkline_method, media_type)
+        if response is not None:
+            return response
+        cached = None
+    else:
+        # 加重指数は事前計算済みの値で差し替えるだけ（スパークラインは差し替え後に間引く）
+        cached = read_precomputed(_resolve_sparkline_variant(f"themes_{period}", points, sparkline_method)[0])
 
     # 2. メモリキャッシュをチェック（5分間有効）
     cache_key = f"themes:{period}"
-    cached = cache.get(cache_key)
-    if cached:
-        return cached
+    if not cached:
+        cached = cache.get(cache_key)
+    if not cached:
+        # 3. フォールバック: リアルタイム計算
+        logger.info(f"Fallback to realtime calculation for period: {period}")
+        cached = _calculate_themes_realtime(period)
 
-    # 3. フォールバック: リアルタイム計算
-    logger.info(f"Fallback to realtime calculation for period: {period}")
-    return _calculate_themes_realtime(period)
+    if weighted:
+        cached = apply_index_to_ranking(cached, read_theme_index(period), weighting)
+    return negotiated_response(_with_sparkline_points(cached, points, sparkline_method), media_type)
 
 
 @router.post("/api/refresh")
@@ -209,6 +348,42 @@ def trigger_manual_refresh(api_key: str = Depends(verify_api_key)):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/api/themes/reload")
+def reload_theme_definitions(background_tasks: BackgroundTasks, api_key: str = Depends(verify_api_key)):
+    """
+    テーマ定義ファイルの再読み込みエンドポイント（API Key認証必須）
+
+    THEMES_FILE を読み直して検証し、問題がなければ即座に反映する。
+    追加・変更されたテーマの事前計算はバックグラウンドで行う（レスポンスは待たない）。
+
+    Headers:
+        X-API-Key: API認証キー
+
+    Returns:
+        追加・変更・削除されたテーマID
+    """
+    from data.theme_loader import ThemeFileError, reload_themes, theme_file_path
+    from jobs.update_data import update_changed_themes
+
+    if theme_file_path() is None:
+        raise HTTPException(status_code=400, detail="THEMES_FILE is not configured")
+
+    try:
+        changes = reload_themes(force=True)
+    except ThemeFileError as e:
+        raise HTTPException(status_code=422, detail={"message": str(e), "errors": e.errors})
+
+    if changes:
+        background_tasks.add_task(update_changed_themes, changes)
+
+    return {
+        "status": "success",
+        "theme_count": len(THEMES),
+        **changes.to_dict(),
+        "timestamp": datetime.now().isoformat(),
+    }
+
+
 def _calculate_themes_realtime(period: str):
     """リアルタイムでテーマデータを計算（フォールバック用）"""
     # 1. 全テーマの全銘柄を重複なしで取得
@@ -222,8 +397,8 @@ def _calculate_themes_realtime(period: str):
     if period != "1d":
         all_data_1d = fetch_batch_parallel(all_tickers, "1d", max_workers=15)
 
-    # スパークライン用に1年分のデータも取得
-    all_data_1y = fetch_batch_parallel(all_tickers, "1y", max_workers=15)
+    # スパークライン用データも取得（1y以下は1年分、3y/5yは期間全体）
+    all_data_1y = fetch_batch_parallel(all_tickers, sparkline_source_period(period), max_workers=15)
 
     themes_with_returns = []
 
@@ -257,7 +432,7 @@ def _calculate_themes_realtime(period: str):
                     "change_percent": round(change, 2),
                 })
 
-            # スパークラインデータを取得（1年分の取得済みデータを使用）
+            # スパークラインデータを取得（取得済みデータを使用）
             sparkline = get_theme_sparkline(theme_data["tickers"], period, all_data_1y)
 
             themes_with_returns.append({
@@ -280,7 +455,7 @@ def _calculate_themes_realtime(period: str):
                 "change_percent_1d": None,
                 "stock_count": len(theme_data["tickers"]),
                 "top_stocks": [],
-                "sparkline": {"data": [], "period_start_index": 0},
+                "sparkline": empty_sparkline(),
                 "error": str(e),
             })
 
@@ -300,17 +475,189 @@ def _calculate_themes_realtime(period: str):
     return result
 
 
+# バッチ取得で一度に指定できるテーマ数
+BATCH_MAX_THEMES = 20
+
+FIELDS_QUERY = Query(
+    None,
+    description="返却するフィールド（カンマ区切り・ドット記法。例: id,name,change_percent,stocks.code）",
+)
+
+
+def _split_csv(value: str) -> list[str]:
+    """カンマ区切りの値を重複を除いて順序通りに分割"""
+    return list(dict.fromkeys(item.strip() for item in value.split(",") if item.strip()))
+
+
+@router.get("/api/themes/batch")
+def get_themes_batch(
+    ids: str = Query(..., description=f"テーマID（カンマ区切り、最大{BATCH_MAX_THEMES}件）"),
+    periods: str = Query("1mo", description="期間（カンマ区切り）: 1d, 5d, 10d, 1mo, 3mo, 6mo, 1y, 3y, 5y"),
+    fields: str | None = FIELDS_QUERY,
+    points: int | None = SPARKLINE_POINTS_QUERY,
+    sparkline_method: str = SPARKLINE_METHOD_QUERY,
+    weighting: str = WEIGHTING_QUERY,
+    accept: str | None = ACCEPT_HEADER,
+):
+    """
+    複数テーマ × 複数期間のテーマ詳細を一括取得
+
+    テーマ比較画面などで1テーマ1期間ずつリクエストする代わりに、
+    インメモリスナップショット（事前計算済みデータ）から1レスポンスで返す。
+    リアルタイム計算は行わず、未計算の組み合わせは missing に列挙する。
+
+    Args:
+        ids: テーマID（カンマ区切り）
+        periods: 期間（カンマ区切り）
+        fields: 各テーマ詳細に含めるフィールド（省略時は全フィールド）
+        points: スパークラインの最大点数（省略時はフル解像度）
+        sparkline_method: 間引き方式（lttb / minmax）
+        weighting: 指数の加重方式（equal以外は事前計算済みの指数で騰落率・スパークラインを差し替え）
+        accept: レスポンス形式（JSON / MessagePack）
+
+    Returns:
+        results[theme_id][period] にテーマ詳細を格納した辞書
+    """
+    theme_ids = [validate_theme_id(theme_id) for theme_id in _split_csv(ids)]
+    if not theme_ids:
+        raise HTTPException(status_code=400, detail="ids is required")
+    if len(theme_ids) > BATCH_MAX_THEMES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many themes: {len(theme_ids)} (max {BATCH_MAX_THEMES})",
+        )
+    unknown = [theme_id for theme_id in theme_ids if theme_id not in THEMES]
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"Theme not found: {', '.join(unknown)}")
+
+    period_list = [validate_period(period) for period in _split_csv(periods)]
+    if not period_list:
+        raise HTTPException(status_code=400, detail="periods is required")
+
+    tree = parse_fields(fields)
+    weighted = weighting != DEFAULT_WEIGHTING
+    indices = {period: read_theme_index(period) for period in period_list} if weighted else {}
+
+    results: dict[str, dict] = {}
+    missing = []
+    for theme_id in theme_ids:
+        results[theme_id] = {}
+        for period in period_list:
+            filename, remaining_points = _resolve_sparkline_variant(
+                f"theme_{theme_id}_{period}", points, sparkline_method
+            )
+            payload = read_precomputed(filename)
+            if payload is None:
+                payload = cache.get(f"theme_detail:{theme_id}:{period}")
+                remaining_points = points
+            if payload is None:
+                missing.append({"theme_id": theme_id, "period": period})
+                continue
+            if weighted:
+                # 差し替えたテーマのスパークラインも間引く（間引き済みの構成銘柄はそのまま）
+                payload = apply_index_to_detail(payload, indices[period], weighting)
+                remaining_points = points
+            results[theme_id][period] = _with_sparkline_points(
+                project(payload, tree), remaining_points, sparkline_method
+            )
+
+    return negotiated_response(
+        {
+            "theme_ids": theme_ids,
+            "periods": period_list,
+            "results": results,
+            "missing": missing,
+        },
+        negotiate(accept),
+    )
+
+
+@router.post("/api/themes/custom")
+async def post_custom_theme(
+    request: CustomThemeRequest,
+    fields: str | None = FIELDS_QUERY,
+    points: int | None = SPARKLINE_POINTS_QUERY,
+    sparkline_method: str = SPARKLINE_METHOD_QUERY,
+    accept: str | None = ACCEPT_HEADER,
+):
+    """
+    カスタムテーマ（任意の銘柄バスケット）を組み込みテーマと同じ形で計算
+
+    事前計算済みの終値行列だけから計算し、yfinance にはアクセスしない。
+    結果はバスケットの正規形のハッシュ単位でキャッシュされ、計算はスレッドプールで行う。
+
+    Args:
+        request: 銘柄・ウェイト・期間（period または periods）・表示名
+        fields: 返却するフィールド（get_theme_detail と同じ）
+        points: スパークラインの最大点数（省略時はフル解像度）
+        sparkline_method: 間引き方式（lttb / minmax）
+        accept: レスポンス形式（JSON / MessagePack / Arrow IPC: period 指定時の構成銘柄の表）
+
+    Returns:
+        period 指定時はテーマ詳細、periods 指定時は results[period] にテーマ詳細を格納した辞書
+    """
+    from services.custom_theme import BasketError, PriceDataUnavailable, get_custom_theme, normalize_basket
+
+    try:
+        basket = normalize_basket(request.tickers, request.weights)
+    except BasketError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    period_list = list(dict.fromkeys(validate_period(period) for period in (request.periods or [request.period])))
+    if not period_list:
+        raise HTTPException(status_code=400, detail="periods is required")
+    tree = parse_fields(fields)
+
+    try:
+        payloads = await asyncio.gather(
+            *(get_custom_theme(basket, period, PRECOMPUTED_DIR) for period in period_list)
+        )
+    except PriceDataUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    results = {}
+    for period, payload in zip(period_list, payloads):
+        # キャッシュ済みの共有オブジェクトは変更せず、表示名だけ差し替えたコピーを返す
+        payload = {
+            **payload,
+            "name": request.name or payload["name"],
+            "description": request.description or payload["description"],
+        }
+        results[period] = _with_sparkline_points(project(payload, tree), points, sparkline_method)
+
+    if request.periods is None:
+        return negotiated_response(results[period_list[0]], negotiate(accept, tabular=True), theme_detail_table)
+    return negotiated_response(
+        {"basket_id": basket.key, "periods": period_list, "results": results},
+        negotiate(accept),
+    )
+
+
 @router.get("/api/themes/{theme_id}")
 def get_theme_detail(
     theme_id: str,
-    period: str = Query("1mo", description="期間: 1d, 5d, 1mo, 3mo, 6mo, 1y")
+    period: str = Query("1mo", description="期間: 1d, 5d, 10d, 1mo, 3mo, 6mo, 1y, 3y, 5y"),
+    points: int | None = SPARKLINE_POINTS_QUERY,
+    sparkline_method: str = SPARKLINE_METHOD_QUERY,
+    fields: str | None = FIELDS_QUERY,
+    weighting: str = WEIGHTING_QUERY,
+    accept: str | None = ACCEPT_HEADER,
 ):
     """
     テーマ詳細を取得（構成銘柄の騰落率含む）（爆速版）
 
+    fields を指定すると指定フィールドのみを返す。リアルタイム計算時は
+    除外されたブロック（ベータ・指標・時価総額・スパークライン等）の計算自体を省略する。
+
     Args:
         theme_id: テーマID
         period: 取得期間
+        fields: 返却するフィールド（例: id,change_percent,stocks.code,stocks.change_percent）
+        points: スパークラインの最大点数（省略時はフル解像度）
+        sparkline_method: 間引き方式（lttb / minmax）
+        weighting: 指数の加重方式（equal以外は事前計算済みの指数で騰落率・スパークラインを差し替え、
+            構成銘柄に最新の weight を付ける）
+        accept: レスポンス形式（JSON / MessagePack / Arrow IPC: 構成銘柄の表）
 
     Returns:
         テーマ詳細と構成銘柄情報
@@ -318,23 +665,35 @@ def get_theme_detail(
     # バリデーション
     period = validate_period(period)
     theme_id = validate_theme_id(theme_id)
+    tree = parse_fields(fields)
 
     # 1. 事前計算済みJSONを確認（最優先・パストラバーサル対策）
-    json_path = safe_path_join(PRECOMPUTED_DIR, f"theme_{theme_id}_{period}.json")
-    if json_path.exists():
-        try:
-            with open(json_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            logger.debug(f"Serving precomputed theme detail: {json_path.name}")
-            return data
-        except Exception as e:
-            logger.warning(f"Failed to read precomputed theme detail JSON: {e}")
+    media_type = negotiate(accept, tabular=True)
+    weighted = weighting != DEFAULT_WEIGHTING
+    if not weighted:
+        response = precomputed_response(
+            f"theme_{theme_id}_{period}", points, sparkline_method, media_type, theme_detail_table, tree
+        )
+        if response is not None:
+            return response
+        cached = None
+    else:
+        cached = read_precomputed(
+            _resolve_sparkline_variant(f"theme_{theme_id}_{period}", points, sparkline_method)[0]
+        )
 
     # 2. キャッシュチェック（5分間有効）
     cache_key = f"theme_detail:{theme_id}:{period}"
-    cached = cache.get(cache_key)
+    if not cached:
+        cached = cache.get(cache_key)
     if cached:
-        return cached
+        if weighted:
+            cached = apply_index_to_detail(cached, read_theme_index(period), weighting)
+        return negotiated_response(
+            _with_sparkline_points(project(cached, tree), points, sparkline_method),
+            media_type,
+            theme_detail_table,
+        )
 
     # 3. フォールバック: リアルタイム計算
     logger.info(f"Fallback to realtime calculation for theme: {theme_id}, period: {period}")
@@ -343,21 +702,27 @@ def get_theme_detail(
     if not theme:
         raise HTTPException(status_code=404, detail=f"Theme not found: {theme_id}")
 
+    # 除外されたブロックは計算しない
+    need_beta = any(wants(tree, "stocks", key) for key in ("beta", "alpha", "r_squared"))
+    need_indicators = wants(tree, "stocks", "price") or wants(tree, "stocks", "rsi")
+    need_market_cap = wants(tree, "stocks", "market_cap") or wants(tree, "stocks", "market_cap_category")
+    need_sparkline = wants(tree, "stocks", "sparkline")
+    need_return_1d = wants(tree, "stocks", "change_percent_1d")
+
     # テーマの騰落率と個別銘柄の騰落率を計算
     theme_return, stock_returns = calculate_theme_return(
         theme["tickers"],
         period
     )
 
-    # テーマの日次リターンを計算
-    theme_daily_returns = calculate_theme_daily_returns(
-        theme["tickers"],
-        period
+    # テーマの日次リターンを計算（ベータ用）
+    theme_daily_returns = (
+        calculate_theme_daily_returns(theme["tickers"], period) if need_beta else None
     )
 
     # 1日騰落率も計算（選択期間が1d以外の場合）
     stock_returns_1d = {}
-    if period != "1d":
+    if period != "1d" and need_return_1d:
         _, stock_returns_1d = calculate_theme_return(theme["tickers"], "1d")
 
     # 各銘柄の詳細情報を取得
@@ -367,23 +732,23 @@ def get_theme_detail(
         stock_return = stock_returns.get(ticker, 0.0)
         stock_return_1d = stock_returns_1d.get(ticker) if period != "1d" else None
 
-        # 個別株の日次リターン
-        df = fetch_stock_data(ticker, period)
-        stock_daily_returns = calculate_daily_returns(df) if df is not None else None
-
         # ベータ・アルファを計算
         beta_alpha = {"beta": None, "alpha": None, "r_squared": None}
-        if stock_daily_returns is not None and not stock_daily_returns.empty and not theme_daily_returns.empty:
-            beta_alpha = calculate_beta_alpha(stock_daily_returns, theme_daily_returns)
+        if need_beta and not theme_daily_returns.empty:
+            # 個別株の日次リターン
+            df = fetch_stock_data(ticker, period)
+            stock_daily_returns = calculate_daily_returns(df) if df is not None else None
+            if stock_daily_returns is not None and not stock_daily_returns.empty:
+                beta_alpha = calculate_beta_alpha(stock_daily_returns, theme_daily_returns)
 
         # 基本指標を取得
-        indicators = get_stock_indicators(ticker, period)
+        indicators = get_stock_indicators(ticker, period) if need_indicators else None
 
         # 時価総額を取得
-        market_cap_data = get_market_cap(ticker)
+        market_cap_data = get_market_cap(ticker) if need_market_cap else {}
 
         # スパークラインデータを取得
-        sparkline = get_stock_sparkline(ticker, period)
+        sparkline = get_stock_sparkline(ticker, period) if need_sparkline else None
 
         stocks.append({
             "code": ticker,
@@ -414,16 +779,24 @@ def get_theme_detail(
         "stock_count": len(stocks),
     }
 
-    # キャッシュに保存（5分間）
-    cache.set(cache_key, result, ttl_seconds=300)
+    # キャッシュに保存（5分間）: 全フィールドを計算した場合のみ
+    if tree is None:
+        cache.set(cache_key, result, ttl_seconds=300)
 
-    return result
+    if weighted:
+        result = apply_index_to_detail(result, read_theme_index(period), weighting)
+
+    return negotiated_response(
+        _with_sparkline_points(project(result, tree), points, sparkline_method),
+        media_type,
+        theme_detail_table,
+    )
 
 
 @router.get("/api/themes/{theme_id}/history")
 def get_theme_history(
     theme_id: str,
-    period: str = Query("1mo", description="期間: 1d, 5d, 1mo, 3mo, 6mo, 1y")
+    period: str = Query("1mo", description="期間: 1d, 5d, 10d, 1mo, 3mo, 6mo, 1y, 3y, 5y")
 ):
     """
     テーマの価格推移履歴を取得（チャート用）
@@ -475,144 +848,76 @@ def get_theme_history(
 
 @router.get("/api/heatmap")
 def get_heatmap_data(
-    period: str = Query("1mo", description="期間: 1d, 5d, 1mo, 3mo, 6mo, 1y")
+    period: str = Query("1mo", description="期間: 1d, 5d, 10d, 1mo, 3mo, 6mo, 1y, 3y, 5y"),
+    theme_id: str | None = Query(None, description="テーマIDで絞り込み"),
+    category: str | None = Query(None, description="時価総額カテゴリ（カンマ区切り: mega,large,mid,small,micro）"),
+    min_change: float | None = Query(None, description="騰落率の下限（%）"),
+    max_change: float | None = Query(None, description="騰落率の上限（%）"),
+    limit: int | None = Query(None, ge=1, le=500, description="カテゴリごとの最大銘柄数（騰落率上位）"),
+    accept: str | None = ACCEPT_HEADER,
 ):
     """
     時価総額別ヒートマップデータを取得（爆速版）
 
-    事前計算済みJSONを優先的に使用
+    絞り込み条件がなければ事前計算済みJSONをそのまま返す。
+    条件があればメトリクステーブルに対してサーバー側でフィルタ・ソートする。
 
     Args:
         period: 取得期間
+        theme_id: テーマIDで絞り込み
+        category: 時価総額カテゴリで絞り込み
+        min_change: 騰落率の下限
+        max_change: 騰落率の上限
+        limit: カテゴリごとの最大銘柄数
+        accept: レスポンス形式（JSON / MessagePack / Arrow IPC: 全銘柄の表）
 
     Returns:
         時価総額カテゴリ別の銘柄一覧
     """
     # バリデーション
     period = validate_period(period)
+    if theme_id is not None:
+        theme_id = validate_theme_id(theme_id)
+        if theme_id not in THEMES:
+            raise HTTPException(status_code=404, detail=f"Theme not found: {theme_id}")
+    categories = _split_csv(category) if category else None
+    if categories:
+        unknown = [c for c in categories if c not in HEATMAP_CATEGORIES]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown category: {', '.join(unknown)}")
+
+    media_type = negotiate(accept, tabular=True)
+    filtered = any(v is not None for v in (theme_id, categories, min_change, max_change, limit))
 
     # 1. 事前計算済みJSONを確認（最優先・パストラバーサル対策）
-    json_path = safe_path_join(PRECOMPUTED_DIR, f"heatmap_{period}.json")
-    if json_path.exists():
-        try:
-            with open(json_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            logger.debug(f"Serving precomputed heatmap: {json_path.name}")
-            return data
-        except Exception as e:
-            logger.warning(f"Failed to read precomputed heatmap JSON: {e}")
-
-    # 2. キャッシュチェック（5分間有効）
-    cache_key = f"heatmap:{period}"
-    cached = cache.get(cache_key)
-    if cached:
-        return cached
-
-    # 3. フォールバック: リアルタイム計算
-    logger.info(f"Fallback to realtime heatmap calculation for period: {period}")
-    from services.data_fetcher import get_market_cap
-
-    stocks_by_category = {
-        "mega": [],
-        "large": [],
-        "mid": [],
-        "small": [],
-        "micro": [],
-        "unknown": [],
-    }
-
-    for theme_id, theme_data in THEMES.items():
-        # テーマの騰落率を計算
-        theme_return, stock_returns = calculate_theme_return(
-            theme_data["tickers"],
-            period
-        )
-
-        for ticker in theme_data["tickers"]:
-            stock_return = stock_returns.get(ticker, 0.0)
-            market_cap_data = get_market_cap(ticker)
-            category = market_cap_data.get("market_cap_category", {})
-            category_id = category.get("id", "unknown")
-
-            stock_info = {
-                "code": ticker,
-                "name": get_ticker_name(theme_id, ticker),
-                "theme_id": theme_id,
-                "theme_name": theme_data["name"],
-                "change_percent": round(stock_return, 2),
-                "market_cap": market_cap_data.get("market_cap", 0),
-                "market_cap_category": category,
-            }
-
-            # 重複チェック（同じ銘柄が複数テーマにある場合）
-            existing_codes = [s["code"] for s in stocks_by_category[category_id]]
-            if ticker not in existing_codes:
-                stocks_by_category[category_id].append(stock_info)
-
-    # 各カテゴリを騰落率でソート
-    for category_id in stocks_by_category:
-        stocks_by_category[category_id].sort(
-            key=lambda x: x["change_percent"],
-            reverse=True
-        )
-
-    result = {
-        "period": period,
-        "categories": {
-            "mega": {
-                "id": "mega",
-                "label": "超大型",
-                "threshold": "10兆円以上",
-                "stocks": stocks_by_category["mega"],
-                "count": len(stocks_by_category["mega"]),
-            },
-            "large": {
-                "id": "large",
-                "label": "大型",
-                "threshold": "1兆円〜10兆円",
-                "stocks": stocks_by_category["large"],
-                "count": len(stocks_by_category["large"]),
-            },
-            "mid": {
-                "id": "mid",
-                "label": "中型",
-                "threshold": "3000億円〜1兆円",
-                "stocks": stocks_by_category["mid"],
-                "count": len(stocks_by_category["mid"]),
-            },
-            "small": {
-                "id": "small",
-                "label": "小型",
-                "threshold": "300億円〜3000億円",
-                "stocks": stocks_by_category["small"],
-                "count": len(stocks_by_category["small"]),
-            },
-            "micro": {
-                "id": "micro",
-                "label": "超小型",
-                "threshold": "300億円未満",
-                "stocks": stocks_by_category["micro"],
-                "count": len(stocks_by_category["micro"]),
-            },
-        },
-        "last_updated": get_last_trading_date(),
-    }
-
-    # キャッシュに保存（5分間）
-    cache.set(cache_key, result, ttl_seconds=300)
-
-    return result
+    if not filtered:
+        response = precomputed_response(f"heatmap_{period}", media_type=media_type, table=heatmap_table)
+        if response is not None:
+            return response
+
+    # 2. メトリクステーブル（スナップショット → キャッシュ → リアルタイム計算）
+    table = load_metrics_table(PRECOMPUTED_DIR, period)
+    mask = table.mask(
+        theme_id=theme_id,
+        categories=categories,
+        min_change=min_change,
+        max_change=max_change,
+    ) if filtered else None
+    result = heatmap_payload(table, mask, limit)
+    return negotiated_response(result, media_type, heatmap_table)
 
 
 @router.get("/api/heatmap/sector")
 def get_sector_heatmap_data(
-    period: str = Query("1mo", description="期間: 1d, 5d, 1mo, 3mo, 6mo, 1y")
+    period: str = Query("1mo", description="期間: 1d, 5d, 10d, 1mo, 3mo, 6mo, 1y, 3y, 5y"),
+    accept: str | None = ACCEPT_HEADER,
 ):
     """
     セクター（テーマ）別ヒートマップデータを取得（爆速版）
 
     Args:
         period: 取得期間
+        accept: レスポンス形式（JSON / MessagePack / Arrow IPC: 全銘柄の表）
 
     Returns:
         セクター別の銘柄一覧とセクター平均騰落率
@@ -621,21 +926,16 @@ def get_sector_heatmap_data(
     period = validate_period(period)
 
     # 1. 事前計算済みJSONを確認（最優先・パストラバーサル対策）
-    json_path = safe_path_join(PRECOMPUTED_DIR, f"heatmap_sector_{period}.json")
-    if json_path.exists():
-        try:
-            with open(json_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            logger.debug(f"Serving precomputed sector heatmap: {json_path.name}")
-            return data
-        except Exception as e:
-            logger.warning(f"Failed to read precomputed sector heatmap JSON: {e}")
+    media_type = negotiate(accept, tabular=True)
+    response = precomputed_response(f"heatmap_sector_{period}", media_type=media_type, table=sector_heatmap_table)
+    if response is not None:
+        return response
 
     # 2. キャッシュチェック（5分間有効）
     cache_key = f"heatmap_sector:{period}"
     cached = cache.get(cache_key)
     if cached:
-        return cached
+        return negotiated_response(cached, media_type, sector_heatmap_table)
 
     # 3. フォールバック: リアルタイム計算
     logger.info(f"Fallback to realtime sector heatmap calculation for period: {period}")
@@ -688,6 +988,6 @@ def get_sector_heatmap_data(
     # キャッシュに保存（5分間）
     cache.set(cache_key, result, ttl_seconds=300)
 
-    return result
+    return negotiated_response(result, media_type, sector_heatmap_table)
 
 
@@ -29,10 +29,72 @@ class StockDetail(StockBase):
 
 class SparklineData(BaseModel):
     """Sparkline chart data for miniature trend visualizations."""
-    data: list[float] = Field(default_factory=list)
+    # Cumulative returns rounded to 2 decimals fit float32 in tabular formats
+    data: list[float] = Field(
+        default_factory=list, json_schema_extra={"arrow_type": "float32"}
+    )
     period_start_index: int = 0
 
 
+class ThemeStock(StockDetail):
+    """Constituent stock row in the theme detail response."""
+    description: Optional[str] = None
+    r_squared: Optional[float] = None
+    market_cap_category: Optional[str] = Field(
+        None, description="Market cap category id (tabular formats only)"
+    )
+    weight: Optional[float] = Field(
+        None, description="Index weight (weighted theme indices and custom baskets)"
+    )
+    sparkline: Optional[SparklineData] = None
+
+
+class HeatmapStock(StockBase):
+    """Stock row in the market-cap and sector heatmaps."""
+    theme_id: Optional[str] = None
+    theme_name: Optional[str] = None
+    change_percent: float = 0.0
+    market_cap: Optional[int] = None
+    market_cap_category: Optional[str] = Field(
+        None, description="Market cap category id (tabular formats only)"
+    )
+
+
+class StockMetrics(StockBase):
+    """Stock row in the screener response (one row of the metrics table)."""
+    theme_id: Optional[str] = Field(None, description="Primary theme id")
+    theme_name: Optional[str] = None
+    theme_ids: list[str] = Field(default_factory=list, description="All themes containing the stock")
+    change_percent: Optional[float] = Field(None, description="Period return %")
+    change_percent_1d: Optional[float] = Field(None, description="1-day return %")
+    market_cap: Optional[int] = Field(None, description="Market cap in JPY")
+    market_cap_category: Optional[str] = Field(
+        None, description="Market cap category id (tabular formats only)"
+    )
+    rsi: Optional[float] = Field(None, description="RSI(14) from 3 months of daily closes")
+    ma5_distance: Optional[float] = Field(None, description="Distance from MA5 %")
+    ma20_distance: Optional[float] = Field(None, description="Distance from MA20 %")
+    volatility: Optional[float] = Field(None, description="Annualized volatility %")
+    beta: Optional[float] = Field(None, description="Beta vs. primary theme over the period")
+    return_1d: Optional[float] = None
+    return_5d: Optional[float] = None
+    return_10d: Optional[float] = None
+    return_1mo: Optional[float] = None
+    return_3mo: Optional[float] = None
+    return_6mo: Optional[float] = None
+    return_1y: Optional[float] = None
+    return_3y: Optional[float] = None
+    return_5y: Optional[float] = None
+
+
+class StockListItem(BaseModel):
+    """Stock row in the stock search/list response."""
+    ticker: str
+    name: str
+    theme_id: Optional[str] = None
+    theme_name: Optional[str] = None
+
+
 class ThemeSummary(BaseModel):
     """Compact theme representation for list views."""
     id: str
@@ -46,10 +108,33 @@ class ThemeDetail(ThemeSummary):
     """Full theme detail including constituent stocks."""
     period: str = "1mo"
     change_percent_1d: Optional[float] = None
-    stocks: list[StockDetail] = Field(default_factory=list)
+    stocks: list[ThemeStock] = Field(default_factory=list)
     sparkline: Optional[SparklineData] = None
 
 
+class CustomThemeRequest(BaseModel):
+    """Ad-hoc basket evaluated like a built-in theme."""
+    tickers: list[str] = Field(..., description="Ticker symbols (7203 or 7203.T)")
+    weights: Optional[dict[str, float]] = Field(
+        None, description="Ticker -> weight, normalized to sum to 1 (equal weight when omitted)"
+    )
+    period: str = Field("1mo", description="Period for a single theme-detail response")
+    periods: Optional[list[str]] = Field(None, description="Several periods; returns results keyed by period")
+    name: Optional[str] = Field(None, max_length=100)
+    description: Optional[str] = Field(None, max_length=500)
+
+
+class PortfolioRequest(BaseModel):
+    """Portfolio of themes (equal weight per theme) or weighted tickers."""
+    theme_ids: Optional[list[str]] = Field(None, description="Theme IDs, each given an equal share")
+    tickers: Optional[list[str]] = Field(None, description="Ticker symbols (7203 or 7203.T)")
+    weights: Optional[dict[str, float]] = Field(
+        None, description="Ticker -> weight, normalized to sum to 1 (equal weight when omitted)"
+    )
+    period: str = Field("1y", description="Return window: 1mo, 3mo, 6mo, 1y, 3y, 5y")
+    risk_free_rate: float = Field(0.0, ge=-10, le=20, description="Annual risk-free rate in percent")
+
+
 class AnalyticsResponse(BaseModel):
     """Response model for analytics summary endpoint."""
     period: str
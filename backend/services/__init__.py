@@ -3,14 +3,18 @@
 from services.calculator import (
     calculate_beta_alpha,
     calculate_daily_returns,
+    calculate_indicators_from_data,
     calculate_ma,
     calculate_return,
     calculate_rsi,
+    calculate_screening_metrics,
     calculate_theme_daily_returns,
     calculate_theme_return,
     calculate_volatility,
     get_price_history,
+    get_price_history_columns,
     get_stock_indicators,
+    series_to_list,
 )
 from services.data_fetcher import (
     clear_cache,
@@ -35,5 +39,9 @@ __all__ = [
     "calculate_ma",
     "calculate_volatility",
     "get_stock_indicators",
+    "calculate_indicators_from_data",
+    "calculate_screening_metrics",
     "get_price_history",
+    "get_price_history_columns",
+    "series_to_list",
 ]
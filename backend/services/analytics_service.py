@@ -3,50 +3,230 @@
 Provides higher-level analytics computations built on top of
 the base calculator module including rankings, correlations,
 and aggregate portfolio statistics.
+
+Return-based analytics (summary statistics, breadth, top movers and
+the theme ranking) are computed once per snapshot by the updater and
+saved as ``analytics_{period}.json``; requests only slice that file.
 """
 
 import logging
 from datetime import datetime
+from pathlib import Path
 from typing import Optional
 
+import numpy as np
+
 from data.themes import THEMES, get_all_tickers
+from services import snapshot
 
 logger = logging.getLogger(__name__)
 
+# Directory holding the updater's precomputed artifacts
+PRECOMPUTED_DIR = Path(__file__).parent.parent / "precomputed"
+
+# Number of gainers/losers/movers kept per kind in the aggregate
+ANALYTICS_TOP_N = 50
+
+# Fields of a theme row in the aggregate
+THEME_ROW_FIELDS = ("id", "name", "change_percent", "change_percent_1d", "stock_count")
+
+# Fields of a stock row in the aggregate
+STOCK_ROW_FIELDS = ("code", "name", "theme_id", "theme_name", "change_percent")
+
+
+def analytics_filename(period: str) -> str:
+    """Return the file name of the analytics aggregate for a period."""
+    return f"analytics_{period}.json"
 
-def calculate_theme_ranking(period: str = "1mo") -> list[dict]:
-    """Rank all themes by their stock count and metadata.
+
+# ---------------------------------------------------------------------------
+# Aggregate construction (updater side)
+# ---------------------------------------------------------------------------
+
+def top_indices(values: np.ndarray, n: int, descending: bool = True) -> np.ndarray:
+    """Return the positions of the ``n`` largest (or smallest) values, best first.
+
+    NaN values are skipped. ``np.argpartition`` selects the candidates in
+    linear time and only the selected ``n`` are sorted (ties keep their
+    original order).
+    """
+    candidates = np.flatnonzero(~np.isnan(values))
+    if n <= 0 or len(candidates) == 0:
+        return np.empty(0, dtype=np.intp)
+    keys = -values[candidates] if descending else values[candidates]
+    if n < len(candidates):
+        selected = np.argpartition(keys, n - 1)[:n]
+        candidates, keys = candidates[selected], keys[selected]
+    return candidates[np.lexsort((candidates, keys))]
+
+
+def breadth_stats(values: np.ndarray) -> dict:
+    """Summarize advancers/decliners and the average and median return.
+
+    Args:
+        values: Change percentages (NaN for missing values).
+    """
+    observed = values[~np.isnan(values)]
+    count = len(observed)
+    advancers = int((observed > 0).sum())
+    decliners = int((observed < 0).sum())
+    return {
+        "count": count,
+        "advancers": advancers,
+        "decliners": decliners,
+        "unchanged": count - advancers - decliners,
+        "advancers_percent": round(advancers / count * 100, 1) if count else None,
+        "average_return": round(float(observed.mean()), 2) if count else None,
+        "median_return": round(float(np.median(observed)), 2) if count else None,
+    }
+
+
+def _movers(values: np.ndarray, rows, n: int) -> dict:
+    """Build gainers, losers and largest absolute movers from a value column."""
+    return {
+        "gainers": rows(top_indices(values, n)),
+        "losers": rows(top_indices(values, n, descending=False)),
+        "movers": rows(top_indices(np.abs(values), n)),
+    }
+
+
+def build_analytics_snapshot(
+    period: str,
+    themes: list[dict],
+    table=None,
+    top_n: int = ANALYTICS_TOP_N,
+    last_updated: Optional[str] = None,
+    generated_at: Optional[str] = None,
+) -> dict:
+    """Build the analytics aggregate for one period.
 
     Args:
         period: Analysis period identifier.
+        themes: Theme rows of ``themes_{period}.json`` (rows with an
+            ``error`` key are left out of the statistics).
+        table: ``MetricsTable`` of the same period, or None when the
+            stock metrics have not been computed yet.
+        top_n: Number of gainers/losers/movers to keep per kind.
+
+    Returns:
+        Dict saved as ``analytics_{period}.json``.
+    """
+    valid = [theme for theme in themes if "error" not in theme]
+    theme_values = np.array(
+        [np.nan if theme["change_percent"] is None else theme["change_percent"] for theme in valid],
+        dtype=np.float64,
+    )
+
+    def theme_rows(indices: np.ndarray) -> list[dict]:
+        rows = []
+        for i in indices:
+            row = {field: valid[i].get(field) for field in THEME_ROW_FIELDS}
+            row["change_percent"] = round(float(theme_values[i]), 2)
+            if row["change_percent_1d"] is not None:
+                row["change_percent_1d"] = round(row["change_percent_1d"], 2)
+            rows.append(row)
+        return rows
+
+    ranking = top_indices(theme_values, len(valid))
+    theme_stats = breadth_stats(theme_values)
+    theme_stats["best"] = theme_rows(ranking[:1])[0] if len(ranking) else None
+    theme_stats["worst"] = theme_rows(ranking[-1:])[0] if len(ranking) else None
+    movers = {"themes": _movers(theme_values, theme_rows, top_n)}
+
+    stock_stats = None
+    if table is not None:
+        # Stocks without a return for the period are excluded (change_percent is 0.0 for them)
+        period_returns = table.numeric.get(f"return_{period}")
+        stock_values = table.numeric["change_percent"].copy()
+        if period_returns is not None:
+            stock_values[np.isnan(period_returns)] = np.nan
+
+        def stock_rows(indices: np.ndarray) -> list[dict]:
+            rows = table.rows(indices, STOCK_ROW_FIELDS)
+            for row, i in zip(rows, indices):
+                row["change_percent"] = float(stock_values[i])
+            return rows
+
+        stock_stats = breadth_stats(stock_values)
+        movers["stocks"] = _movers(stock_values, stock_rows, top_n)
+
+    return {
+        "period": period,
+        "themes": theme_stats,
+        "stocks": stock_stats,
+        "ranking": theme_rows(ranking),
+        "movers": movers,
+        "last_updated": last_updated,
+        "generated_at": generated_at or datetime.now().isoformat(),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Aggregate access (request side)
+# ---------------------------------------------------------------------------
+
+def get_analytics_snapshot(period: str, directory: Path = PRECOMPUTED_DIR) -> Optional[dict]:
+    """Return the analytics aggregate for a period, or None if not computed.
+
+    The dict is shared by every request through the in-memory snapshot
+    and must not be mutated.
+    """
+    return snapshot.get(directory / analytics_filename(period))
+
+
+def calculate_theme_ranking(period: str = "1mo", directory: Path = PRECOMPUTED_DIR) -> list[dict]:
+    """Rank all themes by their return for the period.
+
+    Uses the precomputed analytics aggregate. Themes missing from it
+    (added since the last update, or before the first update) follow
+    the ranked ones without a return.
+
+    Args:
+        period: Analysis period identifier.
+        directory: Directory holding the precomputed aggregate.
 
     Returns:
         Sorted list of theme summary dicts with rank field.
     """
+    aggregate = get_analytics_snapshot(period, directory)
+    ranked = [row for row in (aggregate or {}).get("ranking", []) if row["id"] in THEMES]
+    seen = {row["id"] for row in ranked}
+    unranked = [
+        {"id": theme_id, "name": theme_data["name"], "change_percent": None, "change_percent_1d": None}
+        for theme_id, theme_data in THEMES.items()
+        if theme_id not in seen
+    ]
+
     rankings: list[dict] = []
-    for theme_id, theme_data in THEMES.items():
+    for idx, row in enumerate(ranked + unranked, start=1):
+        theme_data = THEMES[row["id"]]
         rankings.append({
-            "id": theme_id,
+            "id": row["id"],
             "name": theme_data["name"],
             "description": theme_data["description"],
+            "change_percent": row["change_percent"],
+            "change_percent_1d": row["change_percent_1d"],
             "stock_count": len(theme_data["tickers"]),
             "period": period,
+            "rank": idx,
         })
 
-    rankings.sort(key=lambda t: t["stock_count"], reverse=True)
-    for idx, item in enumerate(rankings, start=1):
-        item["rank"] = idx
-
     return rankings
 
 
 def calculate_portfolio_metrics(
     theme_ids: Optional[list[str]] = None,
+    period: Optional[str] = None,
+    directory: Path = PRECOMPUTED_DIR,
 ) -> dict:
     """Calculate aggregate metrics across selected themes.
 
     Args:
         theme_ids: List of theme IDs to include. If None, all themes.
+        period: When given, also compute risk metrics for the
+            equal-theme-weight portfolio over this period (see
+            ``services.portfolio``).
+        directory: Directory holding the precomputed price matrices.
 
     Returns:
         Dict with portfolio-level statistics.
@@ -61,13 +241,20 @@ def calculate_portfolio_metrics(
             total_stocks += len(theme["tickers"])
             unique_tickers.update(theme["tickers"])
 
-    return {
+    result = {
         "selected_themes": len(ids),
         "total_stock_slots": total_stocks,
         "unique_tickers": len(unique_tickers),
         "overlap_count": total_stocks - len(unique_tickers),
         "calculated_at": datetime.now().isoformat(),
     }
+    if period is not None:
+        from services.portfolio import get_portfolio, theme_basket
+
+        known = [tid for tid in ids if tid in THEMES]
+        portfolio = get_portfolio(theme_basket(known, THEMES), period, directory) if known else None
+        result["risk"] = portfolio["metrics"] if portfolio else None
+    return result
 
 
 def get_theme_overlap_matrix() -> dict:
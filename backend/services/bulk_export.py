@@ -0,0 +1,459 @@
+"""一括エクスポート（OHLCV履歴・テーマ指数・ファンダメンタルズを Parquet / Arrow で）
+
+分析用に追跡銘柄全体のデータを列指向のまま書き出す。銘柄ごとに /api/stocks/{code}/chart を
+取得する代わりに、3つのデータセットを Arrow の RecordBatch として生成する。
+
+- ohlcv: 長期履歴ストア（services/history_store.py、最大5年）の日足。1銘柄ずつ読み、メモリには載せない
+- theme_index: 5年分の終値行列（prices_5y.npz）から計算した全テーマ × 加重方式の日次指数と日次リターン
+- fundamentals: メトリクステーブル（metrics_{period}.json）の時価総額・指標・期間別騰落率のスナップショット
+
+数値列は NumPy 配列を連続領域のまま pa.array に渡す（コピーなしで Arrow 配列になる）。
+期間の絞り込みも日付の二分探索によるスライスで行い、ブールマスクによるコピーを避ける。
+欠損値は NaN のまま（null に変換すると検証ビットマップの作成が必要になる）。
+
+since を指定すると、その日より後の行だけを出力する（夜間の差分同期用）。
+ジョブ（jobs/export_history.py）は年ごとの Hive 形式パーティションに書き出し、
+データセットごとの最終日を _manifest.json に記録して次回の since に使う。
+"""
+
+import json
+import logging
+from datetime import date, datetime
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Mapping, Optional
+
+import numpy as np
+import pandas as pd
+
+from services.metrics_table import INDICATOR_COLUMNS, RETURN_COLUMNS, MetricsTable, get_metrics_table
+from services.price_matrix import BENCHMARK_TICKER, PriceMatrix, get_price_matrix
+from services.theme_index import INDEX_WEIGHTINGS, theme_index_levels
+from utils.serialization import temp_path, write_bytes_atomic
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - pyarrowは任意依存
+    pa = None
+    pc = None
+    pq = None
+
+logger = logging.getLogger(__name__)
+
+# データセット
+BULK_DATASETS = ("ohlcv", "theme_index", "fundamentals")
+
+# 出力形式 -> 拡張子（arrow は Arrow IPC ファイル）
+BULK_FORMATS = {"parquet": "parquet", "arrow": "arrow"}
+
+# Parquet の行グループ・パーティションごとの書き込み単位（行数）
+ROW_GROUP_ROWS = 100_000
+
+# テーマ指数を出力する加重方式
+BULK_WEIGHTINGS = ("equal",) + INDEX_WEIGHTINGS
+
+# テーマ指数・ファンダメンタルズの元にする期間
+INDEX_SOURCE_PERIOD = "5y"
+FUNDAMENTALS_PERIOD = "1y"
+
+# 差分エクスポートの記録
+MANIFEST_FILENAME = "_manifest.json"
+
+# データセットごとの差分判定に使う日付列
+DATE_COLUMNS = {"ohlcv": "date", "theme_index": "date", "fundamentals": "as_of"}
+
+# キーごとに最終日を記録するデータセット（銘柄ごとに履歴の最終日が異なるため、差分は銘柄ごとに判定）
+KEY_COLUMNS = {"ohlcv": "ticker"}
+
+OHLCV_COLUMNS = ("Open", "High", "Low", "Close", "Volume")
+
+
+def _schemas() -> dict[str, "pa.Schema"]:
+    float64 = pa.float64()
+    return {
+        "ohlcv": pa.schema(
+            [("ticker", pa.string()), ("date", pa.date32())]
+            + [(column.lower(), float64) for column in OHLCV_COLUMNS]
+        ),
+        "theme_index": pa.schema([
+            ("theme_id", pa.string()),
+            ("weighting", pa.string()),
+            ("date", pa.date32()),
+            ("level", float64),
+            ("return", float64),
+        ]),
+        "fundamentals": pa.schema(
+            [
+                ("ticker", pa.string()),
+                ("name", pa.string()),
+                ("theme_id", pa.string()),
+                ("theme_ids", pa.list_(pa.string())),
+                ("as_of", pa.date32()),
+                ("market_cap", float64),
+                ("market_cap_category", pa.string()),
+                ("float_ratio", float64),
+                ("change_percent_1d", float64),
+            ]
+            + [(column, float64) for column in INDICATOR_COLUMNS + RETURN_COLUMNS]
+        ),
+    }
+
+
+def dataset_schema(dataset: str) -> "pa.Schema":
+    """データセットの Arrow スキーマ"""
+    if pa is None:
+        raise RuntimeError("Bulk export requires pyarrow")
+    return _schemas()[dataset]
+
+
+def _dates(index: pd.DatetimeIndex) -> "pa.Array":
+    return pa.array(index.to_numpy().astype("datetime64[D]"), type=pa.date32())
+
+
+def _since_position(index: pd.DatetimeIndex, since: Optional[date]) -> int:
+    """since より後の最初の行番号（昇順の日付に対する二分探索）"""
+    if since is None:
+        return 0
+    return int(index.searchsorted(pd.Timestamp(since), side="right"))
+
+
+# =============================================================================
+# データセットの生成
+# =============================================================================
+
+def ohlcv_batches(
+    tickers: Iterable[str],
+    since: Optional[date] = None,
+    loader: Optional[Callable[[str], Optional[pd.DataFrame]]] = None,
+    since_by_ticker: Optional[Mapping[str, date]] = None,
+) -> Iterator["pa.RecordBatch"]:
+    """銘柄ごとの日足（1銘柄1バッチ。履歴のない銘柄・since 以降の行がない銘柄は含めない）
+
+    Args:
+        tickers: 出力する銘柄
+        since: この日より後の行だけを出力
+        loader: 履歴の読み込み（省略時は長期履歴ストアから、メモリに載せずに読む）
+        since_by_ticker: 銘柄ごとの since（含まれる銘柄は since の代わりにこの日を使う）
+    """
+    if loader is None:
+        from services.history_store import read_history
+        loader = read_history
+
+    schema = dataset_schema("ohlcv")
+    for ticker in tickers:
+        df = loader(ticker)
+        if df is None or df.empty:
+            continue
+        start = _since_position(df.index, since_by_ticker.get(ticker, since) if since_by_ticker else since)
+        if start >= len(df):
+            continue
+
+        rows = len(df) - start
+        columns = [pa.repeat(pa.scalar(ticker), rows), _dates(df.index[start:])]
+        for column in OHLCV_COLUMNS:
+            if column in df:
+                # float64 の列はコピーなしで Arrow 配列にする（スライスは連続領域のまま）
+                columns.append(pa.array(np.ascontiguousarray(df[column].to_numpy(dtype=np.float64)[start:])))
+            else:
+                columns.append(pa.nulls(rows, pa.float64()))
+        yield pa.record_batch(columns, schema=schema)
+
+
+def theme_index_batches(
+    matrix: PriceMatrix,
+    themes: dict[str, dict],
+    market_caps: dict[str, dict],
+    since: Optional[date] = None,
+    weightings: tuple[str, ...] = BULK_WEIGHTINGS,
+) -> Iterator["pa.RecordBatch"]:
+    """全テーマの日次指数（1加重方式1バッチ。行はテーマ順 × 日付順）
+
+    level は期間の初日を1とした指数で、終値行列の期間がずれると基準も変わる。
+    return（日次リターン）は基準によらないため、差分エクスポートを連結するときはこちらを使う。
+    """
+    schema = dataset_schema("theme_index")
+    start = _since_position(matrix.dates, since)
+    days = len(matrix.dates) - start
+    if days <= 0:
+        return
+    dates = _dates(matrix.dates[start:])
+
+    for weighting in weightings:
+        levels, available = theme_index_levels(matrix, themes, market_caps, weighting)
+        theme_ids = [theme_id for theme_id, ok in zip(themes, available) if ok]
+        if not theme_ids:
+            continue
+        levels = levels[:, available]
+        returns = np.full_like(levels, np.nan)
+        returns[1:] = levels[1:] / levels[:-1] - 1
+
+        # テーマごとに日付が連続するよう転置して1列に並べる
+        yield pa.record_batch(
+            [
+                pa.array(np.repeat(np.array(theme_ids, dtype=object), days), type=pa.string()),
+                pa.repeat(pa.scalar(weighting), days * len(theme_ids)),
+                pa.concat_arrays([dates] * len(theme_ids)),
+                pa.array(np.ascontiguousarray(levels[start:].T).ravel()),
+                pa.array(np.ascontiguousarray(returns[start:].T).ravel()),
+            ],
+            schema=schema,
+        )
+
+
+def fundamentals_batch(
+    table: MetricsTable,
+    market_caps: dict[str, dict],
+    as_of: date,
+) -> "pa.RecordBatch":
+    """銘柄ごとの時価総額・指標・期間別騰落率（メトリクステーブルの列をそのまま使う）"""
+    schema = dataset_schema("fundamentals")
+    codes = table.codes.tolist()
+    columns = {
+        "ticker": pa.array(codes, type=pa.string()),
+        "name": pa.array(table.names.tolist(), type=pa.string()),
+        "theme_id": pa.array([ids[0] if ids else None for ids in table.theme_ids], type=pa.string()),
+        "theme_ids": pa.array(table.theme_ids, type=pa.list_(pa.string())),
+        "as_of": pa.repeat(pa.scalar(as_of, type=pa.date32()), table.size),
+        "market_cap_category": pa.array(table.categories.tolist(), type=pa.string()),
+        "float_ratio": pa.array(
+            np.array([(market_caps.get(code) or {}).get("float_ratio") or np.nan for code in codes], dtype=np.float64)
+        ),
+    }
+    for name in ("market_cap", "change_percent_1d") + INDICATOR_COLUMNS + RETURN_COLUMNS:
+        columns[name] = pa.array(table.numeric[name])
+    return pa.record_batch([columns[name] for name in schema.names], schema=schema)
+
+
+def universe_tickers(themes: dict[str, dict]) -> list[str]:
+    """追跡銘柄全体（テーマ定義順、重複なし）+ ベンチマーク"""
+    tickers = dict.fromkeys(ticker for theme in themes.values() for ticker in theme["tickers"])
+    return list(tickers) + [BENCHMARK_TICKER]
+
+
+def market_caps_from_table(table: Optional[MetricsTable]) -> dict[str, dict]:
+    """メトリクステーブルの時価総額と、キャッシュ済みの浮動株比率（yfinance にはアクセスしない）"""
+    if table is None:
+        return {}
+    from services.data_fetcher import get_cached_market_cap
+
+    market_caps = {}
+    for code, market_cap in zip(table.codes.tolist(), table.numeric["market_cap"].tolist()):
+        cached = get_cached_market_cap(code) or {}
+        market_caps[code] = {
+            "market_cap": 0 if market_cap != market_cap else market_cap,
+            "float_ratio": cached.get("float_ratio"),
+        }
+    return market_caps
+
+
+def fundamentals_as_of(table: MetricsTable) -> date:
+    """スナップショットの基準日（最終取引日。不明なら生成日・当日）"""
+    for value in (table.last_updated, table.generated_at):
+        if value:
+            try:
+                return date.fromisoformat(value[:10])
+            except ValueError:
+                continue
+    return date.today()
+
+
+def dataset_batches(
+    dataset: str,
+    directory: Path,
+    themes: dict[str, dict],
+    since: Optional[date] = None,
+    since_by_key: Optional[Mapping[str, date]] = None,
+) -> Iterator["pa.RecordBatch"]:
+    """データセットのバッチを事前計算済みデータ（と長期履歴ストア）から生成
+
+    元データが未作成のデータセットは何も生成しない。
+
+    Args:
+        dataset: ohlcv / theme_index / fundamentals
+        directory: 事前計算データのディレクトリ
+        themes: テーマ定義（THEMES）
+        since: この日より後の行だけを出力（fundamentals は基準日がこの日より後のときだけ出力）
+        since_by_key: KEY_COLUMNS のキーごとの since（ohlcv のみ）
+    """
+    if dataset == "ohlcv":
+        yield from ohlcv_batches(universe_tickers(themes), since, since_by_ticker=since_by_key)
+        return
+
+    table = get_metrics_table(directory, FUNDAMENTALS_PERIOD)
+    if dataset == "theme_index":
+        matrix = get_price_matrix(directory, INDEX_SOURCE_PERIOD)
+        if matrix is not None:
+            yield from theme_index_batches(matrix, themes, market_caps_from_table(table), since)
+    elif dataset == "fundamentals":
+        if table is not None:
+            as_of = fundamentals_as_of(table)
+            if since is None or as_of > since:
+                yield fundamentals_batch(table, market_caps_from_table(table), as_of)
+    else:
+        raise ValueError(f"Unknown dataset: {dataset}")
+
+
+# =============================================================================
+# パーティション書き出し（ジョブ用）
+# =============================================================================
+
+class PartitionWriter:
+    """年（または任意のキー）ごとのパーティションファイルへ書き出す
+
+    パーティションごとに ROW_GROUP_ROWS 行たまるまでバッファし、まとめて1行グループとして書く。
+    ファイルは一時名で書き、close() 時に正式な名前へ置き換える（途中で失敗しても壊れたファイルを残さない）。
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        schema: "pa.Schema",
+        fmt: str,
+        filename: str,
+        date_column: Optional[str] = "date",
+        key_column: Optional[str] = None,
+    ) -> None:
+        if fmt not in BULK_FORMATS:
+            raise ValueError(f"Unsupported bulk format: {fmt}")
+        self.directory = directory
+        self.schema = schema
+        self.date_column = date_column
+        self.key_column = key_column
+        self.fmt = fmt
+        self.filename = f"{filename}.{BULK_FORMATS[fmt]}"
+        self.rows = 0
+        self.last_date: Optional[date] = None
+        # key_column の値 -> そのキーの最終日
+        self.last_dates: dict[str, date] = {}
+        self.files: list[Path] = []
+        self._writers: dict[str, tuple[Path, object]] = {}
+        self._pending: dict[str, list] = {}
+        self._pending_rows: dict[str, int] = {}
+
+    def _path(self, partition: str) -> Path:
+        return self.directory / partition / self.filename
+
+    def _writer(self, partition: str):
+        entry = self._writers.get(partition)
+        if entry is None:
+            path = self._path(partition)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = temp_path(path)
+            if self.fmt == "parquet":
+                writer = pq.ParquetWriter(tmp_path, self.schema, compression="zstd")
+            else:
+                writer = pa.ipc.new_file(str(tmp_path), self.schema)
+            entry = self._writers[partition] = (tmp_path, writer)
+        return entry[1]
+
+    def _flush(self, partition: str) -> None:
+        batches = self._pending.pop(partition, [])
+        self._pending_rows.pop(partition, None)
+        if batches:
+            self._writer(partition).write_table(pa.Table.from_batches(batches, schema=self.schema))
+
+    def write(self, batch: "pa.RecordBatch", partition: str) -> None:
+        """バッチを指定パーティションに追加"""
+        if batch.num_rows == 0:
+            return
+        self._pending.setdefault(partition, []).append(batch)
+        self._pending_rows[partition] = self._pending_rows.get(partition, 0) + batch.num_rows
+        self.rows += batch.num_rows
+        if self.date_column is not None:
+            last = pc.max(batch.column(self.date_column)).as_py()
+            if last is not None and (self.last_date is None or last > self.last_date):
+                self.last_date = last
+            if self.key_column is not None:
+                self._record_last_dates(batch)
+        if self._pending_rows[partition] >= ROW_GROUP_ROWS:
+            self._flush(partition)
+
+    def _record_last_dates(self, batch: "pa.RecordBatch") -> None:
+        grouped = pa.Table.from_batches([batch]).group_by(self.key_column).aggregate([(self.date_column, "max")])
+        keys = grouped.column(self.key_column).to_pylist()
+        for key, last in zip(keys, grouped.column(f"{self.date_column}_max").to_pylist()):
+            if last is not None and (key not in self.last_dates or last > self.last_dates[key]):
+                self.last_dates[key] = last
+
+    def write_by_year(self, batch: "pa.RecordBatch") -> None:
+        """date 列の年ごとに year=YYYY パーティションへ振り分けて追加
+
+        日付の順序は問わない（theme_index のようにテーマごとに日付が先頭へ戻るバッチもある）。
+        年ごとにまとめて1回ずつ書き、同じ年の行の順序は保つ。
+        """
+        days = batch.column("date").to_numpy(zero_copy_only=False).astype("datetime64[D]")
+        years = days.astype("datetime64[Y]").astype(np.int64) + 1970
+        if len(years) and (years == years[0]).all():
+            self.write(batch, f"year={years[0]}")
+            return
+        if (np.diff(years) < 0).any():
+            order = np.argsort(years, kind="stable")
+            batch, years = batch.take(pa.array(order)), years[order]
+        boundaries = np.flatnonzero(np.diff(years)) + 1
+        for start, end in zip(np.concatenate(([0], boundaries)), np.concatenate((boundaries, [len(years)]))):
+            self.write(batch.slice(start, end - start), f"year={years[start]}")
+
+    def close(self) -> list[Path]:
+        """残りを書き出してファイルを確定し、書き出したファイルのパスを返す"""
+        for partition in list(self._pending):
+            self._flush(partition)
+        for partition, (tmp_path, writer) in self._writers.items():
+            writer.close()
+            path = self._path(partition)
+            tmp_path.replace(path)
+            self.files.append(path)
+        self._writers.clear()
+        return sorted(self.files)
+
+
+def read_manifest(directory: Path) -> dict:
+    """差分エクスポートの記録を読み込み（なければ空）"""
+    path = directory / MANIFEST_FILENAME
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {"datasets": {}}
+
+
+def manifest_since(manifest: dict, dataset: str) -> Optional[date]:
+    """前回エクスポートした最終日（次回の since）"""
+    last_date = manifest.get("datasets", {}).get(dataset, {}).get("last_date")
+    return date.fromisoformat(last_date) if last_date else None
+
+
+def manifest_last_dates(manifest: dict, dataset: str) -> Optional[dict[str, date]]:
+    """キーごとに前回エクスポートした最終日（KEY_COLUMNS のデータセット。記録がなければNone）"""
+    last_dates = manifest.get("datasets", {}).get(dataset, {}).get("last_dates")
+    if not last_dates:
+        return None
+    return {key: date.fromisoformat(value) for key, value in last_dates.items()}
+
+
+def update_manifest(
+    directory: Path,
+    manifest: dict,
+    dataset: str,
+    writer: PartitionWriter,
+    since: Optional[date],
+) -> dict:
+    """データセットの最終日（キーごと）・ファイル一覧を記録（行がなければ最終日は据え置き）"""
+    entry = manifest.setdefault("datasets", {}).setdefault(dataset, {"files": []})
+    files = [str(path.relative_to(directory)) for path in writer.files]
+    entry["files"] = sorted(set(entry.get("files", [])) | set(files))
+    if writer.last_date is not None:
+        entry["last_date"] = writer.last_date.isoformat()
+    if writer.last_dates:
+        last_dates = entry.setdefault("last_dates", {})
+        for key, last in writer.last_dates.items():
+            last_dates[key] = max(last_dates.get(key, ""), last.isoformat())
+    entry["last_export"] = {
+        "since": since.isoformat() if since else None,
+        "rows": writer.rows,
+        "files": files,
+        "exported_at": datetime.now().isoformat(),
+    }
+    manifest["format"] = writer.fmt
+
+    write_bytes_atomic(directory / MANIFEST_FILENAME, json.dumps(manifest, ensure_ascii=False, indent=2).encode("utf-8"))
+    return manifest
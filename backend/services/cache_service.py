@@ -12,6 +12,7 @@ from typing import Any, Optional
 import redis
 
 from utils.cache import cache as memory_cache
+from utils.serialization import dumps, loads
 
 logger = logging.getLogger(__name__)
 
@@ -44,7 +45,7 @@ class CacheService:
             try:
                 raw = self._redis.get(key)
                 if raw is not None:
-                    return json.loads(raw)
+                    return loads(raw)
             except (redis.RedisError, json.JSONDecodeError):
                 pass
 
@@ -61,7 +62,7 @@ class CacheService:
 
         if self._redis:
             try:
-                serialized = json.dumps(value, ensure_ascii=False)
+                serialized = dumps(value)
                 self._redis.setex(key, ttl_seconds, serialized)
             except (redis.RedisError, TypeError) as exc:
                 logger.warning(f"CacheService Redis SET failed: {exc}")
@@ -8,6 +8,50 @@ from scipy import stats
 
 from services.data_fetcher import fetch_batch, fetch_stock_data
 
+# 価格履歴の列名（DataFrame列 → レスポンスのキー）
+PRICE_COLUMNS = {
+    "Open": "open",
+    "High": "high",
+    "Low": "low",
+    "Close": "close",
+}
+
+
+def series_to_list(values, decimals: int = 2) -> list:
+    """
+    数値列を丸めてリストに変換（NaNはNone）
+
+    1要素ずつround/isnanせず、NumPyで一括処理する
+
+    Args:
+        values: SeriesまたはNumPy配列
+        decimals: 小数点以下の桁数
+
+    Returns:
+        丸め済みfloat（欠損はNone）のリスト
+    """
+    if values is None:
+        return []
+    arr = np.asarray(values, dtype=float)
+    if arr.size == 0:
+        return []
+    out = np.round(arr, decimals).astype(object)
+    out[np.isnan(arr)] = None
+    return out.tolist()
+
+
+def integers_to_list(values) -> list:
+    """整数列（出来高など）をリストに変換（NaNはNone）"""
+    if values is None:
+        return []
+    arr = np.asarray(values, dtype=float)
+    if arr.size == 0:
+        return []
+    mask = np.isnan(arr)
+    out = np.where(mask, 0, arr).astype(np.int64).astype(object)
+    out[mask] = None
+    return out.tolist()
+
 
 def calculate_return(df: pd.DataFrame) -> float:
     """
@@ -133,13 +177,15 @@ def calculate_theme_return(
 
 
 def calculate_return_from_data(
-    stock_data: dict[str, pd.DataFrame]
+    stock_data: dict[str, pd.DataFrame],
+    weights: Optional[dict[str, float]] = None,
 ) -> tuple[float, dict]:
     """
     既に取得済みのデータから騰落率を計算
 
     Args:
         stock_data: {ticker: DataFrame} の辞書
+        weights: 銘柄ごとのウェイト（省略時は均等。データのある銘柄で正規化する）
 
     Returns:
         tuple: (テーマ騰落率, 銘柄ごとの騰落率dict)
@@ -155,18 +201,27 @@ def calculate_return_from_data(
     if not returns:
         return 0.0, {}
 
+    if weights is not None:
+        total_weight = sum(weights.get(ticker, 0.0) for ticker in returns)
+        if total_weight <= 0:
+            return 0.0, returns
+        theme_return = sum(r * weights.get(ticker, 0.0) for ticker, r in returns.items()) / total_weight
+        return round(theme_return, 2), returns
+
     theme_return = sum(returns.values()) / len(returns)
     return round(theme_return, 2), returns
 
 
 def calculate_theme_daily_returns_from_data(
-    stock_data: dict[str, pd.DataFrame]
+    stock_data: dict[str, pd.DataFrame],
+    weights: Optional[dict[str, float]] = None,
 ) -> pd.Series:
     """
     既に取得済みのデータからテーマの日次リターンを計算
 
     Args:
         stock_data: {ticker: DataFrame} の辞書
+        weights: 銘柄ごとのウェイト（省略時は均等。日ごとにデータのある銘柄で正規化する）
 
     Returns:
         日次リターンのSeries（%）
@@ -174,19 +229,28 @@ def calculate_theme_daily_returns_from_data(
     if not stock_data:
         return pd.Series(dtype=float)
 
-    all_returns = []
-    for df in stock_data.values():
+    all_returns = {}
+    for ticker, df in stock_data.items():
         if df is not None:
             daily_ret = calculate_daily_returns(df)
             if not daily_ret.empty:
-                all_returns.append(daily_ret)
+                all_returns[ticker] = daily_ret
 
     if not all_returns:
         return pd.Series(dtype=float)
 
     # 全銘柄の日次リターンをDataFrameに結合し、平均を計算
-    combined = pd.concat(all_returns, axis=1)
-    return combined.mean(axis=1)
+    combined = pd.concat(list(all_returns.values()), axis=1)
+    if weights is None:
+        return combined.mean(axis=1)
+
+    w = np.array([weights.get(ticker, 0.0) for ticker in all_returns], dtype=float)
+    values = combined.to_numpy(dtype=float)
+    present = ~np.isnan(values)
+    weight_sum = present @ w
+    with np.errstate(invalid="ignore", divide="ignore"):
+        weighted = np.where(present, values, 0.0) @ w / weight_sum
+    return pd.Series(np.where(weight_sum > 0, weighted, np.nan), index=combined.index)
 
 
 def calculate_theme_daily_returns(
@@ -298,13 +362,10 @@ def calculate_bollinger_bands(prices: pd.Series, period: int = 20, num_std: floa
     upper = middle + (std * num_std)
     lower = middle - (std * num_std)
 
-    def to_list(s):
-        return [round(v, 2) if not np.isnan(v) else None for v in s.values]
-
     return {
-        "middle": to_list(middle),
-        "upper": to_list(upper),
-        "lower": to_list(lower),
+        "middle": series_to_list(middle),
+        "upper": series_to_list(upper),
+        "lower": series_to_list(lower),
     }
 
 
@@ -352,15 +413,12 @@ def calculate_ichimoku(df: pd.DataFrame) -> dict:
     # 遅行スパン（終値を26日前に表示）
     chikou = close.shift(-26)
 
-    def to_list(s):
-        return [round(v, 2) if pd.notna(v) else None for v in s.values]
-
     return {
-        "tenkan": to_list(tenkan),
-        "kijun": to_list(kijun),
-        "senkou_a": to_list(senkou_a),
-        "senkou_b": to_list(senkou_b),
-        "chikou": to_list(chikou),
+        "tenkan": series_to_list(tenkan),
+        "kijun": series_to_list(kijun),
+        "senkou_a": series_to_list(senkou_a),
+        "senkou_b": series_to_list(senkou_b),
+        "chikou": series_to_list(chikou),
     }
 
 
@@ -402,7 +460,20 @@ def get_stock_indicators(ticker: str, period: str = "1mo") -> Optional[dict]:
         dict with various indicators
     """
     df = fetch_stock_data(ticker, period)
+    return calculate_indicators_from_data(ticker, df)
+
+
+def calculate_indicators_from_data(ticker: str, df: pd.DataFrame) -> Optional[dict]:
+    """
+    既に取得済みのデータから銘柄の各種指標を計算
+
+    Args:
+        ticker: 銘柄コード
+        df: 株価DataFrame
 
+    Returns:
+        dict with various indicators（データがなければNone）
+    """
     if df is None or df.empty:
         return None
 
@@ -445,9 +516,85 @@ def get_stock_indicators(ticker: str, period: str = "1mo") -> Optional[dict]:
     }
 
 
+def calculate_screening_metrics(ticker: str, df: pd.DataFrame) -> dict:
+    """
+    スクリーナー用の指標を計算（RSI、移動平均乖離率、ボラティリティ）
+
+    データ不足で計算できない指標はNone（0.0で埋めると条件検索で誤って一致するため）
+
+    Args:
+        ticker: 銘柄コード
+        df: 株価DataFrame（MA20・RSI14のため20営業日以上を推奨）
+
+    Returns:
+        dict with rsi, ma5_distance, ma20_distance (%), volatility (年率%)
+    """
+    indicators = calculate_indicators_from_data(ticker, df)
+    if indicators is None:
+        return {"rsi": None, "ma5_distance": None, "ma20_distance": None, "volatility": None}
+
+    price = indicators["latest_price"]
+
+    def distance(ma: Optional[float]) -> Optional[float]:
+        if not price or not ma:
+            return None
+        return round((price / ma - 1) * 100, 2)
+
+    return {
+        "rsi": indicators["rsi"],
+        "ma5_distance": distance(indicators["ma5"]),
+        "ma20_distance": distance(indicators["ma20"]),
+        "volatility": indicators["volatility"] if len(df) >= 20 else None,
+    }
+
+
+def price_history_columns(df: pd.DataFrame) -> dict:
+    """
+    価格履歴を列指向形式に変換（チャート用）
+
+    Args:
+        df: 株価DataFrame（Open, High, Low, Close, Volume列を含む）
+
+    Returns:
+        dict with dates, open, high, low, close, volume（各リスト、欠損はNone）
+    """
+    if df is None or df.empty:
+        return {"dates": [], "open": [], "high": [], "low": [], "close": [], "volume": []}
+
+    columns = {"dates": pd.DatetimeIndex(df.index).strftime("%Y-%m-%d").tolist()}
+    for source, key in PRICE_COLUMNS.items():
+        columns[key] = series_to_list(df[source]) if source in df.columns else [None] * len(df)
+    columns["volume"] = integers_to_list(df["Volume"]) if "Volume" in df.columns else [None] * len(df)
+    return columns
+
+
+def price_history_rows(df: pd.DataFrame) -> list[dict]:
+    """
+    価格履歴を行形式（1日1dict）に変換（チャート用）
+
+    Args:
+        df: 株価DataFrame
+
+    Returns:
+        list of dict with date and price data
+    """
+    columns = price_history_columns(df)
+    return [
+        {"date": d, "open": o, "high": h, "low": lo, "close": c, "volume": v}
+        for d, o, h, lo, c, v in zip(
+            columns["dates"],
+            columns["open"],
+            columns["high"],
+            columns["low"],
+            columns["close"],
+            columns["volume"],
+        )
+    ]
+
+
 def get_price_history(ticker: str, period: str = "1mo") -> list[dict]:
     """
-    価格履歴を取得（チャート用）
+    価格履歴を取得（チャート用・行形式）
 
     Args:
         ticker: 銘柄コード
@@ -461,15 +608,23 @@ def get_price_history(ticker: str, period: str = "1mo") -> list[dict]:
     if df is None or df.empty:
         return []
 
-    history = []
-    for date, row in df.iterrows():
-        history.append({
-            "date": date.strftime("%Y-%m-%d"),
-            "open": round(row["Open"], 2) if not np.isnan(row["Open"]) else None,
-            "high": round(row["High"], 2) if not np.isnan(row["High"]) else None,
-            "low": round(row["Low"], 2) if not np.isnan(row["Low"]) else None,
-            "close": round(row["Close"], 2) if not np.isnan(row["Close"]) else None,
-            "volume": int(row["Volume"]) if not np.isnan(row["Volume"]) else None,
-        })
-
-    return history
+    return price_history_rows(df)
+
+
+def get_price_history_columns(ticker: str, period: str = "1mo") -> Optional[dict]:
+    """
+    価格履歴を取得（チャート用・列指向形式）
+
+    Args:
+        ticker: 銘柄コード
+        period: 取得期間
+
+    Returns:
+        dict with dates, open, high, low, close, volume（データなしはNone）
+    """
+    df = fetch_stock_data(ticker, period)
+
+    if df is None or df.empty:
+        return None
+
+    return price_history_columns(df)
@@ -0,0 +1,264 @@
+"""テーマ間・銘柄間のリターン相関行列と階層クラスタリング順
+
+update_data.py が期間ごとの終値行列（services/price_matrix.py）から計算し、
+precomputed/correlation_{period}.npz に float32 で保存する（API はメモリに載せた行列から切り出すだけ）。
+
+- 相関の窓は期間そのもの（1mo なら直近1ヶ月の日次リターン）。日数が少なすぎる期間は計算しない
+- 日次リターン行列を列ごとに標準化し（欠損は0）、行列積 Z^T Z 1回で全ペアの相関を求める
+  欠損がある場合は両方に値がある日数をもう1回の行列積で数えて分母にする（上場直後の銘柄が0寄りに縮まない）。
+  平均・標準偏差は各列の全観測から求めるため、欠損のあるペアの値は近似になる（誤差は 1e-3 程度）
+- テーマの日次リターンは構成銘柄の日次リターンの単純平均（従来のテーマ日次リターンと同じ）
+- 表示順は平均連結法の階層クラスタリング（距離 1 - 相関）の葉の順。小さい行列は最適葉順序を使う
+- 銘柄 × 銘柄 の行列は STOCK_CORRELATION_MAX 銘柄以下のときだけ計算する（2,000銘柄で 16 MB）
+"""
+
+import io
+import logging
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from scipy.cluster import hierarchy
+from scipy.spatial.distance import squareform
+
+from services.price_matrix import BENCHMARK_TICKER, PriceMatrix
+from services.theme_index import forward_fill, membership_matrix
+from utils.cache import FileCache
+from utils.serialization import write_bytes_atomic
+
+logger = logging.getLogger(__name__)
+
+# 相関を計算する期間（短すぎる期間は標本が足りない）
+CORRELATION_PERIODS = ("1mo", "3mo", "6mo", "1y", "3y", "5y")
+
+# 相関を計算する最小の観測日数（ペアごと）
+MIN_OBSERVATIONS = 15
+
+# 銘柄 × 銘柄 の行列を計算する銘柄数の上限（0で無効）
+STOCK_CORRELATION_MAX_ENV = "STOCK_CORRELATION_MAX"
+DEFAULT_STOCK_CORRELATION_MAX = 2_000
+
+# 最適葉順序（計算量が大きい）を使う行列サイズの上限
+OPTIMAL_ORDERING_MAX = 300
+
+
+def correlation_filename(period: str) -> str:
+    """相関行列の保存ファイル名"""
+    return f"correlation_{period}.npz"
+
+
+def stock_correlation_max() -> int:
+    """銘柄 × 銘柄 の行列を計算する銘柄数の上限（環境変数 STOCK_CORRELATION_MAX）"""
+    try:
+        return int(os.environ.get(STOCK_CORRELATION_MAX_ENV, DEFAULT_STOCK_CORRELATION_MAX))
+    except ValueError:
+        return DEFAULT_STOCK_CORRELATION_MAX
+
+
+# =============================================================================
+# 計算
+# =============================================================================
+
+def daily_return_matrix(close: np.ndarray, dtype=np.float32) -> np.ndarray:
+    """終値行列から日次リターン行列（既定は float32、日付 - 1 × 銘柄。当日の終値がない日はNaN）"""
+    if close.shape[0] < 2:
+        return np.empty((0, close.shape[1]), dtype=dtype)
+    filled = forward_fill(close)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = filled[1:] / filled[:-1] - 1
+    returns[np.isnan(close[1:])] = np.nan
+    return returns.astype(dtype, copy=False)
+
+
+def correlation_matrix(returns: np.ndarray, min_observations: int = MIN_OBSERVATIONS) -> np.ndarray:
+    """列同士の相関行列（float32。観測日数が足りない・値動きのないペアはNaN）
+
+    Args:
+        returns: 日付 × 系列 のリターン（欠損はNaN）
+        min_observations: ペアごとに必要な観測日数
+    """
+    observed = ~np.isnan(returns)
+    counts = observed.sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = np.where(observed, returns, 0).sum(axis=0) / counts
+        centered = np.where(observed, returns - mean, 0).astype(np.float32)
+        std = np.sqrt((centered * centered).sum(axis=0) / (counts - 1))
+        valid = (counts >= min_observations) & (std > 0)
+        standardized = np.where(valid, centered / std, 0).astype(np.float32)
+
+    # 全ペアの相関を1回の行列積で（BLAS）
+    products = standardized.T @ standardized
+    if observed.all():
+        pairs = np.full(products.shape, returns.shape[0], dtype=np.float32)
+    else:
+        mask = observed.astype(np.float32)
+        pairs = mask.T @ mask
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        corr = products / (pairs - 1)
+    np.clip(corr, -1, 1, out=corr)
+    corr[(pairs < min_observations) | ~valid[:, None] | ~valid[None, :]] = np.nan
+    np.fill_diagonal(corr, np.where(valid, 1.0, np.nan))
+    return corr.astype(np.float32, copy=False)
+
+
+def theme_return_matrix(returns: np.ndarray, membership) -> np.ndarray:
+    """テーマの日次リターン（構成銘柄の単純平均。値のある銘柄がない日はNaN）"""
+    observed = ~np.isnan(returns)
+    totals = np.asarray(membership @ np.where(observed, returns, 0).T).T
+    counts = np.asarray(membership @ observed.T.astype(np.float32)).T
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(counts > 0, totals / counts, np.nan).astype(np.float32)
+
+
+def cluster_order(corr: np.ndarray) -> np.ndarray:
+    """階層クラスタリング（平均連結法、距離 1 - 相関）の葉の順（相関不明のペアは無相関として扱う）"""
+    size = corr.shape[0]
+    if size < 3:
+        return np.arange(size, dtype=np.int32)
+    distance = 1.0 - np.nan_to_num(corr.astype(np.float64), nan=0.0)
+    np.fill_diagonal(distance, 0.0)
+    distance = np.clip((distance + distance.T) / 2, 0.0, 2.0)
+    linkage = hierarchy.linkage(
+        squareform(distance, checks=False),
+        method="average",
+        optimal_ordering=size <= OPTIMAL_ORDERING_MAX,
+    )
+    return hierarchy.leaves_list(linkage).astype(np.int32)
+
+
+@dataclass(frozen=True)
+class Correlation:
+    """相関行列1つ分（ids の並びは元の順、order はクラスタリング順の行番号）"""
+    ids: tuple[str, ...]
+    values: np.ndarray
+    order: np.ndarray
+
+    @classmethod
+    def from_returns(cls, ids: list[str], returns: np.ndarray) -> "Correlation":
+        values = correlation_matrix(returns)
+        return cls(tuple(ids), values, cluster_order(values))
+
+    def select(self, ids: Optional[list[str]] = None, clustered: bool = True) -> tuple[list[str], np.ndarray]:
+        """指定IDの部分行列（省略時は全体）。clustered ならクラスタリング順に並べる"""
+        positions = {identifier: i for i, identifier in enumerate(self.ids)}
+        if ids is None:
+            rows = np.asarray(self.order if clustered else np.arange(len(self.ids)), dtype=np.intp)
+        else:
+            rows = np.asarray([positions[identifier] for identifier in ids if identifier in positions], dtype=np.intp)
+            if clustered:
+                rank = np.empty(len(self.ids), dtype=np.intp)
+                rank[self.order] = np.arange(len(self.ids))
+                rows = rows[np.argsort(rank[rows], kind="stable")]
+        return [self.ids[i] for i in rows], self.values[np.ix_(rows, rows)]
+
+
+@dataclass(frozen=True)
+class CorrelationSet:
+    """1期間分のテーマ間・銘柄間の相関"""
+    period: str
+    themes: Correlation
+    stocks: Optional[Correlation] = None
+    observations: int = 0
+    generated_at: Optional[str] = None
+
+    def to_bytes(self) -> bytes:
+        arrays = {
+            "period": np.array(self.period),
+            "generated_at": np.array(self.generated_at or ""),
+            "observations": np.array(self.observations),
+            "theme_ids": np.array(self.themes.ids, dtype=str),
+            "theme_values": self.themes.values,
+            "theme_order": self.themes.order,
+        }
+        if self.stocks is not None:
+            arrays.update(
+                stock_ids=np.array(self.stocks.ids, dtype=str),
+                stock_values=self.stocks.values,
+                stock_order=self.stocks.order,
+            )
+        buffer = io.BytesIO()
+        np.savez(buffer, **arrays)
+        return buffer.getvalue()
+
+    @classmethod
+    def from_file(cls, path: Path) -> "CorrelationSet":
+        with np.load(path, allow_pickle=False) as data:
+            stocks = None
+            if "stock_values" in data:
+                stocks = Correlation(tuple(data["stock_ids"].tolist()), data["stock_values"], data["stock_order"])
+            return cls(
+                period=str(data["period"]),
+                themes=Correlation(tuple(data["theme_ids"].tolist()), data["theme_values"], data["theme_order"]),
+                stocks=stocks,
+                observations=int(data["observations"]),
+                generated_at=str(data["generated_at"]) or None,
+            )
+
+
+def compute_correlations(
+    matrix: PriceMatrix,
+    themes: dict[str, dict],
+    include_stocks: Optional[bool] = None,
+    generated_at: Optional[str] = None,
+) -> CorrelationSet:
+    """1期間分のテーマ間（と銘柄間）の相関行列を計算
+
+    Args:
+        matrix: 終値行列
+        themes: テーマ定義（THEMES）
+        include_stocks: 銘柄 × 銘柄 も計算するか（省略時は STOCK_CORRELATION_MAX 以下なら計算）
+    """
+    returns = daily_return_matrix(matrix.close)
+    theme_ids = list(themes)
+    theme_returns = theme_return_matrix(returns, membership_matrix(matrix, theme_ids, themes))
+
+    # 銘柄間の行列にベンチマークは含めない
+    stock_columns = [i for i, ticker in enumerate(matrix.tickers) if ticker != BENCHMARK_TICKER]
+    if include_stocks is None:
+        include_stocks = 0 < len(stock_columns) <= stock_correlation_max()
+    stocks = None
+    if include_stocks:
+        stocks = Correlation.from_returns([matrix.tickers[i] for i in stock_columns], returns[:, stock_columns])
+    return CorrelationSet(
+        period=matrix.period,
+        themes=Correlation.from_returns(theme_ids, theme_returns),
+        stocks=stocks,
+        observations=returns.shape[0],
+        generated_at=generated_at,
+    )
+
+
+# =============================================================================
+# 保存・読み込み（ファイルの (mtime_ns, size) が変わったときだけ読み直す）
+# =============================================================================
+
+def _load_correlations(path: Path) -> Optional[CorrelationSet]:
+    try:
+        return CorrelationSet.from_file(path)
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Failed to load correlations {path.name}: {e}")
+        return None
+
+
+_sets: FileCache[CorrelationSet] = FileCache(_load_correlations)
+
+
+def save_correlations(directory: Path, correlations: CorrelationSet) -> Path:
+    """相関行列をアトミックに保存し、同一プロセスのメモリにも即座に反映"""
+    path = directory / correlation_filename(correlations.period)
+    write_bytes_atomic(path, correlations.to_bytes())
+    _sets.put(path, correlations)
+    return path
+
+
+def get_correlations(directory: Path, period: str) -> Optional[CorrelationSet]:
+    """期間の相関行列を取得（未作成ならNone）"""
+    return _sets.get(directory / correlation_filename(period))
+
+
+def clear() -> None:
+    """読み込み済みの相関行列を破棄"""
+    _sets.clear()
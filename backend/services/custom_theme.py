@@ -0,0 +1,246 @@
+"""カスタムテーマ（ユーザー定義の銘柄バスケット）のオンデマンド計算
+
+任意の銘柄（と任意のウェイト）からなるバスケットを、組み込みテーマと同じ形の
+テーマ詳細ペイロードとして返す。
+- 株価は事前計算済みの終値行列（services/price_matrix.py）だけを使い、yfinance にはアクセスしない
+- 結果はバスケットの正規形（銘柄コード順 + 正規化したウェイト）のハッシュ・期間・行列の生成時刻をキーにキャッシュ
+- 計算はスレッドプールで行い（イベントループをブロックしない）、同時計算数を制限する
+- 同じバスケットの同時リクエストは1回の計算結果を共有する（シングルフライト）。計算は
+  リクエストから独立したタスクで行うため、最初のリクエストが切断されても他の待機者には届く
+"""
+
+import asyncio
+import hashlib
+import json
+import math
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+import anyio
+
+from services.metrics_table import get_metrics_table
+from services.price_matrix import PriceMatrix, get_price_matrix
+from services.sparkline import sparkline_source_period
+from services.theme_detail import build_detail_payload
+from utils.cache import cache
+
+# バスケットの上限
+MAX_BASKET_TICKERS = 200
+
+# 結果のキャッシュ有効期間（秒）。行列の更新時はキーが変わるため古い結果は使われない
+CUSTOM_THEME_CACHE_TTL = 300
+
+# 同時に計算するバスケット数（残りは待機。スレッドプールを使い切らないため）
+MAX_CONCURRENT_COMPUTATIONS = 8
+
+# ウェイト正規化後の丸め桁数（ハッシュを浮動小数点の誤差に依存させない）
+WEIGHT_DECIMALS = 10
+
+DEFAULT_NAME = "カスタムテーマ"
+
+
+class BasketError(ValueError):
+    """不正なバスケット定義"""
+
+
+class PriceDataUnavailable(RuntimeError):
+    """終値行列が未作成（初回のデータ更新前）"""
+
+
+@dataclass(frozen=True)
+class Basket:
+    """正規化済みのバスケット（銘柄は指定順、ウェイトは合計1）"""
+    tickers: tuple[str, ...]
+    weights: Optional[tuple[float, ...]] = None
+
+    @property
+    def key(self) -> str:
+        """正規形のハッシュ（銘柄の指定順に依存しない）"""
+        if self.weights is None:
+            canonical = sorted(self.tickers)
+        else:
+            canonical = sorted(zip(self.tickers, self.weights))
+        return hashlib.sha256(json.dumps(canonical, separators=(",", ":")).encode()).hexdigest()
+
+    @property
+    def weight_map(self) -> Optional[dict[str, float]]:
+        if self.weights is None:
+            return None
+        return dict(zip(self.tickers, self.weights))
+
+
+def normalize_basket(
+    tickers: list[str],
+    weights: Optional[dict[str, float]] = None,
+    max_tickers: int = MAX_BASKET_TICKERS,
+) -> Basket:
+    """リクエストのバスケットを検証・正規化
+
+    Args:
+        tickers: 銘柄コード（7203 / 7203.T）
+        weights: 銘柄コード -> ウェイト（省略時は均等。指定時は全銘柄分が必要）
+        max_tickers: 銘柄数の上限
+
+    Raises:
+        BasketError: 銘柄コード・ウェイトが不正な場合
+    """
+    from data.theme_loader import TICKER_PATTERN
+
+    if not tickers:
+        raise BasketError("Basket must contain at least one ticker")
+    if len(tickers) > max_tickers:
+        raise BasketError(f"Too many tickers: {len(tickers)} (max {max_tickers})")
+
+    normalized = []
+    for code in tickers:
+        code = code.strip()
+        if not TICKER_PATTERN.match(code):
+            raise BasketError(f"Invalid stock code: {code}")
+        ticker = code if code.endswith(".T") else f"{code}.T"
+        if ticker in normalized:
+            raise BasketError(f"Duplicate stock code: {ticker}")
+        normalized.append(ticker)
+
+    if weights is None:
+        return Basket(tuple(normalized))
+
+    by_ticker = {}
+    for code, weight in weights.items():
+        code = code.strip()
+        ticker = code if code.endswith(".T") else f"{code}.T"
+        if ticker not in normalized:
+            raise BasketError(f"Weight given for a ticker not in the basket: {code}")
+        if ticker in by_ticker:
+            # "7203" と "7203.T" は同じ銘柄（一方のウェイトを黙って上書きしない）
+            raise BasketError(f"Duplicate weight for: {ticker}")
+        if not isinstance(weight, (int, float)) or not math.isfinite(weight) or weight <= 0:
+            raise BasketError(f"Weight must be a positive number: {code}")
+        by_ticker[ticker] = float(weight)
+    missing = [ticker for ticker in normalized if ticker not in by_ticker]
+    if missing:
+        raise BasketError(f"Missing weights for: {', '.join(missing)}")
+
+    total = sum(by_ticker.values())
+    return Basket(
+        tuple(normalized),
+        tuple(round(by_ticker[ticker] / total, WEIGHT_DECIMALS) for ticker in normalized),
+    )
+
+
+# =============================================================================
+# 計算
+# =============================================================================
+
+def _required_periods(period: str) -> set[str]:
+    """1期間の詳細に必要な行列（騰落率・1日騰落率・ベータ・スパークライン）"""
+    return {period, "1d", "1y", sparkline_source_period(period)}
+
+
+def compute_custom_theme(basket: Basket, period: str, directory: Path) -> dict:
+    """バスケットのテーマ詳細を計算（同期・CPU処理のみ）
+
+    Raises:
+        PriceDataUnavailable: 指定期間の終値行列がない場合
+    """
+    from data.themes import get_registry
+
+    matrices: dict[str, Optional[PriceMatrix]] = {
+        p: get_price_matrix(directory, p) for p in _required_periods(period)
+    }
+    matrix = matrices[period]
+    if matrix is None:
+        raise PriceDataUnavailable(f"Price matrix not available for period: {period}")
+
+    all_data = {p: m.frames(basket.tickers) if m is not None else {} for p, m in matrices.items()}
+
+    registry = get_registry()
+    table = get_metrics_table(directory, period)
+
+    def market_caps(ticker: str) -> dict:
+        if table is None or ticker not in table.row_by_code:
+            return {}
+        return table.row(table.row_by_code[ticker], ("market_cap", "market_cap_category"))
+
+    payload = build_detail_payload(
+        {"id": f"custom_{basket.key[:16]}", "name": DEFAULT_NAME, "description": ""},
+        list(basket.tickers),
+        period,
+        all_data,
+        names=lambda ticker: registry.ticker_names.get(ticker, ticker),
+        descriptions=lambda ticker: registry.ticker_descriptions.get(ticker),
+        market_caps=market_caps,
+        last_updated=table.last_updated if table is not None else None,
+        weights=basket.weight_map,
+    )
+    payload["basket_id"] = basket.key
+    payload["missing"] = [ticker for ticker in basket.tickers if ticker not in matrix]
+    payload["generated_at"] = matrix.generated_at
+    return payload
+
+
+# =============================================================================
+# 非同期（キャッシュ + シングルフライト + 同時実行数の制限）
+# =============================================================================
+
+# キャッシュキー -> 計算中のタスク（同じイベントループ内で共有）
+_inflight: dict[str, asyncio.Task] = {}
+
+# イベントループごとの同時実行数リミッター
+_limiter: Optional[tuple[asyncio.AbstractEventLoop, anyio.CapacityLimiter]] = None
+
+
+def _get_limiter() -> anyio.CapacityLimiter:
+    global _limiter
+    loop = asyncio.get_running_loop()
+    if _limiter is None or _limiter[0] is not loop:
+        _limiter = (loop, anyio.CapacityLimiter(MAX_CONCURRENT_COMPUTATIONS))
+    return _limiter[1]
+
+
+def cache_key(basket: Basket, period: str, directory: Path) -> Optional[str]:
+    """結果のキャッシュキー（行列がなければNone）"""
+    matrix = get_price_matrix(directory, period)
+    if matrix is None:
+        return None
+    return f"custom_theme:{basket.key}:{period}:{matrix.generated_at}"
+
+
+async def get_custom_theme(basket: Basket, period: str, directory: Path) -> dict:
+    """バスケットのテーマ詳細を取得（キャッシュ済みなら即座に返す）
+
+    Raises:
+        PriceDataUnavailable: 指定期間の終値行列がない場合
+    """
+    key = cache_key(basket, period, directory)
+    if key is None:
+        raise PriceDataUnavailable(f"Price matrix not available for period: {period}")
+
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.get_running_loop().create_task(_compute(key, basket, period, directory))
+        _inflight[key] = task
+        task.add_done_callback(_finish)
+    # 呼び出し元がキャンセルされても計算タスクは止めない（他の待機者・キャッシュのため）
+    return await asyncio.shield(task)
+
+
+async def _compute(key: str, basket: Basket, period: str, directory: Path) -> dict:
+    result = await anyio.to_thread.run_sync(
+        compute_custom_theme, basket, period, directory, limiter=_get_limiter()
+    )
+    cache.set(key, result, ttl_seconds=CUSTOM_THEME_CACHE_TTL)
+    return result
+
+
+def _finish(task: asyncio.Task) -> None:
+    for key, pending in list(_inflight.items()):
+        if pending is task:
+            del _inflight[key]
+    # 待機中のリクエストがない場合に「未取得の例外」の警告を出さない
+    if not task.cancelled():
+        task.exception()
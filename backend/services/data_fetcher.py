@@ -2,6 +2,7 @@
 
 import json
 import logging
+import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 from functools import lru_cache
@@ -11,6 +12,8 @@ from typing import Dict, Optional
 import pandas as pd
 import yfinance as yf
 
+from services import pipeline_trace
+
 # ロガー設定
 logger = logging.getLogger(__name__)
 
@@ -93,6 +96,10 @@ def load_from_cache(cache_path: Path) -> Optional[pd.DataFrame]:
         return None
 
 
+# メモリキャッシュのミスを呼び出し元に伝えるフラグ（計測用、スレッドごと）
+_cache_miss = threading.local()
+
+
 # メモリキャッシュ（最大200銘柄×期間）
 @lru_cache(maxsize=200)
 def _fetch_stock_data_cached(ticker: str, period: str, cache_key: str) -> Optional[tuple]:
@@ -105,12 +112,15 @@ def _fetch_stock_data_cached(ticker: str, period: str, cache_key: str) -> Option
     # 1日期間の場合、5日分取得して最新2日を使用（前日比計算のため）
     actual_period = "5d" if period == "1d" else period
     cache_period = period  # キャッシュキーは元のperiodを使用
+    _cache_miss.value = True
 
     cache_path = get_cache_path(ticker, cache_period)
 
     # JSONキャッシュから読み込み
-    cached_df = load_from_cache(cache_path)
+    with pipeline_trace.timed("fetch.file_read"):
+        cached_df = load_from_cache(cache_path)
     if cached_df is not None:
+        pipeline_trace.count("fetch.file_hit")
         # tupleに変換して返す
         return (
             cached_df.index.tolist(),
@@ -120,10 +130,12 @@ def _fetch_stock_data_cached(ticker: str, period: str, cache_key: str) -> Option
 
     # yfinanceからデータ取得
     try:
-        stock = yf.Ticker(ticker)
-        df = stock.history(period=actual_period)
+        with pipeline_trace.timed("fetch.download"):
+            stock = yf.Ticker(ticker)
+            df = stock.history(period=actual_period)
 
         if df.empty:
+            pipeline_trace.count("fetch.empty")
             return None
 
         # 1日期間の場合、最新2日のみを保持
@@ -140,6 +152,7 @@ def _fetch_stock_data_cached(ticker: str, period: str, cache_key: str) -> Option
             list(df.columns)
         )
     except Exception as e:
+        pipeline_trace.count("fetch.download_error")
         print(f"Error fetching {ticker}: {e}")
         return None
 
@@ -150,16 +163,26 @@ def fetch_stock_data(ticker: str, period: str = "1mo") -> Optional[pd.DataFrame]
 
     Args:
         ticker: 銘柄コード（例: "7203.T"）
-        period: 取得期間（1d, 5d, 1mo, 3mo, 6mo, 1y, 2y, 5y, 10y, ytd, max）
+        period: 取得期間（1d, 5d, 10d, 1mo, 3mo, 6mo, 1y, 3y, 5y）
 
     Returns:
         DataFrame with columns: Open, High, Low, Close, Volume, Dividends, Stock Splits
     """
+    # 3y/5y は長期履歴ストアから切り出す（毎回5年分をダウンロードしない）
+    from services.history_store import get_period_history, is_long_period
+
+    if is_long_period(period):
+        pipeline_trace.count("fetch.history_store")
+        return get_period_history(ticker, period)
+
     # 日付ベースのキャッシュキーを使用
     cache_key = get_cache_date_key()
 
     # メモリキャッシュから取得
+    _cache_miss.value = False
     result = _fetch_stock_data_cached(ticker, period, cache_key)
+    if not _cache_miss.value:
+        pipeline_trace.count("fetch.memory_hit")
 
     if result is None:
         return None
@@ -212,8 +235,9 @@ def fetch_batch_parallel(
         return result
 
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # 更新サイクルの計測を引き継ぐ（キャッシュのヒット・ミスを集計するため）
         futures = {
-            executor.submit(fetch_stock_data, ticker, period): ticker
+            pipeline_trace.submit(executor, fetch_stock_data, ticker, period): ticker
             for ticker in unique_tickers
         }
         for future in as_completed(futures):
@@ -339,6 +363,18 @@ def classify_market_cap(market_cap: int) -> dict:
         return {"id": "micro", "label": "超小型", "color": "red"}
 
 
+def calculate_float_ratio(float_shares, shares_outstanding) -> Optional[float]:
+    """浮動株比率（浮動株数 / 発行済株式数、0〜1）。取得できない場合はNone"""
+    try:
+        ratio = float(float_shares) / float(shares_outstanding)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+    if not 0 < ratio <= 1:
+        # 自己株式の扱いなどで1をわずかに超えることがあるため上限で丸める
+        return 1.0 if ratio > 1 else None
+    return round(ratio, 4)
+
+
 def get_market_cap_cache_path(ticker: str) -> Path:
     """時価総額キャッシュファイルパスを取得（パストラバーサル対策済み）"""
     from utils.security import safe_path_join, sanitize_filename
@@ -384,35 +420,44 @@ def get_market_cap(ticker: str) -> dict:
         ticker: 銘柄コード
 
     Returns:
-        dict with market_cap and category
+        dict with market_cap, category and float_ratio（浮動株比率。取得できなければNone）
     """
     # キャッシュから取得
-    cached = get_cached_market_cap(ticker)
+    with pipeline_trace.timed("market_cap.cache_read"):
+        cached = get_cached_market_cap(ticker)
     if cached:
+        pipeline_trace.count("market_cap.cache_hit")
         return {
             "market_cap": cached.get("market_cap", 0),
-            "market_cap_category": cached.get("market_cap_category", classify_market_cap(0))
+            "market_cap_category": cached.get("market_cap_category", classify_market_cap(0)),
+            "float_ratio": cached.get("float_ratio"),
         }
 
     # yfinanceから取得
+    pipeline_trace.count("market_cap.download")
     try:
-        stock = yf.Ticker(ticker)
-        info = stock.info
+        with pipeline_trace.timed("market_cap.fetch_info"):
+            stock = yf.Ticker(ticker)
+            info = stock.info
         market_cap = info.get("marketCap", 0)
         category = classify_market_cap(market_cap)
+        float_ratio = calculate_float_ratio(info.get("floatShares"), info.get("sharesOutstanding"))
 
         # キャッシュに保存
         save_market_cap_cache(ticker, {
             "market_cap": market_cap,
-            "market_cap_category": category
+            "market_cap_category": category,
+            "float_ratio": float_ratio,
         })
 
         return {
             "market_cap": market_cap,
-            "market_cap_category": category
+            "market_cap_category": category,
+            "float_ratio": float_ratio,
         }
     except Exception:
         return {
             "market_cap": 0,
-            "market_cap_category": classify_market_cap(0)
+            "market_cap_category": classify_market_cap(0),
+            "float_ratio": None,
         }
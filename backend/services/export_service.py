@@ -1,20 +1,101 @@
-"""Export data formatting service for CSV and JSON output.
+"""Export data formatting service for CSV, NDJSON, JSON and Parquet output.
 
 Handles the transformation of raw theme and stock data
 into structured export formats with proper encoding
 and metadata.
+
+Data-bearing exports are streamed: rows are read from the precomputed
+snapshot (or the long-term history store for OHLCV) as column batches
+by generators, and each batch is encoded and yielded before the next one
+is read. Memory use is bounded by one batch, whatever the export size.
 """
 
 import csv
 import io
+import json
 import logging
-from datetime import datetime
-from typing import Any
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+import numpy as np
+import pandas as pd
 
 from data.themes import THEMES, get_ticker_name
+from services import snapshot
+from services.metrics_table import INDICATOR_COLUMNS, RETURN_COLUMNS, MetricsTable, get_metrics_table
+from services.sparkline import PERIOD_DAYS
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is an optional dependency
+    orjson = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - pyarrow is an optional dependency
+    pa = None
+    pq = None
 
 logger = logging.getLogger(__name__)
 
+# Directory holding the updater's precomputed artifacts
+PRECOMPUTED_DIR = Path(__file__).parent.parent / "precomputed"
+
+# Streaming formats and their media types
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# Rows per batch read from the snapshot (one Parquet row group per batch)
+EXPORT_BATCH_ROWS = 1000
+
+# Export columns and their types ("str", "float" or "int")
+THEME_EXPORT_COLUMNS = {
+    "theme_id": "str",
+    "name": "str",
+    "description": "str",
+    "stock_count": "int",
+    "period": "str",
+    "change_percent": "float",
+    "change_percent_1d": "float",
+    **{column: "float" for column in RETURN_COLUMNS},
+}
+
+STOCK_EXPORT_COLUMNS = {
+    "ticker": "str",
+    "name": "str",
+    "theme_id": "str",
+    "theme_name": "str",
+    "theme_ids": "str",
+    "period": "str",
+    "market_cap": "float",
+    "market_cap_category": "str",
+    "change_percent": "float",
+    "change_percent_1d": "float",
+    **{column: "float" for column in INDICATOR_COLUMNS},
+    **{column: "float" for column in RETURN_COLUMNS},
+}
+
+HISTORY_EXPORT_COLUMNS = {
+    "ticker": "str",
+    "date": "str",
+    "open": "float",
+    "high": "float",
+    "low": "float",
+    "close": "float",
+    "volume": "float",
+}
+
+# Separator for multi-valued cells (theme_ids)
+LIST_SEPARATOR = "|"
+
+# A batch is a mapping of column name to a list of values (None for missing)
+Batch = dict[str, list]
+
 
 def format_themes_csv(period: str = "1mo") -> str:
     """Generate CSV content for all themes.
@@ -122,3 +203,285 @@ def generate_export_filename(
     """
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     return f"{entity}_{period}_{timestamp}.{fmt}"
+
+
+def parquet_available() -> bool:
+    """Return whether Parquet export is available (pyarrow installed)."""
+    return pq is not None
+
+
+# ---------------------------------------------------------------------------
+# Streaming exports: row batches
+# ---------------------------------------------------------------------------
+
+def _float_list(values: np.ndarray) -> list[Optional[float]]:
+    """Convert a float array to a list with NaN as None."""
+    if not np.isnan(values).any():
+        return values.tolist()
+    return [None if v != v else v for v in values.tolist()]
+
+
+def iter_theme_batches(period: str, directory: Path = PRECOMPUTED_DIR) -> Iterator[Batch]:
+    """Yield the theme export as a single batch (themes are few).
+
+    Returns for every period are looked up in that period's ranking
+    snapshot; themes missing from a snapshot get empty values.
+    """
+    rankings: dict[str, dict[str, dict]] = {}
+    for other in PERIOD_DAYS:
+        payload = snapshot.get(directory / f"themes_{other}.json") or {}
+        rankings[other] = {
+            row["id"]: row for row in payload.get("themes", []) if "id" in row and "error" not in row
+        }
+
+    current = rankings.get(period, {})
+    theme_ids = list(THEMES)
+    batch: Batch = {
+        "theme_id": theme_ids,
+        "name": [THEMES[t]["name"] for t in theme_ids],
+        "description": [THEMES[t]["description"] for t in theme_ids],
+        "stock_count": [len(THEMES[t]["tickers"]) for t in theme_ids],
+        "period": [period] * len(theme_ids),
+        "change_percent": [current.get(t, {}).get("change_percent") for t in theme_ids],
+        "change_percent_1d": [current.get(t, {}).get("change_percent_1d") for t in theme_ids],
+    }
+    for other, rows in rankings.items():
+        batch[f"return_{other}"] = [rows.get(t, {}).get("change_percent") for t in theme_ids]
+    yield batch
+
+
+def _stock_batch(table: MetricsTable, indices: np.ndarray, period: str) -> Batch:
+    """Build one stock batch from metrics table rows (column-wise)."""
+    theme_ids = [table.theme_ids[i] for i in indices]
+    theme_names = [table.theme_names[i] for i in indices]
+    batch: Batch = {
+        "ticker": table.codes[indices].tolist(),
+        "name": table.names[indices].tolist(),
+        "theme_id": [ids[0] if ids else None for ids in theme_ids],
+        "theme_name": [names[0] if names else None for names in theme_names],
+        "theme_ids": [LIST_SEPARATOR.join(ids) for ids in theme_ids],
+        "period": [period] * len(indices),
+        "market_cap_category": table.categories[indices].tolist(),
+    }
+    for column in ("market_cap", "change_percent", "change_percent_1d") + INDICATOR_COLUMNS + RETURN_COLUMNS:
+        batch[column] = _float_list(table.numeric[column][indices])
+    return batch
+
+
+def _metadata_stock_batch(theme_id: Optional[str], period: str) -> Batch:
+    """Stock rows from the theme definitions only (no metrics snapshot yet)."""
+    rows: dict[str, tuple[str, str]] = {}
+    themes = {theme_id: THEMES[theme_id]} if theme_id in THEMES else THEMES
+    for tid, theme_data in themes.items():
+        for ticker in theme_data["tickers"]:
+            rows.setdefault(ticker, (tid, theme_data["name"]))
+
+    tickers = list(rows)
+    batch: Batch = {column: [None] * len(tickers) for column in STOCK_EXPORT_COLUMNS}
+    batch.update({
+        "ticker": tickers,
+        "name": [get_ticker_name(rows[t][0], t) for t in tickers],
+        "theme_id": [rows[t][0] for t in tickers],
+        "theme_name": [rows[t][1] for t in tickers],
+        "theme_ids": [rows[t][0] for t in tickers],
+        "period": [period] * len(tickers),
+    })
+    return batch
+
+
+def iter_stock_batches(
+    period: str,
+    theme_id: Optional[str] = None,
+    directory: Path = PRECOMPUTED_DIR,
+    batch_rows: int = EXPORT_BATCH_ROWS,
+) -> Iterator[Batch]:
+    """Yield stock rows (returns for every period and indicators) in batches.
+
+    Rows come from the period's metrics table snapshot. Before the first
+    update has run, only the theme definitions are exported.
+    """
+    table = get_metrics_table(directory, period)
+    if table is None:
+        yield _metadata_stock_batch(theme_id, period)
+        return
+
+    if theme_id is not None:
+        indices = table.rows_by_theme.get(theme_id, np.empty(0, dtype=np.intp))
+    else:
+        indices = np.arange(table.size, dtype=np.intp)
+    for start in range(0, len(indices), batch_rows):
+        yield _stock_batch(table, indices[start:start + batch_rows], period)
+
+
+def iter_history_batches(
+    tickers: Iterable[str],
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    loader: Optional[Callable[[str], Optional[pd.DataFrame]]] = None,
+) -> Iterator[Batch]:
+    """Yield daily OHLCV rows from the long-term history store, one ticker per batch.
+
+    Histories are read one at a time and not kept in memory, so the full
+    universe over five years streams with the footprint of one ticker.
+
+    Args:
+        tickers: Tickers to export, in order.
+        start: First date to include (inclusive).
+        end: Last date to include (inclusive).
+        loader: History reader (defaults to the history store).
+    """
+    if loader is None:
+        from services.history_store import read_history
+        loader = read_history
+
+    for ticker in tickers:
+        df = loader(ticker)
+        if df is None or df.empty:
+            continue
+        index = df.index
+        selected = np.ones(len(index), dtype=bool)
+        if start is not None:
+            selected &= index >= pd.Timestamp(start)
+        if end is not None:
+            selected &= index <= pd.Timestamp(end)
+        if not selected.any():
+            continue
+
+        batch: Batch = {
+            "ticker": [ticker] * int(selected.sum()),
+            "date": np.datetime_as_string(index.to_numpy()[selected], unit="D").tolist(),
+        }
+        for column in ("Open", "High", "Low", "Close", "Volume"):
+            values = df[column].to_numpy(dtype=np.float64)[selected] if column in df else None
+            batch[column.lower()] = [None] * len(batch["date"]) if values is None else _float_list(values)
+        yield batch
+
+
+# ---------------------------------------------------------------------------
+# Streaming exports: encoders
+# ---------------------------------------------------------------------------
+
+def iter_csv(batches: Iterable[Batch], columns: Iterable[str]) -> Iterator[str]:
+    """Encode batches as CSV, yielding the header and then one chunk per batch."""
+    columns = list(columns)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue()
+
+    for batch in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(zip(*(batch[column] for column in columns)))
+        yield buffer.getvalue()
+
+
+def iter_ndjson(batches: Iterable[Batch], columns: Iterable[str]) -> Iterator[bytes]:
+    """Encode batches as newline-delimited JSON, one chunk per batch."""
+    columns = list(columns)
+    for batch in batches:
+        rows = (dict(zip(columns, values)) for values in zip(*(batch[column] for column in columns)))
+        if orjson is not None:
+            yield b"".join(orjson.dumps(row, option=orjson.OPT_APPEND_NEWLINE) for row in rows)
+        else:
+            yield "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows).encode()
+
+
+class _ChunkSink:
+    """Write-only file object that hands written bytes over in chunks."""
+
+    def __init__(self) -> None:
+        self.chunks: list[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+_ARROW_TYPES = {"str": "string", "float": "float64", "int": "int64"}
+
+
+def iter_record_batches(
+    batches: Iterable["pa.RecordBatch"],
+    schema: "pa.Schema",
+    fmt: str = "parquet",
+    group_rows: int = 0,
+) -> Iterator[bytes]:
+    """Encode Arrow record batches as a Parquet file or an Arrow IPC stream.
+
+    Written bytes are yielded after every row group (Parquet) or batch
+    (Arrow). With ``group_rows``, small batches are coalesced until
+    that many rows are buffered so Parquet row groups stay large.
+    """
+    if pq is None:
+        raise RuntimeError(f"{fmt} export requires pyarrow")
+
+    sink = _ChunkSink()
+    if fmt == "parquet":
+        writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema, compression="zstd")
+    elif fmt == "arrow":
+        writer = pa.ipc.new_stream(pa.PythonFile(sink, mode="w"), schema)
+    else:
+        raise ValueError(f"Unsupported export format: {fmt}")
+
+    pending: list = []
+    pending_rows = 0
+    try:
+        for batch in batches:
+            pending.append(batch)
+            pending_rows += batch.num_rows
+            if pending_rows < group_rows:
+                continue
+            writer.write_table(pa.Table.from_batches(pending, schema=schema))
+            pending, pending_rows = [], 0
+            yield sink.drain()
+        if pending:
+            writer.write_table(pa.Table.from_batches(pending, schema=schema))
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def iter_parquet(batches: Iterable[Batch], columns: dict[str, str]) -> Iterator[bytes]:
+    """Encode batches as a Parquet file, one row group per batch.
+
+    Each row group is yielded as soon as it is written; the footer
+    follows the last one.
+    """
+    if pq is None:
+        raise RuntimeError("Parquet export requires pyarrow")
+
+    schema = pa.schema([(name, _ARROW_TYPES[kind]) for name, kind in columns.items()])
+    record_batches = (
+        pa.record_batch([batch[name] for name in schema.names], schema=schema) for batch in batches
+    )
+    return iter_record_batches(record_batches, schema, "parquet")
+
+
+def stream_export(batches: Iterable[Batch], columns: dict[str, str], fmt: str) -> Iterator:
+    """Encode batches in the requested streaming format (csv, ndjson, parquet)."""
+    if fmt == "csv":
+        return iter_csv(batches, columns)
+    if fmt == "ndjson":
+        return iter_ndjson(batches, columns)
+    if fmt == "parquet":
+        return iter_parquet(batches, columns)
+    raise ValueError(f"Unsupported export format: {fmt}")
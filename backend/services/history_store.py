@@ -0,0 +1,241 @@
+"""長期株価履歴ストア（3y/5y期間用）
+
+5年分の日足を銘柄ごとに一度だけ取得してディスクに永続化し、
+以降は最終取得日以降の差分のみを追記する。
+3y/5yのリクエストは毎回5年分をダウンロードせず、このストアから切り出して応答する。
+"""
+
+import logging
+import threading
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+import yfinance as yf
+
+from services.data_fetcher import CACHE_DIR, get_cache_date_key
+from utils.serialization import read_json_file, write_json_file
+
+logger = logging.getLogger(__name__)
+
+# 長期履歴の保存先
+HISTORY_DIR = CACHE_DIR / "history"
+
+# 初回取得時の期間（ストアが保持する最大期間）
+HISTORY_FETCH_PERIOD = "5y"
+
+# ストアから応答する長期期間（期間 → 年数）
+LONG_PERIODS = {
+    "3y": 3,
+    "5y": 5,
+}
+
+OHLCV_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+# メモリ上の履歴（ticker -> (更新日キー, DataFrame)）
+_memory: dict[str, tuple[str, pd.DataFrame]] = {}
+_lock = threading.Lock()
+
+# 銘柄ごとの更新ロック（更新ジョブとAPIリクエストが同じ銘柄を二重に取得しないため）
+_ticker_locks: dict[str, threading.Lock] = {}
+
+
+class HistoryDownloadError(RuntimeError):
+    """yfinanceからの取得に失敗（データなしとは区別する）"""
+
+
+def is_long_period(period: str) -> bool:
+    """長期履歴ストアから応答する期間か判定"""
+    return period in LONG_PERIODS
+
+
+def get_history_path(ticker: str) -> Path:
+    """履歴ファイルパスを取得（パストラバーサル対策済み）"""
+    from utils.security import safe_path_join, sanitize_filename
+
+    safe_ticker = sanitize_filename(ticker.replace(".", "_"))
+    return safe_path_join(HISTORY_DIR, f"{safe_ticker}_history.json")
+
+
+def _normalize(df: pd.DataFrame) -> pd.DataFrame:
+    """OHLCV列のみを残し、インデックスをタイムゾーンなしの日付に揃える"""
+    columns = [c for c in OHLCV_COLUMNS if c in df.columns]
+    df = df[columns].copy()
+    index = pd.DatetimeIndex(df.index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    df.index = index.normalize()
+    df.index.name = "Date"
+    return df
+
+
+def save_history(ticker: str, df: pd.DataFrame, updated: str) -> None:
+    """履歴を列指向JSONで保存"""
+    HISTORY_DIR.mkdir(parents=True, exist_ok=True)
+    payload = {
+        "ticker": ticker,
+        "updated": updated,
+        "dates": df.index.strftime("%Y-%m-%d").tolist(),
+        "columns": {col: df[col].tolist() for col in df.columns},
+    }
+    write_json_file(get_history_path(ticker), payload)
+
+
+def _load_from_disk(ticker: str) -> Optional[tuple[str, pd.DataFrame]]:
+    """ディスクから履歴を読み込み"""
+    path = get_history_path(ticker)
+    if not path.exists():
+        return None
+
+    try:
+        payload = read_json_file(path)
+        df = pd.DataFrame(
+            payload["columns"],
+            index=pd.DatetimeIndex(pd.to_datetime(payload["dates"]), name="Date"),
+        )
+        return payload.get("updated", ""), df
+    except Exception as e:
+        logger.warning(f"Failed to load history for {ticker}: {e}")
+        return None
+
+
+def load_history(ticker: str) -> Optional[pd.DataFrame]:
+    """保存済みの履歴を取得（メモリ優先、取得は行わない）"""
+    with _lock:
+        entry = _memory.get(ticker)
+    if entry is None:
+        entry = _load_from_disk(ticker)
+        if entry is None:
+            return None
+        with _lock:
+            _memory[ticker] = entry
+    return entry[1]
+
+
+def read_history(ticker: str) -> Optional[pd.DataFrame]:
+    """保存済みの履歴を読み取り専用で取得（メモリになければディスクから読み、メモリには載せない）
+
+    全銘柄を順に読むエクスポート用。読んだ履歴をメモリに溜めないため、使用量は1銘柄分で済む
+    """
+    with _lock:
+        entry = _memory.get(ticker)
+    if entry is None:
+        entry = _load_from_disk(ticker)
+    return None if entry is None else entry[1]
+
+
+def _download(ticker: str, **kwargs) -> Optional[pd.DataFrame]:
+    """yfinanceから日足を取得（該当データがなければNone）
+
+    Raises:
+        HistoryDownloadError: 取得に失敗した場合
+    """
+    try:
+        df = yf.Ticker(ticker).history(**kwargs)
+    except Exception as e:
+        logger.warning(f"History download failed for {ticker}: {e}")
+        raise HistoryDownloadError(f"History download failed for {ticker}") from e
+    if df is None or df.empty:
+        return None
+    return _normalize(df)
+
+
+def _ticker_lock(ticker: str) -> threading.Lock:
+    with _lock:
+        lock = _ticker_locks.get(ticker)
+        if lock is None:
+            lock = _ticker_locks[ticker] = threading.Lock()
+        return lock
+
+
+def _current_entry(ticker: str, today: str) -> tuple[Optional[tuple[str, pd.DataFrame]], bool]:
+    """メモリ（なければディスク）の履歴と、当日更新済みかどうか"""
+    with _lock:
+        entry = _memory.get(ticker)
+    if entry is None:
+        entry = _load_from_disk(ticker)
+
+    if entry is not None and entry[0] == today:
+        with _lock:
+            _memory[ticker] = entry
+        return entry, True
+    return entry, False
+
+
+def update_history(ticker: str) -> Optional[pd.DataFrame]:
+    """履歴を最新化して返す
+
+    - 未取得の銘柄: 5年分を一度だけ取得
+    - 取得済みの銘柄: 最終日以降の差分のみ取得して追記
+    - 当日更新済みの銘柄: 取得せずにそのまま返す
+    - 取得に失敗した場合: 保存済みの履歴をそのまま返す（当日更新済みとして記録せず、次回に再試行する）
+
+    同じ銘柄の取得は銘柄ごとのロックで1回にまとめる（待っていた側は取得結果を使う）。
+    """
+    today = get_cache_date_key()
+    entry, fresh = _current_entry(ticker, today)
+    if fresh:
+        return entry[1]
+
+    with _ticker_lock(ticker):
+        # 待っている間に別スレッドが更新していればその結果を使う
+        entry, fresh = _current_entry(ticker, today)
+        if fresh:
+            return entry[1]
+        existing = entry[1] if entry is not None else None
+
+        try:
+            if existing is None or existing.empty:
+                merged = _download(ticker, period=HISTORY_FETCH_PERIOD)
+                if merged is None:
+                    return None
+            else:
+                last_date = existing.index[-1]
+                new_rows = _download(ticker, start=last_date.strftime("%Y-%m-%d"))
+                if new_rows is None:
+                    merged = existing
+                else:
+                    merged = pd.concat([existing, new_rows])
+                    merged = merged[~merged.index.duplicated(keep="last")].sort_index()
+
+                # 保持期間を超えた古いデータを切り捨て
+                cutoff = merged.index[-1] - pd.DateOffset(years=max(LONG_PERIODS.values()))
+                merged = merged[merged.index >= cutoff]
+        except HistoryDownloadError:
+            return existing
+
+        try:
+            save_history(ticker, merged, today)
+        except OSError as e:
+            logger.warning(f"Failed to save history for {ticker}: {e}")
+
+        with _lock:
+            _memory[ticker] = (today, merged)
+        return merged
+
+
+def slice_period(df: Optional[pd.DataFrame], period: str) -> Optional[pd.DataFrame]:
+    """長期履歴から指定期間分（暦年ベース）を切り出す"""
+    if df is None or df.empty:
+        return df
+
+    years = LONG_PERIODS.get(period)
+    if years is None:
+        return df
+
+    start = df.index[-1] - pd.DateOffset(years=years)
+    return df[df.index >= start]
+
+
+def get_period_history(ticker: str, period: str) -> Optional[pd.DataFrame]:
+    """長期期間のデータを取得（ストアを最新化してから切り出し）"""
+    df = update_history(ticker)
+    if df is None or df.empty:
+        return None
+    return slice_period(df, period).copy()
+
+
+def clear_memory() -> None:
+    """メモリ上の履歴を破棄（ディスクは保持）"""
+    with _lock:
+        _memory.clear()
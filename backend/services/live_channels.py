@@ -0,0 +1,94 @@
+"""リアルタイム配信チャンネル（WebSocket / SSE）の状態
+
+チャンネルは事前計算済みスナップショットの配信用の射影（projection）に対応する。
+- themes:{period}           テーマランキング（themes_{period}.json）
+- theme:{theme_id}:{period} テーマ詳細の構成銘柄（theme_{theme_id}_{period}.json）
+
+射影はテーマ・銘柄をID（銘柄コード）をキーにした dict に並べ替え、並び順は "order" に分ける。
+順位が変わっても行の値は動かないため、更新ごとの差分（utils.json_patch）は値が変わった
+フィールドだけになる。スパークラインと generated_at は毎回変わり、配信には不要なので含めない。
+"""
+
+from pathlib import Path
+from typing import Any, Optional
+
+from data.themes import THEMES
+from services import snapshot
+from utils.security import THEME_ID_PATTERN, VALID_PERIODS
+
+# 事前計算済みデータの保存先
+PRECOMPUTED_DIR = Path(__file__).parent.parent / "precomputed"
+
+# 射影に含めるフィールド
+THEME_FIELDS = ("name", "change_percent", "change_percent_1d", "stock_count", "top_stocks", "error")
+STOCK_FIELDS = (
+    "name", "change_percent", "change_percent_1d", "beta", "alpha", "r_squared",
+    "market_cap", "market_cap_category", "weight",
+)
+DETAIL_FIELDS = ("name", "change_percent", "change_percent_1d", "stock_count")
+
+
+class ChannelError(ValueError):
+    """不正なチャンネル名"""
+
+
+def parse_channel(channel: str) -> tuple[str, Optional[str], str]:
+    """チャンネル名を (種類, テーマID, 期間) に分解して検証
+
+    Raises:
+        ChannelError: 形式・期間・テーマIDが不正な場合
+    """
+    parts = channel.split(":")
+    if len(parts) == 2 and parts[0] == "themes":
+        kind, theme_id, period = "themes", None, parts[1]
+    elif len(parts) == 3 and parts[0] == "theme":
+        kind, theme_id, period = "theme", parts[1], parts[2]
+        if not THEME_ID_PATTERN.match(theme_id) or theme_id not in THEMES:
+            raise ChannelError(f"Unknown theme: {theme_id}")
+    else:
+        raise ChannelError(f"Invalid channel: {channel} (expected themes:{{period}} or theme:{{theme_id}}:{{period}})")
+    if period not in VALID_PERIODS:
+        raise ChannelError(f"Invalid period: {period}")
+    return kind, theme_id, period
+
+
+def _pick(row: dict, fields: tuple[str, ...]) -> dict:
+    return {name: row[name] for name in fields if name in row}
+
+
+def themes_projection(payload: dict) -> dict:
+    """テーマランキングの射影"""
+    rows = payload.get("themes", [])
+    return {
+        "period": payload.get("period"),
+        "last_updated": payload.get("last_updated"),
+        "order": [row["id"] for row in rows],
+        "themes": {row["id"]: _pick(row, THEME_FIELDS) for row in rows},
+    }
+
+
+def theme_projection(payload: dict) -> dict:
+    """テーマ詳細の射影"""
+    rows = payload.get("stocks", [])
+    return {
+        "id": payload.get("id"),
+        "period": payload.get("period"),
+        "last_updated": payload.get("last_updated"),
+        **_pick(payload, DETAIL_FIELDS),
+        "order": [row["code"] for row in rows],
+        "stocks": {row["code"]: _pick(row, STOCK_FIELDS) for row in rows},
+    }
+
+
+def channel_state(channel: str, directory: Path = PRECOMPUTED_DIR) -> Optional[dict[str, Any]]:
+    """チャンネルの現在の状態（スナップショットが未作成ならNone）
+
+    Raises:
+        ChannelError: チャンネル名が不正な場合
+    """
+    kind, theme_id, period = parse_channel(channel)
+    if kind == "themes":
+        payload = snapshot.get(directory / f"themes_{period}.json")
+        return themes_projection(payload) if payload is not None else None
+    payload = snapshot.get(directory / f"theme_{theme_id}_{period}.json")
+    return theme_projection(payload) if payload is not None else None
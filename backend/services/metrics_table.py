@@ -0,0 +1,538 @@
+"""銘柄メトリクステーブル（列指向・インデックス付き）
+
+期間ごとに全銘柄の指標を1つの列指向テーブルにまとめ、
+フィルタ・ソート・ページング（カーソル）をサーバー側で処理する。
+- 更新ジョブが metrics_{period}.json として保存（列指向JSON）
+- APIはスナップショットから1回だけテーブルを構築し、ファイルが更新されるまで再利用
+- テーマ・時価総額カテゴリは転置インデックス、ソート順は列ごとに一度だけ argsort
+"""
+
+import base64
+import binascii
+import hashlib
+import json
+import logging
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Iterable, Optional
+
+import numpy as np
+
+from services import snapshot
+from services.sparkline import PERIOD_DAYS
+
+logger = logging.getLogger(__name__)
+
+# 時価総額カテゴリ（ヒートマップの表示順）
+HEATMAP_CATEGORIES = {
+    "mega": {"label": "超大型", "threshold": "10兆円以上"},
+    "large": {"label": "大型", "threshold": "1兆円〜10兆円"},
+    "mid": {"label": "中型", "threshold": "3000億円〜1兆円"},
+    "small": {"label": "小型", "threshold": "300億円〜3000億円"},
+    "micro": {"label": "超小型", "threshold": "300億円未満"},
+}
+
+# 全期間の騰落率列（return_1d, return_5d, ..., return_5y）
+RETURN_COLUMNS = tuple(f"return_{period}" for period in PERIOD_DAYS)
+
+# テクニカル指標列（calculate_screening_metrics() の結果）
+SCREENING_COLUMNS = ("rsi", "ma5_distance", "ma20_distance", "volatility")
+
+# テクニカル指標（RSI14・MA20）の計算に使う期間（テーブルの期間によらず共通）
+INDICATOR_PERIOD = "3mo"
+
+# 指標列（ベータは期間ごとに主テーマの日次リターンに対して計算）
+INDICATOR_COLUMNS = SCREENING_COLUMNS + ("beta",)
+
+# 数値列（欠損は NaN）
+NUMERIC_COLUMNS = ("change_percent", "change_percent_1d", "market_cap") + INDICATOR_COLUMNS + RETURN_COLUMNS
+
+# ソート可能な列
+SORTABLE_COLUMNS = NUMERIC_COLUMNS + ("code", "name")
+
+# ヒートマップの銘柄に含める列
+HEATMAP_FIELDS = (
+    "code", "name", "theme_id", "theme_name", "theme_ids",
+    "change_percent", "market_cap", "market_cap_category",
+)
+
+
+def metrics_filename(period: str) -> str:
+    """メトリクステーブルのファイル名"""
+    return f"metrics_{period}.json"
+
+
+def build_metric_records(
+    themes: dict[str, dict],
+    returns: dict[str, float],
+    returns_1d: dict[str, float],
+    market_caps: dict[str, dict],
+    period_returns: Optional[dict[str, dict[str, float]]] = None,
+    indicators: Optional[dict[str, dict]] = None,
+    betas: Optional[dict[str, float]] = None,
+) -> list[dict]:
+    """テーマ定義と計算済みの指標から銘柄ごとのレコードを作成
+
+    複数テーマに属する銘柄は1レコードにまとめ、所属テーマを theme_ids に列挙する
+    （集合による重複排除で O(n)）。
+
+    Args:
+        themes: テーマ定義（THEMES）
+        returns: 銘柄ごとの期間騰落率
+        returns_1d: 銘柄ごとの1日騰落率
+        market_caps: 銘柄ごとの get_market_cap() の結果
+        period_returns: 期間 -> 銘柄ごとの騰落率（return_{period} 列）
+        indicators: 銘柄ごとの calculate_screening_metrics() の結果
+        betas: 銘柄ごとのベータ値
+    """
+    period_returns = period_returns or {}
+    indicators = indicators or {}
+    betas = betas or {}
+
+    records: dict[str, dict] = {}
+    for theme_id, theme in themes.items():
+        for ticker in theme["tickers"]:
+            record = records.get(ticker)
+            if record is not None:
+                if theme_id not in record["theme_ids"]:
+                    record["theme_ids"].append(theme_id)
+                    record["theme_names"].append(theme["name"])
+                continue
+
+            market_cap_data = market_caps.get(ticker, {})
+            change_1d = returns_1d.get(ticker)
+            records[ticker] = {
+                "code": ticker,
+                "name": theme.get("ticker_names", {}).get(ticker, ticker),
+                "theme_ids": [theme_id],
+                "theme_names": [theme["name"]],
+                "change_percent": round(returns.get(ticker, 0.0), 2),
+                "change_percent_1d": round(change_1d, 2) if change_1d is not None else None,
+                "market_cap": market_cap_data.get("market_cap") or 0,
+                "market_cap_category": market_cap_data.get("market_cap_category")
+                or {"id": "unknown", "label": "不明", "color": "gray"},
+                "beta": betas.get(ticker),
+                **{column: indicators.get(ticker, {}).get(column) for column in SCREENING_COLUMNS},
+            }
+            for period, period_return in period_returns.items():
+                value = period_return.get(ticker)
+                records[ticker][f"return_{period}"] = round(value, 2) if value is not None else None
+    return list(records.values())
+
+
+def _float_column(values: Iterable[Any]) -> np.ndarray:
+    """None を NaN にした float64 列"""
+    return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+
+class MetricsTable:
+    """銘柄メトリクスの列指向テーブル（1期間分）"""
+
+    def __init__(
+        self,
+        period: str,
+        records: list[dict],
+        generated_at: Optional[str] = None,
+        last_updated: Optional[str] = None,
+    ) -> None:
+        self.period = period
+        self.generated_at = generated_at
+        self.last_updated = last_updated
+        self.size = len(records)
+
+        self.codes = np.array([r["code"] for r in records], dtype=object)
+        self.names = np.array([r["name"] for r in records], dtype=object)
+        self.theme_ids = [list(r.get("theme_ids") or []) for r in records]
+        self.theme_names = [list(r.get("theme_names") or []) for r in records]
+        self.category_info = [r.get("market_cap_category") or {"id": "unknown"} for r in records]
+        self.categories = np.array([c.get("id", "unknown") for c in self.category_info], dtype=object)
+        self.numeric = {
+            column: _float_column(r.get(column) for r in records)
+            for column in NUMERIC_COLUMNS
+        }
+
+        # 転置インデックス
+        self.row_by_code = {code: i for i, code in enumerate(self.codes)}
+        self.rows_by_theme = self._build_index(self.theme_ids)
+        self.rows_by_category = self._build_index([[c] for c in self.categories])
+
+        # ソート順（列・方向ごとに一度だけ計算）
+        self._orders: dict[tuple[str, bool], np.ndarray] = {}
+        self._order_lock = threading.Lock()
+
+    @staticmethod
+    def _build_index(keys_per_row: list[list[str]]) -> dict[str, np.ndarray]:
+        index: dict[str, list[int]] = {}
+        for row, keys in enumerate(keys_per_row):
+            for key in keys:
+                index.setdefault(key, []).append(row)
+        return {key: np.array(rows, dtype=np.intp) for key, rows in index.items()}
+
+    # -------------------------------------------------------------------------
+    # シリアライズ（metrics_{period}.json）
+    # -------------------------------------------------------------------------
+
+    def to_payload(self) -> dict:
+        """列指向のJSONペイロードに変換"""
+        columns = {
+            "code": self.codes.tolist(),
+            "name": self.names.tolist(),
+            "theme_ids": self.theme_ids,
+            "theme_names": self.theme_names,
+            "market_cap_category": self.category_info,
+        }
+        for column, values in self.numeric.items():
+            columns[column] = [None if np.isnan(v) else float(v) for v in values]
+        return {
+            "period": self.period,
+            "generated_at": self.generated_at,
+            "last_updated": self.last_updated,
+            "size": self.size,
+            "columns": columns,
+        }
+
+    @classmethod
+    def from_payload(cls, payload: dict) -> "MetricsTable":
+        """列指向のJSONペイロードから構築"""
+        columns = payload.get("columns", {})
+        size = len(columns.get("code", []))
+        records = [
+            {name: values[i] for name, values in columns.items()}
+            for i in range(size)
+        ]
+        return cls(
+            payload.get("period", ""),
+            records,
+            generated_at=payload.get("generated_at"),
+            last_updated=payload.get("last_updated"),
+        )
+
+    # -------------------------------------------------------------------------
+    # クエリ
+    # -------------------------------------------------------------------------
+
+    def column(self, name: str) -> np.ndarray:
+        """列を取得"""
+        if name in self.numeric:
+            return self.numeric[name]
+        if name == "code":
+            return self.codes
+        if name == "name":
+            return self.names
+        if name == "market_cap_category":
+            return self.categories
+        raise KeyError(name)
+
+    def sorted_rows(self, column: str, descending: bool = True) -> np.ndarray:
+        """列でソートした行インデックス（欠損値は常に末尾・同値は安定）"""
+        key = (column, descending)
+        order = self._orders.get(key)
+        if order is not None:
+            return order
+
+        values = self.column(column)
+        if column in self.numeric:
+            missing = np.isnan(values)
+            order = np.argsort(-values if descending else values, kind="stable")
+            order = np.concatenate([order[~missing[order]], order[missing[order]]])
+        else:
+            # 文字列は順位に置き換えて降順でも同値の行の順序を保つ
+            _, ranks = np.unique(values, return_inverse=True)
+            order = np.argsort(-ranks if descending else ranks, kind="stable")
+
+        with self._order_lock:
+            self._orders[key] = order
+        return order
+
+    def mask(
+        self,
+        theme_id: Optional[str] = None,
+        categories: Optional[Iterable[str]] = None,
+        min_change: Optional[float] = None,
+        max_change: Optional[float] = None,
+        min_market_cap: Optional[float] = None,
+        max_market_cap: Optional[float] = None,
+    ) -> np.ndarray:
+        """条件に合う行のブールマスク（条件なしなら全行True）"""
+        result = np.ones(self.size, dtype=bool)
+
+        if theme_id is not None:
+            result &= self.index_mask(self.rows_by_theme, [theme_id])
+        if categories:
+            result &= self.index_mask(self.rows_by_category, categories)
+
+        change = self.numeric["change_percent"]
+        if min_change is not None:
+            result &= change >= min_change
+        if max_change is not None:
+            result &= change <= max_change
+
+        market_cap = self.numeric["market_cap"]
+        if min_market_cap is not None:
+            result &= market_cap >= min_market_cap
+        if max_market_cap is not None:
+            result &= market_cap <= max_market_cap
+
+        return result
+
+    def index_mask(self, index: dict[str, np.ndarray], keys: Iterable[str]) -> np.ndarray:
+        """転置インデックスでいずれかのキーに該当する行のブールマスク"""
+        result = np.zeros(self.size, dtype=bool)
+        for key in keys:
+            rows = index.get(key)
+            if rows is not None:
+                result[rows] = True
+        return result
+
+    def query(
+        self,
+        mask: Optional[np.ndarray] = None,
+        sort: str = "change_percent",
+        descending: bool = True,
+        offset: int = 0,
+        limit: Optional[int] = None,
+    ) -> tuple[np.ndarray, int]:
+        """フィルタ・ソート・ページングした行インデックスと該当件数を返す"""
+        order = self.sorted_rows(sort, descending)
+        if mask is not None:
+            order = order[mask[order]]
+        total = len(order)
+        end = None if limit is None else offset + limit
+        return order[offset:end], total
+
+    def rows(self, indices: Iterable[int], fields: Optional[Iterable[str]] = None) -> list[dict]:
+        """行をレスポンス用のdictに変換（fields 指定時はその列のみ）
+
+        数値列は行ごとではなく列ごとにまとめて取り出す（NaN は None）
+        """
+        indices = np.asarray(indices if isinstance(indices, np.ndarray) else list(indices), dtype=np.intp)
+        columns: dict[str, list] = {
+            "code": self.codes[indices].tolist(),
+            "name": self.names[indices].tolist(),
+            "theme_id": [self.theme_ids[i][0] if self.theme_ids[i] else None for i in indices],
+            "theme_name": [self.theme_names[i][0] if self.theme_names[i] else None for i in indices],
+            "theme_ids": [self.theme_ids[i] for i in indices],
+            "market_cap": [
+                None if v != v else int(v) for v in self.numeric["market_cap"][indices].tolist()
+            ],
+            "market_cap_category": [self.category_info[i] for i in indices],
+        }
+        for column, values in self.numeric.items():
+            if column != "market_cap":
+                columns[column] = [None if v != v else v for v in values[indices].tolist()]
+
+        if fields is not None:
+            columns = {field: columns[field] for field in fields if field in columns}
+        if not columns:
+            return [{} for _ in indices]
+        names = list(columns)
+        return [dict(zip(names, values)) for values in zip(*columns.values())]
+
+    def row(self, index: int, fields: Optional[Iterable[str]] = None) -> dict:
+        """1行をレスポンス用のdictに変換"""
+        return self.rows([index], fields)[0]
+
+
+# =============================================================================
+# ヒートマップ
+# =============================================================================
+
+def heatmap_payload(
+    table: MetricsTable,
+    mask: Optional[np.ndarray] = None,
+    limit: Optional[int] = None,
+) -> dict:
+    """メトリクステーブルから時価総額別ヒートマップを生成
+
+    各カテゴリは騰落率の降順。limit を指定するとカテゴリごとの上位のみ返す（count は該当総数）。
+    """
+    categories = {}
+    for category_id, info in HEATMAP_CATEGORIES.items():
+        category_mask = table.index_mask(table.rows_by_category, [category_id])
+        if mask is not None:
+            category_mask &= mask
+        indices, total = table.query(category_mask, "change_percent", True, 0, limit)
+        stocks = table.rows(indices, HEATMAP_FIELDS)
+        categories[category_id] = {
+            "id": category_id,
+            "label": info["label"],
+            "threshold": info["threshold"],
+            "stocks": stocks,
+            "count": total,
+        }
+
+    return {
+        "period": table.period,
+        "categories": categories,
+        "last_updated": table.last_updated,
+        "generated_at": table.generated_at,
+    }
+
+
+# =============================================================================
+# スナップショットからの読み込み
+# =============================================================================
+
+# ファイルパス -> (スナップショットのペイロード, テーブル)
+_tables: dict[Path, tuple[Any, MetricsTable]] = {}
+_tables_lock = threading.Lock()
+
+
+def get_metrics_table(directory: Path, period: str) -> Optional[MetricsTable]:
+    """スナップショットからメトリクステーブルを取得（ファイル更新時のみ再構築）"""
+    path = directory / metrics_filename(period)
+    payload = snapshot.get(path)
+    if payload is None:
+        return None
+
+    cached = _tables.get(path)
+    if cached is not None and cached[0] is payload:
+        return cached[1]
+
+    table = MetricsTable.from_payload(payload)
+    with _tables_lock:
+        _tables[path] = (payload, table)
+    return table
+
+
+def clear_tables() -> None:
+    """構築済みテーブルを破棄"""
+    with _tables_lock:
+        _tables.clear()
+
+
+def compute_indicators(all_data: dict) -> dict[str, dict]:
+    """取得済みデータから銘柄ごとのスクリーナー用指標を計算"""
+    from services.calculator import calculate_screening_metrics
+
+    return {ticker: calculate_screening_metrics(ticker, df) for ticker, df in all_data.items()}
+
+
+def compute_betas(themes: dict[str, dict], all_data: dict) -> dict[str, float]:
+    """取得済みデータから各銘柄の主テーマ（最初に所属するテーマ）に対するベータ値を計算"""
+    from services.calculator import (
+        calculate_beta_alpha,
+        calculate_daily_returns,
+        calculate_theme_daily_returns_from_data,
+    )
+
+    betas: dict[str, float] = {}
+    assigned: set[str] = set()
+    for theme in themes.values():
+        theme_data = {t: all_data[t] for t in theme["tickers"] if t in all_data}
+        pending = [ticker for ticker in theme_data if ticker not in assigned]
+        if not pending:
+            continue
+        assigned.update(pending)
+
+        theme_returns = calculate_theme_daily_returns_from_data(theme_data)
+        if theme_returns.empty:
+            continue
+        for ticker in pending:
+            beta = calculate_beta_alpha(calculate_daily_returns(theme_data[ticker]), theme_returns)["beta"]
+            if beta is not None:
+                betas[ticker] = beta
+    return betas
+
+
+def compute_metrics_table(period: str) -> MetricsTable:
+    """メトリクステーブルをリアルタイム計算（事前計算データがない場合のフォールバック）
+
+    取得するのは指定期間・1日・指標用（INDICATOR_PERIOD）のデータのみのため、
+    他期間の return_{period} 列は欠損になる
+    """
+    from data.themes import THEMES, get_all_tickers
+    from services.calculator import calculate_return_from_data
+    from services.data_fetcher import fetch_batch_parallel, get_market_cap
+
+    all_tickers = get_all_tickers()
+    all_data = fetch_batch_parallel(all_tickers, period, max_workers=15)
+    _, returns = calculate_return_from_data(all_data)
+    if period == "1d":
+        returns_1d = returns
+    else:
+        _, returns_1d = calculate_return_from_data(fetch_batch_parallel(all_tickers, "1d", max_workers=15))
+    # 指標は事前計算と同じく INDICATOR_PERIOD のデータから計算（期間によって値が変わらないように）
+    if period == INDICATOR_PERIOD:
+        indicator_data = all_data
+    else:
+        indicator_data = fetch_batch_parallel(all_tickers, INDICATOR_PERIOD, max_workers=15)
+    market_caps = {ticker: get_market_cap(ticker) for ticker in all_tickers}
+
+    records = build_metric_records(
+        THEMES,
+        returns,
+        returns_1d,
+        market_caps,
+        period_returns={"1d": returns_1d, period: returns},
+        indicators=compute_indicators(indicator_data),
+        betas=compute_betas(THEMES, all_data),
+    )
+    return MetricsTable(period, records, generated_at=datetime.now().isoformat())
+
+
+def load_metrics_table(directory: Path, period: str) -> MetricsTable:
+    """メトリクステーブルを取得
+
+    1. 事前計算済みの metrics_{period}.json（スナップショット）
+    2. キャッシュ（5分間有効）
+    3. リアルタイム計算
+    """
+    table = get_metrics_table(directory, period)
+    if table is not None:
+        return table
+
+    from utils.cache import cache
+
+    cache_key = f"metrics:{period}"
+    cached = cache.get(cache_key)
+    if cached:
+        return MetricsTable.from_payload(cached)
+
+    logger.info(f"Fallback to realtime metrics calculation for period: {period}")
+    table = compute_metrics_table(period)
+    cache.set(cache_key, table.to_payload(), ttl_seconds=300)
+    return table
+
+
+# =============================================================================
+# カーソル（ページング）
+# =============================================================================
+
+def query_key(**conditions: Any) -> str:
+    """検索条件（期間・テーマ・フィルタ式など）のハッシュ（カーソルに含め、条件の変更を検出する）"""
+    raw = json.dumps(conditions, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def encode_cursor(
+    offset: int, sort: str, descending: bool, version: Optional[str], query: Optional[str] = None
+) -> str:
+    """次ページのカーソルを生成（不透明な文字列。query は query_key() の結果）"""
+    raw = json.dumps({"o": offset, "s": sort, "d": descending, "v": version, "q": query}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(
+    cursor: str, sort: str, descending: bool, version: Optional[str], query: Optional[str] = None
+) -> int:
+    """カーソルを検証してオフセットを返す
+
+    Raises:
+        ValueError: 不正なカーソル、またはソート条件・検索条件・スナップショットが変わった場合
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        offset = int(data["o"])
+    except (ValueError, KeyError, TypeError, binascii.Error, UnicodeEncodeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+    if offset < 0 or data.get("s") != sort or data.get("d") != descending:
+        raise ValueError("Cursor does not match the requested sort order")
+    if data.get("q") != query:
+        raise ValueError("Cursor does not match the requested filters")
+    if data.get("v") != version:
+        raise ValueError("Cursor expired: data has been updated")
+    return offset
@@ -0,0 +1,300 @@
+"""更新ジョブ（jobs/update_data.py）の計測（スパン・カウンター・プロファイル）
+
+- cycle(kind): 1回の更新サイクル。直近 PIPELINE_TRACE_CYCLES 回分をメモリに保持する
+- span(name, **attrs) / traced(name): 段階ごとの所要時間（入れ子のツリー）
+- timed(name): ループ内で何度も呼ばれる処理の合計時間と回数（{name}.seconds / {name}.calls）
+- count(name, value): カウンター（キャッシュのヒット・ミス、書き込みバイト数など）
+
+現在のスパンは contextvars で受け渡し、サイクルの外（APIリクエストから呼ばれた
+データ取得など）では何も記録しない。スレッドプールに投入する処理は submit() を使うと
+サイクルのカウンターに加算される。
+
+request_profile() を呼ぶと次のサイクルを cProfile（または pyinstrument）で計測し、
+結果を precomputed/profiles/ に保存する（プロファイルは更新ジョブのスレッドのみ）。
+"""
+
+import cProfile
+import io
+import itertools
+import logging
+import os
+import pstats
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, Future
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from datetime import datetime
+from functools import wraps
+from pathlib import Path
+from typing import Any, Callable, Iterator, Optional
+
+try:
+    import pyinstrument
+except ImportError:  # pragma: no cover - pyinstrumentは任意依存
+    pyinstrument = None
+
+logger = logging.getLogger(__name__)
+
+# 保持するサイクル数
+PIPELINE_TRACE_CYCLES = int(os.environ.get("PIPELINE_TRACE_CYCLES", "20"))
+
+# プロファイル結果の保存先
+PROFILE_DIR = Path(__file__).parent.parent / "precomputed" / "profiles"
+
+PROFILERS = ("cprofile", "pyinstrument")
+
+# テキスト出力に含める関数の数（cProfile、累積時間順）
+PROFILE_TOP_FUNCTIONS = 40
+
+
+class Span:
+    """計測区間（子スパンを持つ）"""
+
+    __slots__ = ("name", "attrs", "cycle", "children", "duration")
+
+    def __init__(self, name: str, attrs: dict, cycle: "Cycle") -> None:
+        self.name = name
+        self.attrs = attrs
+        self.cycle = cycle
+        self.children: list[Span] = []
+        self.duration: Optional[float] = None
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        return round(self.duration * 1000, 3) if self.duration is not None else None
+
+    def to_dict(self) -> dict:
+        # 取得ワーカーのスレッドが追加・更新中でも読めるようにロック下でコピー
+        with self.cycle._lock:
+            attrs = dict(self.attrs)
+            children = list(self.children)
+        result: dict[str, Any] = {"name": self.name, "duration_ms": self.duration_ms}
+        if attrs:
+            result["attrs"] = attrs
+        if children:
+            result["children"] = [child.to_dict() for child in children]
+        return result
+
+
+class Cycle:
+    """1回の更新サイクルの計測結果"""
+
+    def __init__(self, cycle_id: int, kind: str) -> None:
+        self.id = cycle_id
+        self.kind = kind
+        self.started_at = datetime.now().isoformat()
+        self.status = "running"
+        self.error: Optional[str] = None
+        self.root = Span(kind, {}, self)
+        self.counters: dict[str, float] = {}
+        self.profile: Optional[dict] = None
+        self._lock = threading.Lock()
+
+    def add(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def summary(self) -> dict:
+        """一覧用（段階ごとの所要時間とカウンター）"""
+        # 実行中のサイクルは取得ワーカーのスレッドが add() / span() で更新するためロック下でコピー
+        with self._lock:
+            stages = list(self.root.children)
+            counters = dict(self.counters)
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "started_at": self.started_at,
+            "duration_ms": self.root.duration_ms,
+            "status": self.status,
+            "error": self.error,
+            "stages": [{"name": child.name, "duration_ms": child.duration_ms} for child in stages],
+            "counters": {name: round(value, 6) for name, value in sorted(counters.items())},
+            "profile": {"profiler": self.profile["profiler"], "path": self.profile["path"]} if self.profile else None,
+        }
+
+    def to_dict(self) -> dict:
+        """詳細（スパンのツリーを含む）"""
+        return {**self.summary(), "spans": self.root.to_dict().get("children", [])}
+
+
+_current: ContextVar[Optional[Span]] = ContextVar("pipeline_span", default=None)
+_cycles: deque[Cycle] = deque(maxlen=PIPELINE_TRACE_CYCLES)
+_cycle_ids = itertools.count(1)
+_lock = threading.Lock()
+_profile_request: Optional[str] = None
+
+
+def current_cycle() -> Optional[Cycle]:
+    """実行中のサイクル（サイクル外ならNone）"""
+    span_ = _current.get()
+    return span_.cycle if span_ is not None else None
+
+
+def recent_cycles() -> list[Cycle]:
+    """保持しているサイクル（新しい順）"""
+    with _lock:
+        return list(reversed(_cycles))
+
+
+def get_cycle(cycle_id: int) -> Optional[Cycle]:
+    with _lock:
+        return next((c for c in _cycles if c.id == cycle_id), None)
+
+
+def clear() -> None:
+    """保持しているサイクルを消去（テスト用）"""
+    global _profile_request
+    with _lock:
+        _cycles.clear()
+        _profile_request = None
+
+
+def request_profile(profiler: str = "cprofile") -> None:
+    """次のサイクルをプロファイルする
+
+    Raises:
+        ValueError: 未対応のプロファイラ、または pyinstrument が未インストールの場合
+    """
+    global _profile_request
+    if profiler not in PROFILERS:
+        raise ValueError(f"Unknown profiler: {profiler} (expected {' or '.join(PROFILERS)})")
+    if profiler == "pyinstrument" and pyinstrument is None:
+        raise ValueError("pyinstrument is not installed")
+    with _lock:
+        _profile_request = profiler
+
+
+def profile_pending() -> Optional[str]:
+    return _profile_request
+
+
+@contextmanager
+def cycle(kind: str) -> Iterator[Cycle]:
+    """更新サイクルを計測（サイクル内から呼ばれた場合は子スパンとして扱う）"""
+    global _profile_request
+    parent = _current.get()
+    if parent is not None:
+        with span(kind):
+            yield parent.cycle
+        return
+
+    new_cycle = Cycle(next(_cycle_ids), kind)
+    with _lock:
+        _cycles.append(new_cycle)
+        profiler, _profile_request = _profile_request, None
+
+    token = _current.set(new_cycle.root)
+    running_profiler = _start_profiler(profiler) if profiler else None
+    start = time.perf_counter()
+    try:
+        yield new_cycle
+        new_cycle.status = "ok"
+    except BaseException as e:
+        new_cycle.status = "error"
+        new_cycle.error = str(e)
+        raise
+    finally:
+        new_cycle.root.duration = time.perf_counter() - start
+        _current.reset(token)
+        if running_profiler is not None:
+            new_cycle.profile = _stop_profiler(profiler, running_profiler, new_cycle)
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Optional[Span]]:
+    """段階の所要時間を計測（サイクル外では何もしない）"""
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+
+    new_span = Span(name, attrs, parent.cycle)
+    with parent.cycle._lock:
+        parent.children.append(new_span)
+    token = _current.set(new_span)
+    start = time.perf_counter()
+    try:
+        yield new_span
+    finally:
+        new_span.duration = time.perf_counter() - start
+        _current.reset(token)
+
+
+def traced(name: str) -> Callable:
+    """関数の呼び出しをスパンとして計測するデコレーター"""
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def annotate(**attrs: Any) -> None:
+    """現在のスパンに属性（件数など）を追加"""
+    span_ = _current.get()
+    if span_ is not None:
+        with span_.cycle._lock:
+            span_.attrs.update(attrs)
+
+
+def count(name: str, value: float = 1) -> None:
+    """サイクルのカウンターに加算（サイクル外では何もしない）"""
+    span_ = _current.get()
+    if span_ is not None:
+        span_.cycle.add(name, value)
+
+
+@contextmanager
+def timed(name: str) -> Iterator[None]:
+    """合計時間（{name}.seconds）と回数（{name}.calls）を加算（スパンは作らない）"""
+    span_ = _current.get()
+    if span_ is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        span_.cycle.add(f"{name}.seconds", time.perf_counter() - start)
+        span_.cycle.add(f"{name}.calls")
+
+
+def submit(executor: Executor, fn: Callable, *args: Any) -> Future:
+    """現在のサイクルを引き継いでスレッドプールに投入"""
+    return executor.submit(copy_context().run, fn, *args)
+
+
+def _start_profiler(profiler: str) -> Any:
+    try:
+        if profiler == "pyinstrument":
+            running = pyinstrument.Profiler()
+            running.start()
+        else:
+            running = cProfile.Profile()
+            running.enable()
+        return running
+    except (ValueError, RuntimeError) as e:  # 別のプロファイラが動作中
+        logger.warning(f"Failed to start {profiler}: {e}")
+        return None
+
+
+def _stop_profiler(profiler: str, running: Any, profiled: Cycle) -> dict:
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    if profiler == "pyinstrument":
+        running.stop()
+        path = PROFILE_DIR / f"cycle-{profiled.id}.html"
+        path.write_text(running.output_html(), encoding="utf-8")
+        text = running.output_text()
+    else:
+        running.disable()
+        path = PROFILE_DIR / f"cycle-{profiled.id}.prof"
+        running.dump_stats(path)
+        buffer = io.StringIO()
+        pstats.Stats(running, stream=buffer).sort_stats("cumulative").print_stats(PROFILE_TOP_FUNCTIONS)
+        text = buffer.getvalue()
+    logger.info(f"Saved {profiler} profile of cycle {profiled.id}: {path}")
+    return {"profiler": profiler, "path": str(path), "text": text}
@@ -0,0 +1,247 @@
+"""ポートフォリオ分析エンジン（リスク指標のベクトル計算）
+
+選択したテーマ、またはウェイト付きの銘柄からなるポートフォリオのリスク指標を、
+事前計算済みの終値行列（services/price_matrix.py）だけから計算する（yfinance にはアクセスしない）。
+- ポートフォリオの日次リターンは、その日に値のある銘柄のウェイトで加重平均する（日次リバランス）
+- 騰落率・ボラティリティ・最大ドローダウン・シャープレシオ・ソルティノレシオはポートフォリオの日次リターンから
+- 銘柄ごとのリスク寄与度 w_i (Σw)_i / w'Σw は共分散行列 Σ = C'C / (n - 1)（C は平均を引いた日次リターン、
+  欠損は平均リターンとみなして0）を作らずに Σw = C'(Cw) / (n - 1) で求める（行列 × ベクトルの積2回、O(日数 × 銘柄数)）
+- ベータは終値行列のベンチマーク列（日経225）の日次リターンに対して計算
+- 結果はバスケットの正規形のハッシュ・期間・無リスク金利・行列の生成時刻をキーにキャッシュ
+"""
+
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from services.correlation import CORRELATION_PERIODS, MIN_OBSERVATIONS, daily_return_matrix
+from services.custom_theme import Basket, BasketError, normalize_basket
+from services.price_matrix import BENCHMARK_TICKER, PriceMatrix, get_price_matrix
+from utils.cache import cache
+
+# 分析できる期間（日次リターンの標本が足りる期間）
+PORTFOLIO_PERIODS = CORRELATION_PERIODS
+
+# ポートフォリオの銘柄数の上限
+MAX_PORTFOLIO_HOLDINGS = 500
+
+# 年率換算の営業日数
+TRADING_DAYS_PER_YEAR = 252
+
+# 結果のキャッシュ有効期間（秒）。行列の更新時はキーが変わるため古い結果は使われない
+PORTFOLIO_CACHE_TTL = 300
+
+
+def theme_basket(theme_ids: list[str], themes: dict[str, dict]) -> Basket:
+    """テーマを均等に配分したバスケット（テーマ内の銘柄も均等。重複銘柄はウェイトを合算）
+
+    Raises:
+        BasketError: 存在しないテーマ・銘柄数の上限超過
+    """
+    weights: dict[str, float] = {}
+    for theme_id in theme_ids:
+        theme = themes.get(theme_id)
+        if theme is None:
+            raise BasketError(f"Theme not found: {theme_id}")
+        share = 1.0 / len(theme_ids) / len(theme["tickers"])
+        for ticker in theme["tickers"]:
+            weights[ticker] = weights.get(ticker, 0.0) + share
+    return normalize_basket(list(weights), weights, max_tickers=MAX_PORTFOLIO_HOLDINGS)
+
+
+# =============================================================================
+# 計算
+# =============================================================================
+
+def risk_contributions(returns: np.ndarray, weights: np.ndarray) -> tuple[np.ndarray, np.ndarray, float]:
+    """銘柄ごとのリスク寄与度（合計1）・年率ボラティリティと、ポートフォリオの年率分散
+
+    欠損日は平均リターンとみなす（共分散行列が半正定値のまま保たれ、寄与度の合計が必ず1になる）。
+    銘柄のボラティリティは値のある日だけから求める。
+
+    Args:
+        returns: 日付 × 銘柄 の日次リターン（欠損はNaN）
+        weights: 合計1のウェイト
+    """
+    observed = ~np.isnan(returns)
+    values = np.where(observed, returns, 0)
+    counts = observed.sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = values.sum(axis=0, dtype=np.float64) / counts
+        centered = np.where(observed, values - mean.astype(values.dtype), 0)
+        squares = np.einsum("ij,ij->j", centered, centered, dtype=np.float64)
+        volatility = np.sqrt(squares / (counts - 1) * TRADING_DAYS_PER_YEAR)
+
+    scale = TRADING_DAYS_PER_YEAR / max(returns.shape[0] - 1, 1)
+    marginal = (centered.T @ (centered @ weights.astype(centered.dtype))).astype(np.float64) * scale
+    variance = float(weights @ marginal)
+    if variance <= 0:
+        return np.full(len(weights), np.nan), volatility, variance
+    return weights * marginal / variance, volatility, variance
+
+
+def max_drawdown(returns: np.ndarray) -> float:
+    """日次リターン列の最大ドローダウン（0以下の比率）"""
+    wealth = np.cumprod(1 + returns)
+    peaks = np.maximum.accumulate(np.concatenate([[1.0], wealth]))[1:]
+    return float((wealth / peaks - 1).min()) if len(wealth) else 0.0
+
+
+def _beta(returns: np.ndarray, market: np.ndarray) -> np.ndarray:
+    """各列の市場リターンに対するベータ（両方に値がある日で計算。不足ならNaN）
+
+    日付 × 銘柄 の中間配列は欠損を0にした1つだけで、和は行列 × ベクトルの積で求める
+    """
+    observed = ~np.isnan(returns)
+    values = np.where(observed, returns, 0)
+    observed = observed.astype(values.dtype)
+    market_observed = (~np.isnan(market)).astype(values.dtype)
+    x = np.where(np.isnan(market), 0, market).astype(values.dtype)
+
+    counts = (market_observed @ observed).astype(np.float64)
+    sum_x = (x @ observed).astype(np.float64)
+    sum_y = (market_observed @ values).astype(np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        variance = (x * x) @ observed - sum_x * sum_x / counts
+        covariance = (x @ values).astype(np.float64) - sum_x * sum_y / counts
+        beta = covariance / variance
+    return np.where((counts >= MIN_OBSERVATIONS) & (variance > 0), beta, np.nan)
+
+
+def _round(value: float, digits: int) -> Optional[float]:
+    return None if value is None or not np.isfinite(value) else round(float(value), digits)
+
+
+def _round_column(values: np.ndarray, digits: int) -> list[Optional[float]]:
+    rounded = np.round(values.astype(np.float64), digits)
+    return [None if v != v or v in (np.inf, -np.inf) else v for v in rounded.tolist()]
+
+
+def compute_portfolio(basket: Basket, matrix: PriceMatrix, risk_free_rate: float = 0.0) -> dict:
+    """ポートフォリオのリスク指標と銘柄ごとの寄与度を計算（同期・CPU処理のみ）
+
+    Args:
+        basket: 正規化済みのバスケット（ウェイトなしなら均等）
+        matrix: 期間の終値行列
+        risk_free_rate: 年率の無リスク金利（%）
+
+    Returns:
+        metrics（ポートフォリオ全体）・holdings（リスク寄与度の降順）・missing（行列にない銘柄）
+    """
+    weight_map = basket.weight_map or {ticker: 1.0 for ticker in basket.tickers}
+    held = [ticker for ticker in basket.tickers if ticker in matrix]
+    result = {
+        "period": matrix.period,
+        "holdings_count": len(held),
+        "observations": 0,
+        "metrics": None,
+        "holdings": [],
+        "missing": [ticker for ticker in basket.tickers if ticker not in matrix],
+        "generated_at": matrix.generated_at,
+    }
+    if not held:
+        return result
+
+    columns = [matrix.columns[ticker] for ticker in held]
+    weights = np.array([weight_map[ticker] for ticker in held], dtype=np.float64)
+    weights /= weights.sum()
+    close = np.take(matrix.close, columns, axis=1)
+    returns = daily_return_matrix(close)
+    observed = ~np.isnan(returns)
+
+    # ポートフォリオの日次リターン（値のある銘柄のウェイトで加重平均）
+    available = observed @ weights
+    with np.errstate(divide="ignore", invalid="ignore"):
+        daily = np.where(available > 0, (np.where(observed, returns, 0) @ weights.astype(np.float32)) / available, np.nan)
+    valid_days = ~np.isnan(daily)
+    portfolio = daily[valid_days]
+    result["observations"] = int(len(portfolio))
+    if len(portfolio) < MIN_OBSERVATIONS:
+        return result
+
+    contribution, holding_volatility, _ = risk_contributions(returns, weights)
+
+    # ベンチマーク（日経225）に対するベータ
+    market = None
+    if BENCHMARK_TICKER in matrix:
+        market = daily_return_matrix(matrix.close[:, [matrix.columns[BENCHMARK_TICKER]]])[:, 0]
+    if market is not None:
+        holding_beta = _beta(returns, market)
+        portfolio_beta = _beta(daily[:, None], market)[0]
+    else:
+        holding_beta = np.full(len(held), np.nan)
+        portfolio_beta = np.nan
+
+    # 期間騰落率（銘柄は最初と最後の終値から）
+    total_return = float(np.prod(1 + portfolio) - 1)
+    has_close = ~np.isnan(close)
+    positions = np.arange(len(held))
+    first = close[np.argmax(has_close, axis=0), positions]
+    last = close[close.shape[0] - 1 - np.argmax(has_close[::-1], axis=0), positions]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        holding_return = (last / first - 1) * 100
+
+    # リスク調整後リターン（年率）
+    excess_daily = portfolio - risk_free_rate / 100 / TRADING_DAYS_PER_YEAR
+    volatility = float(portfolio.std(ddof=1) * np.sqrt(TRADING_DAYS_PER_YEAR))
+    downside = float(np.sqrt(np.mean(np.minimum(excess_daily, 0) ** 2)) * np.sqrt(TRADING_DAYS_PER_YEAR))
+    annual_excess = float(excess_daily.mean() * TRADING_DAYS_PER_YEAR)
+    annualized_return = (1 + total_return) ** (TRADING_DAYS_PER_YEAR / len(portfolio)) - 1
+
+    result["metrics"] = {
+        "return": _round(total_return * 100, 2),
+        "annualized_return": _round(annualized_return * 100, 2),
+        "volatility": _round(volatility * 100, 2),
+        "max_drawdown": _round(max_drawdown(portfolio) * 100, 2),
+        "sharpe_ratio": _round(annual_excess / volatility, 3) if volatility > 0 else None,
+        "sortino_ratio": _round(annual_excess / downside, 3) if downside > 0 else None,
+        "beta": _round(portfolio_beta, 3),
+        "risk_free_rate": risk_free_rate,
+    }
+
+    # 銘柄ごとの値は列ごとにまとめて丸める（NaN は None）
+    order = np.argsort(-np.nan_to_num(contribution, nan=-np.inf), kind="stable")
+    columns = {
+        "code": [held[i] for i in order],
+        "weight": _round_column(weights[order], 4),
+        "change_percent": _round_column(holding_return[order], 2),
+        "volatility": _round_column(holding_volatility[order] * 100, 2),
+        "beta": _round_column(holding_beta[order], 3),
+        "risk_contribution": _round_column(contribution[order] * 100, 2),
+    }
+    names = list(columns)
+    result["holdings"] = [dict(zip(names, values)) for values in zip(*columns.values())]
+    return result
+
+
+# =============================================================================
+# キャッシュ
+# =============================================================================
+
+def cache_key(basket: Basket, period: str, risk_free_rate: float, matrix: PriceMatrix) -> str:
+    """結果のキャッシュキー（バスケットの正規形・期間・無リスク金利・行列の生成時刻）"""
+    return f"portfolio:{basket.key}:{period}:{risk_free_rate}:{matrix.generated_at}"
+
+
+def get_portfolio(
+    basket: Basket,
+    period: str,
+    directory: Path,
+    risk_free_rate: float = 0.0,
+) -> Optional[dict]:
+    """ポートフォリオ分析を取得（終値行列が未作成ならNone。キャッシュ済みなら即座に返す）
+
+    返す dict はキャッシュ経由で共有されるため、呼び出し側で変更しないこと
+    """
+    matrix = get_price_matrix(directory, period)
+    if matrix is None:
+        return None
+
+    key = cache_key(basket, period, risk_free_rate, matrix)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    result = compute_portfolio(basket, matrix, risk_free_rate)
+    cache.set(key, result, ttl_seconds=PORTFOLIO_CACHE_TTL)
+    return result
@@ -0,0 +1,162 @@
+"""期間ごとの終値行列（日付 × 銘柄）
+
+update_data.py が全銘柄の株価を取得した直後に期間ごとの終値行列を構築し、
+メモリに公開すると同時に precomputed/prices_{period}.npz に保存する。
+カスタムテーマなどのオンデマンド計算はこの行列だけを使い、yfinance へのアクセスは行わない。
+
+- 行: 全銘柄の取引日の和集合（昇順）、列: 銘柄（テーマ定義順）+ ベンチマーク（日経225）、欠損は NaN
+- 別プロセス（ジョブ単体実行）が書き込んだファイルは (mtime_ns, size) の変化で検知して読み直す
+"""
+
+import io
+import logging
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from utils.cache import FileCache
+from utils.serialization import write_bytes_atomic
+
+logger = logging.getLogger(__name__)
+
+# 終値行列に含めるベンチマーク（ポートフォリオのベータ計算用）
+BENCHMARK_TICKER = "^N225"
+
+
+def price_matrix_filename(period: str) -> str:
+    """終値行列の保存ファイル名"""
+    return f"prices_{period}.npz"
+
+
+class PriceMatrix:
+    """1期間分の終値行列（構築後は読み取り専用）"""
+
+    def __init__(
+        self,
+        period: str,
+        dates: np.ndarray,
+        tickers: list[str],
+        close: np.ndarray,
+        generated_at: Optional[str] = None,
+    ) -> None:
+        self.period = period
+        self.dates = pd.DatetimeIndex(dates)
+        self.tickers: tuple[str, ...] = tuple(tickers)
+        self.close = close
+        self.close.flags.writeable = False
+        self.generated_at = generated_at
+        self.columns = {ticker: i for i, ticker in enumerate(self.tickers)}
+
+    @classmethod
+    def from_frames(
+        cls,
+        period: str,
+        frames: dict[str, pd.DataFrame],
+        generated_at: Optional[str] = None,
+    ) -> "PriceMatrix":
+        """{ticker: DataFrame（Close列）} から構築"""
+        closes = {}
+        for ticker, df in frames.items():
+            if df is None or df.empty or "Close" not in df:
+                continue
+            close = df["Close"]
+            # 同じ日付の重複行は最後の値を使う（結合時の整列のため）
+            closes[ticker] = close[~close.index.duplicated(keep="last")]
+        if not closes:
+            return cls(period, np.array([], dtype="datetime64[ns]"), [], np.empty((0, 0)), generated_at)
+        combined = pd.concat(closes, axis=1).sort_index()
+        index = combined.index
+        if index.tz is not None:
+            # 保存形式に合わせて現地時刻のまま tz なしに揃える
+            index = index.tz_localize(None)
+        return cls(
+            period,
+            index.to_numpy(dtype="datetime64[ns]"),
+            list(combined.columns),
+            combined.to_numpy(dtype=float),
+            generated_at,
+        )
+
+    def __contains__(self, ticker: str) -> bool:
+        return ticker in self.columns
+
+    def series(self, ticker: str) -> Optional[pd.Series]:
+        """1銘柄の終値（欠損日を除く）。行列にない銘柄はNone"""
+        column = self.columns.get(ticker)
+        if column is None:
+            return None
+        values = self.close[:, column]
+        valid = ~np.isnan(values)
+        return pd.Series(values[valid], index=self.dates[valid], name="Close")
+
+    def frames(self, tickers) -> dict[str, pd.DataFrame]:
+        """calculator の *_from_data 関数にそのまま渡せる {ticker: DataFrame（Close列）}"""
+        frames = {}
+        for ticker in tickers:
+            close = self.series(ticker)
+            if close is not None and not close.empty:
+                frames[ticker] = close.to_frame()
+        return frames
+
+    # -------------------------------------------------------------------------
+    # 保存・読み込み
+    # -------------------------------------------------------------------------
+
+    def to_bytes(self) -> bytes:
+        buffer = io.BytesIO()
+        np.savez(
+            buffer,
+            period=np.array(self.period),
+            generated_at=np.array(self.generated_at or ""),
+            dates=self.dates.to_numpy().astype("datetime64[ns]").astype(np.int64),
+            tickers=np.array(self.tickers, dtype=str),
+            close=self.close,
+        )
+        return buffer.getvalue()
+
+    @classmethod
+    def from_file(cls, path: Path) -> "PriceMatrix":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                str(data["period"]),
+                data["dates"].astype("datetime64[ns]"),
+                data["tickers"].tolist(),
+                data["close"],
+                str(data["generated_at"]) or None,
+            )
+
+
+# =============================================================================
+# モジュール共有の行列
+# =============================================================================
+
+def _load_matrix(path: Path) -> Optional[PriceMatrix]:
+    try:
+        return PriceMatrix.from_file(path)
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Failed to load price matrix {path.name}: {e}")
+        return None
+
+
+# パス -> 行列（ファイル更新時のみ読み直す）
+_matrices: FileCache[PriceMatrix] = FileCache(_load_matrix)
+
+
+def save_price_matrix(directory: Path, matrix: PriceMatrix) -> Path:
+    """行列をアトミックに保存し、同一プロセスのメモリにも即座に反映"""
+    path = directory / price_matrix_filename(matrix.period)
+    write_bytes_atomic(path, matrix.to_bytes())
+    _matrices.put(path, matrix)
+    return path
+
+
+def get_price_matrix(directory: Path, period: str) -> Optional[PriceMatrix]:
+    """期間の終値行列を取得（未作成ならNone。ファイル更新時のみ読み直す）"""
+    return _matrices.get(directory / price_matrix_filename(period))
+
+
+def clear() -> None:
+    """読み込み済みの行列を破棄"""
+    _matrices.clear()
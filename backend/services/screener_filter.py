@@ -0,0 +1,246 @@
+"""スクリーナーのフィルタ式
+
+`rsi < 30 and return_1mo > 5 and category == mid` のような条件式を
+メトリクステーブルの列に対するNumPyのブールマスク演算に変換する。
+
+文法:
+    expr       := and_expr ("or" and_expr)*
+    and_expr   := unary ("and" unary)*
+    unary      := "not" unary | "(" expr ")" | comparison
+    comparison := 数値列 比較演算子 (数値 | 数値列)
+                | カテゴリ列 ("==" | "!=") 値
+                | カテゴリ列 "in" "(" 値 ("," 値)* ")"
+
+- 比較演算子: <, <=, >, >=, ==（= も可）, !=
+- カテゴリ列: theme（所属テーマのいずれか）, category（時価総額カテゴリ）
+- 欠損値（NaN）を含む比較は常に False（!= も含む）。not は単純に反転する
+- 式は文字列ごとにコンパイル結果をキャッシュし、評価は列全体のベクトル演算のみ
+"""
+
+import json
+import operator
+import re
+from functools import lru_cache
+from typing import Callable
+
+import numpy as np
+
+from services.metrics_table import NUMERIC_COLUMNS, MetricsTable
+
+# 式の最大長・比較の最大数・括弧と not の最大ネスト
+MAX_FILTER_LENGTH = 1000
+MAX_COMPARISONS = 32
+MAX_DEPTH = 16
+
+# カテゴリ列 -> テーブルの転置インデックス名
+CATEGORICAL_COLUMNS = {
+    "theme": "rows_by_theme",
+    "theme_id": "rows_by_theme",
+    "category": "rows_by_category",
+    "market_cap_category": "rows_by_category",
+}
+
+COMPARISONS = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "==": operator.eq,
+    "=": operator.eq,
+    "!=": operator.ne,
+}
+
+KEYWORDS = frozenset(["and", "or", "not", "in"])
+
+TOKEN_PATTERN = re.compile(
+    r"\s*(?:"
+    r"(?P<number>-?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)"
+    r"|(?P<op><=|>=|==|!=|<|>|=)"
+    r"|(?P<punct>[(),])"
+    r"|(?P<string>'[^']*'|\"[^\"]*\")"
+    r"|(?P<name>[A-Za-z_][A-Za-z0-9_.\-]*)"
+    r")"
+)
+
+# テーブル -> ブールマスク
+FilterFunc = Callable[[MetricsTable], np.ndarray]
+
+
+class FilterError(ValueError):
+    """フィルタ式の構文・列名エラー"""
+
+
+def _tokenize(text: str) -> list[tuple[str, str]]:
+    """式をトークン列 [(種類, 値)] に分割"""
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = TOKEN_PATTERN.match(text, position)
+        if match is None or match.end() == position:
+            raise FilterError(f"Unexpected character at position {position}: {text[position]!r}")
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "string":
+            kind, value = "value", value[1:-1]
+        elif kind == "name" and value.lower() in KEYWORDS:
+            kind, value = "keyword", value.lower()
+        tokens.append((kind, value))
+        position = match.end()
+    return tokens
+
+
+class _Parser:
+    """再帰下降パーサー（トークン列 -> マスク関数）"""
+
+    def __init__(self, tokens: list[tuple[str, str]]) -> None:
+        self.tokens = tokens
+        self.position = 0
+        self.comparisons = 0
+        self.depth = 0
+
+    def peek(self) -> tuple[str, str] | None:
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def take(self, kind: str | None = None, value: str | None = None) -> tuple[str, str]:
+        token = self.peek()
+        if token is None:
+            raise FilterError("Unexpected end of filter")
+        if (kind is not None and token[0] != kind) or (value is not None and token[1] != value):
+            expected = value or kind
+            raise FilterError(f"Expected {expected} but got {token[1]!r}")
+        self.position += 1
+        return token
+
+    def accept(self, kind: str, value: str) -> bool:
+        if self.peek() == (kind, value):
+            self.position += 1
+            return True
+        return False
+
+    def parse(self) -> FilterFunc:
+        func = self.expr()
+        token = self.peek()
+        if token is not None:
+            raise FilterError(f"Unexpected token: {token[1]!r}")
+        return func
+
+    def expr(self) -> FilterFunc:
+        funcs = [self.and_expr()]
+        while self.accept("keyword", "or"):
+            funcs.append(self.and_expr())
+        if len(funcs) == 1:
+            return funcs[0]
+        return lambda table: np.logical_or.reduce([f(table) for f in funcs])
+
+    def and_expr(self) -> FilterFunc:
+        funcs = [self.unary()]
+        while self.accept("keyword", "and"):
+            funcs.append(self.unary())
+        if len(funcs) == 1:
+            return funcs[0]
+        return lambda table: np.logical_and.reduce([f(table) for f in funcs])
+
+    def unary(self) -> FilterFunc:
+        if self.accept("keyword", "not"):
+            inner = self.nested(self.unary)
+            return lambda table: ~inner(table)
+        if self.accept("punct", "("):
+            inner = self.nested(self.expr)
+            self.take("punct", ")")
+            return inner
+        return self.comparison()
+
+    def nested(self, parse: Callable[[], FilterFunc]) -> FilterFunc:
+        self.depth += 1
+        if self.depth > MAX_DEPTH:
+            raise FilterError(f"Filter nested too deeply (max {MAX_DEPTH})")
+        func = parse()
+        self.depth -= 1
+        return func
+
+    def comparison(self) -> FilterFunc:
+        self.comparisons += 1
+        if self.comparisons > MAX_COMPARISONS:
+            raise FilterError(f"Too many conditions (max {MAX_COMPARISONS})")
+
+        _, column = self.take("name")
+        if column in CATEGORICAL_COLUMNS:
+            return self.categorical(column)
+        if column not in NUMERIC_COLUMNS:
+            raise FilterError(f"Unknown column: {column}")
+
+        op_token = self.peek()
+        if op_token is None or op_token[0] != "op":
+            raise FilterError(f"Expected comparison operator after {column}")
+        self.position += 1
+        compare = COMPARISONS[op_token[1]]
+
+        kind, operand = self.take()
+        if kind == "number":
+            value = float(operand)
+
+            def compare_value(table: MetricsTable) -> np.ndarray:
+                values = table.numeric[column]
+                result = compare(values, value)
+                return result & ~np.isnan(values) if compare is operator.ne else result
+            return compare_value
+        if kind == "name" and operand in NUMERIC_COLUMNS:
+            def compare_columns(table: MetricsTable) -> np.ndarray:
+                left, right = table.numeric[column], table.numeric[operand]
+                return compare(left, right) & ~np.isnan(left) & ~np.isnan(right)
+            return compare_columns
+        raise FilterError(f"Expected number or numeric column after {column} {op_token[1]}")
+
+    def categorical(self, column: str) -> FilterFunc:
+        index_name = CATEGORICAL_COLUMNS[column]
+        kind, op = self.take()
+        if kind == "keyword" and op == "in":
+            self.take("punct", "(")
+            values = [self.value()]
+            while self.accept("punct", ","):
+                values.append(self.value())
+            self.take("punct", ")")
+            negate = False
+        elif kind == "op" and op in ("==", "=", "!="):
+            values = [self.value()]
+            negate = op == "!="
+        else:
+            raise FilterError(f"{column} supports ==, != and in (...)")
+
+        def match(table: MetricsTable) -> np.ndarray:
+            mask = table.index_mask(getattr(table, index_name), values)
+            return ~mask if negate else mask
+        return match
+
+    def value(self) -> str:
+        kind, value = self.take()
+        if kind not in ("name", "value", "number"):
+            raise FilterError(f"Expected value but got {value!r}")
+        return value
+
+
+@lru_cache(maxsize=256)
+def compile_filter(text: str) -> FilterFunc:
+    """フィルタ式をマスク関数にコンパイル（同じ式はキャッシュを再利用）
+
+    Raises:
+        FilterError: 構文エラー・未知の列名の場合
+    """
+    if len(text) > MAX_FILTER_LENGTH:
+        raise FilterError(f"Filter too long (max {MAX_FILTER_LENGTH} characters)")
+    tokens = _tokenize(text)
+    if not tokens:
+        raise FilterError("Empty filter")
+    return _Parser(tokens).parse()
+
+
+def normalize_filter(text: str) -> str:
+    """フィルタ式の正規形（空白・キーワードの大文字小文字に依存しない。カーソルの照合用）"""
+    return json.dumps(_tokenize(text), ensure_ascii=False, separators=(",", ":"))
+
+
+def evaluate_filter(table: MetricsTable, text: str) -> np.ndarray:
+    """フィルタ式をテーブルに適用してブールマスクを返す"""
+    with np.errstate(invalid="ignore"):
+        return compile_filter(text)(table)
@@ -0,0 +1,277 @@
+"""銘柄・テーマ検索の転置インデックス
+
+テーマ定義から検索用インデックスを1回だけ構築し、リクエストごとの全件走査をなくす。
+- 企業名・テーマ名・説明: 正規化した文字列の1-gram / 2-gram ポスティング
+  （候補をポスティングの積集合で絞り込んでから部分一致を確認するため誤検出はない）
+- 銘柄コード: ソート済み配列の二分探索による前方一致（"72" → 7203.T, 7267.T, ...）
+- 正規化: NFKC（全角英数字→半角、半角カナ→全角）、小文字化、カタカナ→ひらがな、空白除去
+- スコア順（完全一致 > 前方一致 > 部分一致、同点は出現位置・名前の短さ・コード順）
+
+テーマ定義を変更した場合は rebuild_search_index() で作り直す。
+"""
+
+import bisect
+import heapq
+import re
+import threading
+import unicodedata
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+# カタカナ（ァ〜ヶ）→ ひらがな
+_KATAKANA_TO_HIRAGANA = {code: code - 0x60 for code in range(0x30A1, 0x30F7)}
+
+_WHITESPACE = re.compile(r"\s+")
+
+# スコア（大きいほど上位）
+SCORE_EXACT = 100
+SCORE_CODE_PREFIX = 80
+SCORE_PREFIX = 70
+SCORE_SUBSTRING = 50
+SCORE_ID_SUBSTRING = 40
+SCORE_DESCRIPTION = 20
+
+
+def normalize(text: str) -> str:
+    """検索用に文字列を正規化（全角・半角、カタカナ・ひらがな、大文字・小文字の違いを吸収）"""
+    text = unicodedata.normalize("NFKC", text).lower()
+    return _WHITESPACE.sub("", text.translate(_KATAKANA_TO_HIRAGANA))
+
+
+def _grams(text: str) -> set[str]:
+    """1-gram と 2-gram の集合"""
+    grams = set(text)
+    grams.update(text[i:i + 2] for i in range(len(text) - 1))
+    return grams
+
+
+def _query_grams(query: str) -> set[str]:
+    """クエリの候補絞り込みに使う n-gram（1文字なら1-gram、それ以外は2-gram）"""
+    if len(query) == 1:
+        return {query}
+    return {query[i:i + 2] for i in range(len(query) - 1)}
+
+
+def _build_postings(texts: Iterable[str]) -> dict[str, frozenset[int]]:
+    """n-gram -> 文書番号の集合"""
+    postings: dict[str, set[int]] = {}
+    for doc_id, text in enumerate(texts):
+        for gram in _grams(text):
+            postings.setdefault(gram, set()).add(doc_id)
+    return {gram: frozenset(ids) for gram, ids in postings.items()}
+
+
+def _candidates(postings: dict[str, frozenset[int]], query: str) -> set[int]:
+    """クエリの全 n-gram を含む文書（小さいポスティングから積集合を取る）"""
+    lists = sorted((postings.get(gram, frozenset()) for gram in _query_grams(query)), key=len)
+    if not lists or not lists[0]:
+        return set()
+    result = set(lists[0])
+    for ids in lists[1:]:
+        result &= ids
+        if not result:
+            break
+    return result
+
+
+def _text_score(text: str, query: str, substring: int = SCORE_SUBSTRING) -> Optional[tuple[int, int]]:
+    """(スコア, 出現位置)。一致しなければNone"""
+    position = text.find(query)
+    if position < 0:
+        return None
+    if text == query:
+        return SCORE_EXACT, 0
+    if position == 0:
+        return SCORE_PREFIX, 0
+    return substring, position
+
+
+def _top(doc_ids: Iterable[int], key, limit: Optional[int]) -> list[int]:
+    """順位の高い文書番号（limit 指定時は部分ソート）"""
+    if limit is None:
+        return sorted(doc_ids, key=key)
+    return heapq.nsmallest(limit, doc_ids, key=key)
+
+
+@dataclass(frozen=True)
+class StockEntry:
+    """検索対象の銘柄（複数テーマに属する場合は最初のテーマ）"""
+    ticker: str
+    name: str
+    theme_id: str
+    theme_name: str
+    code: str
+    normalized_name: str
+
+    def to_dict(self) -> dict:
+        return {
+            "ticker": self.ticker,
+            "name": self.name,
+            "theme_id": self.theme_id,
+            "theme_name": self.theme_name,
+        }
+
+
+@dataclass(frozen=True)
+class ThemeEntry:
+    """検索対象のテーマ"""
+    id: str
+    name: str
+    description: str
+    stock_count: int
+    normalized_id: str
+    normalized_name: str
+    normalized_description: str
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "description": self.description,
+            "stock_count": self.stock_count,
+        }
+
+
+class SearchIndex:
+    """銘柄・テーマの検索インデックス（構築後は読み取り専用）"""
+
+    def __init__(self, themes: dict[str, dict]) -> None:
+        stocks: dict[str, StockEntry] = {}
+        theme_entries = []
+        for theme_id, theme in themes.items():
+            for ticker in theme["tickers"]:
+                if ticker in stocks:
+                    continue
+                name = theme.get("ticker_names", {}).get(ticker, ticker)
+                stocks[ticker] = StockEntry(
+                    ticker=ticker,
+                    name=name,
+                    theme_id=theme_id,
+                    theme_name=theme["name"],
+                    code=normalize(ticker),
+                    normalized_name=normalize(name),
+                )
+            theme_entries.append(ThemeEntry(
+                id=theme_id,
+                name=theme["name"],
+                description=theme.get("description", ""),
+                stock_count=len(theme["tickers"]),
+                normalized_id=normalize(theme_id),
+                normalized_name=normalize(theme["name"]),
+                normalized_description=normalize(theme.get("description", "")),
+            ))
+
+        self.stocks: tuple[StockEntry, ...] = tuple(stocks.values())
+        self.themes: tuple[ThemeEntry, ...] = tuple(theme_entries)
+        self.stock_ids = {entry.ticker: i for i, entry in enumerate(self.stocks)}
+
+        # 企業名の n-gram
+        self._stock_postings = _build_postings(entry.normalized_name for entry in self.stocks)
+
+        # 銘柄コードの前方一致用（正規化コード, 文書番号）のソート済み配列
+        codes = sorted((entry.code, i) for i, entry in enumerate(self.stocks))
+        self._codes = [code for code, _ in codes]
+        self._code_ids = [doc_id for _, doc_id in codes]
+
+        # テーマID・名前・説明の n-gram（区切り文字を挟んで1文書にまとめる）
+        self._theme_postings = _build_postings(
+            "\x00".join((entry.normalized_id, entry.normalized_name, entry.normalized_description))
+            for entry in self.themes
+        )
+
+    # -------------------------------------------------------------------------
+    # 銘柄
+    # -------------------------------------------------------------------------
+
+    def _code_prefix(self, query: str) -> list[int]:
+        start = bisect.bisect_left(self._codes, query)
+        end = bisect.bisect_left(self._codes, query + "\uffff")
+        return self._code_ids[start:end]
+
+    def search_stocks(self, query: str, limit: Optional[int] = None) -> list[StockEntry]:
+        """銘柄コードの前方一致・企業名の部分一致で検索（スコア順）"""
+        query = normalize(query)
+        if not query:
+            return []
+
+        # 文書番号 -> (スコア, 出現位置, 名前の長さ)。コード一致は名前の長さを問わずコード順
+        scored: dict[int, tuple[int, int, int]] = {}
+        for doc_id in self._code_prefix(query):
+            code = self.stocks[doc_id].code
+            exact = code == query or code.split(".", 1)[0] == query
+            scored[doc_id] = (SCORE_EXACT if exact else SCORE_CODE_PREFIX, 0, 0)
+
+        for doc_id in _candidates(self._stock_postings, query):
+            entry = self.stocks[doc_id]
+            score = _text_score(entry.normalized_name, query)
+            if score is not None and score[0] > scored.get(doc_id, (-1, 0, 0))[0]:
+                scored[doc_id] = (*score, len(entry.name))
+
+        def rank(doc_id: int) -> tuple:
+            score, position, length = scored[doc_id]
+            return -score, position, length, self.stocks[doc_id].ticker
+
+        return [self.stocks[doc_id] for doc_id in _top(scored, rank, limit)]
+
+    # -------------------------------------------------------------------------
+    # テーマ
+    # -------------------------------------------------------------------------
+
+    def _theme_score(self, entry: ThemeEntry, query: str) -> Optional[tuple[int, int]]:
+        scores = [
+            _text_score(entry.normalized_name, query),
+            _text_score(entry.normalized_id, query, substring=SCORE_ID_SUBSTRING),
+        ]
+        position = entry.normalized_description.find(query)
+        if position >= 0:
+            scores.append((SCORE_DESCRIPTION, position))
+        matched = [score for score in scores if score is not None]
+        if not matched:
+            return None
+        return max(matched, key=lambda score: (score[0], -score[1]))
+
+    def search_themes(self, query: str, limit: Optional[int] = None) -> list[ThemeEntry]:
+        """テーマID・名前・説明の部分一致で検索（スコア順）"""
+        query = normalize(query)
+        if not query:
+            return []
+
+        scored = {}
+        for doc_id in _candidates(self._theme_postings, query):
+            score = self._theme_score(self.themes[doc_id], query)
+            if score is not None:
+                scored[doc_id] = score
+
+        def rank(doc_id: int) -> tuple:
+            return -scored[doc_id][0], scored[doc_id][1], doc_id
+
+        return [self.themes[doc_id] for doc_id in _top(scored, rank, limit)]
+
+
+# =============================================================================
+# モジュール共有のインデックス
+# =============================================================================
+
+_index: Optional[SearchIndex] = None
+_index_lock = threading.Lock()
+
+
+def rebuild_search_index(themes: Optional[dict[str, dict]] = None) -> SearchIndex:
+    """テーマ定義から検索インデックスを作り直す（省略時は data.themes.THEMES）"""
+    global _index
+    if themes is None:
+        from data.themes import THEMES
+        themes = THEMES
+    index = SearchIndex(themes)
+    with _index_lock:
+        _index = index
+    return index
+
+
+def get_search_index() -> SearchIndex:
+    """現在の検索インデックスを取得"""
+    return _index or rebuild_search_index()
+
+
+# インポート時に構築
+rebuild_search_index()
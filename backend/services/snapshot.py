@@ -0,0 +1,89 @@
+"""事前計算済みデータのインメモリスナップショット
+
+precomputed/ のJSONファイルをバイト列とデコード済みdictの両方でメモリに保持する。
+- APIはリクエストごとにファイルを開いてパースせず、メモリ上の内容を返す
+- ファイルの更新（mtime・サイズの変化）を検知すると次のアクセス時に読み直す
+- update_data.py は書き込み直後に publish() し、同一プロセスでは即座に反映される
+
+デコード済みdictは全リクエストで共有されるため、呼び出し側で変更してはならない。
+"""
+
+import logging
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Optional
+
+from utils.cache import FileCache
+from utils.serialization import loads
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SnapshotEntry:
+    """1ファイル分のスナップショット"""
+    body: bytes
+    data: Any = field(default=None, repr=False)
+    decoded: bool = False
+
+
+def _read_entry(path: Path) -> Optional[SnapshotEntry]:
+    try:
+        body = path.read_bytes()
+    except OSError as e:
+        logger.warning(f"Failed to read precomputed JSON {path.name}: {e}")
+        return None
+    if not body:
+        return None
+    return SnapshotEntry(body=body)
+
+
+# パス -> スナップショット（ファイルが更新されていれば読み直す）
+_entries: FileCache[SnapshotEntry] = FileCache(_read_entry)
+
+
+def get_bytes(path: Path) -> Optional[bytes]:
+    """エンコード済みJSONのバイト列を取得（存在しなければNone）"""
+    entry = _entries.get(path)
+    return entry.body if entry is not None else None
+
+
+def get(path: Path) -> Optional[Any]:
+    """デコード済みの内容を取得（存在しない・壊れている場合はNone）
+
+    戻り値は共有オブジェクトのため変更しないこと。
+    """
+    entry = _entries.get(path)
+    if entry is None:
+        return None
+    if not entry.decoded:
+        try:
+            entry.data = loads(entry.body)
+        except ValueError as e:
+            logger.warning(f"Failed to decode precomputed JSON {path.name}: {e}")
+            return None
+        entry.decoded = True
+    return entry.data
+
+
+def publish(path: Path, body: bytes) -> None:
+    """書き込み済みファイルの内容をスナップショットに反映（再読み込みを省略）
+
+    デコードは初回の get() まで遅延する（読み込み時と同じJSON型に揃える）。
+    """
+    _entries.put(path, SnapshotEntry(body=body))
+
+
+def clear() -> None:
+    """スナップショットを破棄"""
+    _entries.clear()
+
+
+def stats() -> dict:
+    """スナップショットの統計"""
+    entries = _entries.values()
+    return {
+        "files": len(entries),
+        "bytes": sum(len(entry.body) for entry in entries),
+        "decoded": sum(1 for entry in entries if entry.decoded),
+    }
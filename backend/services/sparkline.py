@@ -0,0 +1,225 @@
+"""スパークライン生成モジュール（累積リターン）
+
+短期期間（〜1y）は常に1年分の日次データを返し、選択期間の開始インデックスを付与する。
+長期期間（3y/5y）は期間全体を週次・月次に間引いてデータ点数を一定範囲に抑える。
+"""
+
+import numpy as np
+import pandas as pd
+
+from services.history_store import is_long_period
+
+# スパークライン用の基準データ期間（短期期間用）
+SPARKLINE_BASE_PERIOD = "1y"
+
+# 長期期間の間引き単位（週次: 約156点 / 月次: 約60点）
+SPARKLINE_RESAMPLE_FREQ = {
+    "3y": "W-FRI",
+    "5y": "M",
+}
+
+# 期間ごとの営業日数
+PERIOD_DAYS = {
+    "1d": 1,
+    "5d": 5,
+    "10d": 10,
+    "1mo": 21,
+    "3mo": 63,
+    "6mo": 126,
+    "1y": 252,
+    "3y": 756,
+    "5y": 1260,
+}
+
+
+def empty_sparkline() -> dict:
+    """空のスパークライン"""
+    return {"data": [], "period_start_index": 0}
+
+
+def sparkline_source_period(period: str) -> str:
+    """スパークラインの元データとして使う期間を返す"""
+    return period if is_long_period(period) else SPARKLINE_BASE_PERIOD
+
+
+def build_sparkline(daily_returns: pd.Series | None, period: str) -> dict:
+    """日次リターン（%）からスパークラインを生成
+
+    Args:
+        daily_returns: 日次リターンのSeries（%）
+        period: 選択期間
+
+    Returns:
+        dict with data（累積リターン%のリスト）, period_start_index
+    """
+    if daily_returns is None or daily_returns.empty:
+        return empty_sparkline()
+
+    # 累積リターンを計算（パーセント表示）
+    cumulative = ((1 + daily_returns / 100).cumprod() - 1) * 100
+    cumulative = cumulative.fillna(0.0)
+
+    # 長期期間は週次・月次の終値ベースに間引く
+    freq = SPARKLINE_RESAMPLE_FREQ.get(period)
+    if freq is not None:
+        index = pd.DatetimeIndex(cumulative.index)
+        if index.tz is not None:
+            index = index.tz_localize(None)
+        cumulative = cumulative.groupby(index.to_period(freq)).last()
+        return {
+            "data": cumulative.round(2).tolist(),
+            "period_start_index": 0,
+        }
+
+    data = cumulative.round(2).tolist()
+
+    # 選択期間の開始インデックスを計算
+    period_days = PERIOD_DAYS.get(period, 21)
+    period_start_index = max(0, len(data) - period_days)
+
+    return {
+        "data": data,
+        "period_start_index": period_start_index,
+    }
+
+
+# =============================================================================
+# ダウンサンプリング（クライアント指定の点数に間引く）
+# =============================================================================
+
+# 事前計算しておく点数（一覧カード・詳細カード・拡大表示）
+SPARKLINE_POINT_BUDGETS = (30, 60, 120)
+
+# 指定可能な点数の範囲
+SPARKLINE_MIN_POINTS = 3
+SPARKLINE_MAX_POINTS = 1000
+
+# 間引き方式
+DOWNSAMPLE_METHODS = ("lttb", "minmax")
+
+
+def _endpoint_indices(n: int, threshold: int) -> np.ndarray:
+    """threshold が2点以下のときの選択（2点: 先頭・末尾 / 1点: 末尾）"""
+    return np.array([0, n - 1], dtype=int)[2 - max(0, threshold):]
+
+
+def lttb_indices(values, threshold: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets で残す点のインデックスを返す
+
+    先頭・末尾の点は常に残し、中間を threshold - 2 個のバケットに分けて
+    前後の点と作る三角形の面積が最大になる点を各バケットから1点選ぶ。
+    """
+    y = np.asarray(values, dtype=float)
+    n = len(y)
+    if threshold >= n:
+        return np.arange(n)
+    if threshold < 3:
+        return _endpoint_indices(n, threshold)
+
+    x = np.arange(n, dtype=float)
+    selected = np.empty(threshold, dtype=int)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    # 中間点（先頭・末尾を除く）をバケットに分割
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+
+        # 次のバケットの平均点（最後のバケットの次は末尾の点）
+        if i + 2 < len(edges):
+            next_start, next_end = edges[i + 1], edges[i + 2]
+            avg_x = x[next_start:next_end].mean()
+            avg_y = y[next_start:next_end].mean()
+        else:
+            avg_x, avg_y = x[-1], y[-1]
+
+        # 三角形の面積（定数倍は比較に不要）
+        areas = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(areas))
+        selected[i + 1] = a
+
+    return selected
+
+
+def minmax_indices(values, threshold: int) -> np.ndarray:
+    """バケットごとの最小値・最大値を残すインデックスを返す（threshold 点以下）"""
+    y = np.asarray(values, dtype=float)
+    n = len(y)
+    if threshold >= n:
+        return np.arange(n)
+    if threshold < 3:
+        return _endpoint_indices(n, threshold)
+    if threshold == 3:
+        # 中間に1点しか残せない場合は平均から最も離れた点（最小値か最大値）を選ぶ
+        middle = y[1:n - 1]
+        return np.array([0, 1 + int(np.argmax(np.abs(middle - middle.mean()))), n - 1])
+
+    # 先頭・末尾を除いた中間をバケットに分け、各バケットから2点ずつ選ぶ
+    bucket_count = (threshold - 2) // 2
+    edges = np.linspace(1, n - 1, bucket_count + 1).astype(int)
+
+    picked = [0, n - 1]
+    for start, end in zip(edges[:-1], edges[1:]):
+        if end <= start:
+            continue
+        bucket = y[start:end]
+        picked.append(start + int(np.argmin(bucket)))
+        picked.append(start + int(np.argmax(bucket)))
+
+    return np.unique(picked)
+
+
+def downsample_sparkline(sparkline: dict, points: int, method: str = "lttb") -> dict:
+    """スパークラインを指定点数以下に間引く
+
+    選択期間の開始点は必ず残し、period_start_index を間引き後の位置に付け替える。
+    """
+    data = sparkline.get("data") or []
+    if points >= len(data):
+        return sparkline
+
+    start = sparkline.get("period_start_index", 0)
+    select = minmax_indices if method == "minmax" else lttb_indices
+
+    # 開始点を追加する分、1点少なく間引く（points=3 なら先頭・末尾 + 開始点）
+    budget = points - 1 if 0 < start < len(data) else points
+    indices = select(data, budget)
+    if 0 < start < len(data):
+        indices = np.union1d(indices, [start])
+
+    values = np.asarray(data, dtype=float)[indices]
+    return {
+        "data": values.tolist(),
+        "period_start_index": int(np.searchsorted(indices, start)),
+    }
+
+
+def downsample_payload(payload: dict, points: int, method: str = "lttb") -> dict:
+    """レスポンス内の全スパークラインを間引いたコピーを返す
+
+    テーマ一覧（themes[].sparkline）、テーマ詳細（sparkline, stocks[].sparkline）に対応。
+    元のpayloadは変更しない。
+    """
+    result = dict(payload)
+
+    if isinstance(result.get("sparkline"), dict):
+        result["sparkline"] = downsample_sparkline(result["sparkline"], points, method)
+
+    for key in ("themes", "stocks"):
+        items = result.get(key)
+        if not isinstance(items, list):
+            continue
+        result[key] = [
+            {**item, "sparkline": downsample_sparkline(item["sparkline"], points, method)}
+            if isinstance(item.get("sparkline"), dict) else item
+            for item in items
+        ]
+
+    result["sparkline_points"] = points
+    return result
@@ -0,0 +1,139 @@
+"""テーマ詳細ペイロードの計算
+
+事前計算（jobs/update_data.py の build_theme_detail）とカスタムテーマ（services/custom_theme.py）で
+共通に使う。取得済みの株価データ {period: {ticker: DataFrame}} だけから計算し、
+銘柄名・説明・時価総額の取得方法は呼び出し側が渡す。
+"""
+
+from datetime import datetime
+from typing import Callable, Optional
+
+from services.calculator import (
+    calculate_beta_alpha,
+    calculate_daily_returns,
+    calculate_return_from_data,
+    calculate_theme_daily_returns_from_data,
+)
+from services.sparkline import build_sparkline, sparkline_source_period
+
+
+def build_detail_payload(
+    info: dict,
+    tickers: list[str],
+    period: str,
+    all_data: dict[str, dict],
+    names: Callable[[str], str],
+    descriptions: Callable[[str], Optional[str]],
+    market_caps: Callable[[str], dict],
+    last_updated: Optional[str] = None,
+    weights: Optional[dict[str, float]] = None,
+) -> dict:
+    """テーマ詳細（構成銘柄・ベータ・スパークライン含む）を計算
+
+    Args:
+        info: {"id", "name", "description"}
+        tickers: 構成銘柄
+        period: 期間
+        all_data: {period: {ticker: DataFrame}}（period, 1d, 1y, スパークライン用の期間を参照）
+        names: 銘柄コード -> 銘柄名
+        descriptions: 銘柄コード -> 説明
+        market_caps: 銘柄コード -> {"market_cap", "market_cap_category"}
+        last_updated: 最終取引日
+        weights: 銘柄ごとのウェイト（省略時は均等。指定時は各銘柄に weight を含める）
+
+    Returns:
+        テーマ詳細のdict（theme_{id}_{period}.json と同じ形）
+    """
+    period_data = all_data[period]
+    day_data = all_data.get("1d", {}) if period != "1d" else {}
+
+    # ベータ計算は常に1年分の日次リターンを使用
+    beta_data = all_data.get("1y", {})
+    # スパークライン用データ（1y以下は1年分、3y/5yは期間全体）
+    sparkline_data = all_data.get(sparkline_source_period(period), {})
+
+    # 該当テーマの銘柄データを抽出
+    theme_stock_data = {t: period_data[t] for t in tickers if t in period_data}
+
+    # テーマの騰落率計算
+    theme_return, stock_returns = calculate_return_from_data(theme_stock_data, weights)
+
+    # 1日騰落率
+    theme_return_1d = None
+    stock_returns_1d = {}
+    if period != "1d" and day_data:
+        theme_stock_data_1d = {t: day_data[t] for t in tickers if t in day_data}
+        theme_return_1d, stock_returns_1d = calculate_return_from_data(theme_stock_data_1d, weights)
+
+    # テーマの日次リターン（ベータ計算用）
+    theme_beta_data = {t: beta_data[t] for t in tickers if t in beta_data}
+    theme_daily_returns = calculate_theme_daily_returns_from_data(theme_beta_data, weights)
+
+    # テーマのスパークライン
+    if sparkline_data is beta_data:
+        theme_sparkline_returns = theme_daily_returns
+    else:
+        theme_sparkline_data = {t: sparkline_data[t] for t in tickers if t in sparkline_data}
+        theme_sparkline_returns = calculate_theme_daily_returns_from_data(theme_sparkline_data, weights)
+    theme_sparkline = build_sparkline(theme_sparkline_returns, period)
+
+    # 各銘柄の詳細情報
+    stocks = []
+    for ticker in tickers:
+        stock_return = stock_returns.get(ticker, 0.0)
+        stock_return_1d = stock_returns_1d.get(ticker) if period != "1d" else None
+
+        # 個別株の日次リターン
+        stock_df = beta_data.get(ticker)
+        stock_daily_returns = calculate_daily_returns(stock_df) if stock_df is not None else None
+
+        # ベータ・アルファを計算
+        beta_alpha = {"beta": None, "alpha": None, "r_squared": None}
+        if stock_daily_returns is not None and not stock_daily_returns.empty and not theme_daily_returns.empty:
+            beta_alpha = calculate_beta_alpha(stock_daily_returns, theme_daily_returns)
+
+        # 時価総額を取得
+        market_cap_data = market_caps(ticker) or {}
+
+        # スパークラインデータ
+        spark_df = sparkline_data.get(ticker)
+        if spark_df is stock_df:
+            stock_sparkline_returns = stock_daily_returns
+        else:
+            stock_sparkline_returns = calculate_daily_returns(spark_df) if spark_df is not None else None
+        stock_sparkline = build_sparkline(stock_sparkline_returns, period)
+
+        stock = {
+            "code": ticker,
+            "name": names(ticker),
+            "description": descriptions(ticker),
+            "change_percent": round(stock_return, 2),
+            "change_percent_1d": round(stock_return_1d, 2) if stock_return_1d is not None else None,
+            "beta": round(beta_alpha["beta"], 3) if beta_alpha["beta"] is not None else None,
+            "alpha": round(beta_alpha["alpha"], 3) if beta_alpha["alpha"] is not None else None,
+            "r_squared": round(beta_alpha["r_squared"], 3) if beta_alpha.get("r_squared") is not None else None,
+            "market_cap": market_cap_data.get("market_cap"),
+            "market_cap_category": market_cap_data.get("market_cap_category"),
+            "sparkline": stock_sparkline,
+        }
+        if weights is not None:
+            stock["weight"] = weights.get(ticker)
+        stocks.append(stock)
+
+    # 騰落率でソート
+    stocks.sort(key=lambda x: x["change_percent"], reverse=True)
+
+    return {
+        "id": info["id"],
+        "name": info["name"],
+        "description": info.get("description", ""),
+        "change_percent": theme_return,
+        "change_percent_1d": theme_return_1d,
+        "stock_count": len(tickers),
+        "sparkline": theme_sparkline,
+        "stocks": stocks,
+        "period": period,
+        "last_updated": last_updated,
+        "generated_at": datetime.now().isoformat(),
+    }
+
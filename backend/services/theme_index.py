@@ -0,0 +1,347 @@
+"""テーマ指数（加重方式別）の一括計算
+
+テーマの騰落率は従来どおり均等加重（構成銘柄の期間騰落率の単純平均）を基本とし、
+追加の方式として時価総額加重・浮動株調整時価総額加重・カスタムウェイトの指数を
+終値行列（services/price_matrix.py）から全テーマまとめて計算する。
+
+- 指数は各リバランス日（既定: 月末の取引日）の終値でウェイトを決め、次のリバランス日まで
+  値動きに応じてウェイトが変化する（バイ・アンド・ホールド）
+- 時価総額加重のリバランス時点の時価総額は、最新の時価総額 × その日の株価 / 最新株価 で推定する
+  （発行済株式数は期間中一定とみなす）
+- 浮動株調整は get_market_cap() の float_ratio を掛ける（取得できない銘柄は1として扱う）
+- カスタムウェイトはテーマ定義の weights。未定義のテーマは出力に含めない（均等加重のまま）
+- テーマ × 銘柄 の疎行列と 日付 × 銘柄 の行列の積で、テーマ数によらず1回の行列演算で計算する
+
+結果は precomputed/theme_index_{period}.json に保存し、API は weighting クエリで
+テーマ一覧・テーマ詳細の騰落率・スパークラインを差し替えて返す（リクエスト時の再計算なし）。
+"""
+
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from services.price_matrix import PriceMatrix
+from services.sparkline import PERIOD_DAYS, SPARKLINE_RESAMPLE_FREQ, empty_sparkline, sparkline_source_period
+
+# 加重方式（equal は従来の事前計算結果をそのまま使う）
+WEIGHTINGS = ("equal", "market_cap", "float", "custom")
+DEFAULT_WEIGHTING = "equal"
+
+# 指数として追加で事前計算する方式
+INDEX_WEIGHTINGS = ("market_cap", "float", "custom")
+
+# リバランス頻度 -> pandas の期間単位（none は期間の初日のみ）
+REBALANCE_FREQUENCIES = {"monthly": "M", "quarterly": "Q", "none": None}
+DEFAULT_REBALANCE = "monthly"
+
+# 指数で差し替えるテーマのフィールド
+INDEX_FIELDS = ("change_percent", "change_percent_1d", "sparkline")
+
+# 構成ウェイトの丸め桁数
+WEIGHT_DECIMALS = 4
+
+
+def theme_index_filename(period: str) -> str:
+    """テーマ指数の保存ファイル名"""
+    return f"theme_index_{period}.json"
+
+
+# =============================================================================
+# 行列計算
+# =============================================================================
+
+def rebalance_anchors(dates: pd.DatetimeIndex, rebalance: str = DEFAULT_REBALANCE) -> np.ndarray:
+    """リバランスを行う行番号（昇順）
+
+    先頭行と、各月（四半期）の最終取引日の行。最終行はリバランス不要のため含めない。
+    """
+    if len(dates) == 0:
+        return np.zeros(0, dtype=np.intp)
+    freq = REBALANCE_FREQUENCIES[rebalance]
+    if freq is None or len(dates) == 1:
+        return np.zeros(1, dtype=np.intp)
+    labels = pd.DatetimeIndex(dates).to_period(freq).asi8
+    period_ends = np.flatnonzero(labels[1:] != labels[:-1])
+    return np.unique(np.concatenate(([0], period_ends))).astype(np.intp)
+
+
+def forward_fill(close: np.ndarray) -> np.ndarray:
+    """欠損（NaN）を直前の値で埋める（上場前の行はNaNのまま。欠損のある列だけ処理する）"""
+    filled = close.copy()
+    missing = np.isnan(close)
+    columns = np.flatnonzero(missing.any(axis=0))
+    if len(columns) == 0:
+        return filled
+    rows = np.arange(close.shape[0])[:, None]
+    index = np.where(missing[:, columns], 0, rows)
+    np.maximum.accumulate(index, axis=0, out=index)
+    filled[:, columns] = close[index, columns]
+    return filled
+
+
+def compute_index_levels(
+    close: np.ndarray,
+    anchors: np.ndarray,
+    membership: sparse.csr_matrix,
+    scale: Optional[np.ndarray] = None,
+) -> tuple[np.ndarray, sparse.csr_matrix, np.ndarray]:
+    """全テーマの指数を一括計算
+
+    Args:
+        close: 終値行列（日付 × 銘柄、欠損はNaN）
+        anchors: リバランス行（rebalance_anchors の結果）
+        membership: テーマ × 銘柄 の目標ウェイト（均等・時価総額加重は所属=1、カスタムは指定ウェイト）
+        scale: 銘柄ごとの最新の時価総額。指定時はリバランス時点の推定時価総額をウェイトに掛ける
+
+    Returns:
+        (指数: 日付 × テーマ（先頭行=1）,
+         最終日の構成ウェイト: テーマ × 銘柄（行ごとに合計1）,
+         計算できたテーマのマスク（1度もウェイトが付かなかったテーマはFalse）)
+    """
+    days = close.shape[0]
+    themes = membership.shape[0]
+    if days == 0:
+        return np.ones((0, themes)), sparse.csr_matrix(membership.shape), np.zeros(themes, dtype=bool)
+
+    filled = forward_fill(close)
+    anchor_prices = filled[anchors]
+    listed = ~np.isnan(anchor_prices)
+
+    # リバランス時点の銘柄ごとの係数（上場前の銘柄は0）
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if scale is None:
+            factors = listed.astype(float)
+        else:
+            factors = np.where(listed, scale * anchor_prices / filled[-1], 0.0)
+    factors = np.nan_to_num(factors, nan=0.0, posinf=0.0, neginf=0.0)
+
+    # 各行が属する区間（リバランス日の翌日〜次のリバランス日）
+    segment = np.maximum(np.searchsorted(anchors, np.arange(days), side="left") - 1, 0)
+
+    # リバランス時点を1とした各銘柄の保有価値
+    with np.errstate(divide="ignore", invalid="ignore"):
+        held = factors[segment] * filled / anchor_prices[segment]
+    held = np.nan_to_num(held, nan=0.0, posinf=0.0, neginf=0.0)
+
+    numerator = np.asarray(membership @ held.T).T
+    denominator = np.asarray(membership @ factors.T).T
+    active = denominator > 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.where(active[segment], numerator / denominator[segment], 1.0)
+
+    # 区間ごとの騰落を連結（次のリバランス日の値が区間の終値）
+    growth = np.ones_like(denominator)
+    growth[1:] = ratio[anchors[1:]]
+    levels = np.cumprod(growth, axis=0)[segment] * ratio
+
+    held_last = membership.multiply(held[-1]).tocsr()
+    totals = np.asarray(held_last.sum(axis=1)).ravel()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        inverse = np.where(totals > 0, 1.0 / totals, 0.0)
+    weights = sparse.diags(inverse) @ held_last
+
+    return levels, sparse.csr_matrix(weights), active.any(axis=0)
+
+
+def membership_matrix(
+    matrix: PriceMatrix,
+    theme_ids: list[str],
+    themes: dict[str, dict],
+    weighting: str = DEFAULT_WEIGHTING,
+) -> sparse.csr_matrix:
+    """テーマ × 行列の銘柄 の目標ウェイト（所属=1。カスタムは指定ウェイトで、未定義のテーマは空行）"""
+    rows, columns, values = [], [], []
+    for row, theme_id in enumerate(theme_ids):
+        theme = themes[theme_id]
+        custom = theme.get("weights") if weighting == "custom" else None
+        if weighting == "custom" and not custom:
+            continue
+        for ticker in theme["tickers"]:
+            column = matrix.columns.get(ticker)
+            if column is None:
+                continue
+            rows.append(row)
+            columns.append(column)
+            values.append(custom[ticker] if custom else 1.0)
+    return sparse.csr_matrix(
+        (np.asarray(values, dtype=float), (np.asarray(rows, dtype=np.intp), np.asarray(columns, dtype=np.intp))),
+        shape=(len(theme_ids), len(matrix.tickers)),
+    )
+
+
+def _scale(matrix: PriceMatrix, weighting: str, market_caps: dict[str, dict]) -> Optional[np.ndarray]:
+    """時価総額加重の銘柄ごとの最新時価総額（浮動株調整を含む）"""
+    if weighting not in ("market_cap", "float"):
+        return None
+    scale = np.zeros(len(matrix.tickers))
+    for column, ticker in enumerate(matrix.tickers):
+        data = market_caps.get(ticker) or {}
+        market_cap = data.get("market_cap") or 0
+        if weighting == "float":
+            market_cap *= data.get("float_ratio") or 1.0
+        scale[column] = market_cap
+    return scale
+
+
+def theme_index_levels(
+    matrix: PriceMatrix,
+    themes: dict[str, dict],
+    market_caps: dict[str, dict],
+    weighting: str = DEFAULT_WEIGHTING,
+    rebalance: str = DEFAULT_REBALANCE,
+) -> tuple[np.ndarray, np.ndarray]:
+    """1方式分の全テーマの日次指数（日付 × テーマ、先頭行=1）と計算できたテーマのマスク
+
+    均等加重も所属=1の構成行列で同じ計算を行う（リバランス日に均等へ戻すバイ・アンド・ホールド）
+    """
+    levels, _, available = compute_index_levels(
+        matrix.close,
+        rebalance_anchors(matrix.dates, rebalance),
+        membership_matrix(matrix, list(themes), themes, weighting),
+        _scale(matrix, weighting, market_caps),
+    )
+    return levels, available
+
+
+def _sparklines(levels: np.ndarray, dates: pd.DatetimeIndex, period: str) -> list[dict]:
+    """指数からテーマごとのスパークラインを生成（build_sparkline と同じ形式）"""
+    if len(levels) == 0:
+        return [empty_sparkline() for _ in range(levels.shape[1])]
+
+    cumulative = pd.DataFrame((levels - 1) * 100, index=dates)
+    freq = SPARKLINE_RESAMPLE_FREQ.get(period)
+    if freq is not None:
+        cumulative = cumulative.groupby(pd.DatetimeIndex(dates).to_period(freq)).last()
+        start = 0
+    else:
+        start = max(0, len(cumulative) - PERIOD_DAYS.get(period, 21))
+    values = cumulative.round(2).to_numpy()
+    return [{"data": values[:, column].tolist(), "period_start_index": start} for column in range(values.shape[1])]
+
+
+def build_theme_indices(
+    matrices: dict[str, PriceMatrix],
+    themes: dict[str, dict],
+    market_caps: dict[str, dict],
+    weightings: tuple[str, ...] = INDEX_WEIGHTINGS,
+    rebalance: str = DEFAULT_REBALANCE,
+) -> dict[str, dict]:
+    """全期間・全方式のテーマ指数を計算
+
+    Args:
+        matrices: 期間 -> 終値行列
+        themes: テーマ定義（THEMES）
+        market_caps: 銘柄ごとの get_market_cap() の結果
+        weightings: 計算する加重方式
+        rebalance: リバランス頻度（monthly / quarterly / none）
+
+    Returns:
+        期間 -> theme_index_{period}.json の内容
+    """
+    theme_ids = list(themes)
+    generated_at = datetime.now().isoformat()
+
+    # (期間, 方式) -> (指数, 最終日のウェイト, 計算できたテーマ)
+    computed = {}
+    # 銘柄の並びが同じ行列（通常は全期間）では構成行列を使い回す
+    memberships: dict[tuple, sparse.csr_matrix] = {}
+    for period, matrix in matrices.items():
+        anchors = rebalance_anchors(matrix.dates, rebalance)
+        for weighting in weightings:
+            key = (matrix.tickers, weighting == "custom")
+            if key not in memberships:
+                memberships[key] = membership_matrix(matrix, theme_ids, themes, weighting)
+            computed[period, weighting] = compute_index_levels(
+                matrix.close,
+                anchors,
+                memberships[key],
+                _scale(matrix, weighting, market_caps),
+            )
+
+    payloads = {}
+    for period, matrix in matrices.items():
+        entries: dict[str, dict] = {theme_id: {} for theme_id in theme_ids}
+        for weighting in weightings:
+            levels, weights, available = computed[period, weighting]
+            day = computed.get(("1d", weighting)) if period != "1d" else None
+            source_period = sparkline_source_period(period)
+            source = computed.get((source_period, weighting))
+            sparklines = (
+                _sparklines(source[0], matrices[source_period].dates, period) if source is not None else None
+            )
+            if len(levels) == 0:
+                continue
+            changes = np.round((levels[-1] - 1) * 100, 2).tolist()
+            changes_1d = np.round((day[0][-1] - 1) * 100, 2).tolist() if day is not None and len(day[0]) else None
+            weight_values = np.round(weights.data, WEIGHT_DECIMALS).tolist()
+            for row, theme_id in enumerate(theme_ids):
+                if not available[row]:
+                    continue
+                start, end = weights.indptr[row], weights.indptr[row + 1]
+                entries[theme_id][weighting] = {
+                    "change_percent": changes[row],
+                    "change_percent_1d": changes_1d[row] if changes_1d is not None and day[2][row] else None,
+                    "sparkline": sparklines[row] if sparklines is not None else empty_sparkline(),
+                    "weights": dict(zip(
+                        [matrix.tickers[column] for column in weights.indices[start:end]],
+                        weight_values[start:end],
+                    )),
+                }
+        payloads[period] = {
+            "period": period,
+            "weightings": list(weightings),
+            "rebalance": rebalance,
+            "themes": {theme_id: entry for theme_id, entry in entries.items() if entry},
+            "generated_at": generated_at,
+        }
+    return payloads
+
+
+# =============================================================================
+# レスポンスへの適用（事前計算済みの値の差し替えのみ）
+# =============================================================================
+
+def _index_entry(index: Optional[dict], theme_id: str, weighting: str) -> Optional[dict]:
+    if not index:
+        return None
+    return index.get("themes", {}).get(theme_id, {}).get(weighting)
+
+
+def apply_index_to_ranking(ranking: dict, index: Optional[dict], weighting: str) -> dict:
+    """テーマ一覧の騰落率・スパークラインを指定方式の指数に差し替えたコピー（騰落率順に並べ直す）
+
+    指数のないテーマ（カスタムウェイト未定義・未計算）は均等加重の値のまま weighting="equal" とする。
+    元のpayload（スナップショットの共有オブジェクト）は変更しない。
+    """
+    themes = []
+    for theme in ranking.get("themes", []):
+        entry = _index_entry(index, theme["id"], weighting)
+        if entry is None:
+            themes.append({**theme, "weighting": DEFAULT_WEIGHTING})
+        else:
+            themes.append({**theme, **{key: entry[key] for key in INDEX_FIELDS}, "weighting": weighting})
+    themes.sort(key=lambda theme: theme["change_percent"], reverse=True)
+    return {
+        **ranking,
+        "themes": themes,
+        "weighting": weighting,
+        "rebalance": index.get("rebalance") if index else None,
+    }
+
+
+def apply_index_to_detail(detail: dict, index: Optional[dict], weighting: str) -> dict:
+    """テーマ詳細の騰落率・スパークラインを指定方式の指数に差し替え、構成銘柄に weight を付けたコピー"""
+    entry = _index_entry(index, detail.get("id"), weighting)
+    if entry is None:
+        return {**detail, "weighting": DEFAULT_WEIGHTING}
+    weights = entry.get("weights", {})
+    return {
+        **detail,
+        **{key: entry[key] for key in INDEX_FIELDS},
+        "stocks": [{**stock, "weight": weights.get(stock["code"], 0.0)} for stock in detail.get("stocks", [])],
+        "weighting": weighting,
+        "rebalance": index.get("rebalance"),
+    }
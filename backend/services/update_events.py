@@ -0,0 +1,218 @@
+"""データ更新完了イベントのプロセス内 pub/sub（Server-Sent Events 用）
+
+update_data の更新リスナーとして on_update() を登録すると、更新のたびに
+テーマランキング（themes_{period}.json）を前回と比べ、変わったテーマの一覧を持つ
+イベントを作ってイベントループ上の購読者に通知する。
+
+- イベントは1回だけシリアライズし、全購読者で同じバイト列を送る
+- 購読者ごとのキューは持たない。購読者は共有の asyncio.Event を待ち、起きたら最新の
+  イベントだけを送る（取りこぼした途中の版は最新版にまとまる）
+- keepalive もひとつのタスクが全購読者をまとめて起こすため、接続ごとのタイマーは不要
+  （アイドル接続1本あたりのコストは待機中のコルーチン1つ）
+
+版番号（version）はプロセス起動ごとに1から振り直すため、イベントID には起動時刻（ミリ秒）を
+前置する（"{epoch}-{version}"）。Last-Event-ID が最新イベントの ID と一致しなければ接続直後に
+最新イベントを送るため、再起動をまたいだ再接続でも更新を取りこぼさない。
+"""
+
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+from services import snapshot
+from utils.serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+# 事前計算済みデータの保存先
+PRECOMPUTED_DIR = Path(__file__).parent.parent / "precomputed"
+
+# 変更を判定する期間
+EVENT_PERIODS = ["1d", "5d", "10d", "1mo", "3mo", "6mo", "1y", "3y", "5y"]
+
+# keepalive コメントの送信間隔（秒）。プロキシのアイドルタイムアウトより短くする
+SSE_KEEPALIVE_SECONDS = float(os.environ.get("SSE_KEEPALIVE_SECONDS", "15"))
+
+# 再接続までの待ち時間（ミリ秒、SSE の retry フィールド）
+SSE_RETRY_MS = 5000
+
+# テーマの変更判定に使うフィールド
+FINGERPRINT_FIELDS = ("change_percent", "change_percent_1d", "stock_count")
+
+KEEPALIVE = b": keepalive\n\n"
+
+
+@dataclass(frozen=True)
+class UpdateEvent:
+    """1回分の更新イベント（message はSSE形式にエンコード済み）"""
+    id: str
+    version: int
+    payload: dict
+    message: bytes
+
+
+def encode_event(event_id: str, payload: dict, event: str = "snapshot") -> bytes:
+    """SSE のイベント（id / event / data）にエンコード"""
+    return b"id: %s\nevent: %s\ndata: %s\n\n" % (event_id.encode(), event.encode(), dumps(payload))
+
+
+def ranking_fingerprints(directory: Path = PRECOMPUTED_DIR) -> dict[str, dict[str, tuple]]:
+    """期間 -> テーマID -> 変更判定用の値（ランキングが未作成の期間は含めない）"""
+    fingerprints = {}
+    for period in EVENT_PERIODS:
+        payload = snapshot.get(directory / f"themes_{period}.json")
+        if payload is None:
+            continue
+        fingerprints[period] = {
+            row["id"]: tuple(row.get(name) for name in FINGERPRINT_FIELDS) for row in payload.get("themes", [])
+        }
+    return fingerprints
+
+
+def summarize_changes(old: dict[str, dict[str, tuple]], new: dict[str, dict[str, tuple]]) -> dict:
+    """前回と今回のフィンガープリントから変わったテーマ・期間をまとめる"""
+    changed: set[str] = set()
+    periods = []
+    for period, themes in new.items():
+        previous = old.get(period, {})
+        period_changed = {theme_id for theme_id, value in themes.items() if previous.get(theme_id) != value}
+        period_changed |= previous.keys() - themes.keys()
+        if period_changed:
+            periods.append(period)
+            changed |= period_changed
+
+    old_ids = {theme_id for themes in old.values() for theme_id in themes}
+    new_ids = {theme_id for themes in new.values() for theme_id in themes}
+    added = new_ids - old_ids
+    removed = old_ids - new_ids
+    return {
+        "periods": periods,
+        "themes": {
+            "changed": sorted(changed - added - removed),
+            "added": sorted(added),
+            "removed": sorted(removed),
+        },
+    }
+
+
+class UpdateBroker:
+    """更新イベントの配信元（イベントループ上の購読者へ通知）"""
+
+    def __init__(self, directory: Path = PRECOMPUTED_DIR, keepalive_seconds: float = SSE_KEEPALIVE_SECONDS) -> None:
+        self._directory = directory
+        self._keepalive_seconds = keepalive_seconds
+        self._fingerprints: Optional[dict[str, dict[str, tuple]]] = None
+        # イベントID の接頭辞（再起動後の版番号と前のプロセスの版番号を区別する）
+        self.epoch = time.time_ns() // 1_000_000
+        self._version = 0
+        self._latest: Optional[UpdateEvent] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._closed = False
+        self.subscribers = 0
+
+    @property
+    def latest(self) -> Optional[UpdateEvent]:
+        return self._latest
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop) -> None:
+        """通知先のイベントループを設定（アプリ起動時。close() 後の再利用に備えて終了状態も戻す）"""
+        self._loop = loop
+        self._closed = False
+        self._wakeup = None
+        self._heartbeat = None
+
+    def on_update(self) -> None:
+        """更新リスナー（更新ジョブのスレッドから呼ばれる）: イベントを作ってループに通知"""
+        fingerprints = ranking_fingerprints(self._directory)
+        previous, self._fingerprints = self._fingerprints, fingerprints
+        if previous is None:
+            # 起動後最初の呼び出しは基準となるイベント（変更なし）
+            summary = summarize_changes(fingerprints, fingerprints)
+        else:
+            summary = summarize_changes(previous, fingerprints)
+            if not summary["periods"]:
+                return  # ランキングに変化なし
+
+        ranking = snapshot.get(self._directory / "themes_1mo.json") or {}
+        payload = {
+            "generated_at": ranking.get("generated_at"),
+            "last_updated": ranking.get("last_updated"),
+            **summary,
+        }
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            self._publish(payload)
+            return
+        try:
+            loop.call_soon_threadsafe(self._publish, payload)
+        except RuntimeError:  # ループが終了済み
+            pass
+
+    def _publish(self, payload: dict) -> None:
+        self._version += 1
+        event_id = f"{self.epoch}-{self._version}"
+        payload = {"version": self._version, **payload}
+        self._latest = UpdateEvent(event_id, self._version, payload, encode_event(event_id, payload))
+        logger.info(f"Update event v{self._version}: periods={payload['periods']}, subscribers={self.subscribers}")
+        self._wake()
+
+    def _wake(self) -> None:
+        # 待機中の全購読者を起こし、次の待機用に新しい Event を用意する
+        wakeup, self._wakeup = self._wakeup, None
+        if wakeup is not None:
+            wakeup.set()
+
+    async def _wait(self) -> None:
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        if self._heartbeat is None or self._heartbeat.done():
+            self._heartbeat = asyncio.get_running_loop().create_task(self._heartbeat_loop())
+        await self._wakeup.wait()
+
+    async def _heartbeat_loop(self) -> None:
+        while not self._closed and self.subscribers:
+            await asyncio.sleep(self._keepalive_seconds)
+            self._wake()
+
+    def close(self) -> None:
+        """全ストリームを終了させる（シャットダウン時。イベントループ上で呼ぶ）"""
+        self._closed = True
+        self._wake()
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+
+    async def stream(self, last_event_id: Optional[str] = None) -> AsyncIterator[bytes]:
+        """SSE のバイト列を生成（最新イベント、以降は更新ごとのイベントと keepalive）
+
+        Args:
+            last_event_id: 再接続時の Last-Event-ID。最新イベントの ID と一致すれば最新イベントを送らない
+                （別のプロセスが振った ID は一致しないため、再起動後は必ず最新イベントを送る）
+        """
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+        sent = last_event_id
+        self.subscribers += 1
+        try:
+            yield b"retry: %d\n\n" % SSE_RETRY_MS
+            while True:
+                latest = self._latest
+                if latest is not None and latest.id != sent:
+                    sent = latest.id
+                    yield latest.message
+                if self._closed:
+                    return
+                await self._wait()
+                if self._latest is latest and not self._closed:
+                    yield KEEPALIVE
+        finally:
+            self.subscribers -= 1
+
+
+# プロセス全体で共有するブローカー
+update_broker = UpdateBroker()
@@ -7,19 +7,30 @@ for the analytics module using the FastAPI test client.
 import sys
 from pathlib import Path
 
+import numpy as np
+import pytest
+
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
 from fastapi import APIRouter, FastAPI
 from fastapi.testclient import TestClient
 
 from data.themes import THEMES
+from routers import analytics as analytics_router
 from routers.analytics import router
+from services import snapshot
 from services.analytics_service import (
+    analytics_filename,
+    breadth_stats,
+    build_analytics_snapshot,
     calculate_portfolio_metrics,
     calculate_theme_ranking,
     get_sector_distribution,
     get_theme_overlap_matrix,
+    top_indices,
 )
+from services.metrics_table import MetricsTable
+from utils.serialization import dumps
 
 # Verify router is properly configured
 assert isinstance(router, APIRouter), "analytics router must be an APIRouter"
@@ -79,6 +90,10 @@ class TestTopMoversEndpoint:
         data = client.get("/api/analytics/top-movers").json()
         assert data["limit"] == 10
 
+    def test_invalid_period_rejected(self):
+        assert client.get("/api/analytics/top-movers?period=2w").status_code == 400
+        assert client.get("/api/analytics/summary?period=2w").status_code == 400
+
 
 class TestPortfolioEndpoint:
     """Tests for @router.get /api/analytics/portfolio"""
@@ -130,3 +145,133 @@ class TestAnalyticsService:
         for item in dist:
             assert "stock_count" in item
             assert "percentage_of_total" in item
+
+
+# ---------------------------------------------------------------------------
+# Per-snapshot analytics aggregate
+# ---------------------------------------------------------------------------
+
+def _ranking_rows() -> list[dict]:
+    returns = {"ai": 8.5, "semiconductor": 12.25, "ev": -3.0, "finance": 0.0, "healthcare": -7.5}
+    rows = [
+        {"id": theme_id, "name": THEMES[theme_id]["name"], "change_percent": value,
+         "change_percent_1d": value / 10, "stock_count": len(THEMES[theme_id]["tickers"])}
+        for theme_id, value in returns.items()
+    ]
+    rows.append({"id": "retail-ec", "name": "小売・EC", "change_percent": 0.0, "error": "fetch failed"})
+    return rows
+
+
+def _metrics_table() -> MetricsTable:
+    values = [("7203.T", 4.0), ("6758.T", -2.5), ("9984.T", 15.0), ("8306.T", None), ("6861.T", -9.0)]
+    records = [
+        {"code": code, "name": code, "theme_ids": ["ai"], "theme_names": ["AI"],
+         "change_percent": value if value is not None else 0.0, "return_1mo": value}
+        for code, value in values
+    ]
+    return MetricsTable("1mo", records)
+
+
+class TestAnalyticsAggregate:
+    """Tests for the analytics aggregate built by the updater."""
+
+    def test_top_indices_matches_full_sort(self):
+        values = np.random.default_rng(0).normal(size=1000)
+        values[::7] = np.nan
+        order = np.argsort(-np.nan_to_num(values, nan=-np.inf), kind="stable")
+        assert top_indices(values, 25).tolist() == order[:25].tolist()
+        assert top_indices(values, 5, descending=False).tolist() == np.argsort(np.nan_to_num(values, nan=np.inf))[:5].tolist()
+        assert len(top_indices(values, 5000)) == np.count_nonzero(~np.isnan(values))
+        assert len(top_indices(np.array([np.nan]), 3)) == 0
+
+    def test_breadth_stats(self):
+        stats = breadth_stats(np.array([1.0, -2.0, 0.0, 3.0, np.nan]))
+        assert stats["count"] == 4
+        assert (stats["advancers"], stats["decliners"], stats["unchanged"]) == (2, 1, 1)
+        assert stats["advancers_percent"] == 50.0
+        assert stats["average_return"] == 0.5
+        assert breadth_stats(np.array([]))["average_return"] is None
+
+    def test_build_snapshot(self):
+        aggregate = build_analytics_snapshot("1mo", _ranking_rows(), _metrics_table(), top_n=2)
+
+        assert aggregate["themes"]["count"] == 5  # error row excluded
+        assert aggregate["themes"]["best"]["id"] == "semiconductor"
+        assert aggregate["themes"]["worst"]["id"] == "healthcare"
+        assert [row["id"] for row in aggregate["ranking"]] == [
+            "semiconductor", "ai", "finance", "ev", "healthcare",
+        ]
+
+        themes = aggregate["movers"]["themes"]
+        assert [row["id"] for row in themes["gainers"]] == ["semiconductor", "ai"]
+        assert [row["id"] for row in themes["losers"]] == ["healthcare", "ev"]
+        assert [row["id"] for row in themes["movers"]] == ["semiconductor", "ai"]
+
+        # Stocks without a period return are excluded
+        assert aggregate["stocks"]["count"] == 4
+        stocks = aggregate["movers"]["stocks"]
+        assert [row["code"] for row in stocks["gainers"]] == ["9984.T", "7203.T"]
+        assert [row["code"] for row in stocks["movers"]] == ["9984.T", "6861.T"]
+        assert stocks["losers"][0] == {
+            "code": "6861.T", "name": "6861.T", "theme_id": "ai", "theme_name": "AI", "change_percent": -9.0,
+        }
+
+    def test_build_snapshot_without_metrics(self):
+        aggregate = build_analytics_snapshot("1mo", _ranking_rows())
+        assert aggregate["stocks"] is None
+        assert "stocks" not in aggregate["movers"]
+
+
+@pytest.fixture
+def aggregate_client(tmp_path, monkeypatch):
+    aggregate = build_analytics_snapshot("1mo", _ranking_rows(), _metrics_table(), last_updated="2026-01-05")
+    (tmp_path / analytics_filename("1mo")).write_bytes(dumps(aggregate))
+    monkeypatch.setattr(analytics_router, "PRECOMPUTED_DIR", tmp_path)
+    yield client
+    snapshot.clear()
+
+
+class TestAggregateEndpoints:
+    """Endpoints served from a precomputed aggregate."""
+
+    def test_summary(self, aggregate_client):
+        data = aggregate_client.get("/api/analytics/summary?period=1mo").json()
+        assert data["best_theme"]["id"] == "semiconductor"
+        assert data["worst_theme"]["id"] == "healthcare"
+        assert data["average_return"] == 2.05
+        assert data["breadth"]["themes"]["advancers"] == 2
+        assert data["breadth"]["stocks"]["decliners"] == 2
+        assert data["last_updated"] == "2026-01-05"
+
+    def test_summary_before_first_update(self, aggregate_client):
+        data = aggregate_client.get("/api/analytics/summary?period=3mo").json()
+        assert data["total_themes"] == len(THEMES)
+        assert data["best_theme"] is None
+
+    def test_top_movers(self, aggregate_client):
+        data = aggregate_client.get("/api/analytics/top-movers?period=1mo&limit=3").json()
+        assert [row["id"] for row in data["gainers"]] == ["semiconductor", "ai", "finance"]
+        assert [row["id"] for row in data["movers"]] == ["semiconductor", "ai", "healthcare"]
+
+        stocks = aggregate_client.get("/api/analytics/top-movers?period=1mo&kind=stocks&limit=1").json()
+        assert stocks["losers"][0]["code"] == "6861.T"
+
+    def test_theme_ranking_uses_aggregate(self, aggregate_client, tmp_path):
+        ranking = calculate_theme_ranking("1mo", tmp_path)
+        assert len(ranking) == len(THEMES)
+        assert [item["id"] for item in ranking[:2]] == ["semiconductor", "ai"]
+        assert ranking[0]["change_percent"] == 12.25
+        # Themes without a return follow the ranked ones
+        assert ranking[5]["change_percent"] is None
+        assert [item["rank"] for item in ranking] == list(range(1, len(THEMES) + 1))
+
+
+class TestAppRouters:
+    """main.py mounts every API router."""
+
+    def test_routers_registered(self):
+        from main import app
+
+        paths = set(app.openapi()["paths"])
+        for path in ("/api/analytics/summary", "/api/search/stocks", "/api/export/themes/csv", "/api/health/live"):
+            assert path in paths
@@ -0,0 +1,66 @@
+"""Tests for the benchmark result comparison and the offline market stand-in"""
+
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks import compare as compare_module
+from benchmarks.bench_pipeline import SyntheticMarket, build_themes
+from benchmarks.compare import compare, direction, flatten
+
+
+class TestCompare:
+    def test_flatten_and_direction(self):
+        flat = flatten({
+            "meta": {"commit": "abc", "elapsed_s": 1.0},
+            "pipeline": {"200": {"cycle_s": 1.5, "tickers": 200, "stages": {"themes_s": 0.5}}},
+            "runs": [{"p50_ms": 2.0}],
+        })
+        assert flat == {
+            "pipeline.200.cycle_s": 1.5,
+            "pipeline.200.tickers": 200.0,
+            "pipeline.200.stages.themes_s": 0.5,
+            "runs.0.p50_ms": 2.0,
+        }
+        assert direction("throughput.beta_alpha_per_s") == 1
+        assert direction("pipeline.200.peak_mib") == -1
+        assert direction("pipeline.4000.fallback.themes.p95_ms") == -1
+        assert direction("pipeline.200.tickers") == 0
+
+    def test_regressions_over_threshold(self):
+        baseline = {"cycle_s": 10.0, "p50_ms": 2.0, "beta_alpha_per_s": 1000.0, "files": 100, "gone_s": 1.0}
+        current = {"cycle_s": 11.0, "p50_ms": 3.0, "beta_alpha_per_s": 700.0, "files": 500, "new_s": 9.0}
+        regressions = compare(baseline, current, threshold=0.2)
+        assert [r["metric"] for r in regressions] == ["p50_ms", "beta_alpha_per_s"]
+        assert regressions[0]["change"] == 0.5
+        assert compare(baseline, current, threshold=0.6) == []
+
+    def test_cli_exit_code(self, tmp_path, capsys):
+        baseline, current = tmp_path / "baseline.json", tmp_path / "current.json"
+        baseline.write_text(json.dumps({"cycle_s": 1.0}))
+        current.write_text(json.dumps({"cycle_s": 1.5}))
+        assert compare_module.main([str(baseline), str(current), "--threshold", "0.25"]) == 1
+        assert "cycle_s" in capsys.readouterr().out
+        assert compare_module.main([str(baseline), str(current), "--threshold", "0.6"]) == 0
+
+
+class TestSyntheticMarket:
+    def test_history_is_deterministic_per_ticker(self):
+        market = SyntheticMarket()
+        month = market.Ticker("1000.T").history(period="1mo")
+        assert len(month) == 21
+        assert list(month.columns[:5]) == ["Open", "High", "Low", "Close", "Volume"]
+        assert month.equals(SyntheticMarket().Ticker("1000.T").history(period="1mo"))
+        assert not month["Close"].equals(market.Ticker("1001.T").history(period="1mo")["Close"])
+
+        since = month.index[-3].strftime("%Y-%m-%d")
+        assert len(market.Ticker("1000.T").history(start=since)) == 3
+        assert market.Ticker("1000.T").info["marketCap"] > 0
+
+    def test_build_themes(self):
+        themes = build_themes(25, tickers_per_theme=10)
+        assert [len(theme["tickers"]) for theme in themes.values()] == [10, 10, 5]
+        assert themes["theme_000"]["tickers"][0] == "1000.T"
+
@@ -0,0 +1,229 @@
+"""Tests for the bulk Parquet/Arrow export (service, job and endpoint)"""
+
+import io
+import sys
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from jobs.export_history import export_history, main
+from routers import export as export_router
+from services import history_store, price_matrix, snapshot
+from services.bulk_export import (
+    MANIFEST_FILENAME,
+    PartitionWriter,
+    fundamentals_batch,
+    ohlcv_batches,
+    theme_index_batches,
+)
+from services.metrics_table import MetricsTable, metrics_filename
+from services.price_matrix import BENCHMARK_TICKER, PriceMatrix, save_price_matrix
+from utils.serialization import dumps
+
+THEMES = {
+    "auto": {"name": "自動車", "description": "", "tickers": ["7203.T", "7267.T"]},
+    "bank": {"name": "銀行", "description": "", "tickers": ["8306.T"]},
+}
+TICKERS = ["7203.T", "7267.T", "8306.T"]
+
+
+def _history(days: int = 400, seed: int = 0) -> pd.DataFrame:
+    """2025-01-01 から営業日 days 本の OHLCV"""
+    close = 1000 * np.cumprod(1 + np.random.default_rng(seed).normal(0, 0.01, days))
+    return pd.DataFrame(
+        {"Open": close, "High": close * 1.01, "Low": close * 0.99, "Close": close, "Volume": np.full(days, 1e6)},
+        index=pd.DatetimeIndex(pd.bdate_range("2025-01-01", periods=days), name="Date"),
+    )
+
+
+def _matrix(days: int = 400) -> PriceMatrix:
+    closes = [_history(days, seed)["Close"].to_numpy() for seed in range(4)]
+    return PriceMatrix(
+        "5y", pd.bdate_range("2025-01-01", periods=days).to_numpy(), TICKERS + [BENCHMARK_TICKER], np.column_stack(closes)
+    )
+
+
+def _table() -> MetricsTable:
+    records = [
+        {"code": ticker, "name": ticker, "theme_ids": [theme_id], "theme_names": [THEMES[theme_id]["name"]],
+         "market_cap": 1e12 * (i + 1), "rsi": 50.0 + i, "return_1y": float(i)}
+        for i, (ticker, theme_id) in enumerate([("7203.T", "auto"), ("7267.T", "auto"), ("8306.T", "bank")])
+    ]
+    return MetricsTable("1y", records, last_updated="2026-07-31 15:00")
+
+
+class TestBulkBatches:
+    def test_ohlcv_is_zero_copy_and_respects_since(self):
+        frame = _history()
+        batches = list(ohlcv_batches(["7203.T", "9999.T"], since=date(2026, 1, 1), loader=lambda t: frame if t == "7203.T" else None))
+        assert len(batches) == 1
+        batch = batches[0]
+        assert batch.column("date")[0].as_py() == date(2026, 1, 2)
+        assert batch.column("ticker").unique().to_pylist() == ["7203.T"]
+
+        # Arrow の close 列は DataFrame の列のメモリをそのまま参照している
+        start = len(frame) - batch.num_rows
+        close = frame["Close"].to_numpy()
+        assert batch.column("close").buffers()[1].address == close.ctypes.data + start * close.itemsize
+
+    def test_theme_index_returns_chain_to_levels(self):
+        matrix = _matrix()
+        batch = next(theme_index_batches(matrix, THEMES, {}, weightings=("equal",)))
+        frame = batch.to_pandas()
+        auto = frame[frame["theme_id"] == "auto"]
+        assert len(frame) == len(THEMES) * len(matrix.dates)
+        assert auto["level"].iloc[0] == 1.0
+        np.testing.assert_allclose(np.prod(1 + auto["return"].iloc[1:]), auto["level"].iloc[-1])
+
+        # 差分エクスポートの日次リターンは全期間の値と一致する
+        later = next(theme_index_batches(matrix, THEMES, {}, since=date(2026, 1, 1), weightings=("equal",))).to_pandas()
+        merged = later.merge(frame, on=["theme_id", "date"], suffixes=("", "_full"))
+        assert len(merged) == len(later) > 0
+        np.testing.assert_allclose(merged["return"], merged["return_full"])
+
+    def test_market_cap_index_needs_caps_and_custom_needs_weights(self):
+        batches = list(theme_index_batches(_matrix(), THEMES, {"7203.T": {"market_cap": 1e12}}))
+        assert [batch.column("weighting")[0].as_py() for batch in batches] == ["equal", "market_cap", "float"]
+        market_cap = batches[1].to_pandas()
+        assert set(market_cap["theme_id"]) == {"auto"}
+
+    def test_fundamentals(self):
+        batch = fundamentals_batch(_table(), {"7203.T": {"float_ratio": 0.8}}, date(2026, 7, 31))
+        rows = batch.to_pylist()
+        assert rows[0]["theme_ids"] == ["auto"]
+        assert rows[0]["float_ratio"] == 0.8
+        assert np.isnan(rows[1]["float_ratio"])
+        assert rows[2]["market_cap"] == 3e12
+        assert rows[0]["as_of"] == date(2026, 7, 31)
+
+
+@pytest.fixture
+def precomputed(tmp_path, monkeypatch):
+    directory = tmp_path / "precomputed"
+    directory.mkdir()
+    save_price_matrix(directory, _matrix())
+    (directory / metrics_filename("1y")).write_bytes(dumps(_table().to_payload()))
+
+    histories = {ticker: _history(seed=i) for i, ticker in enumerate(TICKERS)}
+    monkeypatch.setattr(history_store, "read_history", lambda ticker: histories.get(ticker))
+    monkeypatch.setattr(export_router, "PRECOMPUTED_DIR", directory)
+    for theme_id, theme in THEMES.items():
+        monkeypatch.setitem(export_router.THEMES, theme_id, theme)
+    yield directory, histories
+    snapshot.clear()
+    price_matrix.clear()
+
+
+class TestPartitionWriter:
+    def test_write_by_year_groups_unordered_dates(self, tmp_path):
+        # テーマ順のバッチ（テーマごとに日付が先頭へ戻る）
+        # （先頭と末尾が同じ年でも途中に別の年がある）
+        dates = [date(2026, 1, 5), date(2025, 12, 30), date(2026, 1, 5), date(2026, 1, 6)]
+        batch = pa.record_batch(
+            [pa.array(dates, pa.date32()), pa.array(["a", "b", "b", "b"])],
+            names=["date", "theme_id"],
+        )
+        writer = PartitionWriter(tmp_path, batch.schema, "parquet", "theme_index")
+        writer.write_by_year(batch)
+        writer.close()
+        assert pq.read_table(tmp_path / "year=2025" / "theme_index.parquet").column("theme_id").to_pylist() == ["b"]
+        table = pq.read_table(tmp_path / "year=2026" / "theme_index.parquet")
+        assert table.column("theme_id").to_pylist() == ["a", "b", "b"]
+        assert writer.last_date == date(2026, 1, 6)
+
+
+class TestExportHistoryJob:
+    def test_partitions_and_incremental_sync(self, precomputed, tmp_path):
+        directory, histories = precomputed
+        output = tmp_path / "export"
+        manifest = export_history(output, directory=directory, themes=THEMES)
+
+        assert manifest["datasets"]["ohlcv"]["last_date"] == histories["7203.T"].index[-1].date().isoformat()
+        assert (output / MANIFEST_FILENAME).exists()
+        years = sorted(p.name for p in (output / "ohlcv").iterdir())
+        assert years == ["year=2025", "year=2026"]
+        ohlcv = ds.dataset(output / "ohlcv", format="parquet", partitioning="hive").to_table()
+        assert ohlcv.num_rows == sum(len(h) for h in histories.values())
+        assert (output / "fundamentals" / "as_of=2026-07-31").is_dir()
+
+        # 新しい日足が1本増えたら、差分エクスポートはその行だけを書き出す
+        for ticker, frame in histories.items():
+            next_day = frame.index[-1] + pd.offsets.BDay()
+            histories[ticker] = pd.concat([frame, frame.iloc[[-1]].set_axis([next_day])])
+        manifest = export_history(output, since="auto", datasets=("ohlcv", "fundamentals"), directory=directory, themes=THEMES)
+        last_export = manifest["datasets"]["ohlcv"]["last_export"]
+        assert last_export["rows"] == len(TICKERS)
+        assert len(last_export["files"]) == 1
+        assert pq.read_table(output / last_export["files"][0]).num_rows == len(TICKERS)
+        # ファンダメンタルズは基準日が変わっていないので書き出さない
+        assert manifest["datasets"]["fundamentals"]["last_export"]["rows"] == 0
+
+    def test_incremental_sync_per_ticker(self, precomputed, tmp_path):
+        # 前回のエクスポート時点で 7203.T の履歴だけ2日遅れていた
+        directory, histories = precomputed
+        full = dict(histories)
+        histories["7203.T"] = full["7203.T"].iloc[:-2]
+        output = tmp_path / "export"
+        manifest = export_history(output, datasets=("ohlcv",), directory=directory, themes=THEMES)
+        last_dates = manifest["datasets"]["ohlcv"]["last_dates"]
+        assert last_dates["7203.T"] == full["7203.T"].index[-3].date().isoformat()
+        assert last_dates["7267.T"] == manifest["datasets"]["ohlcv"]["last_date"]
+
+        # 遅れていた2日分も、他の銘柄より前の日付だが差分に含まれる
+        histories["7203.T"] = full["7203.T"]
+        manifest = export_history(output, since="auto", datasets=("ohlcv",), directory=directory, themes=THEMES)
+        assert manifest["datasets"]["ohlcv"]["last_export"]["rows"] == 2
+        ohlcv = ds.dataset(output / "ohlcv", format="parquet", partitioning="hive").to_table()
+        assert ohlcv.num_rows == sum(len(h) for h in full.values())
+        assert len(set(zip(ohlcv.column("ticker").to_pylist(), ohlcv.column("date").to_pylist()))) == ohlcv.num_rows
+        assert manifest["datasets"]["ohlcv"]["last_dates"]["7203.T"] == manifest["datasets"]["ohlcv"]["last_date"]
+
+    def test_cli_arrow_format(self, precomputed, tmp_path, monkeypatch):
+        directory, _ = precomputed
+        monkeypatch.setattr("jobs.export_history.PRECOMPUTED_DIR", directory)
+        monkeypatch.setattr("jobs.export_history.THEMES", THEMES)
+        output = tmp_path / "arrow"
+        main(["--output", str(output), "--format", "arrow", "--datasets", "theme_index", "--since", "2026-01-01"])
+        files = list((output / "theme_index").rglob("*.arrow"))
+        assert [f.parent.name for f in files] == ["year=2026"]
+        table = pa.ipc.open_file(files[0]).read_all()
+        assert min(table.column("date").to_pylist()) > date(2026, 1, 1)
+
+        with pytest.raises(SystemExit):
+            main(["--output", str(output), "--datasets", "prices"])
+
+
+class TestBulkEndpoint:
+    @pytest.fixture
+    def client(self, precomputed):
+        app = FastAPI()
+        app.include_router(export_router.router)
+        return TestClient(app)
+
+    def test_parquet_and_arrow_stream(self, client, precomputed):
+        _, histories = precomputed
+        resp = client.get("/api/export/bulk/ohlcv")
+        assert "attachment" in resp.headers["content-disposition"]
+        assert pq.read_table(io.BytesIO(resp.content)).num_rows == sum(len(h) for h in histories.values())
+
+        resp = client.get("/api/export/bulk/theme_index?format=arrow&since=2026-07-01")
+        assert resp.headers["content-type"] == "application/vnd.apache.arrow.stream"
+        table = pa.ipc.open_stream(resp.content).read_all()
+        assert table.num_rows > 0
+        assert min(table.column("date").to_pylist()) > date(2026, 7, 1)
+
+    def test_errors(self, client):
+        assert client.get("/api/export/bulk/prices").status_code == 404
+        assert client.get("/api/export/bulk/ohlcv?since=yesterday").status_code == 400
+        assert client.get("/api/export/bulk/ohlcv?format=csv").status_code == 422
@@ -18,6 +18,10 @@ from services.calculator import (
     calculate_return_from_data,
     calculate_rsi,
     calculate_volatility,
+    integers_to_list,
+    price_history_columns,
+    price_history_rows,
+    series_to_list,
 )
 
 # ---------------------------------------------------------------------------
@@ -233,3 +237,55 @@ class TestCalculateReturnFromData:
         assert theme_ret == pytest.approx(50.0)
         assert "A" in returns
         assert "B" not in returns
+
+
+# ---------------------------------------------------------------------------
+# Vectorized serialization helpers
+# ---------------------------------------------------------------------------
+
+class TestSeriesToList:
+    def test_rounds_and_masks_nan(self):
+        result = series_to_list(pd.Series([1.234, np.nan, 2.0]))
+        assert result == [1.23, None, 2.0]
+
+    def test_values_are_python_floats(self):
+        result = series_to_list(np.array([1.5, 2.5]))
+        assert all(type(v) is float for v in result)
+
+    def test_empty_and_none(self):
+        assert series_to_list(pd.Series(dtype=float)) == []
+        assert series_to_list(None) == []
+
+    def test_integers(self):
+        result = integers_to_list(pd.Series([1000.0, np.nan]))
+        assert result == [1000, None]
+        assert type(result[0]) is int
+
+
+class TestPriceHistory:
+    def test_columns_layout(self):
+        df = _make_df([100.0, 101.5, 102.25])
+        df.iloc[1, df.columns.get_loc("Open")] = np.nan
+        columns = price_history_columns(df)
+        assert set(columns) == {"dates", "open", "high", "low", "close", "volume"}
+        assert len(columns["dates"]) == 3
+        assert columns["dates"][-1] == "2025-12-31"
+        assert columns["open"][1] is None
+        assert columns["close"] == [100.0, 101.5, 102.25]
+        assert columns["volume"] == [1000, 1000, 1000]
+
+    def test_rows_match_legacy_row_format(self):
+        df = _make_df([100.123, 101.456])
+        rows = price_history_rows(df)
+        assert rows[0] == {
+            "date": df.index[0].strftime("%Y-%m-%d"),
+            "open": 100.12,
+            "high": round(100.123 * 1.02, 2),
+            "low": round(100.123 * 0.98, 2),
+            "close": 100.12,
+            "volume": 1000,
+        }
+
+    def test_empty_df(self, empty_df):
+        assert price_history_rows(empty_df) == []
+        assert price_history_columns(empty_df)["dates"] == []
@@ -0,0 +1,132 @@
+"""Tests for precomputed return-correlation matrices and clustering order"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routers import analytics as analytics_router
+from services import correlation
+from services.correlation import (
+    CorrelationSet,
+    cluster_order,
+    compute_correlations,
+    correlation_matrix,
+    daily_return_matrix,
+    get_correlations,
+    save_correlations,
+)
+from services.price_matrix import PriceMatrix
+
+# 2つのグループ（A: 自動車、B: 銀行）に分かれる銘柄
+GROUPS = {"7203.T": 0, "7267.T": 0, "7201.T": 0, "8306.T": 1, "8316.T": 1, "8411.T": 1}
+
+THEMES = {
+    "auto": {"name": "自動車", "tickers": ["7203.T", "7267.T"]},
+    "bank": {"name": "銀行", "tickers": ["8306.T", "8316.T"]},
+    "auto2": {"name": "自動車2", "tickers": ["7201.T", "7203.T"]},
+    "bank2": {"name": "銀行2", "tickers": ["8411.T"]},
+}
+
+
+def _matrix(period: str = "1y", days: int = 120, seed: int = 0) -> PriceMatrix:
+    rng = np.random.default_rng(seed)
+    factors = rng.normal(0, 0.02, size=(days, 2))
+    interleaved = ["7203.T", "8306.T", "7267.T", "8316.T", "7201.T", "8411.T"]
+    columns = [factors[:, GROUPS[ticker]] + rng.normal(0, 0.005, days) for ticker in interleaved]
+    close = 1000 * np.cumprod(1 + np.column_stack(columns), axis=0)
+    close[:40, 4] = np.nan  # 7201.T は途中から上場
+    return PriceMatrix(period, pd.bdate_range("2025-01-06", periods=days).to_numpy(), interleaved, close)
+
+
+class TestCorrelationMatrix:
+    def test_matches_pandas_for_complete_data(self):
+        rng = np.random.default_rng(1)
+        returns = rng.normal(size=(60, 5)).astype(np.float32)
+        expected = pd.DataFrame(returns.astype(float)).corr().to_numpy()
+        np.testing.assert_allclose(correlation_matrix(returns), expected, atol=1e-5)
+
+    def test_missing_and_flat_series(self):
+        matrix = _matrix()
+        returns = daily_return_matrix(matrix.close)
+        assert returns.dtype == np.float32
+        assert np.isnan(returns[:40, 4]).all()
+
+        corr = correlation_matrix(np.column_stack([returns, np.zeros(len(returns), dtype=np.float32)]))
+        assert corr.dtype == np.float32
+        assert np.isnan(corr[-1]).all()
+        # 上場後の期間だけで相関を計算（同じグループと高相関）
+        assert corr[4, 0] > 0.8
+        assert corr[4, 1] < 0.3
+
+    def test_cluster_order_groups_correlated_series(self):
+        matrix = _matrix()
+        corr = correlation_matrix(daily_return_matrix(matrix.close))
+        order = cluster_order(corr)
+        groups = [GROUPS[matrix.tickers[i]] for i in order]
+        # グループごとに連続して並ぶ
+        assert groups in ([0, 0, 0, 1, 1, 1], [1, 1, 1, 0, 0, 0])
+
+
+class TestCorrelationSet:
+    def test_round_trip_and_selection(self, tmp_path):
+        correlation.clear()
+        correlations = compute_correlations(_matrix(), THEMES, generated_at="2026-01-05T15:30:00")
+        assert correlations.themes.values.dtype == np.float32
+        assert correlations.stocks is not None
+
+        save_correlations(tmp_path, correlations)
+        correlation.clear()
+        loaded = get_correlations(tmp_path, "1y")
+        assert loaded.generated_at == "2026-01-05T15:30:00"
+        np.testing.assert_array_equal(loaded.stocks.values, correlations.stocks.values)
+        assert isinstance(loaded, CorrelationSet)
+
+        ids, values = loaded.themes.select(["bank", "auto", "auto2"])
+        assert set(ids) == {"bank", "auto", "auto2"}
+        # クラスタリング順では自動車テーマが隣り合う
+        assert abs(ids.index("auto") - ids.index("auto2")) == 1
+        assert values.shape == (3, 3)
+        assert loaded.themes.select(["bank", "auto"], clustered=False)[0] == ["bank", "auto"]
+
+    def test_stock_matrix_is_optional(self, monkeypatch):
+        monkeypatch.setenv(correlation.STOCK_CORRELATION_MAX_ENV, "3")
+        assert compute_correlations(_matrix(), THEMES).stocks is None
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    correlation.clear()
+    save_correlations(tmp_path, compute_correlations(_matrix(), THEMES))
+    monkeypatch.setattr(analytics_router, "PRECOMPUTED_DIR", tmp_path)
+    for theme_id, theme in THEMES.items():
+        monkeypatch.setitem(analytics_router.THEMES, theme_id, {**theme, "description": ""})
+    app = FastAPI()
+    app.include_router(analytics_router.router)
+    yield TestClient(app)
+    correlation.clear()
+
+
+class TestCorrelationEndpoint:
+    def test_theme_matrix(self, client):
+        data = client.get("/api/analytics/correlation?period=1y&ids=auto,bank,nothing").json()
+        assert set(data["ids"]) == {"auto", "bank"}
+        assert data["missing"] == ["nothing"]
+        assert data["names"][data["ids"].index("auto")] == "自動車"
+        assert data["matrix"][0][0] == 1.0
+
+    def test_stock_matrix(self, client):
+        data = client.get("/api/analytics/correlation?kind=stocks&theme_id=auto&order=original").json()
+        assert data["ids"] == ["7203.T", "7267.T"]
+        assert data["matrix"][0][1] > 0.8
+
+        assert client.get("/api/analytics/correlation?kind=stocks").status_code == 400
+        assert client.get("/api/analytics/correlation?period=5d").status_code == 400
+        assert client.get("/api/analytics/correlation?period=3y").status_code == 503
@@ -0,0 +1,220 @@
+"""Tests for custom baskets computed from the shared price matrix"""
+
+import asyncio
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routers import themes as themes_router
+from services import custom_theme, price_matrix, snapshot
+from services.calculator import calculate_return_from_data, calculate_theme_daily_returns_from_data
+from services.custom_theme import BasketError, normalize_basket
+from services.price_matrix import PriceMatrix, get_price_matrix, save_price_matrix
+from utils.cache import cache
+from utils.serialization import FastJSONResponse
+
+TICKERS = ["7203.T", "6758.T", "9984.T", "8306.T"]
+PERIOD_LENGTHS = {"1d": 2, "1mo": 21, "1y": 245}
+
+
+def _frames(length: int, seed: int) -> dict[str, pd.DataFrame]:
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range("2025-01-06", periods=length)
+    frames = {}
+    for i, ticker in enumerate(TICKERS):
+        close = 1000 * np.cumprod(1 + rng.normal(0.001 * (i - 1), 0.02, length))
+        frames[ticker] = pd.DataFrame({"Close": close}, index=dates)
+    # 9984.T は上場が遅く、期間の途中から
+    frames["9984.T"] = frames["9984.T"].iloc[length // 2:]
+    return frames
+
+
+@pytest.fixture
+def frames():
+    return {period: _frames(length, seed) for seed, (period, length) in enumerate(PERIOD_LENGTHS.items())}
+
+
+@pytest.fixture
+def directory(tmp_path, frames):
+    price_matrix.clear()
+    snapshot.clear()
+    cache.clear()
+    for period, period_frames in frames.items():
+        save_price_matrix(tmp_path, PriceMatrix.from_frames(period, period_frames, generated_at="2026-01-05T15:30:00"))
+    yield tmp_path
+    price_matrix.clear()
+    cache.clear()
+
+
+class TestPriceMatrix:
+    def test_round_trip_preserves_series(self, directory, frames):
+        price_matrix.clear()
+        matrix = get_price_matrix(directory, "1y")
+        assert matrix.generated_at == "2026-01-05T15:30:00"
+        rebuilt = matrix.frames(["9984.T", "0000.T"])
+        assert list(rebuilt) == ["9984.T"]
+        np.testing.assert_array_equal(rebuilt["9984.T"]["Close"].to_numpy(), frames["1y"]["9984.T"]["Close"].to_numpy())
+        assert get_price_matrix(directory, "5y") is None
+
+
+class TestWeightedCalculations:
+    def test_weighted_return(self, frames):
+        data = frames["1mo"]
+        _, returns = calculate_return_from_data(data)
+        weights = {"7203.T": 3.0, "6758.T": 1.0}
+        theme_return, _ = calculate_return_from_data({t: data[t] for t in weights}, weights)
+        assert theme_return == round((3 * returns["7203.T"] + returns["6758.T"]) / 4, 2)
+
+    def test_weighted_daily_returns_renormalize_missing_days(self, frames):
+        data = frames["1y"]
+        weights = {ticker: 1.0 for ticker in TICKERS}
+        np.testing.assert_allclose(
+            calculate_theme_daily_returns_from_data(data, weights).to_numpy(),
+            calculate_theme_daily_returns_from_data(data).to_numpy(),
+        )
+
+
+class TestBasket:
+    def test_key_is_canonical(self):
+        assert normalize_basket(["7203", "6758.T"]).key == normalize_basket(["6758.T", "7203.T"]).key
+        weighted = normalize_basket(["7203", "6758"], {"7203": 2, "6758.T": 1})
+        assert weighted.weights == (pytest.approx(2 / 3), pytest.approx(1 / 3))
+        assert weighted.key == normalize_basket(["6758", "7203"], {"7203.T": 20, "6758": 10}).key
+        assert weighted.key != normalize_basket(["7203", "6758"]).key
+
+    @pytest.mark.parametrize(
+        "tickers, weights",
+        [
+            ([], None),
+            (["72A3"], None),
+            (["7203", "7203.T"], None),
+            (["7203"], {"6758": 1.0}),
+            (["7203", "6758"], {"7203": 1.0}),
+            (["7203"], {"7203": 0}),
+            (["7203"], {"7203": 1.0, "7203.T": 2.0}),
+        ],
+    )
+    def test_invalid(self, tickers, weights):
+        with pytest.raises(BasketError):
+            normalize_basket(tickers, weights)
+
+
+class TestComputation:
+    def test_matches_theme_calculation(self, directory, frames):
+        payload = custom_theme.compute_custom_theme(normalize_basket(TICKERS + ["1111.T"]), "1mo", directory)
+        expected_return, _ = calculate_return_from_data(frames["1mo"])
+        assert payload["change_percent"] == expected_return
+        assert payload["missing"] == ["1111.T"]
+        assert payload["stock_count"] == 5
+        assert {stock["code"] for stock in payload["stocks"]} == set(TICKERS) | {"1111.T"}
+        assert payload["sparkline"]["data"]
+
+    def test_single_flight_and_concurrency_limit(self, directory, monkeypatch):
+        calls = []
+        active = []
+        peak = []
+        lock = threading.Lock()
+        compute = custom_theme.compute_custom_theme
+
+        def slow_compute(basket, period, directory):
+            with lock:
+                calls.append(basket.key)
+                active.append(1)
+                peak.append(len(active))
+            time.sleep(0.02)
+            try:
+                return compute(basket, period, directory)
+            finally:
+                with lock:
+                    active.pop()
+
+        monkeypatch.setattr(custom_theme, "compute_custom_theme", slow_compute)
+        baskets = [normalize_basket(TICKERS[:2])] * 50 + [normalize_basket([f"{1000 + i}"]) for i in range(30)]
+
+        async def run():
+            return await asyncio.gather(*(custom_theme.get_custom_theme(b, "1mo", directory) for b in baskets))
+
+        results = asyncio.run(run())
+        assert len(results) == 80
+        assert calls.count(baskets[0].key) == 1
+        assert max(peak) <= custom_theme.MAX_CONCURRENT_COMPUTATIONS
+        # 2回目以降はキャッシュから
+        asyncio.run(run())
+        assert len(calls) == 31
+
+    def test_cancelled_requester_does_not_cancel_waiters(self, directory, monkeypatch):
+        compute = custom_theme.compute_custom_theme
+
+        def slow_compute(basket, period, directory):
+            time.sleep(0.05)
+            return compute(basket, period, directory)
+
+        monkeypatch.setattr(custom_theme, "compute_custom_theme", slow_compute)
+        basket = normalize_basket(TICKERS[:3])
+
+        async def run():
+            first = asyncio.ensure_future(custom_theme.get_custom_theme(basket, "1mo", directory))
+            await asyncio.sleep(0)
+            second = asyncio.ensure_future(custom_theme.get_custom_theme(basket, "1mo", directory))
+            await asyncio.sleep(0)
+            first.cancel()  # 最初のリクエストの切断
+            result = await second
+            assert first.cancelled()
+            return result
+
+        assert asyncio.run(run())["stock_count"] == 3
+        assert custom_theme._inflight == {}
+
+
+@pytest.fixture
+def client(directory, monkeypatch):
+    monkeypatch.setattr(themes_router, "PRECOMPUTED_DIR", directory)
+
+    def no_fetch(*args, **kwargs):
+        raise AssertionError("custom themes must not fetch prices")
+
+    monkeypatch.setattr("services.data_fetcher.fetch_stock_data", no_fetch)
+    monkeypatch.setattr("services.data_fetcher.fetch_batch_parallel", no_fetch)
+    app = FastAPI(default_response_class=FastJSONResponse)
+    app.include_router(themes_router.router)
+    return TestClient(app)
+
+
+class TestCustomThemeEndpoint:
+    def test_single_period_has_theme_detail_shape(self, client):
+        response = client.post(
+            "/api/themes/custom",
+            json={"tickers": ["7203", "6758"], "weights": {"7203": 3, "6758": 1}, "name": "自動車と電機"},
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data["name"] == "自動車と電機"
+        assert data["id"].startswith("custom_")
+        assert {"change_percent", "change_percent_1d", "stocks", "sparkline", "period"} <= set(data)
+        assert {stock["code"]: stock["weight"] for stock in data["stocks"]} == {"7203.T": 0.75, "6758.T": 0.25}
+
+    def test_multiple_periods_and_fields(self, client):
+        response = client.post(
+            "/api/themes/custom?fields=change_percent,stocks.code",
+            json={"tickers": TICKERS, "periods": ["1mo", "1y"]},
+        )
+        data = response.json()
+        assert data["periods"] == ["1mo", "1y"]
+        assert set(data["results"]["1y"]) == {"change_percent", "stocks"}
+        assert data["basket_id"] == normalize_basket(TICKERS).key
+
+    def test_errors(self, client):
+        assert client.post("/api/themes/custom", json={"tickers": ["abc"]}).status_code == 400
+        assert client.post("/api/themes/custom", json={"tickers": ["7203"], "period": "2w"}).status_code == 400
+        response = client.post("/api/themes/custom", json={"tickers": ["7203"], "period": "5y"})
+        assert response.status_code == 503
@@ -6,22 +6,37 @@ and formatting service functions.
 
 import csv
 import io
+import json
 import sys
+import tracemalloc
+from datetime import date
 from pathlib import Path
 
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
 from fastapi import APIRouter, FastAPI
 from fastapi.testclient import TestClient
 
 from data.themes import THEMES
+from routers import export as export_router
 from routers.export import router
+from services import history_store, snapshot
 from services.export_service import (
+    HISTORY_EXPORT_COLUMNS,
     format_stocks_csv,
     format_themes_csv,
     format_themes_json,
     generate_export_filename,
+    iter_csv,
+    iter_history_batches,
 )
+from services.metrics_table import MetricsTable, metrics_filename
+from utils.serialization import dumps
 
 # Verify router uses @router decorators
 assert isinstance(router, APIRouter), "export router must be an APIRouter"
@@ -147,3 +162,120 @@ class TestExportService:
         name = generate_export_filename("stocks", "json", "3mo")
         assert name.startswith("stocks_3mo_")
         assert name.endswith(".json")
+
+
+# ---------------------------------------------------------------------------
+# Streaming, data-bearing exports
+# ---------------------------------------------------------------------------
+
+def _history(days: int = 1260) -> pd.DataFrame:
+    """Synthetic five-year OHLCV history."""
+    close = 1000 * np.cumprod(1 + np.random.default_rng(0).normal(0, 0.01, days))
+    return pd.DataFrame(
+        {"Open": close, "High": close * 1.01, "Low": close * 0.99, "Close": close, "Volume": np.full(days, 1e6)},
+        index=pd.DatetimeIndex(pd.bdate_range("2021-01-04", periods=days), name="Date"),
+    )
+
+
+@pytest.fixture
+def data_client(tmp_path, monkeypatch):
+    records = [
+        {"code": "7203.T", "name": "トヨタ", "theme_ids": ["ev", "ai"], "theme_names": ["EV", "AI"],
+         "change_percent": 4.0, "rsi": 55.0, "return_1mo": 4.0, "return_1y": 20.5},
+        {"code": "6758.T", "name": "ソニー", "theme_ids": ["ai"], "theme_names": ["AI"],
+         "change_percent": -2.5, "rsi": None, "return_1mo": -2.5},
+    ]
+    table = MetricsTable("1mo", records)
+    (tmp_path / metrics_filename("1mo")).write_bytes(dumps(table.to_payload()))
+    for period, change in (("1mo", 3.2), ("1y", 12.0)):
+        ranking = {"period": period, "themes": [{"id": "ai", "change_percent": change, "change_percent_1d": 0.5}]}
+        (tmp_path / f"themes_{period}.json").write_bytes(dumps(ranking))
+    monkeypatch.setattr(export_router, "PRECOMPUTED_DIR", tmp_path)
+    yield client
+    snapshot.clear()
+
+
+class TestStreamingExport:
+    """Tests for /api/export/themes, /api/export/stocks and /api/export/stocks/history"""
+
+    def test_themes_include_returns_for_every_period(self, data_client):
+        rows = list(csv.DictReader(io.StringIO(data_client.get("/api/export/themes?period=1mo").text)))
+        assert len(rows) == len(THEMES)
+        ai = next(row for row in rows if row["theme_id"] == "ai")
+        assert ai["change_percent"] == "3.2"
+        assert ai["return_1y"] == "12.0"
+        assert ai["return_3mo"] == ""
+
+    def test_stocks_ndjson(self, data_client):
+        resp = data_client.get("/api/export/stocks?period=1mo&format=ndjson")
+        assert resp.headers["content-type"].startswith("application/x-ndjson")
+        rows = [json.loads(line) for line in resp.text.splitlines()]
+        assert [row["ticker"] for row in rows] == ["7203.T", "6758.T"]
+        assert rows[0]["theme_ids"] == "ev|ai"
+        assert rows[0]["rsi"] == 55.0
+        assert rows[1]["rsi"] is None
+        assert rows[0]["return_1y"] == 20.5
+
+    def test_stocks_parquet_filtered_by_theme(self, data_client):
+        resp = data_client.get("/api/export/stocks?period=1mo&format=parquet&theme_id=ev")
+        assert "attachment" in resp.headers["content-disposition"]
+        table = pq.read_table(io.BytesIO(resp.content))
+        assert table.column("ticker").to_pylist() == ["7203.T"]
+        assert table.schema.field("change_percent").type == "double"
+
+    def test_stocks_without_snapshot_fall_back_to_definitions(self, data_client):
+        rows = list(csv.DictReader(io.StringIO(data_client.get("/api/export/stocks/csv?period=3mo&theme_id=ai").text)))
+        assert len(rows) == len(THEMES["ai"]["tickers"])
+        assert rows[0]["change_percent"] == ""
+
+    def test_errors(self, data_client):
+        assert data_client.get("/api/export/stocks?period=2w").status_code == 400
+        assert data_client.get("/api/export/stocks?format=xlsx").status_code == 422
+        assert data_client.get("/api/export/stocks?theme_id=nothing").status_code == 404
+        assert data_client.get("/api/export/stocks/history?start=2024-13-01").status_code == 400
+        assert data_client.get("/api/export/stocks/history?start=2025-01-02&end=2025-01-01").status_code == 400
+        assert data_client.get("/api/export/stocks/history?tickers=../etc").status_code == 400
+
+    def test_history_date_range(self, data_client, monkeypatch):
+        monkeypatch.setattr(history_store, "read_history", lambda ticker: _history() if ticker == "7203.T" else None)
+        resp = data_client.get("/api/export/stocks/history?tickers=7203,6758&start=2025-01-01&end=2025-01-31")
+        rows = list(csv.DictReader(io.StringIO(resp.text)))
+        assert {row["ticker"] for row in rows} == {"7203.T"}
+        assert rows[0]["date"] >= "2025-01-01"
+        assert rows[-1]["date"] <= "2025-01-31"
+        assert float(rows[0]["volume"]) == 1e6
+
+    def test_read_history_does_not_fill_memory(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(history_store, "HISTORY_DIR", tmp_path)
+        history_store.clear_memory()
+        history_store.save_history("7203.T", _history(10), "2026-01-05")
+        assert len(history_store.read_history("7203.T")) == 10
+        assert history_store.load_history("6758.T") is None
+        assert history_store._memory == {}
+
+    def test_full_universe_five_years_memory_is_flat(self):
+        """Export every tracked ticker x 5 years of OHLCV; peak memory is one ticker's batch."""
+        universe = list(dict.fromkeys(t for theme in THEMES.values() for t in theme["tickers"]))
+        history = _history()
+
+        def measure(tickers: list[str]) -> tuple[int, int]:
+            tracemalloc.start()
+            try:
+                size = 0
+                for chunk in iter_csv(iter_history_batches(tickers, loader=lambda _: history), HISTORY_EXPORT_COLUMNS):
+                    size += len(chunk)
+                return size, tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        small_size, small_peak = measure(universe[:5])
+        size, peak = measure(universe)
+        assert size > 30 * small_size
+        # Tens of MB are written, but the peak stays at about one batch whatever the ticker count
+        assert size > 15 * 1024 * 1024
+        assert peak < 4 * 1024 * 1024
+        assert peak < small_peak * 1.5
+
+    def test_history_rows_respect_range(self):
+        batches = list(iter_history_batches(["7203.T"], date(2021, 1, 4), date(2021, 1, 8), loader=lambda _: _history()))
+        assert batches[0]["date"] == ["2021-01-04", "2021-01-05", "2021-01-06", "2021-01-07", "2021-01-08"]
@@ -0,0 +1,152 @@
+"""Tests for fields= on theme detail and include= on stock detail"""
+
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routers import stocks as stocks_router
+from routers import themes as themes_router
+from services import snapshot
+from utils.cache import cache
+from utils.fields import parse_fields, wants
+from utils.serialization import FastJSONResponse, write_json_file
+
+THEME_ID = next(iter(themes_router.THEMES))
+TICKER = themes_router.THEMES[THEME_ID]["tickers"][0]
+
+
+class _Calls:
+    """Record which helpers an endpoint invoked."""
+
+    def __init__(self):
+        self.names: list[str] = []
+
+    def stub(self, name, result):
+        def _fn(*args, **kwargs):
+            self.names.append(name)
+            return result() if callable(result) else result
+        return _fn
+
+
+@pytest.fixture
+def app_client(tmp_path, monkeypatch):
+    monkeypatch.setattr(themes_router, "PRECOMPUTED_DIR", tmp_path)
+    cache.clear()
+    snapshot.clear()
+    app = FastAPI(default_response_class=FastJSONResponse)
+    app.include_router(themes_router.router)
+    app.include_router(stocks_router.router)
+    yield TestClient(app), tmp_path
+    cache.clear()
+
+
+class TestWants:
+    def test_paths(self):
+        tree = parse_fields("id,stocks.code")
+        assert wants(tree, "stocks", "code")
+        assert not wants(tree, "stocks", "sparkline")
+        assert not wants(tree, "name")
+        assert wants(None, "stocks", "sparkline")
+        assert wants(parse_fields("stocks"), "stocks", "sparkline")
+
+
+# ---------------------------------------------------------------------------
+# Theme detail: fields=
+# ---------------------------------------------------------------------------
+
+class TestThemeDetailFields:
+    def test_precomputed_payload_is_projected(self, app_client):
+        test_client, directory = app_client
+        payload = {
+            "id": THEME_ID,
+            "change_percent": 1.0,
+            "stocks": [{"code": TICKER, "change_percent": 2.0, "beta": 1.1, "sparkline": {"data": [1.0]}}],
+        }
+        write_json_file(directory / f"theme_{THEME_ID}_1mo.json", payload)
+        data = test_client.get(
+            f"/api/themes/{THEME_ID}?period=1mo&fields=id,stocks.code,stocks.change_percent"
+        ).json()
+        assert data == {"id": THEME_ID, "stocks": [{"code": TICKER, "change_percent": 2.0}]}
+
+    def test_realtime_path_skips_excluded_blocks(self, app_client, monkeypatch):
+        test_client, _ = app_client
+        calls = _Calls()
+        tickers = themes_router.THEMES[THEME_ID]["tickers"]
+        monkeypatch.setattr(
+            themes_router, "calculate_theme_return",
+            calls.stub("theme_return", (1.5, {t: 1.0 for t in tickers})),
+        )
+        for name in ("calculate_theme_daily_returns", "get_stock_indicators",
+                     "get_market_cap", "get_stock_sparkline", "fetch_stock_data"):
+            monkeypatch.setattr(themes_router, name, calls.stub(name, None))
+
+        response = test_client.get(
+            f"/api/themes/{THEME_ID}?period=1y&fields=change_percent,stocks.code,stocks.change_percent"
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data["change_percent"] == 1.5
+        assert set(data["stocks"][0]) == {"code", "change_percent"}
+        # Only the 1y return itself was computed
+        assert calls.names == ["theme_return"]
+        # Partial results are not cached as the full detail
+        assert cache.get(f"theme_detail:{THEME_ID}:1y") is None
+
+
+# ---------------------------------------------------------------------------
+# Stock detail: include=
+# ---------------------------------------------------------------------------
+
+@pytest.fixture
+def stock_calls(monkeypatch, sample_stock_df):
+    calls = _Calls()
+    indicators = {
+        "latest_price": 114.5, "period_return": 14.5, "rsi": 70.0, "ma5": 113.5,
+        "ma20": 110.0, "volatility": 5.0, "high": 115.0, "low": 100.0,
+    }
+    monkeypatch.setattr(stocks_router, "fetch_stock_data", calls.stub("fetch", sample_stock_df))
+    monkeypatch.setattr(stocks_router, "get_stock_indicators", calls.stub("indicators", indicators))
+    monkeypatch.setattr(stocks_router, "get_stock_info", calls.stub("stock_info", None))
+    monkeypatch.setattr(stocks_router, "calculate_theme_daily_returns", calls.stub("theme_returns", pd.Series(dtype=float)))
+    monkeypatch.setattr(stocks_router, "calculate_ichimoku", calls.stub("ichimoku", {}))
+    monkeypatch.setattr(stocks_router, "calculate_bollinger_bands", calls.stub("bollinger", {}))
+    return calls
+
+
+class TestStockDetailInclude:
+    def test_indicators_only_skips_chart_and_beta(self, app_client, stock_calls):
+        test_client, _ = app_client
+        data = test_client.get(f"/api/stocks/{TICKER}?period=1mo&include=indicators").json()
+        assert data["indicators"]["latest_price"] == 114.5
+        assert "beta" not in data["indicators"]
+        assert "price_history" not in data
+        assert "chart_indicators" not in data
+        # Only the period data was fetched; no chart data, no theme returns, no yfinance info
+        assert stock_calls.names == ["fetch", "indicators"]
+
+    def test_chart_blocks_are_selective(self, app_client, stock_calls):
+        test_client, _ = app_client
+        data = test_client.get(f"/api/stocks/{TICKER}?period=1mo&include=price_history,rsi").json()
+        assert "indicators" not in data
+        assert set(data["chart_indicators"]) == {"rsi"}
+        assert len(data["price_history"]) == 30
+        assert "ichimoku" not in stock_calls.names
+        assert "bollinger" not in stock_calls.names
+
+    def test_default_includes_every_block(self, app_client, stock_calls):
+        test_client, _ = app_client
+        data = test_client.get(f"/api/stocks/{TICKER}?period=1mo").json()
+        assert set(data["chart_indicators"]) == {"ma", "rsi", "bollinger", "ichimoku"}
+        assert {"beta", "latest_price"} <= set(data["indicators"])
+        assert "price_history" in data
+
+    def test_unknown_block_rejected(self, app_client, stock_calls):
+        test_client, _ = app_client
+        assert test_client.get(f"/api/stocks/{TICKER}?include=macd").status_code == 400
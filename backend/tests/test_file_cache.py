@@ -0,0 +1,66 @@
+"""Tests for utils/cache.FileCache and the atomic write helper"""
+
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.cache import FileCache, file_stamp
+from utils.serialization import write_bytes_atomic
+
+
+@pytest.fixture
+def file_cache(tmp_path):
+    calls: list[Path] = []
+
+    def loader(path: Path):
+        calls.append(path)
+        body = path.read_bytes()
+        return None if body == b"broken" else body.decode()
+
+    return FileCache(loader), calls
+
+
+class TestFileCache:
+    def test_reloads_only_when_file_changes(self, tmp_path, file_cache):
+        cache, calls = file_cache
+        path = tmp_path / "prices_1mo.npz"
+        assert cache.get(path) is None
+        assert write_bytes_atomic(path, b"v1") == 2
+        assert list(tmp_path.iterdir()) == [path]
+
+        assert cache.get(path) == "v1"
+        assert cache.get(path) == "v1"
+        assert len(calls) == 1
+
+        write_bytes_atomic(path, b"v2-longer")
+        assert cache.get(path) == "v2-longer"
+        assert len(calls) == 2
+
+        # 読めないファイルはキャッシュせず、次回も読み直す
+        write_bytes_atomic(path, b"broken")
+        assert cache.get(path) is None
+        assert cache.get(path) is None
+        assert len(calls) == 4
+
+        # 削除されたファイルはキャッシュからも消える
+        os.remove(path)
+        assert cache.get(path) is None
+        assert cache.values() == []
+
+    def test_put_skips_reload(self, tmp_path, file_cache):
+        cache, calls = file_cache
+        path = tmp_path / "themes_1mo.json"
+        write_bytes_atomic(path, b"{}")
+        cache.put(path, "published")
+        assert cache.get(path) == "published"
+        assert calls == []
+        assert file_stamp(path) == (path.stat().st_mtime_ns, 2)
+
+        cache.clear()
+        assert cache.get(path) == "{}"
+        cache.put(tmp_path / "missing.json", "x")
+        assert cache.values() == ["{}"]
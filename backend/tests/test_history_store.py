@@ -0,0 +1,192 @@
+"""Tests for services/history_store.py and long-period sparklines"""
+
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services import history_store
+from services.sparkline import build_sparkline
+from utils.security import VALID_PERIODS
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+def _make_history(start: str, periods: int, base: float = 100.0) -> pd.DataFrame:
+    dates = pd.bdate_range(start=start, periods=periods)
+    prices = [base + i * 0.1 for i in range(periods)]
+    return pd.DataFrame(
+        {
+            "Open": prices,
+            "High": prices,
+            "Low": prices,
+            "Close": prices,
+            "Volume": [1000] * periods,
+        },
+        index=dates,
+    )
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """Point the history store at a temp dir and record download calls."""
+    monkeypatch.setattr(history_store, "HISTORY_DIR", tmp_path / "history")
+    history_store.clear_memory()
+    calls: list[dict] = []
+    responses: list[pd.DataFrame] = []
+
+    def fake_download(ticker, **kwargs):
+        calls.append(kwargs)
+        if not responses:
+            return None
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise history_store.HistoryDownloadError(str(response))
+        return history_store._normalize(response)
+
+    monkeypatch.setattr(history_store, "_download", fake_download)
+    yield calls, responses
+    history_store.clear_memory()
+
+
+# ---------------------------------------------------------------------------
+# update_history
+# ---------------------------------------------------------------------------
+
+class TestUpdateHistory:
+    def test_first_fetch_downloads_full_history(self, store, monkeypatch):
+        calls, responses = store
+        responses.append(_make_history("2021-01-04", 1300))
+        df = history_store.update_history("7203.T")
+        assert len(df) == 1300
+        assert calls == [{"period": history_store.HISTORY_FETCH_PERIOD}]
+
+    def test_same_day_does_not_refetch(self, store):
+        calls, responses = store
+        responses.append(_make_history("2021-01-04", 300))
+        history_store.update_history("7203.T")
+        history_store.update_history("7203.T")
+        history_store.get_period_history("7203.T", "3y")
+        assert len(calls) == 1
+
+    def test_incremental_fetch_appends_new_rows(self, store, monkeypatch):
+        calls, responses = store
+        full = _make_history("2021-01-04", 300)
+        responses.append(full)
+        monkeypatch.setattr(history_store, "get_cache_date_key", lambda: "day-1")
+        history_store.update_history("7203.T")
+
+        # Next day: the last stored bar is re-fetched together with new bars
+        responses.append(_make_history(str(full.index[-1].date()), 6, base=200.0))
+        monkeypatch.setattr(history_store, "get_cache_date_key", lambda: "day-2")
+        df = history_store.update_history("7203.T")
+
+        assert calls[1] == {"start": full.index[-1].strftime("%Y-%m-%d")}
+        assert len(df) == 305
+        assert df.index.is_monotonic_increasing
+        assert df["Close"].iloc[-1] == pytest.approx(200.5)
+
+    def test_persisted_history_survives_memory_reset(self, store, monkeypatch):
+        calls, responses = store
+        responses.append(_make_history("2021-01-04", 300))
+        history_store.update_history("7203.T")
+        history_store.clear_memory()
+        df = history_store.load_history("7203.T")
+        assert df is not None
+        assert len(df) == 300
+        assert len(calls) == 1
+
+    def test_download_failure_returns_none(self, store):
+        calls, responses = store
+        responses.append(RuntimeError("timeout"))
+        assert history_store.update_history("7203.T") is None
+        assert history_store.update_history("7203.T") is None
+        assert len(calls) == 2
+
+    def test_failed_incremental_fetch_is_retried(self, store, monkeypatch):
+        calls, responses = store
+        full = _make_history("2021-01-04", 300)
+        responses.append(full)
+        monkeypatch.setattr(history_store, "get_cache_date_key", lambda: "day-1")
+        history_store.update_history("7203.T")
+
+        # 取得に失敗しても保存済みの履歴を返し、当日更新済みにはしない
+        responses.append(RuntimeError("timeout"))
+        monkeypatch.setattr(history_store, "get_cache_date_key", lambda: "day-2")
+        assert len(history_store.update_history("7203.T")) == 300
+        assert history_store.load_history("7203.T") is not None
+        assert history_store._memory["7203.T"][0] == "day-1"
+
+        # 次の呼び出しで再試行する（新しい行がなくても成功すれば当日分として記録）
+        assert len(history_store.update_history("7203.T")) == 300
+        assert len(calls) == 3
+        history_store.update_history("7203.T")
+        assert len(calls) == 3
+        assert history_store._memory["7203.T"][0] == "day-2"
+
+    def test_concurrent_misses_download_once(self, store, monkeypatch):
+        calls, responses = store
+        responses.append(_make_history("2021-01-04", 300))
+        download = history_store._download
+
+        def slow_download(ticker, **kwargs):
+            time.sleep(0.05)
+            return download(ticker, **kwargs)
+
+        monkeypatch.setattr(history_store, "_download", slow_download)
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(history_store.update_history, ["7203.T"] * 4))
+        assert len(calls) == 1
+        assert all(len(df) == 300 for df in results)
+
+
+# ---------------------------------------------------------------------------
+# slice_period
+# ---------------------------------------------------------------------------
+
+class TestSlicePeriod:
+    def test_three_years_is_shorter_than_five(self):
+        df = _make_history("2020-01-01", 1400)
+        three = history_store.slice_period(df, "3y")
+        five = history_store.slice_period(df, "5y")
+        assert len(three) < len(five)
+        assert three.index[0] >= df.index[-1] - pd.DateOffset(years=3)
+
+    def test_short_period_is_unchanged(self):
+        df = _make_history("2024-01-01", 30)
+        assert len(history_store.slice_period(df, "1mo")) == 30
+
+
+# ---------------------------------------------------------------------------
+# Long-period sparklines and period coverage
+# ---------------------------------------------------------------------------
+
+class TestLongPeriodSparkline:
+    def test_three_year_sparkline_is_weekly(self):
+        df = _make_history("2022-01-03", 756)
+        sparkline = build_sparkline(df["Close"].pct_change() * 100, "3y")
+        assert 150 <= len(sparkline["data"]) <= 160
+        assert sparkline["period_start_index"] == 0
+
+    def test_five_year_sparkline_is_monthly(self):
+        df = _make_history("2020-01-01", 1260)
+        sparkline = build_sparkline(df["Close"].pct_change() * 100, "5y")
+        assert 58 <= len(sparkline["data"]) <= 62
+
+    def test_one_year_sparkline_keeps_daily_points(self):
+        df = _make_history("2025-01-01", 252)
+        sparkline = build_sparkline(df["Close"].pct_change() * 100, "1mo")
+        assert len(sparkline["data"]) == 252
+        assert sparkline["period_start_index"] == 252 - 21
+
+
+def test_update_job_precomputes_every_valid_period():
+    from jobs.update_data import PERIODS
+
+    assert set(PERIODS) == set(VALID_PERIODS)
@@ -0,0 +1,278 @@
+"""Tests for the indexed metrics table, /api/screener and filtered heatmaps"""
+
+import math
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routers import screener as screener_router
+from routers import themes as themes_router
+from services import metrics_table, snapshot
+from services.metrics_table import (
+    MetricsTable,
+    build_metric_records,
+    decode_cursor,
+    encode_cursor,
+    get_metrics_table,
+    heatmap_payload,
+    metrics_filename,
+)
+from utils.serialization import FastJSONResponse, write_json_file
+
+THEMES = {
+    "ai": {"name": "AI", "tickers": ["A.T", "B.T", "C.T"], "ticker_names": {"A.T": "A社", "B.T": "B社"}},
+    "chip": {"name": "半導体", "tickers": ["B.T", "D.T"], "ticker_names": {"B.T": "B社", "D.T": "D社"}},
+}
+RETURNS = {"A.T": 5.0, "B.T": -2.0, "C.T": 5.0, "D.T": 12.345}
+MARKET_CAPS = {
+    "A.T": {"market_cap": 20_000_000_000_000, "market_cap_category": {"id": "mega", "label": "超大型"}},
+    "B.T": {"market_cap": 500_000_000_000, "market_cap_category": {"id": "mid", "label": "中型"}},
+    "D.T": {"market_cap": 50_000_000_000, "market_cap_category": {"id": "small", "label": "小型"}},
+}
+
+
+def _table(period: str = "1mo", generated_at: str = "2026-01-01T00:00:00") -> MetricsTable:
+    records = build_metric_records(THEMES, RETURNS, {"A.T": 1.0}, MARKET_CAPS)
+    return MetricsTable(period, records, generated_at=generated_at, last_updated="2026-01-01 15:00")
+
+
+@pytest.fixture(autouse=True)
+def _clear_state():
+    snapshot.clear()
+    metrics_table.clear_tables()
+    yield
+    snapshot.clear()
+    metrics_table.clear_tables()
+
+
+class TestBuildRecords:
+    def test_duplicate_tickers_are_merged(self):
+        records = build_metric_records(THEMES, RETURNS, {}, MARKET_CAPS)
+        assert [r["code"] for r in records] == ["A.T", "B.T", "C.T", "D.T"]
+        shared = records[1]
+        assert shared["theme_ids"] == ["ai", "chip"]
+        assert shared["theme_names"] == ["AI", "半導体"]
+
+    def test_missing_values_use_defaults(self):
+        record = build_metric_records(THEMES, RETURNS, {}, MARKET_CAPS)[2]
+        assert record["name"] == "C.T"
+        assert record["change_percent_1d"] is None
+        assert record["market_cap"] == 0
+        assert record["market_cap_category"]["id"] == "unknown"
+
+
+class TestMetricsTable:
+    def test_sort_is_stable_with_missing_last(self):
+        table = _table()
+        assert table.codes[table.sorted_rows("change_percent")].tolist() == ["D.T", "A.T", "C.T", "B.T"]
+        assert table.codes[table.sorted_rows("change_percent_1d", False)][0] == "A.T"
+        assert table.sorted_rows("change_percent") is table.sorted_rows("change_percent")
+
+    def test_descending_string_sort_keeps_ties_in_order(self):
+        themes = {"t": {"name": "T", "tickers": ["A.T", "B.T", "C.T", "D.T"],
+                        "ticker_names": {"A.T": "Alpha", "B.T": "Beta", "C.T": "Alpha", "D.T": "Beta"}}}
+        table = MetricsTable("1mo", build_metric_records(themes, RETURNS, {}, MARKET_CAPS))
+        assert table.codes[table.sorted_rows("name", False)].tolist() == ["A.T", "C.T", "B.T", "D.T"]
+        assert table.codes[table.sorted_rows("name", True)].tolist() == ["B.T", "D.T", "A.T", "C.T"]
+
+    def test_mask_combines_indexes_and_ranges(self):
+        table = _table()
+        mask = table.mask(theme_id="ai", min_change=0)
+        assert sorted(table.codes[mask].tolist()) == ["A.T", "C.T"]
+        mask = table.mask(categories=["mid", "small"], max_market_cap=100_000_000_000)
+        assert table.codes[mask].tolist() == ["D.T"]
+        assert not table.mask(theme_id="unknown").any()
+
+    def test_query_pages_through_results(self):
+        table = _table()
+        first, total = table.query(None, "change_percent", True, 0, 2)
+        second, _ = table.query(None, "change_percent", True, 2, 2)
+        assert total == 4
+        assert table.codes[list(first) + list(second)].tolist() == ["D.T", "A.T", "C.T", "B.T"]
+
+    def test_payload_round_trip(self):
+        table = _table()
+        restored = MetricsTable.from_payload(table.to_payload())
+        assert restored.rows(range(restored.size)) == table.rows(range(table.size))
+        assert math.isnan(restored.numeric["change_percent_1d"][1])
+
+    def test_heatmap_payload_groups_by_category(self):
+        payload = heatmap_payload(_table(), limit=1)
+        assert list(payload["categories"]) == ["mega", "large", "mid", "small", "micro"]
+        assert payload["categories"]["mega"]["stocks"][0]["code"] == "A.T"
+        assert payload["categories"]["mid"]["stocks"][0]["theme_ids"] == ["ai", "chip"]
+        assert payload["categories"]["large"]["count"] == 0
+
+    def test_table_is_reused_until_file_changes(self, tmp_path):
+        path = tmp_path / metrics_filename("1mo")
+        write_json_file(path, _table().to_payload())
+        first = get_metrics_table(tmp_path, "1mo")
+        assert get_metrics_table(tmp_path, "1mo") is first
+
+        write_json_file(path, _table(generated_at="2026-01-02T00:00:00").to_payload())
+        stat = path.stat()
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+        second = get_metrics_table(tmp_path, "1mo")
+        assert second is not first
+        assert second.generated_at == "2026-01-02T00:00:00"
+
+
+@pytest.fixture
+def fetched_periods(monkeypatch):
+    """リアルタイム計算の取得を合成データに置き換え、取得した期間を記録"""
+    import pandas as pd
+
+    closes = {
+        "1d": [100.0, 103.0],
+        "5d": [100.0, 101.0, 99.0, 102.0, 104.0],
+        "1mo": [100.0, 90.0, 110.0],
+        "3mo": [100.0 + (i % 7) * 1.5 - i * 0.2 for i in range(60)],
+    }
+    fetched = []
+
+    def fake_fetch(tickers, period, max_workers=10):
+        fetched.append(period)
+        return {t: pd.DataFrame({"Close": closes[period]}) for t in tickers}
+
+    monkeypatch.setattr("data.themes.THEMES", THEMES)
+    monkeypatch.setattr("data.themes.get_all_tickers", lambda: ["A.T", "B.T", "C.T", "D.T"])
+    monkeypatch.setattr("services.data_fetcher.fetch_batch_parallel", fake_fetch)
+    monkeypatch.setattr("services.data_fetcher.get_market_cap", lambda ticker: MARKET_CAPS.get(ticker, {}))
+    return fetched
+
+
+class TestRealtimeFallback:
+    def test_fetches_1d_returns_for_every_period(self, fetched_periods):
+        table = metrics_table.compute_metrics_table("1mo")
+        assert sorted(fetched_periods) == ["1d", "1mo", "3mo"]
+        row = table.row(table.row_by_code["A.T"])
+        assert row["change_percent"] == 10.0
+        assert row["change_percent_1d"] == 3.0
+        assert row["return_1d"] == 3.0
+
+    def test_indicators_use_indicator_period(self, fetched_periods):
+        short = metrics_table.compute_metrics_table("5d")
+        fetched_periods.clear()
+        base = metrics_table.compute_metrics_table(metrics_table.INDICATOR_PERIOD)
+        assert sorted(fetched_periods) == ["1d", "3mo"]
+        columns = metrics_table.SCREENING_COLUMNS
+        expected = base.row(base.row_by_code["A.T"], columns)
+        assert expected["rsi"] is not None and expected["ma20_distance"] is not None
+        assert short.row(short.row_by_code["A.T"], columns) == expected
+
+
+class TestCursor:
+    def test_round_trip(self):
+        cursor = encode_cursor(50, "market_cap", False, "v1")
+        assert decode_cursor(cursor, "market_cap", False, "v1") == 50
+
+    @pytest.mark.parametrize(
+        "cursor,sort,version",
+        [
+            ("not-a-cursor!", "change_percent", "v1"),
+            (encode_cursor(10, "change_percent", True, "v1"), "market_cap", "v1"),
+            (encode_cursor(10, "change_percent", True, "v1"), "change_percent", "v2"),
+        ],
+    )
+    def test_rejects_invalid_or_stale(self, cursor, sort, version):
+        with pytest.raises(ValueError):
+            decode_cursor(cursor, sort, True, version)
+
+    def test_rejects_changed_query(self):
+        query = metrics_table.query_key(period="1mo", theme_id=None, filter="rsi < 50")
+        assert query == metrics_table.query_key(filter="rsi < 50", theme_id=None, period="1mo")
+        cursor = encode_cursor(10, "rsi", True, "v1", query)
+        assert decode_cursor(cursor, "rsi", True, "v1", query) == 10
+        for other in (metrics_table.query_key(period="5d", theme_id=None, filter="rsi < 50"), None):
+            with pytest.raises(ValueError, match="filters"):
+                decode_cursor(cursor, "rsi", True, "v1", other)
+
+
+# ---------------------------------------------------------------------------
+# Endpoints
+# ---------------------------------------------------------------------------
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(themes_router, "PRECOMPUTED_DIR", tmp_path)
+    monkeypatch.setattr(screener_router, "PRECOMPUTED_DIR", tmp_path)
+    theme_ids = list(themes_router.THEMES)[:2]
+    themes = {
+        theme_ids[0]: THEMES["ai"],
+        theme_ids[1]: THEMES["chip"],
+    }
+    records = build_metric_records(themes, RETURNS, {}, MARKET_CAPS)
+    table = MetricsTable("1mo", records, generated_at="2026-01-01T00:00:00")
+    write_json_file(tmp_path / metrics_filename("1mo"), table.to_payload())
+    write_json_file(tmp_path / "heatmap_1mo.json", {"precomputed": True})
+
+    app = FastAPI(default_response_class=FastJSONResponse)
+    app.include_router(themes_router.router)
+    app.include_router(screener_router.router)
+    return TestClient(app), theme_ids
+
+
+class TestScreenerEndpoint:
+    def test_filter_and_sort(self, client):
+        test_client, theme_ids = client
+        data = test_client.get(f"/api/screener?theme_id={theme_ids[0]}&sort=market_cap&order=asc").json()
+        assert data["total"] == 3
+        assert [s["code"] for s in data["stocks"]] == ["C.T", "B.T", "A.T"]
+        assert data["next_cursor"] is None
+
+    def test_cursor_pagination(self, client):
+        test_client, _ = client
+        first = test_client.get("/api/screener?limit=3").json()
+        assert [s["code"] for s in first["stocks"]] == ["D.T", "A.T", "C.T"]
+        second = test_client.get(f"/api/screener?limit=3&cursor={first['next_cursor']}").json()
+        assert [s["code"] for s in second["stocks"]] == ["B.T"]
+        assert second["next_cursor"] is None
+
+        mismatch = test_client.get(f"/api/screener?sort=market_cap&cursor={first['next_cursor']}")
+        assert mismatch.status_code == 400
+
+    def test_cursor_is_bound_to_filters_and_period(self, client, tmp_path):
+        test_client, theme_ids = client
+        # 同じ更新サイクル（generated_at が同じ）の別期間
+        table = MetricsTable("5d", build_metric_records(THEMES, RETURNS, {}, MARKET_CAPS), generated_at="2026-01-01T00:00:00")
+        write_json_file(tmp_path / metrics_filename("5d"), table.to_payload())
+
+        first = test_client.get("/api/screener?limit=1&filter=change_percent > 0").json()
+        cursor = first["next_cursor"]
+        # 空白だけが違う式は同じ条件
+        same = test_client.get(f"/api/screener?limit=1&filter=change_percent>0&cursor={cursor}")
+        assert same.status_code == 200
+        assert same.json()["offset"] == 1
+
+        for params in ("filter=change_percent > 5", "", f"filter=change_percent > 0&theme_id={theme_ids[0]}",
+                       "filter=change_percent > 0&period=5d"):
+            resp = test_client.get(f"/api/screener?limit=1&{params}&cursor={cursor}")
+            assert resp.status_code == 400, params
+            assert "filters" in resp.json()["detail"]
+
+    def test_invalid_parameters(self, client):
+        test_client, _ = client
+        assert test_client.get("/api/screener?sort=price").status_code == 400
+        assert test_client.get("/api/screener?category=huge").status_code == 400
+        assert test_client.get("/api/screener?theme_id=no_such_theme").status_code == 404
+
+
+class TestFilteredHeatmap:
+    def test_unfiltered_serves_precomputed(self, client):
+        test_client, _ = client
+        assert test_client.get("/api/heatmap?period=1mo").json() == {"precomputed": True}
+
+    def test_filters_query_the_table(self, client):
+        test_client, theme_ids = client
+        data = test_client.get(f"/api/heatmap?period=1mo&theme_id={theme_ids[1]}&min_change=0").json()
+        categories = data["categories"]
+        assert [s["code"] for s in categories["small"]["stocks"]] == ["D.T"]
+        assert categories["mid"]["count"] == 0
+        assert categories["mega"]["stocks"] == []
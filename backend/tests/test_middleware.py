@@ -0,0 +1,216 @@
+"""Tests for middleware.py (rate limiting, security headers, request metrics)"""
+
+import asyncio
+import logging
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi import FastAPI, WebSocket
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from middleware import (
+    RateLimitMiddleware,
+    RedisTokenBucketLimiter,
+    RequestMetricsMiddleware,
+    SecurityHeadersMiddleware,
+    TokenBucketLimiter,
+)
+from routers import health
+from utils.metrics import Histogram, RequestMetrics
+
+
+class TestTokenBucketLimiter:
+    def test_burst_then_refill(self):
+        limiter = TokenBucketLimiter(capacity=3, window_seconds=3)  # 1 token/s
+        assert [limiter.take("a", now=0).allowed for _ in range(4)] == [True, True, True, False]
+        denied = limiter.take("a", now=0.5)
+        assert not denied.allowed and 0 < denied.retry_after <= 1
+        assert limiter.take("a", now=1.5).allowed
+        # 満タン以上には貯まらない
+        assert limiter.take("b", now=0).remaining == 2
+        assert limiter.take("b", now=1000).remaining == 2
+
+    def test_costs(self):
+        limiter = TokenBucketLimiter(capacity=10, window_seconds=10)
+        assert limiter.take("a", cost=8, now=0).allowed
+        denied = limiter.take("a", cost=5, now=0)
+        assert not denied.allowed and denied.retry_after == 3
+        assert limiter.take("a", cost=2, now=0).allowed
+
+    def test_memory_is_bounded_by_lru(self):
+        limiter = TokenBucketLimiter(capacity=1, window_seconds=60, max_clients=100)
+        limiter.take("hot", now=0)
+        for i in range(1000):
+            limiter.take(f"10.0.{i // 256}.{i % 256}", now=0)
+            limiter.take("hot", now=0)  # 最近使われたクライアントは残る
+        assert len(limiter) == 100
+        assert not limiter.take("hot", now=0).allowed
+
+
+def _app(**kwargs) -> FastAPI:
+    app = _routes()
+    app.add_middleware(RateLimitMiddleware, **kwargs)
+    return app
+
+
+def _routes() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/themes")
+    def themes():
+        return {"ok": True}
+
+    @app.post("/api/refresh")
+    def refresh():
+        return {"ok": True}
+
+    @app.get("/api/health")
+    def health():
+        return {"status": "healthy"}
+
+    @app.get("/api/stream")
+    def stream():
+        return StreamingResponse(iter([b"a", b"b", b"c"]), media_type="text/plain")
+
+    @app.websocket("/ws")
+    async def ws(websocket: WebSocket):
+        await websocket.accept()
+        await websocket.send_text("hello")
+        await websocket.close()
+
+    @app.get("/api/themes/{theme_id}")
+    def theme(theme_id: str):
+        if theme_id == "boom":
+            raise RuntimeError("boom")
+        return {"id": theme_id}
+
+    return app
+
+
+class TestRateLimitMiddleware:
+    def test_limits_and_route_costs(self):
+        client = TestClient(_app(max_requests=30, window_seconds=3600))
+        assert client.post("/api/refresh").status_code == 200  # コスト20
+        for _ in range(10):
+            assert client.get("/api/themes").status_code == 200
+        resp = client.post("/api/refresh")
+        assert resp.status_code == 429
+        assert resp.json() == {"detail": "Too many requests"}
+        assert int(resp.headers["retry-after"]) > 0
+        assert resp.headers["x-ratelimit-limit"] == "30"
+        # ヘルスチェックはコスト0
+        for _ in range(50):
+            assert client.get("/api/health").status_code == 200
+        assert client.get("/api/themes").status_code == 429
+
+    def test_passes_streaming_and_websocket_through(self):
+        client = TestClient(_app(max_requests=1, window_seconds=3600))
+        assert client.get("/api/stream").text == "abc"
+        assert client.get("/api/stream").status_code == 429
+        with client.websocket_connect("/ws") as ws:
+            assert ws.receive_text() == "hello"
+
+    def test_route_cost_rules(self):
+        middleware = RateLimitMiddleware(None)
+        assert middleware.route_cost("POST", "/api/stocks/7203/refresh") == 10
+        assert middleware.route_cost("GET", "/api/stocks/7203") == 1
+        assert middleware.route_cost("GET", "/api/export/bulk/ohlcv") == 5
+        assert middleware.route_cost("GET", "/api/health/ready") == 0
+
+
+class TestRedisTokenBucketLimiter:
+    def test_falls_back_to_local_buckets_when_unreachable(self):
+        limiter = RedisTokenBucketLimiter("redis://127.0.0.1:1/0", capacity=2, window_seconds=60)
+
+        async def scenario():
+            return [(await limiter.acquire("a")).allowed for _ in range(3)]
+
+        assert asyncio.run(scenario()) == [True, True, False]
+        assert len(limiter.fallback) == 1
+
+
+class TestHistogram:
+    def test_quantiles_interpolate_within_buckets(self):
+        histogram = Histogram((0.01, 0.1, 1.0))
+        for _ in range(90):
+            histogram.observe(0.005)
+        for _ in range(10):
+            histogram.observe(0.5)
+        assert histogram.cumulative() == [90, 90, 100, 100]
+        assert histogram.quantile(0.5) < 0.01
+        assert 0.1 < histogram.quantile(0.95) <= 1.0
+        histogram.observe(100)
+        assert histogram.quantile(1.0) == 1.0
+        assert Histogram().quantile(0.5) is None
+
+
+@pytest.fixture
+def metrics_client():
+    metrics = RequestMetrics()
+    app = _routes()
+    app.include_router(health.router)
+    app.add_middleware(SecurityHeadersMiddleware)
+    app.add_middleware(RequestMetricsMiddleware, metrics=metrics, log_sample_rate=0)
+    return TestClient(app, raise_server_exceptions=False), metrics
+
+
+class TestRequestMetricsMiddleware:
+    def test_routes_sizes_and_status(self, metrics_client):
+        client, metrics = metrics_client
+        for theme_id in ("ai", "ev", "semiconductor"):
+            assert client.get(f"/api/themes/{theme_id}").status_code == 200
+        assert client.get("/api/stream").text == "abc"
+        assert client.get("/api/themes/boom").status_code == 500
+        assert client.get("/nope").status_code == 404
+
+        # ルートのテンプレートでまとめる（パスごとに系列が増えない）
+        assert metrics.requests[("GET", "/api/themes/{theme_id}", 200)] == 3
+        assert metrics.requests[("GET", "/api/themes/{theme_id}", 500)] == 1
+        assert metrics.requests[("GET", "unmatched", 404)] == 1
+        assert metrics.response_bytes[("GET", "/api/stream")] == 3
+        assert metrics.in_flight == {"GET": 0}
+        summary = {row["route"]: row for row in metrics.summary()}
+        assert summary["/api/themes/{theme_id}"]["count"] == 4
+        assert summary["/api/themes/{theme_id}"]["p99_ms"] > 0
+
+    def test_security_headers_on_plain_and_streaming(self, metrics_client):
+        client, _ = metrics_client
+        for path in ("/api/themes/ai", "/api/stream"):
+            resp = client.get(path)
+            assert resp.headers["x-content-type-options"] == "nosniff"
+            assert resp.headers["x-frame-options"] == "DENY"
+        with client.websocket_connect("/ws") as ws:
+            assert ws.receive_text() == "hello"
+
+    def test_prometheus_endpoint(self, metrics_client, monkeypatch):
+        client, metrics = metrics_client
+        monkeypatch.setattr(health, "request_metrics", metrics)
+        client.get("/api/themes/ai")
+        resp = client.get("/metrics")
+        assert resp.headers["content-type"].startswith("text/plain; version=0.0.4")
+        text = resp.text
+        assert '# TYPE http_request_duration_seconds histogram' in text
+        assert 'http_requests_total{method="GET",route="/api/themes/{theme_id}",status="200"} 1' in text
+        assert 'http_request_duration_seconds_bucket{method="GET",route="/api/themes/{theme_id}",le="+Inf"} 1' in text
+        assert 'quantile="0.99"' in text
+        assert "websocket_connections 0" in text
+        # /metrics 自身は処理中として数えられる
+        assert 'http_requests_in_flight{method="GET"} 1' in text
+        assert client.get("/api/health/metrics").json()["routes"][0]["route"] == "/api/themes/{theme_id}"
+
+    def test_access_log_sampling(self, caplog):
+        app = _routes()
+        app.add_middleware(RequestMetricsMiddleware, metrics=RequestMetrics(), log_sample_rate=0.25)
+        client = TestClient(app, raise_server_exceptions=False)
+        with caplog.at_level(logging.INFO, logger="middleware"):
+            for _ in range(8):
+                client.get("/api/themes/ai")
+            client.get("/api/themes/boom")
+        lines = [r.getMessage() for r in caplog.records if r.name == "middleware"]
+        assert len(lines) == 3  # 4件に1件 + 5xx は常に出力
+        assert "status=500" in lines[-1]
@@ -0,0 +1,179 @@
+"""Tests for services/pipeline_trace.py and the admin pipeline endpoints"""
+
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pandas as pd
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routers import admin
+from services import data_fetcher, pipeline_trace, snapshot
+
+
+@pytest.fixture(autouse=True)
+def _reset_traces():
+    pipeline_trace.clear()
+    yield
+    pipeline_trace.clear()
+
+
+class TestPipelineTrace:
+    def test_spans_and_counters(self):
+        with pipeline_trace.cycle("update_all_data") as cycle:
+            with pipeline_trace.span("themes"):
+                with pipeline_trace.span("fetch", period="1mo", tickers=3):
+                    pipeline_trace.annotate(fetched=2)
+                for _ in range(3):
+                    with pipeline_trace.timed("write"):
+                        pipeline_trace.count("write.bytes", 100)
+            # 入れ子のサイクルは子スパンになる
+            with pipeline_trace.cycle("update_changed_themes") as inner:
+                assert inner is cycle
+
+        detail = cycle.to_dict()
+        assert detail["status"] == "ok"
+        assert [stage["name"] for stage in detail["stages"]] == ["themes", "update_changed_themes"]
+        fetch = detail["spans"][0]["children"][0]
+        assert fetch["attrs"] == {"period": "1mo", "tickers": 3, "fetched": 2}
+        assert detail["counters"]["write.calls"] == 3
+        assert detail["counters"]["write.bytes"] == 300
+        assert detail["counters"]["write.seconds"] >= 0
+        assert pipeline_trace.current_cycle() is None
+
+    def test_noop_outside_cycle(self):
+        with pipeline_trace.span("fetch") as span_:
+            assert span_ is None
+        pipeline_trace.count("write.files")
+        with pipeline_trace.timed("write"):
+            pass
+        assert pipeline_trace.recent_cycles() == []
+
+    def test_error_status_and_retention(self, monkeypatch):
+        monkeypatch.setattr(pipeline_trace, "_cycles", pipeline_trace.deque(maxlen=3))
+        for _ in range(5):
+            with pipeline_trace.cycle("update_all_data"):
+                pass
+        with pytest.raises(RuntimeError):
+            with pipeline_trace.cycle("update_all_data"):
+                raise RuntimeError("boom")
+
+        cycles = pipeline_trace.recent_cycles()
+        assert len(cycles) == 3
+        assert cycles[0].status == "error" and cycles[0].error == "boom"
+        assert cycles[0].id > cycles[1].id > cycles[2].id
+        assert pipeline_trace.get_cycle(cycles[2].id) is cycles[2]
+
+    def test_submit_propagates_cycle_to_threads(self):
+        with pipeline_trace.cycle("update_all_data") as cycle:
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                futures = [pipeline_trace.submit(executor, pipeline_trace.count, "fetch.download") for _ in range(20)]
+                for future in futures:
+                    future.result()
+        assert cycle.counters["fetch.download"] == 20
+
+    def test_summary_while_workers_record(self):
+        # 実行中のサイクルを読んでも「dictionary changed size during iteration」にならない
+        with pipeline_trace.cycle("update_all_data") as cycle:
+            def record(i):
+                for j in range(200):
+                    pipeline_trace.count(f"fetch.{i}.{j}")
+                    with pipeline_trace.span("fetch", worker=i):
+                        pipeline_trace.annotate(n=j)
+
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                futures = [pipeline_trace.submit(executor, record, i) for i in range(4)]
+                while not all(future.done() for future in futures):
+                    cycle.summary()
+                    cycle.to_dict()
+                for future in futures:
+                    future.result()
+        assert len(cycle.summary()["counters"]) == 800
+        assert len(cycle.to_dict()["spans"]) == 800
+
+    def test_cprofile_dump(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(pipeline_trace, "PROFILE_DIR", tmp_path)
+        pipeline_trace.request_profile("cprofile")
+        assert pipeline_trace.profile_pending() == "cprofile"
+        with pipeline_trace.cycle("update_all_data") as cycle:
+            sorted(range(1000), key=lambda x: -x)
+        assert pipeline_trace.profile_pending() is None
+        assert Path(cycle.profile["path"]).exists()
+        assert "cumulative" in cycle.profile["text"]
+        assert cycle.summary()["profile"]["profiler"] == "cprofile"
+
+        with pytest.raises(ValueError):
+            pipeline_trace.request_profile("perf")
+
+
+class TestFetcherInstrumentation:
+    def test_cache_hits_are_counted(self, monkeypatch):
+        df = pd.DataFrame({"Close": [100.0, 101.0]}, index=pd.date_range("2024-01-01", periods=2))
+        monkeypatch.setattr(data_fetcher, "load_from_cache", lambda path: df)
+        data_fetcher._fetch_stock_data_cached.cache_clear()
+        try:
+            with pipeline_trace.cycle("update_all_data") as cycle:
+                data_fetcher.fetch_batch_parallel(["1111.T", "2222.T"], "1mo")
+                data_fetcher.fetch_batch_parallel(["1111.T", "2222.T"], "1mo")
+        finally:
+            data_fetcher._fetch_stock_data_cached.cache_clear()
+        assert cycle.counters["fetch.file_hit"] == 2
+        assert cycle.counters["fetch.memory_hit"] == 2
+        assert "fetch.download.calls" not in cycle.counters
+
+    def test_write_precomputed_counts_bytes(self, monkeypatch, tmp_path):
+        from jobs import update_data
+
+        monkeypatch.setattr(update_data, "PRECOMPUTED_DIR", tmp_path)
+        try:
+            with pipeline_trace.cycle("update_all_data") as cycle:
+                path = update_data.write_precomputed("themes_1mo.json", {"themes": []})
+        finally:
+            snapshot.clear()
+        assert cycle.counters["write.files"] == 1
+        assert cycle.counters["write.bytes"] == path.stat().st_size
+
+
+@pytest.fixture
+def admin_client(monkeypatch, tmp_path):
+    monkeypatch.setenv("API_REFRESH_KEY", "secret")
+    monkeypatch.setattr(pipeline_trace, "PROFILE_DIR", tmp_path)
+    app = FastAPI()
+    app.include_router(admin.router)
+    return TestClient(app)
+
+
+class TestAdminEndpoints:
+    def test_requires_api_key(self, admin_client):
+        assert admin_client.get("/api/admin/pipeline").status_code == 401
+        assert admin_client.get("/api/admin/pipeline", headers={"X-API-Key": "wrong"}).status_code == 403
+
+    def test_list_detail_and_profile(self, admin_client):
+        headers = {"X-API-Key": "secret"}
+        resp = admin_client.post("/api/admin/pipeline/profile?profiler=cprofile", headers=headers)
+        assert resp.json() == {"status": "armed", "profiler": "cprofile"}
+        assert admin_client.get("/api/admin/pipeline", headers=headers).json()["profile_pending"] == "cprofile"
+
+        with pipeline_trace.cycle("update_all_data") as cycle:
+            with pipeline_trace.span("themes"):
+                pipeline_trace.count("write.files")
+
+        listing = admin_client.get("/api/admin/pipeline", headers=headers).json()
+        assert listing["retained"] == 1 and listing["profile_pending"] is None
+        assert listing["cycles"][0]["stages"][0]["name"] == "themes"
+
+        detail = admin_client.get(f"/api/admin/pipeline/{cycle.id}", headers=headers).json()
+        assert detail["spans"][0]["name"] == "themes"
+        assert detail["counters"] == {"write.files": 1}
+
+        profile = admin_client.get(f"/api/admin/pipeline/{cycle.id}/profile", headers=headers)
+        assert profile.headers["content-type"].startswith("text/plain")
+        assert "function calls" in profile.text
+
+        assert admin_client.get("/api/admin/pipeline/999999", headers=headers).status_code == 404
+        assert admin_client.post("/api/admin/pipeline/profile?profiler=perf", headers=headers).status_code == 400
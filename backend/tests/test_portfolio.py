@@ -0,0 +1,168 @@
+"""Tests for the portfolio analytics engine and /api/analytics/portfolio"""
+
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routers import analytics as analytics_router
+from services import price_matrix
+from services.custom_theme import BasketError, normalize_basket
+from services.portfolio import (
+    TRADING_DAYS_PER_YEAR,
+    compute_portfolio,
+    get_portfolio,
+    max_drawdown,
+    risk_contributions,
+    theme_basket,
+)
+from services.price_matrix import BENCHMARK_TICKER, PriceMatrix, save_price_matrix
+from utils.cache import cache
+
+TICKERS = ["7203.T", "6758.T", "9984.T", "8306.T"]
+
+THEMES = {
+    "auto": {"name": "自動車", "description": "", "tickers": ["7203.T", "6758.T"]},
+    "mix": {"name": "ミックス", "description": "", "tickers": ["6758.T", "9984.T", "8306.T"]},
+}
+
+
+def _matrix(period: str = "1y", days: int = 250, seed: int = 0) -> PriceMatrix:
+    """市場リターン × ベータ（0.5, 1, 2, 0）+ 個別ノイズの合成データ"""
+    rng = np.random.default_rng(seed)
+    market = rng.normal(0.0005, 0.01, days)
+    betas = np.array([0.5, 1.0, 2.0, 0.0])
+    returns = market[:, None] * betas + rng.normal(0, 0.002, (days, len(betas)))
+    close = np.column_stack([1000 * np.cumprod(1 + returns, axis=0), 30000 * np.cumprod(1 + market)])
+    dates = pd.bdate_range("2025-01-06", periods=days).to_numpy()
+    return PriceMatrix(period, dates, TICKERS + [BENCHMARK_TICKER], close, generated_at="2026-01-05T15:30:00")
+
+
+class TestPortfolioEngine:
+    def test_metrics_match_direct_computation(self):
+        matrix = _matrix()
+        basket = normalize_basket(TICKERS, {"7203": 1, "6758": 1, "9984": 2, "8306": 1})
+        result = compute_portfolio(basket, matrix, risk_free_rate=1.0)
+
+        weights = np.array([0.2, 0.2, 0.4, 0.2])
+        returns = matrix.close[1:, :4] / matrix.close[:-1, :4] - 1
+        daily = returns @ weights
+        expected_volatility = daily.std(ddof=1) * np.sqrt(TRADING_DAYS_PER_YEAR) * 100
+
+        metrics = result["metrics"]
+        assert result["observations"] == 249
+        assert metrics["volatility"] == pytest.approx(expected_volatility, abs=0.01)
+        assert metrics["return"] == pytest.approx((np.prod(1 + daily) - 1) * 100, abs=0.01)
+        assert metrics["beta"] == pytest.approx(0.2 * 0.5 + 0.2 + 0.4 * 2, abs=0.05)
+        assert metrics["max_drawdown"] <= 0
+        excess = daily - 0.01 / TRADING_DAYS_PER_YEAR
+        assert metrics["sharpe_ratio"] == pytest.approx(
+            excess.mean() / daily.std(ddof=1) * np.sqrt(TRADING_DAYS_PER_YEAR), abs=1e-3
+        )
+
+        holdings = {holding["code"]: holding for holding in result["holdings"]}
+        assert holdings["9984.T"]["beta"] == pytest.approx(2.0, abs=0.05)
+        assert holdings["8306.T"]["beta"] == pytest.approx(0.0, abs=0.05)
+        # 寄与度の合計は100%（ボラティリティは共分散から求めた値と一致）
+        assert sum(h["risk_contribution"] for h in result["holdings"]) == pytest.approx(100, abs=0.05)
+        assert result["holdings"][0]["code"] == "9984.T"
+
+    def test_missing_and_unknown_tickers(self):
+        matrix = _matrix()
+        close = matrix.close.copy()
+        close[:100, 0] = np.nan  # 途中から上場
+        matrix = PriceMatrix("1y", matrix.dates, matrix.tickers, close)
+        result = compute_portfolio(normalize_basket(["7203", "6758", "1234"]), matrix)
+        assert result["missing"] == ["1234.T"]
+        assert result["holdings_count"] == 2
+        assert result["observations"] == 249
+        assert all(np.isfinite(h["volatility"]) for h in result["holdings"])
+
+    def test_risk_contributions_and_drawdown(self):
+        returns = np.random.default_rng(2).normal(0, 0.01, size=(50, 3))
+        weights = np.array([0.5, 0.3, 0.2])
+        covariance = np.cov(returns, rowvar=False) * TRADING_DAYS_PER_YEAR
+        contribution, volatility, variance = risk_contributions(returns, weights)
+        np.testing.assert_allclose(contribution, weights * (covariance @ weights) / (weights @ covariance @ weights))
+        np.testing.assert_allclose(volatility, np.sqrt(np.diag(covariance)))
+        assert variance == pytest.approx(weights @ covariance @ weights)
+
+        assert max_drawdown(np.array([0.1, -0.5, 0.2])) == pytest.approx(-0.5)
+        assert max_drawdown(np.array([0.1, 0.1])) == 0.0
+
+    def test_theme_basket(self):
+        basket = theme_basket(["auto", "mix"], THEMES)
+        weights = basket.weight_map
+        assert weights["7203.T"] == pytest.approx(0.25)
+        assert weights["6758.T"] == pytest.approx(0.25 + 1 / 6)
+        with pytest.raises(BasketError):
+            theme_basket(["nothing"], THEMES)
+
+    def test_memoized_by_canonical_key(self, tmp_path):
+        cache.clear()
+        save_price_matrix(tmp_path, _matrix())
+        first = get_portfolio(normalize_basket(["7203", "6758"]), "1y", tmp_path)
+        second = get_portfolio(normalize_basket(["6758.T", "7203.T"]), "1y", tmp_path)
+        assert first is second
+        assert get_portfolio(normalize_basket(["7203"]), "3mo", tmp_path) is None
+        cache.clear()
+        price_matrix.clear()
+
+    def test_500_holdings_are_fast(self):
+        rng = np.random.default_rng(5)
+        tickers = [f"{1000 + i}.T" for i in range(500)]
+        close = 1000 * np.cumprod(1 + rng.normal(0, 0.02, (1260, 501)), axis=0)
+        matrix = PriceMatrix("5y", pd.bdate_range("2021-01-04", periods=1260).to_numpy(), tickers + [BENCHMARK_TICKER], close)
+        basket = normalize_basket(tickers, {t: float(w) for t, w in zip(tickers, rng.uniform(1, 2, 500))}, 500)
+        compute_portfolio(basket, matrix)
+        start = time.perf_counter()
+        result = compute_portfolio(basket, matrix)
+        elapsed = time.perf_counter() - start
+        assert len(result["holdings"]) == 500
+        # 計測値は 50 ms を大きく下回る（CI の揺らぎを見込んだ上限）
+        assert elapsed < 0.25
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    cache.clear()
+    save_price_matrix(tmp_path, _matrix())
+    monkeypatch.setattr(analytics_router, "PRECOMPUTED_DIR", tmp_path)
+    for theme_id, theme in THEMES.items():
+        monkeypatch.setitem(analytics_router.THEMES, theme_id, theme)
+    app = FastAPI()
+    app.include_router(analytics_router.router)
+    yield TestClient(app)
+    cache.clear()
+    price_matrix.clear()
+
+
+class TestPortfolioEndpoint:
+    def test_themes(self, client):
+        data = client.get("/api/analytics/portfolio?theme_ids=auto,mix&period=1y").json()
+        assert data["selected_themes"] == 2
+        assert data["metrics"]["volatility"] > 0
+        assert {h["code"] for h in data["holdings"]} == set(TICKERS)
+
+    def test_weighted_tickers(self, client):
+        data = client.post("/api/analytics/portfolio", json={
+            "tickers": ["7203", "9984"], "weights": {"7203": 3, "9984": 1}, "period": "1y",
+        }).json()
+        assert data["total_stocks"] == 2
+        weights = {h["code"]: h["weight"] for h in data["holdings"]}
+        assert weights == {"7203.T": 0.75, "9984.T": 0.25}
+
+    def test_errors(self, client):
+        assert client.get("/api/analytics/portfolio?theme_ids=auto&tickers=7203").status_code == 400
+        assert client.get("/api/analytics/portfolio?period=5d").status_code == 400
+        assert client.post("/api/analytics/portfolio", json={"period": "1y"}).status_code == 400
+        data = client.get("/api/analytics/portfolio?theme_ids=auto&period=3mo").json()
+        assert data["metrics"] is None
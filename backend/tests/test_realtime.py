@@ -0,0 +1,330 @@
+"""Tests for WebSocket delta push (JSON Patch, channels, manager, endpoint)"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.websocket_manager import MAX_SUBSCRIPTIONS, ConnectionManager
+from jobs import update_data
+from routers import realtime
+from services import live_channels, snapshot
+from services.live_channels import ChannelError, channel_state, parse_channel, themes_projection
+from services.update_events import UpdateBroker
+from utils.json_patch import apply_patch, diff
+from utils.serialization import dumps, loads
+
+
+class TestJsonPatch:
+    def test_only_changed_fields(self):
+        old = {"themes": {"ai": {"change_percent": 1.0, "name": "AI"}, "bank": {"change_percent": 2.0}}, "order": ["ai", "bank"]}
+        new = {"themes": {"ai": {"change_percent": 1.5, "name": "AI"}, "ev": {"change_percent": 0.1}}, "order": ["ai", "ev"]}
+        ops = diff(old, new)
+        assert {"op": "replace", "path": "/themes/ai/change_percent", "value": 1.5} in ops
+        assert {"op": "remove", "path": "/themes/bank"} in ops
+        assert {"op": "add", "path": "/themes/ev", "value": {"change_percent": 0.1}} in ops
+        assert {"op": "replace", "path": "/order", "value": ["ai", "ev"]} in ops
+        assert len(ops) == 4
+        assert apply_patch(old, ops) == new
+        assert diff(new, new) == []
+
+    def test_pointer_escaping_and_root(self):
+        old = {"a/b": {"~x": 1}}
+        new = {"a/b": {"~x": 2}}
+        ops = diff(old, new)
+        assert ops == [{"op": "replace", "path": "/a~1b/~0x", "value": 2}]
+        assert apply_patch(old, ops) == new
+        # 状態が未作成（None）から作成された場合はルートを置き換える
+        assert apply_patch(None, diff(None, new)) == new
+        # 1 と True、1 と 1.0 は型が違うので変更として扱う
+        assert diff({"v": 1}, {"v": True}) != []
+
+
+def _ranking(changes: dict[str, float]) -> dict:
+    rows = sorted(({"id": k, "name": k, "change_percent": v, "sparkline": {"data": [v]}} for k, v in changes.items()),
+                  key=lambda row: -row["change_percent"])
+    return {"period": "1mo", "themes": rows, "total": len(rows), "last_updated": "2026-07-31 15:00", "generated_at": "x"}
+
+
+class TestLiveChannels:
+    def test_parse_channel(self, monkeypatch):
+        monkeypatch.setitem(live_channels.THEMES, "ai", {"name": "AI", "tickers": []})
+        assert parse_channel("themes:1mo") == ("themes", None, "1mo")
+        assert parse_channel("theme:ai:5y") == ("theme", "ai", "5y")
+        for bad in ("themes:2w", "theme:missing:1mo", "theme:../x:1mo", "stocks:1mo", "themes"):
+            with pytest.raises(ChannelError):
+                parse_channel(bad)
+
+    def test_projection_is_keyed_and_drops_sparklines(self, tmp_path):
+        (tmp_path / "themes_1mo.json").write_bytes(dumps(_ranking({"ai": 1.0, "bank": 2.0})))
+        state = channel_state("themes:1mo", tmp_path)
+        assert state["order"] == ["bank", "ai"]
+        assert state["themes"]["ai"] == {"name": "ai", "change_percent": 1.0}
+        assert channel_state("themes:5y", tmp_path) is None
+        snapshot.clear()
+
+        # 順位の入れ替わりは order の置換と値の変わった行だけになる
+        (tmp_path / "themes_1mo.json").write_bytes(dumps(_ranking({"ai": 3.0, "bank": 2.0})))
+        ops = diff(state, channel_state("themes:1mo", tmp_path))
+        assert sorted(op["path"] for op in ops) == ["/order", "/themes/ai/change_percent"]
+        snapshot.clear()
+
+
+class FakeSocket:
+    """Records sent frames; send_text blocks while ``gate`` is cleared."""
+
+    def __init__(self) -> None:
+        self.sent: list[dict] = []
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    async def accept(self) -> None:
+        pass
+
+    async def send_text(self, text: str) -> None:
+        await self.gate.wait()
+        self.sent.append(loads(text))
+
+
+class TestConnectionManager:
+    def test_slow_client_does_not_stall_and_is_coalesced(self):
+        states = {"themes:1mo": {"v": 0}}
+
+        async def scenario():
+            manager = ConnectionManager(states.get, queue_size=MAX_SUBSCRIPTIONS + 1)
+            fast, slow = FakeSocket(), FakeSocket()
+            slow.gate.clear()
+            fast_client = await manager.connect(fast)
+            slow_client = await manager.connect(slow)
+            for client in (fast_client, slow_client):
+                await manager.subscribe(client, "themes:1mo")
+
+            updates = 100
+            for i in range(1, updates + 1):
+                states["themes:1mo"] = {"v": i}
+                assert await manager.publish_updates() == 1
+                await asyncio.sleep(0)
+
+            # 送信が止まっている接続のキューは上限を超えない
+            assert slow_client.queue.qsize() <= slow_client.queue.maxsize
+            assert slow_client.resyncs > 0
+            slow.gate.set()
+            for _ in range(5):
+                await asyncio.sleep(0)
+            await manager.disconnect(fast_client)
+            await manager.disconnect(slow_client)
+            return manager, fast.sent, slow.sent
+
+        manager, fast_sent, slow_sent = asyncio.run(scenario())
+        assert [m["type"] for m in fast_sent] == ["snapshot"] + ["patch"] * 100
+        assert fast_sent[-1]["version"] == 101
+
+        # 遅い接続は最新のスナップショットに追いつき、以降のパッチは版が連続する
+        resync = max(i for i, m in enumerate(slow_sent) if m["type"] == "snapshot")
+        state, version = slow_sent[resync]["data"], slow_sent[resync]["version"]
+        for message in slow_sent[resync + 1:]:
+            if message["base"] < version:
+                continue
+            assert message["base"] == version
+            state, version = apply_patch(state, message["ops"]), message["version"]
+        assert (state, version) == ({"v": 100}, 101)
+        assert len(slow_sent) < len(fast_sent)
+        stats = manager.stats()
+        assert stats["resyncs"] > 0 and stats["dropped"] > 0
+        assert stats["connections"] == 0 and stats["channels"] == {}
+
+    def test_serializes_once_per_channel(self, monkeypatch):
+        calls = []
+        real_dumps = dumps
+        monkeypatch.setattr("app.websocket_manager.dumps", lambda obj: calls.append(obj) or real_dumps(obj))
+        states = {"themes:1mo": {"v": 0}}
+
+        async def scenario():
+            manager = ConnectionManager(states.get)
+            clients = [await manager.connect(FakeSocket()) for _ in range(50)]
+            for client in clients:
+                await manager.subscribe(client, "themes:1mo")
+            calls.clear()
+            states["themes:1mo"] = {"v": 1}
+            await manager.publish_updates()
+            for client in clients:
+                await manager.disconnect(client)
+
+        asyncio.run(scenario())
+        assert len(calls) == 1
+
+
+@pytest.fixture
+def ws_app(monkeypatch):
+    states = {"themes:1mo": _ranking({"ai": 1.0})}
+    manager = ConnectionManager(lambda channel: themes_projection(states[channel]) if channel in states else None)
+    monkeypatch.setattr(realtime, "ws_manager", manager)
+    monkeypatch.setitem(live_channels.THEMES, "ai", {"name": "AI", "tickers": []})
+    app = FastAPI()
+    app.include_router(realtime.router)
+    with TestClient(app) as client:
+        yield client, manager, states
+
+
+class TestWebSocketEndpoint:
+    def test_snapshot_then_patch_after_update(self, ws_app, monkeypatch):
+        client, manager, states = ws_app
+        monkeypatch.setattr(update_data, "_update_listeners", [manager.notify_threadsafe])
+        with client.websocket_connect("/ws?channels=themes:1mo") as ws:
+            first = ws.receive_json()
+            assert first["type"] == "snapshot" and first["version"] == 1
+            assert first["data"]["themes"]["ai"]["change_percent"] == 1.0
+
+            states["themes:1mo"] = _ranking({"ai": 1.25})
+            update_data.notify_update_listeners()
+            patch = ws.receive_json()
+            assert patch["type"] == "patch"
+            assert (patch["base"], patch["version"]) == (1, 2)
+            assert patch["ops"] == [{"op": "replace", "path": "/themes/ai/change_percent", "value": 1.25}]
+
+    def test_subscribe_errors_and_ping(self, ws_app):
+        client, manager, _ = ws_app
+        with client.websocket_connect("/ws") as ws:
+            ws.send_json({"action": "subscribe", "channels": ["theme:ai:1mo", "themes:2w"]})
+            snap = ws.receive_json()
+            assert (snap["channel"], snap["version"], snap["data"]) == ("theme:ai:1mo", 0, None)
+            assert ws.receive_json()["type"] == "error"
+            ws.send_text("not json")
+            assert ws.receive_json()["message"] == "Invalid JSON"
+            ws.send_json({"action": "ping"})
+            assert ws.receive_json() == {"type": "pong"}
+            ws.send_json({"action": "unsubscribe", "channels": ["theme:ai:1mo"]})
+            ws.send_json({"action": "ping"})
+            assert ws.receive_json() == {"type": "pong"}
+            assert manager.connection_count("theme:ai:1mo") == 0
+
+
+def _write_rankings(directory: Path, changes: dict[str, float], periods=("1mo", "1y")) -> None:
+    for period in periods:
+        payload = _ranking(changes)
+        payload["period"] = period
+        (directory / f"themes_{period}.json").write_bytes(dumps(payload))
+    snapshot.clear()
+
+
+def _parse_sse(body: bytes) -> list[dict]:
+    events = []
+    for block in body.decode().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if line and not line.startswith(":"))
+        if "data" in fields:
+            events.append({"id": fields["id"], "event": fields["event"], **loads(fields["data"])})
+    return events
+
+
+class TestUpdateEvents:
+    def test_summary_of_changed_themes(self, tmp_path):
+        broker = UpdateBroker(tmp_path)
+        _write_rankings(tmp_path, {"ai": 1.0, "bank": 2.0})
+        broker.on_update()
+        assert broker.latest.version == 1
+        assert broker.latest.payload["themes"] == {"changed": [], "added": [], "removed": []}
+
+        # ランキングの値が変わらなければイベントを出さない（generated_at だけの更新）
+        broker.on_update()
+        assert broker.latest.version == 1
+
+        _write_rankings(tmp_path, {"ai": 1.5, "ev": 0.1}, periods=("1mo",))
+        broker.on_update()
+        payload = broker.latest.payload
+        assert payload["version"] == 2
+        assert payload["periods"] == ["1mo"]
+        assert payload["themes"] == {"changed": ["ai", "bank"], "added": ["ev"], "removed": []}
+        assert payload["last_updated"] == "2026-07-31 15:00"
+        snapshot.clear()
+
+    def test_idle_subscribers_share_one_event(self, tmp_path):
+        _write_rankings(tmp_path, {"ai": 1.0})
+
+        async def scenario():
+            broker = UpdateBroker(tmp_path, keepalive_seconds=0.05)
+            broker.on_update()
+            streams = [broker.stream(broker.latest.id) for _ in range(2000)]
+            # 接続直後は retry のみ（Last-Event-ID が最新イベントと一致）
+            assert {await anext(s) for s in streams} == {b"retry: 5000\n\n"}
+            pending = [asyncio.ensure_future(anext(s)) for s in streams]
+            await asyncio.sleep(0)
+            assert broker.subscribers == 2000
+
+            _write_rankings(tmp_path, {"ai": 2.0})
+            broker.on_update()
+            messages = await asyncio.gather(*pending)
+            # 全購読者が同じバイト列（1回だけエンコードしたもの）を受け取る
+            assert all(m is broker.latest.message for m in messages)
+
+            # 更新がなければ keepalive コメントが届く
+            assert await anext(streams[0]) == b": keepalive\n\n"
+            broker.close()
+            for s in streams:
+                await s.aclose()
+            return broker
+
+        broker = asyncio.run(scenario())
+        assert broker.subscribers == 0
+        snapshot.clear()
+
+    def test_endpoint(self, tmp_path, monkeypatch):
+        _write_rankings(tmp_path, {"ai": 1.0})
+        broker = UpdateBroker(tmp_path)
+        broker.on_update()
+        broker.close()  # ストリームが最新イベントを送って終わるように
+        monkeypatch.setattr(realtime, "update_broker", broker)
+        app = FastAPI()
+        app.include_router(realtime.router)
+        client = TestClient(app)
+
+        resp = client.get("/api/events")
+        assert resp.headers["content-type"].startswith("text/event-stream")
+        assert resp.headers["cache-control"] == "no-cache"
+        events = _parse_sse(resp.content)
+        assert [(e["id"], e["event"], e["version"]) for e in events] == [(f"{broker.epoch}-1", "snapshot", 1)]
+
+        resp = client.get("/api/events", headers={"Last-Event-ID": events[0]["id"]})
+        assert _parse_sse(resp.content) == []
+        assert resp.content.startswith(b"retry: ")
+        snapshot.clear()
+
+    def test_restart_and_reuse_after_close(self, tmp_path):
+        _write_rankings(tmp_path, {"ai": 1.0})
+        before = UpdateBroker(tmp_path)
+        before.epoch -= 1  # 再起動前のプロセス（起動時刻が異なる）
+        before.on_update()
+
+        async def scenario():
+            # 再起動後の版1でも、前のプロセスの版1の ID では最新イベントを省略しない
+            restarted = UpdateBroker(tmp_path)
+            restarted.bind_loop(asyncio.get_running_loop())
+            restarted.on_update()
+            await asyncio.sleep(0)
+            assert restarted.latest.version == before.latest.version == 1
+            stream = restarted.stream(before.latest.id)
+            assert await anext(stream) == b"retry: 5000\n\n"
+            assert await anext(stream) is restarted.latest.message
+
+            # close() 後もアプリ起動時の bind_loop で再び配信できる
+            restarted.close()
+            assert await anext(stream, None) is None
+            restarted.bind_loop(asyncio.get_running_loop())
+            stream = restarted.stream(restarted.latest.id)
+            await anext(stream)
+            pending = asyncio.ensure_future(anext(stream))
+            await asyncio.sleep(0)
+            _write_rankings(tmp_path, {"ai": 2.0})
+            restarted.on_update()
+            await asyncio.sleep(0)
+            assert await pending is restarted.latest.message
+            restarted.close()
+            await stream.aclose()
+
+        asyncio.run(scenario())
+        snapshot.clear()
@@ -0,0 +1,152 @@
+"""Tests for screener filter expressions, screening metrics and /api/screener"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from benchmarks.bench_screener import FILTER, build_records, python_filter
+from routers import screener as screener_router
+from services import metrics_table, snapshot
+from services.calculator import calculate_screening_metrics
+from services.metrics_table import MetricsTable, metrics_filename
+from services.screener_filter import MAX_DEPTH, FilterError, compile_filter, evaluate_filter
+from utils.serialization import FastJSONResponse, write_json_file
+
+
+@pytest.fixture(scope="module")
+def table():
+    return MetricsTable("1mo", build_records(3_000), generated_at="2026-01-05T15:30:00")
+
+
+def _codes(table: MetricsTable, expression: str) -> set[str]:
+    return set(table.codes[evaluate_filter(table, expression)].tolist())
+
+
+class TestFilterExpression:
+    def test_matches_python_reference(self, table):
+        records = build_records(3_000)
+        expected = [r["code"] for r in python_filter(records)]
+        indices, _ = table.query(evaluate_filter(table, FILTER), "change_percent", True, 0, 50)
+        assert table.codes[indices].tolist() == expected
+
+    def test_boolean_operators_and_precedence(self, table):
+        both = _codes(table, "return_1mo > 5 and beta < 1")
+        either = _codes(table, "return_1mo > 5 or beta < 1")
+        assert both == _codes(table, "return_1mo > 5") & _codes(table, "beta < 1")
+        assert either == _codes(table, "return_1mo > 5") | _codes(table, "beta < 1")
+        assert _codes(table, "volatility > 70 or beta > 1.5 and rsi < 20") == (
+            _codes(table, "volatility > 70") | (_codes(table, "beta > 1.5") & _codes(table, "rsi < 20"))
+        )
+        assert _codes(table, "not (return_1mo > 5)") == set(table.codes) - _codes(table, "return_1mo > 5")
+
+    def test_missing_values_never_match(self, table):
+        missing = {code for code, rsi in zip(table.codes, table.numeric["rsi"]) if np.isnan(rsi)}
+        assert missing
+        assert not missing & _codes(table, "rsi != 50")
+        assert not missing & _codes(table, "rsi >= 0")
+        assert missing <= _codes(table, "not rsi >= 0")
+
+    def test_categorical_columns(self, table):
+        assert _codes(table, "category in (mid, 'small')") == _codes(table, "category == mid or category == small")
+        assert _codes(table, "theme == theme_03") == {
+            table.codes[i] for i in table.rows_by_theme["theme_03"]
+        }
+        assert _codes(table, "theme != theme_03") == set(table.codes) - _codes(table, "theme == theme_03")
+
+    def test_column_to_column_comparison(self, table):
+        expected = {
+            code for code, ma5, ma20 in zip(table.codes, table.numeric["ma5_distance"], table.numeric["ma20_distance"])
+            if ma5 > ma20
+        }
+        assert _codes(table, "ma5_distance > ma20_distance") == expected
+
+    def test_compiled_filter_is_cached(self):
+        assert compile_filter("rsi < 30") is compile_filter("rsi < 30")
+
+    @pytest.mark.parametrize(
+        "expression",
+        [
+            "",
+            "rsi <",
+            "price > 10",
+            "rsi < abc",
+            "category > mid",
+            "rsi < 30 and",
+            "(rsi < 30",
+            "rsi < 30)",
+            "rsi ; 30",
+            "(" * (MAX_DEPTH + 1) + "rsi < 30" + ")" * (MAX_DEPTH + 1),
+            " or ".join(["rsi < 30"] * 40),
+        ],
+    )
+    def test_invalid_expressions(self, expression):
+        with pytest.raises(FilterError):
+            compile_filter(expression)
+
+
+class TestScreeningMetrics:
+    def test_distances_and_rsi(self):
+        # 上昇トレンドに小さな押し目を混ぜる
+        close = pd.Series(np.linspace(100, 130, 63) + np.tile([0.0, -1.0], 32)[:63])
+        df = pd.DataFrame({"Close": close, "High": close, "Low": close})
+        metrics = calculate_screening_metrics("TEST.T", df)
+        assert metrics["rsi"] > 60
+        expected = (round(close.iloc[-1], 2) / round(close.iloc[-5:].mean(), 2) - 1) * 100
+        assert metrics["ma5_distance"] == pytest.approx(expected, abs=0.01)
+        assert metrics["ma20_distance"] > metrics["ma5_distance"] > 0
+        assert metrics["volatility"] is not None
+
+    def test_short_history_is_missing_not_zero(self):
+        close = pd.Series([100.0, 101.0, 102.0])
+        metrics = calculate_screening_metrics("TEST.T", pd.DataFrame({"Close": close}))
+        assert metrics == {"rsi": None, "ma5_distance": None, "ma20_distance": None, "volatility": None}
+        assert calculate_screening_metrics("TEST.T", None)["rsi"] is None
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    snapshot.clear()
+    metrics_table.clear_tables()
+    monkeypatch.setattr(screener_router, "PRECOMPUTED_DIR", tmp_path)
+    table = MetricsTable("1mo", build_records(500), generated_at="2026-01-05T15:30:00")
+    write_json_file(tmp_path / metrics_filename("1mo"), table.to_payload())
+    app = FastAPI(default_response_class=FastJSONResponse)
+    app.include_router(screener_router.router)
+    yield TestClient(app), table
+    snapshot.clear()
+    metrics_table.clear_tables()
+
+
+class TestScreenerFilterEndpoint:
+    def test_filter_sort_and_fields(self, client):
+        test_client, table = client
+        response = test_client.get(
+            "/api/screener",
+            params={"filter": "rsi < 40 and return_3mo > 0", "sort": "rsi", "order": "asc", "fields": "code,rsi"},
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total"] == len(_codes(table, "rsi < 40 and return_3mo > 0"))
+        rsi = [stock["rsi"] for stock in data["stocks"]]
+        assert rsi == sorted(rsi)
+        assert set(data["stocks"][0]) == {"code", "rsi"}
+
+    def test_invalid_filter_is_rejected(self, client):
+        test_client, _ = client
+        response = test_client.get("/api/screener", params={"filter": "price > 10"})
+        assert response.status_code == 400
+        assert "Unknown column" in response.json()["detail"]
+
+    def test_sort_by_indicator_columns(self, client):
+        test_client, _ = client
+        data = test_client.get("/api/screener?sort=return_1y&limit=5").json()
+        values = [stock["return_1y"] for stock in data["stocks"]]
+        assert values == sorted(values, reverse=True)
@@ -0,0 +1,130 @@
+"""Tests for the stock/theme search index and the search endpoints"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from benchmarks.bench_search import build_themes
+from routers import search as search_router
+from routers import stocks as stocks_router
+from services.search_index import SearchIndex, get_search_index, normalize, rebuild_search_index
+
+THEMES = {
+    "ai": {
+        "name": "AI・人工知能",
+        "description": "AI技術開発・活用企業",
+        "tickers": ["6758.T", "6861.T", "7203.T"],
+        "ticker_names": {"6758.T": "ソニーグループ", "6861.T": "キーエンス", "7203.T": "トヨタ自動車"},
+    },
+    "ev": {
+        "name": "EV・電気自動車",
+        "description": "電気自動車と電池",
+        "tickers": ["7203.T", "7267.T", "6752.T"],
+        "ticker_names": {"7203.T": "トヨタ自動車", "7267.T": "ホンダ", "6752.T": "パナソニック"},
+    },
+}
+
+
+@pytest.fixture
+def index():
+    return SearchIndex(THEMES)
+
+
+def _tickers(entries) -> list[str]:
+    return [entry.ticker for entry in entries]
+
+
+class TestNormalize:
+    def test_width_case_and_kana(self):
+        assert normalize("７２０３") == "7203"
+        assert normalize("ＡＩ") == "ai"
+        assert normalize("ソニー") == normalize("そにー") == normalize("ｿﾆｰ")
+        assert normalize("トヨタ 自動車") == normalize("とよた自動車")
+
+
+class TestStockSearch:
+    def test_code_prefix(self, index):
+        assert _tickers(index.search_stocks("72")) == ["7203.T", "7267.T"]
+        assert _tickers(index.search_stocks("７２０３")) == ["7203.T"]
+        assert index.search_stocks("03") == []
+
+    def test_name_matching_is_normalized(self, index):
+        assert _tickers(index.search_stocks("そにー")) == ["6758.T"]
+        assert _tickers(index.search_stocks("ﾄﾖﾀ")) == ["7203.T"]
+
+    def test_ranking_exact_prefix_substring(self, index):
+        # 前方一致（ソニーグループ）が部分一致（パナソニック）より上位
+        assert _tickers(index.search_stocks("ソニ")) == ["6758.T", "6752.T"]
+        assert _tickers(index.search_stocks("ホンダ")) == ["7267.T"]
+
+    def test_duplicates_keep_first_theme(self, index):
+        matches = index.search_stocks("トヨタ")
+        assert len(matches) == 1
+        assert matches[0].theme_id == "ai"
+
+    def test_single_character_and_limit(self, index):
+        # キーエンス（2文字目）がソニーグループ（3文字目）より上位
+        assert _tickers(index.search_stocks("ー")) == ["6861.T", "6758.T"]
+        assert len(index.search_stocks("ー", limit=1)) == 1
+        assert index.search_stocks("   ") == []
+
+    def test_matches_brute_force_substring(self):
+        themes = build_themes(listing_count=600, theme_count=20)
+        index = SearchIndex(themes)
+        for query in ("ソニー", "ほーるでぃんぐす", "電", "化学工業", "日本"):
+            expected = {entry.ticker for entry in index.stocks if normalize(query) in entry.normalized_name}
+            assert set(_tickers(index.search_stocks(query))) == expected
+
+
+class TestThemeSearch:
+    def test_name_id_and_description(self, index):
+        assert [entry.id for entry in index.search_themes("電気自動車")] == ["ev"]
+        assert [entry.id for entry in index.search_themes("ａｉ")] == ["ai"]
+        assert [entry.id for entry in index.search_themes("電池")] == ["ev"]
+
+    def test_name_match_ranks_above_description(self, index):
+        assert [entry.id for entry in index.search_themes("自動車")] == ["ev"]
+        assert [entry.id for entry in index.search_themes("企業")] == ["ai"]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    rebuild_search_index(THEMES)
+    monkeypatch.setattr(stocks_router, "THEMES", THEMES)
+    app = FastAPI()
+    app.include_router(search_router.router)
+    app.include_router(stocks_router.router)
+    yield TestClient(app)
+    rebuild_search_index()
+
+
+class TestSearchEndpoints:
+    def test_search_stocks(self, client):
+        data = client.get("/api/search/stocks", params={"q": "ｿﾆ"}).json()
+        assert [r["ticker"] for r in data["results"]] == ["6758.T", "6752.T"]
+        assert data["results"][0] == {
+            "ticker": "6758.T", "name": "ソニーグループ", "theme_id": "ai", "theme_name": "AI・人工知能",
+        }
+
+    def test_search_all(self, client):
+        data = client.get("/api/search/all", params={"q": "自動車"}).json()
+        assert [r["ticker"] for r in data["stocks"]] == ["7203.T"]
+        assert [t["id"] for t in data["themes"]] == ["ev"]
+
+    def test_stock_list_uses_index(self, client):
+        listed = client.get("/api/stocks").json()
+        assert [r["ticker"] for r in listed["results"]] == ["6758.T", "6861.T", "7203.T", "7267.T", "6752.T"]
+        searched = client.get("/api/stocks", params={"q": "72"}).json()
+        assert [r["ticker"] for r in searched["results"]] == ["7203.T", "7267.T"]
+
+    def test_rebuild_replaces_index(self, client):
+        before = get_search_index()
+        rebuild_search_index({"x": {"name": "X", "tickers": ["1111.T"], "ticker_names": {"1111.T": "新会社"}}})
+        assert get_search_index() is not before
+        assert client.get("/api/search/stocks", params={"q": "新会社"}).json()["total"] == 1
@@ -0,0 +1,96 @@
+"""Tests for utils/serialization.py and raw precomputed responses"""
+
+import sys
+from datetime import date, datetime
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routers import themes as themes_router
+from utils import serialization
+from utils.serialization import FastJSONResponse, dumps, loads, read_json_file, write_json_file
+
+PAYLOAD = {
+    "a": float("nan"),
+    "b": np.int64(3),
+    "c": np.bool_(True),
+    "d": date(2024, 1, 1),
+    "e": np.array([1, 2]),
+    "f": np.float64("inf"),
+}
+EXPECTED = {"a": None, "b": 3, "c": True, "d": "2024-01-01", "e": [1, 2], "f": None}
+
+
+# ---------------------------------------------------------------------------
+# dumps / loads
+# ---------------------------------------------------------------------------
+
+class TestDumps:
+    def test_numpy_nan_and_dates(self):
+        assert loads(dumps(PAYLOAD)) == EXPECTED
+
+    def test_output_is_compact_utf8(self):
+        body = dumps({"name": "半導体", "values": [1, 2]})
+        assert body == '{"name":"半導体","values":[1,2]}'.encode("utf-8")
+
+    def test_datetime_and_set(self):
+        result = loads(dumps({"t": datetime(2024, 1, 2, 3, 4, 5), "s": {1}}))
+        assert result == {"t": "2024-01-02T03:04:05", "s": [1]}
+
+    def test_unsupported_type_raises_type_error(self):
+        with pytest.raises(TypeError):
+            dumps({"x": object()})
+
+    def test_stdlib_fallback_matches(self, monkeypatch):
+        monkeypatch.setattr(serialization, "orjson", None)
+        assert loads(dumps(PAYLOAD)) == EXPECTED
+        assert b"NaN" not in dumps(PAYLOAD)
+
+
+class TestJsonFile:
+    def test_atomic_write_roundtrip(self, tmp_path):
+        path = tmp_path / "themes_1mo.json"
+        size = write_json_file(path, {"period": "1mo", "value": np.float32(1.5)})
+        assert size == path.stat().st_size
+        assert read_json_file(path) == {"period": "1mo", "value": 1.5}
+        assert list(tmp_path.iterdir()) == [path]
+
+
+# ---------------------------------------------------------------------------
+# Responses
+# ---------------------------------------------------------------------------
+
+class TestFastJSONResponse:
+    def test_render_numpy_content(self):
+        response = FastJSONResponse({"value": np.float64(1.25), "missing": np.nan})
+        assert response.body == b'{"value":1.25,"missing":null}'
+        assert response.media_type == "application/json"
+
+
+class TestRawPrecomputedResponse:
+    @pytest.fixture
+    def client(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(themes_router, "PRECOMPUTED_DIR", tmp_path)
+        app = FastAPI(default_response_class=FastJSONResponse)
+        app.include_router(themes_router.router)
+        return TestClient(app), tmp_path
+
+    def test_file_bytes_are_served_verbatim(self, client):
+        test_client, directory = client
+        body = b'{"period":"1mo","themes":[],"marker":"raw"}'
+        (directory / "themes_1mo.json").write_bytes(body)
+        response = test_client.get("/api/themes?period=1mo")
+        assert response.status_code == 200
+        assert response.content == body
+        assert response.headers["content-type"] == "application/json"
+
+    def test_heatmap_is_served_from_file(self, client):
+        test_client, directory = client
+        write_json_file(directory / "heatmap_1mo.json", {"period": "1mo", "categories": []})
+        assert test_client.get("/api/heatmap?period=1mo").json()["categories"] == []
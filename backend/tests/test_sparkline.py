@@ -0,0 +1,155 @@
+"""Tests for sparkline downsampling (services/sparkline.py) and the points parameter"""
+
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routers import themes as themes_router
+from services.sparkline import (
+    downsample_payload,
+    downsample_sparkline,
+    lttb_indices,
+    minmax_indices,
+)
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+def _wave(n: int = 252) -> list[float]:
+    x = np.arange(n)
+    return (np.sin(x / 10) * 10 + x * 0.05).round(2).tolist()
+
+
+def _payload(n: int = 252) -> dict:
+    sparkline = {"data": _wave(n), "period_start_index": n - 21}
+    return {
+        "period": "1mo",
+        "themes": [{"id": "ai", "sparkline": dict(sparkline)}],
+        "sparkline": dict(sparkline),
+        "stocks": [{"code": "7203.T", "sparkline": dict(sparkline)}],
+    }
+
+
+# ---------------------------------------------------------------------------
+# Index selection
+# ---------------------------------------------------------------------------
+
+class TestLttbIndices:
+    def test_exact_budget_with_endpoints(self):
+        idx = lttb_indices(_wave(), 30)
+        assert len(idx) == 30
+        assert idx[0] == 0
+        assert idx[-1] == 251
+        assert np.all(np.diff(idx) > 0)
+
+    def test_short_series_is_untouched(self):
+        assert lttb_indices([1.0, 2.0, 3.0], 10).tolist() == [0, 1, 2]
+
+    def test_keeps_spike(self):
+        data = [0.0] * 200
+        data[117] = 50.0
+        assert 117 in lttb_indices(data, 20)
+
+
+class TestMinmaxIndices:
+    def test_keeps_global_extremes(self):
+        data = _wave()
+        idx = minmax_indices(data, 30)
+        assert len(idx) <= 30
+        assert int(np.argmax(data)) in idx
+        assert int(np.argmin(data)) in idx
+
+    @pytest.mark.parametrize("threshold", [1, 2, 3, 4, 5])
+    def test_never_exceeds_small_thresholds(self, threshold):
+        data = _wave()
+        idx = minmax_indices(data, threshold)
+        assert 0 < len(idx) <= threshold
+        assert idx[-1] == len(data) - 1
+        assert len(lttb_indices(data, threshold)) == threshold
+
+
+# ---------------------------------------------------------------------------
+# Sparkline / payload transforms
+# ---------------------------------------------------------------------------
+
+class TestDownsampleSparkline:
+    @pytest.mark.parametrize("method", ["lttb", "minmax"])
+    def test_period_start_point_is_preserved(self, method):
+        sparkline = {"data": _wave(), "period_start_index": 231}
+        result = downsample_sparkline(sparkline, 30, method)
+        assert len(result["data"]) <= 30
+        assert result["data"][result["period_start_index"]] == sparkline["data"][231]
+        assert result["data"][-1] == sparkline["data"][-1]
+
+    @pytest.mark.parametrize("method", ["lttb", "minmax"])
+    @pytest.mark.parametrize("points", [3, 4])
+    def test_minimum_budget_with_period_start(self, method, points):
+        sparkline = {"data": _wave(), "period_start_index": 231}
+        result = downsample_sparkline(sparkline, points, method)
+        assert len(result["data"]) == points
+        assert result["data"][0] == sparkline["data"][0]
+        assert result["data"][result["period_start_index"]] == sparkline["data"][231]
+        assert result["data"][-1] == sparkline["data"][-1]
+
+    def test_budget_larger_than_data_returns_input(self):
+        sparkline = {"data": [1.0, 2.0], "period_start_index": 0}
+        assert downsample_sparkline(sparkline, 60) is sparkline
+
+    def test_payload_is_not_mutated(self):
+        payload = _payload()
+        result = downsample_payload(payload, 30)
+        assert len(payload["themes"][0]["sparkline"]["data"]) == 252
+        assert len(result["themes"][0]["sparkline"]["data"]) == 30
+        assert len(result["stocks"][0]["sparkline"]["data"]) == 30
+        assert len(result["sparkline"]["data"]) == 30
+        assert result["sparkline_points"] == 30
+
+
+# ---------------------------------------------------------------------------
+# Router: points parameter
+# ---------------------------------------------------------------------------
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(themes_router, "PRECOMPUTED_DIR", tmp_path)
+    app = FastAPI()
+    app.include_router(themes_router.router)
+    return TestClient(app), tmp_path
+
+
+class TestPointsParameter:
+    def test_full_resolution_by_default(self, client):
+        test_client, directory = client
+        (directory / "themes_1mo.json").write_text(json.dumps(_payload()), encoding="utf-8")
+        data = test_client.get("/api/themes?period=1mo").json()
+        assert len(data["themes"][0]["sparkline"]["data"]) == 252
+
+    def test_precomputed_variant_is_served(self, client):
+        test_client, directory = client
+        (directory / "themes_1mo.json").write_text(json.dumps(_payload()), encoding="utf-8")
+        variant = downsample_payload(_payload(), 30)
+        variant["marker"] = "variant"
+        (directory / "themes_1mo_p30.json").write_text(json.dumps(variant), encoding="utf-8")
+        data = test_client.get("/api/themes?period=1mo&points=30").json()
+        assert data["marker"] == "variant"
+
+    def test_arbitrary_budget_is_downsampled_on_the_fly(self, client):
+        test_client, directory = client
+        (directory / "theme_ai_1mo.json").write_text(json.dumps(_payload()), encoding="utf-8")
+        data = test_client.get("/api/themes/ai?period=1mo&points=45&sparkline_method=minmax").json()
+        assert len(data["stocks"][0]["sparkline"]["data"]) <= 45
+        assert data["sparkline_points"] == 45
+
+    def test_invalid_points_rejected(self, client):
+        test_client, _ = client
+        assert test_client.get("/api/themes?points=1").status_code == 422
+        assert test_client.get("/api/themes?points=10&sparkline_method=avg").status_code == 422
@@ -0,0 +1,225 @@
+"""Tests for weighted theme indices computed from the price matrices"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import sparse
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routers import themes as themes_router
+from services import snapshot
+from services.calculator import calculate_return_from_data, calculate_theme_daily_returns_from_data
+from services.price_matrix import PriceMatrix
+from services.sparkline import build_sparkline
+from services.theme_index import (
+    apply_index_to_detail,
+    apply_index_to_ranking,
+    build_theme_indices,
+    compute_index_levels,
+    rebalance_anchors,
+    theme_index_filename,
+)
+from utils.cache import cache
+from utils.serialization import dumps
+
+TICKERS = ["7203.T", "6758.T", "9984.T", "8306.T"]
+
+THEMES = {
+    "all": {"name": "全銘柄", "tickers": TICKERS},
+    "pair": {"name": "2銘柄", "tickers": ["7203.T", "6758.T"], "weights": {"7203.T": 3.0, "6758.T": 1.0}},
+}
+
+MARKET_CAPS = {
+    "7203.T": {"market_cap": 40_000_000_000_000, "float_ratio": 0.5},
+    "6758.T": {"market_cap": 20_000_000_000_000, "float_ratio": 0.9},
+    "9984.T": {"market_cap": 10_000_000_000_000, "float_ratio": None},
+    "8306.T": {"market_cap": 0},
+}
+
+
+def _frames(length: int, seed: int = 0) -> dict[str, pd.DataFrame]:
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range("2025-01-06", periods=length)
+    return {
+        ticker: pd.DataFrame({"Close": 1000 * np.cumprod(1 + rng.normal(0.001 * i, 0.02, length))}, index=dates)
+        for i, ticker in enumerate(TICKERS)
+    }
+
+
+@pytest.fixture
+def frames():
+    return _frames(245)
+
+
+@pytest.fixture
+def matrix(frames):
+    return PriceMatrix.from_frames("1y", frames)
+
+
+def _membership(rows: list[list[float]]) -> sparse.csr_matrix:
+    return sparse.csr_matrix(np.asarray(rows, dtype=float))
+
+
+class TestIndexLevels:
+    def test_rebalance_anchors_are_month_ends(self):
+        dates = pd.bdate_range("2025-01-27", periods=30)
+        anchors = rebalance_anchors(dates)
+        assert [dates[i].strftime("%Y-%m-%d") for i in anchors] == ["2025-01-27", "2025-01-31", "2025-02-28"]
+        assert rebalance_anchors(dates, "none").tolist() == [0]
+
+    def test_equal_weight_matches_legacy_calculations(self, frames, matrix):
+        membership = _membership([[1, 1, 1, 1]])
+        levels, weights, available = compute_index_levels(matrix.close, np.array([0]), membership)
+        expected_return, _ = calculate_return_from_data(frames)
+        assert round((levels[-1, 0] - 1) * 100, 2) == expected_return
+        assert available.tolist() == [True]
+        assert weights.sum() == pytest.approx(1.0)
+
+        # 毎日リバランスすると従来の日次リターンの単純平均と一致
+        daily = compute_index_levels(matrix.close, np.arange(len(matrix.dates) - 1), membership)[0]
+        legacy = calculate_theme_daily_returns_from_data(frames).fillna(0.0)
+        assert daily[-1, 0] == pytest.approx(float((1 + legacy / 100).prod()))
+
+    def test_market_cap_weight_does_not_depend_on_rebalancing(self, matrix):
+        membership = _membership([[1, 1, 1, 0]])
+        scale = np.array([4.0, 2.0, 1.0, 0.0])
+        monthly = compute_index_levels(matrix.close, rebalance_anchors(matrix.dates), membership, scale)[0]
+        buy_and_hold = compute_index_levels(matrix.close, np.array([0]), membership, scale)[0]
+        np.testing.assert_allclose(monthly, buy_and_hold)
+
+        # 最終日の構成比は最新の時価総額の比
+        weights = compute_index_levels(matrix.close, np.array([0]), membership, scale)[1].toarray()[0]
+        np.testing.assert_allclose(weights, [4 / 7, 2 / 7, 1 / 7, 0])
+
+    def test_late_listing_joins_at_next_rebalance(self, frames):
+        frames["9984.T"] = frames["9984.T"].iloc[30:]
+        matrix = PriceMatrix.from_frames("1y", frames)
+        anchors = rebalance_anchors(matrix.dates)
+        membership = _membership([[0, 0, 1, 0], [1, 1, 1, 1]])
+        levels, weights, available = compute_index_levels(matrix.close, anchors, membership)
+        assert available.tolist() == [True, True]
+        # 上場前は構成銘柄がないため横ばい
+        first_anchor_after_listing = anchors[np.searchsorted(anchors, 30)]
+        assert np.all(levels[: first_anchor_after_listing + 1, 0] == 1.0)
+        assert weights.toarray()[1, 2] > 0
+
+
+class TestBuildThemeIndices:
+    def test_payload_for_every_weighting(self, frames, matrix):
+        day = PriceMatrix.from_frames("1d", {ticker: df.iloc[-2:] for ticker, df in frames.items()})
+        payloads = build_theme_indices({"1y": matrix, "1d": day, "1mo": matrix}, THEMES, MARKET_CAPS)
+        index = payloads["1y"]
+        assert index["rebalance"] == "monthly"
+        assert set(index["themes"]["all"]) == {"market_cap", "float"}
+        assert set(index["themes"]["pair"]) == {"market_cap", "float", "custom"}
+
+        cap = index["themes"]["all"]["market_cap"]
+        assert "8306.T" not in cap["weights"]
+        assert sum(cap["weights"].values()) == pytest.approx(1.0, abs=1e-3)
+        assert cap["change_percent_1d"] is not None
+        assert payloads["1d"]["themes"]["all"]["market_cap"]["change_percent_1d"] is None
+
+        # 浮動株調整で 7203.T の比重が下がる
+        float_weights = index["themes"]["all"]["float"]["weights"]
+        assert float_weights["7203.T"] < cap["weights"]["7203.T"]
+
+        custom = index["themes"]["pair"]["custom"]
+        assert custom["change_percent"] != index["themes"]["pair"]["market_cap"]["change_percent"]
+
+    def test_sparkline_matches_build_sparkline(self, matrix):
+        payloads = build_theme_indices({"1y": matrix}, THEMES, MARKET_CAPS, weightings=("custom",), rebalance="none")
+        sparkline = payloads["1y"]["themes"]["pair"]["custom"]["sparkline"]
+
+        levels = compute_index_levels(matrix.close, np.array([0]), _membership([[3, 1, 0, 0]]))[0][:, 0]
+        daily = pd.Series(levels, index=matrix.dates).pct_change() * 100
+        assert sparkline == build_sparkline(daily, "1y")
+
+
+class TestApplyIndex:
+    INDEX = {
+        "rebalance": "monthly",
+        "themes": {
+            "b": {"market_cap": {
+                "change_percent": 9.0, "change_percent_1d": 1.0,
+                "sparkline": {"data": [0.0, 9.0], "period_start_index": 0},
+                "weights": {"1111.T": 1.0},
+            }},
+        },
+    }
+
+    def test_ranking_is_resorted_and_falls_back_to_equal(self):
+        ranking = {"period": "1mo", "themes": [
+            {"id": "a", "change_percent": 5.0, "sparkline": None},
+            {"id": "b", "change_percent": 1.0, "sparkline": None},
+        ]}
+        result = apply_index_to_ranking(ranking, self.INDEX, "market_cap")
+        assert [(theme["id"], theme["weighting"]) for theme in result["themes"]] == [
+            ("b", "market_cap"), ("a", "equal"),
+        ]
+        assert result["themes"][0]["change_percent_1d"] == 1.0
+        assert "weighting" not in ranking["themes"][0]
+
+    def test_detail_stocks_get_weights(self):
+        detail = {"id": "b", "change_percent": 1.0, "stocks": [{"code": "1111.T"}, {"code": "2222.T"}]}
+        result = apply_index_to_detail(detail, self.INDEX, "market_cap")
+        assert [stock["weight"] for stock in result["stocks"]] == [1.0, 0.0]
+        assert apply_index_to_detail(detail, None, "float")["weighting"] == "equal"
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch, frames, matrix):
+    snapshot.clear()
+    cache.clear()
+    monkeypatch.setattr(themes_router, "PRECOMPUTED_DIR", tmp_path)
+    monkeypatch.setitem(themes_router.THEMES, "pair", {**THEMES["pair"], "description": ""})
+
+    index = build_theme_indices({"1mo": matrix}, THEMES, MARKET_CAPS)["1mo"]
+    (tmp_path / theme_index_filename("1mo")).write_bytes(dumps(index))
+    sparkline = {"data": [0.0, 1.0], "period_start_index": 0}
+    (tmp_path / "themes_1mo.json").write_bytes(dumps({"period": "1mo", "themes": [
+        {"id": "all", "change_percent": 100.0, "sparkline": sparkline},
+        {"id": "pair", "change_percent": -100.0, "sparkline": sparkline},
+    ]}))
+    (tmp_path / "theme_pair_1mo.json").write_bytes(dumps({
+        "id": "pair", "change_percent": -100.0, "sparkline": sparkline,
+        "stocks": [{"code": "7203.T", "change_percent": 1.0}, {"code": "6758.T", "change_percent": 2.0}],
+    }))
+
+    app = FastAPI()
+    app.include_router(themes_router.router)
+    yield TestClient(app), index
+    snapshot.clear()
+
+
+class TestWeightingQuery:
+    def test_ranking(self, client):
+        client, index = client
+        default = client.get("/api/themes?period=1mo").json()
+        assert [theme["id"] for theme in default["themes"]] == ["all", "pair"]
+
+        data = client.get("/api/themes?period=1mo&weighting=custom&points=30").json()
+        assert data["weighting"] == "custom"
+        pair = next(theme for theme in data["themes"] if theme["id"] == "pair")
+        assert pair["change_percent"] == index["themes"]["pair"]["custom"]["change_percent"]
+        assert len(pair["sparkline"]["data"]) <= 30
+        assert next(theme for theme in data["themes"] if theme["id"] == "all")["weighting"] == "equal"
+
+    def test_detail_and_batch(self, client):
+        client, index = client
+        data = client.get("/api/themes/pair?period=1mo&weighting=market_cap").json()
+        assert data["change_percent"] == index["themes"]["pair"]["market_cap"]["change_percent"]
+        assert {stock["code"]: stock["weight"] for stock in data["stocks"]} == index["themes"]["pair"]["market_cap"]["weights"]
+
+        batch = client.get("/api/themes/batch?ids=pair&periods=1mo&weighting=float&fields=change_percent,weighting").json()
+        assert batch["results"]["pair"]["1mo"] == {
+            "change_percent": index["themes"]["pair"]["float"]["change_percent"],
+            "weighting": "float",
+        }
+        assert client.get("/api/themes?weighting=price").status_code == 422
@@ -0,0 +1,324 @@
+"""Tests for theme definition files, hot reload and incremental precompute"""
+
+import copy
+import csv
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from data import theme_loader
+from data.theme_loader import (
+    CSV_COLUMNS,
+    ThemeChanges,
+    ThemeFileError,
+    apply_themes,
+    diff_fingerprints,
+    load_themes,
+    reload_themes,
+    theme_fingerprints,
+    validate_themes,
+)
+from data.themes import THEMES, get_registry, get_ticker_themes
+from jobs import update_data
+from services.search_index import get_search_index
+from utils.serialization import dumps, read_json_file
+
+DEFINITIONS = [
+    {
+        "id": "robot",
+        "name": "ロボット",
+        "description": "産業用ロボット",
+        "tickers": [
+            {"code": "6954", "name": "ファナック", "description": "産業用ロボット大手"},
+            {"code": "6506.T", "name": "安川電機"},
+        ],
+    },
+    {
+        "id": "space",
+        "name": "宇宙",
+        "tickers": ["7011.T", "6506.T"],
+        "ticker_names": {"7011.T": "三菱重工業", "6506.T": "安川電機"},
+    },
+]
+
+
+def _write_json(path: Path, definitions) -> Path:
+    path.write_bytes(dumps({"themes": definitions}))
+    return path
+
+
+@pytest.fixture
+def restore_themes(monkeypatch):
+    original = copy.deepcopy(THEMES)
+    monkeypatch.setattr(theme_loader, "_loaded_stamp", None)
+    yield
+    apply_themes(original)
+
+
+class TestLoadThemeFiles:
+    def test_json_is_normalized(self, tmp_path):
+        themes = load_themes(_write_json(tmp_path / "themes.json", DEFINITIONS))
+        assert list(themes) == ["robot", "space"]
+        assert themes["robot"]["tickers"] == ["6954.T", "6506.T"]
+        assert themes["robot"]["ticker_names"] == {"6954.T": "ファナック", "6506.T": "安川電機"}
+        assert themes["robot"]["ticker_descriptions"] == {"6954.T": "産業用ロボット大手"}
+        assert themes["space"]["description"] == ""
+
+    def test_formats_are_equivalent(self, tmp_path):
+        expected = load_themes(_write_json(tmp_path / "themes.json", DEFINITIONS))
+
+        csv_path = tmp_path / "themes.csv"
+        with csv_path.open("w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(CSV_COLUMNS)
+            for theme_id, theme in expected.items():
+                for ticker in theme["tickers"]:
+                    writer.writerow([
+                        theme_id, theme["name"], theme["description"], ticker,
+                        theme["ticker_names"][ticker], theme["ticker_descriptions"].get(ticker, ""),
+                    ])
+        assert load_themes(csv_path) == expected
+
+        if theme_loader.yaml is not None:
+            yaml_path = tmp_path / "themes.yaml"
+            yaml_path.write_text(theme_loader.yaml.safe_dump(DEFINITIONS, allow_unicode=True), encoding="utf-8")
+            assert load_themes(yaml_path) == expected
+
+        # テーマID -> テーマ のdict形式
+        mapping = {theme["id"]: {k: v for k, v in theme.items() if k != "id"} for theme in DEFINITIONS}
+        assert validate_themes(mapping) == expected
+
+    def test_unsupported_and_malformed_files(self, tmp_path):
+        (tmp_path / "themes.txt").write_text("robot")
+        with pytest.raises(ThemeFileError, match="Unsupported"):
+            load_themes(tmp_path / "themes.txt")
+        (tmp_path / "broken.json").write_text("{")
+        with pytest.raises(ThemeFileError, match="Failed to parse"):
+            load_themes(tmp_path / "broken.json")
+        (tmp_path / "themes.csv").write_text("theme_id,ticker\nrobot,6954\n")
+        with pytest.raises(ThemeFileError, match="theme_name"):
+            load_themes(tmp_path / "themes.csv")
+
+
+class TestValidation:
+    def test_reports_every_error(self):
+        with pytest.raises(ThemeFileError) as exc_info:
+            validate_themes([
+                {"id": "bad id", "name": "x", "tickers": ["7203"]},
+                {"id": "ok", "name": "", "tickers": ["7203"]},
+                {"id": "codes", "name": "銘柄", "tickers": ["72A3", "7203", "7203.T"]},
+                {"id": "empty", "name": "空", "tickers": []},
+                {"id": "dup", "name": "重複", "tickers": ["7203"]},
+                {"id": "dup", "name": "重複", "tickers": ["7203"]},
+            ])
+        errors = exc_info.value.errors
+        assert len(errors) == 6
+        assert any("invalid theme id" in error for error in errors)
+        assert any("themes[ok].name" in error for error in errors)
+        assert any("invalid stock code '72A3'" in error for error in errors)
+        assert any("duplicate stock code 7203.T" in error for error in errors)
+        assert any("themes[empty].tickers" in error for error in errors)
+        assert any("duplicate theme id 'dup'" in error for error in errors)
+
+    def test_custom_weights(self):
+        themes = validate_themes([
+            {"id": "a", "name": "A", "tickers": [{"code": "7203", "weight": 2}, {"code": "6758", "weight": "1.5"}]},
+            {"id": "b", "name": "B", "tickers": ["7203", "6758.T"], "weights": {"7203": 1, "6758.T": 3}},
+            {"id": "c", "name": "C", "tickers": ["7203"]},
+        ])
+        assert themes["a"]["weights"] == {"7203.T": 2.0, "6758.T": 1.5}
+        assert themes["b"]["weights"] == {"7203.T": 1.0, "6758.T": 3.0}
+        assert "weights" not in themes["c"]
+
+        with pytest.raises(ThemeFileError) as exc_info:
+            validate_themes([
+                {"id": "partial", "name": "P", "tickers": ["7203", "6758"], "weights": {"7203": 1}},
+                {"id": "negative", "name": "N", "tickers": [{"code": "7203", "weight": -1}]},
+            ])
+        errors = exc_info.value.errors
+        assert any("missing weights for 6758.T" in error for error in errors)
+        assert any("weight must be a positive number" in error for error in errors)
+
+    def test_empty_definitions(self):
+        with pytest.raises(ThemeFileError):
+            validate_themes([])
+        with pytest.raises(ThemeFileError):
+            validate_themes("robot")
+
+
+class TestDiff:
+    def test_fingerprint_ignores_key_order(self):
+        theme = {"id": "a", "name": "A", "tickers": ["1111.T"]}
+        reordered = {"tickers": ["1111.T"], "name": "A", "id": "a"}
+        assert theme_fingerprints({"a": theme}) == theme_fingerprints({"a": reordered})
+
+    def test_added_changed_removed(self):
+        changes = diff_fingerprints({"a": "1", "b": "2", "c": "3"}, {"a": "1", "b": "9", "d": "4"})
+        assert changes == ThemeChanges(added=("d",), changed=("b",), removed=("c",))
+        assert changes.updated == ("d", "b")
+        assert not diff_fingerprints({"a": "1"}, {"a": "1"})
+
+
+class TestReload:
+    def test_reload_applies_and_rebuilds_indexes(self, tmp_path, restore_themes):
+        path = _write_json(tmp_path / "themes.json", DEFINITIONS)
+        changes = reload_themes(path)
+        assert set(changes.added) == {"robot", "space"}
+        assert len(changes.removed) == 20
+        assert list(THEMES) == ["robot", "space"]
+        assert get_ticker_themes("6506.T") == ("robot", "space")
+        assert get_registry().tickers == ("6954.T", "6506.T", "7011.T")
+        assert [entry.ticker for entry in get_search_index().search_stocks("ファナック")] == ["6954.T"]
+
+        # 未変更なら読み直さない
+        assert reload_themes(path) is None
+
+        definitions = copy.deepcopy(DEFINITIONS)
+        definitions[1]["tickers"].append("9412.T")
+        definitions.append({"id": "drone", "name": "ドローン", "tickers": ["6758.T"]})
+        _write_json(path, definitions)
+        changes = reload_themes(path)
+        assert changes == ThemeChanges(added=("drone",), changed=("space",))
+        assert "9412.T" in get_registry().tickers
+
+    def test_reload_while_iterating(self, tmp_path, restore_themes):
+        # 別スレッドの反復中に再読み込みしても、各反復は変更前か変更後の定義全体を見る
+        original = copy.deepcopy(THEMES)
+        reordered = load_themes(_write_json(tmp_path / "themes.json", DEFINITIONS[::-1]))
+        expected = {tuple(original), ("space", "robot")}
+        seen, errors = set(), []
+        stop = threading.Event()
+
+        def read():
+            try:
+                while not stop.is_set():
+                    ids = []
+                    for theme_id, theme in THEMES.items():
+                        ids.append(theme_id)
+                        assert theme["tickers"]
+                    seen.add(tuple(ids))
+            except Exception as e:  # pragma: no cover - 失敗時のみ
+                errors.append(e)
+
+        reader = threading.Thread(target=read)
+        reader.start()
+        try:
+            for i in range(200):
+                apply_themes(reordered if i % 2 == 0 else original)
+        finally:
+            stop.set()
+            reader.join()
+        assert errors == []
+        assert seen <= expected and len(THEMES) > 0
+
+    def test_invalid_file_keeps_current_definitions(self, tmp_path, restore_themes):
+        before = copy.deepcopy(THEMES)
+        path = _write_json(tmp_path / "themes.json", [{"id": "robot", "name": "ロボット", "tickers": ["x"]}])
+        with pytest.raises(ThemeFileError):
+            reload_themes(path)
+        assert THEMES == before
+
+
+@pytest.fixture
+def precomputed(tmp_path, monkeypatch, restore_themes):
+    apply_themes(load_themes(_write_json(tmp_path / "themes.json", DEFINITIONS)))
+    directory = tmp_path / "precomputed"
+    directory.mkdir()
+    monkeypatch.setattr(update_data, "PRECOMPUTED_DIR", directory)
+    monkeypatch.setattr(update_data, "get_last_trading_date", lambda: "2026-01-05 15:00")
+
+    fetched = []
+
+    def fake_fetch(tickers):
+        fetched.append(list(tickers))
+        return {period: {} for period in update_data.PERIODS}
+
+    def fake_detail(theme_id, period, all_data):
+        return {"id": theme_id, "period": period, "stock_count": len(THEMES[theme_id]["tickers"])}
+
+    monkeypatch.setattr(update_data, "fetch_all_periods", fake_fetch)
+    monkeypatch.setattr(update_data, "build_theme_detail", fake_detail)
+
+    # 既存のランキング（前回の事前計算結果）
+    for period in update_data.PERIODS:
+        update_data.write_precomputed(f"themes_{period}.json", {
+            "period": period,
+            "themes": [
+                {"id": "robot", "name": "ロボット", "change_percent": 5.0, "stock_count": 2},
+                {"id": "space", "name": "宇宙", "change_percent": 1.0, "stock_count": 2},
+            ],
+        })
+        for theme_id in ("robot", "space"):
+            update_data.save_theme_detail(theme_id, period, {"id": theme_id})
+    update_data.save_fingerprints()
+    return directory, fetched
+
+
+class TestUpdateChangedThemes:
+    def test_only_changed_themes_are_recomputed(self, precomputed):
+        directory, fetched = precomputed
+        definitions = copy.deepcopy(DEFINITIONS)[1:]
+        definitions[0]["tickers"].append("9412.T")
+        definitions.append({"id": "drone", "name": "ドローン", "tickers": ["6758.T"]})
+        apply_themes(validate_themes(definitions))
+
+        changes = update_data.pending_theme_changes()
+        assert changes == ThemeChanges(added=("drone",), changed=("space",), removed=("robot",))
+        update_data.update_changed_themes(changes)
+
+        # 追加・変更されたテーマの銘柄だけ取得
+        assert fetched == [sorted({"7011.T", "6506.T", "9412.T", "6758.T"})]
+
+        ranking = read_json_file(directory / "themes_1mo.json")
+        assert {theme["id"] for theme in ranking["themes"]} == {"space", "drone"}
+        space = next(theme for theme in ranking["themes"] if theme["id"] == "space")
+        assert space["stock_count"] == 3
+
+        assert read_json_file(directory / "theme_drone_1mo.json")["stock_count"] == 1
+        assert not list(directory.glob("theme_robot_*"))
+        assert not update_data.pending_theme_changes()
+
+    def test_unchanged_themes_keep_previous_results(self, precomputed):
+        directory, fetched = precomputed
+        definitions = copy.deepcopy(DEFINITIONS)
+        definitions[1]["name"] = "宇宙開発"
+        apply_themes(validate_themes(definitions))
+
+        update_data.update_changed_themes(update_data.pending_theme_changes())
+        assert fetched == [["6506.T", "7011.T"]]
+        ranking = read_json_file(directory / "themes_1y.json")
+        robot = next(theme for theme in ranking["themes"] if theme["id"] == "robot")
+        assert robot["change_percent"] == 5.0
+        assert read_json_file(directory / "theme_robot_1y.json") == {"id": "robot"}
+
+
+class TestReloadEndpoint:
+    @pytest.fixture
+    def client(self, monkeypatch, restore_themes):
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+
+        from routers import themes as themes_router
+
+        monkeypatch.setenv("API_REFRESH_KEY", "secret")
+        app = FastAPI()
+        app.include_router(themes_router.router)
+        return TestClient(app)
+
+    def test_requires_theme_file(self, client, monkeypatch):
+        monkeypatch.delenv(theme_loader.THEMES_FILE_ENV, raising=False)
+        response = client.post("/api/themes/reload", headers={"X-API-Key": "secret"})
+        assert response.status_code == 400
+        assert client.post("/api/themes/reload").status_code == 401
+
+    def test_reports_validation_errors(self, client, monkeypatch, tmp_path):
+        path = _write_json(tmp_path / "themes.json", [{"id": "robot", "name": "ロボット", "tickers": ["x", "y"]}])
+        monkeypatch.setenv(theme_loader.THEMES_FILE_ENV, str(path))
+        response = client.post("/api/themes/reload", headers={"X-API-Key": "secret"})
+        assert response.status_code == 422
+        assert len(response.json()["detail"]["errors"]) == 2
+        assert len(THEMES) == 20
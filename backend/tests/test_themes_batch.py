@@ -0,0 +1,168 @@
+"""Tests for the precomputed snapshot, field projection and /api/themes/batch"""
+
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from routers import themes as themes_router
+from services import snapshot
+from services.sparkline import downsample_payload
+from utils.fields import parse_fields, project
+from utils.serialization import FastJSONResponse, write_json_bytes, write_json_file
+
+
+def _detail(theme_id: str, period: str, change: float) -> dict:
+    sparkline = {"data": [float(i) for i in range(100)], "period_start_index": 79}
+    return {
+        "id": theme_id,
+        "name": theme_id.upper(),
+        "period": period,
+        "change_percent": change,
+        "sparkline": sparkline,
+        "stocks": [
+            {"code": "7203.T", "name": "トヨタ", "change_percent": 1.0, "sparkline": sparkline},
+            {"code": "6758.T", "name": "ソニー", "change_percent": -1.0, "sparkline": sparkline},
+        ],
+    }
+
+
+# ---------------------------------------------------------------------------
+# Snapshot
+# ---------------------------------------------------------------------------
+
+@pytest.fixture(autouse=True)
+def _clear_snapshot():
+    snapshot.clear()
+    yield
+    snapshot.clear()
+
+
+class TestSnapshot:
+    def test_decoded_payload_is_cached(self, tmp_path):
+        path = tmp_path / "theme_ai_1mo.json"
+        write_json_file(path, {"value": 1})
+        first = snapshot.get(path)
+        assert snapshot.get(path) is first
+        assert snapshot.stats()["decoded"] == 1
+
+    def test_file_change_is_detected(self, tmp_path):
+        path = tmp_path / "theme_ai_1mo.json"
+        write_json_file(path, {"value": 1})
+        assert snapshot.get(path) == {"value": 1}
+        write_json_file(path, {"value": 22})
+        stat = path.stat()
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+        assert snapshot.get(path) == {"value": 22}
+
+    def test_published_body_is_served_without_rereading(self, tmp_path):
+        path = tmp_path / "themes_1mo.json"
+        write_json_bytes(path, b'{"value":3}')
+        # Same stamp as the file on disk, so the published body is trusted as-is
+        snapshot.publish(path, b'{"value":4}')
+        assert snapshot.get(path) == {"value": 4}
+
+    def test_deleted_file_is_evicted(self, tmp_path):
+        path = tmp_path / "themes_1mo.json"
+        write_json_file(path, {"value": 1})
+        assert snapshot.get_bytes(path) is not None
+        path.unlink()
+        assert snapshot.get_bytes(path) is None
+        assert snapshot.stats()["files"] == 0
+
+
+# ---------------------------------------------------------------------------
+# Field projection
+# ---------------------------------------------------------------------------
+
+class TestProjection:
+    def test_nested_list_fields(self):
+        tree = parse_fields("id,stocks.code")
+        result = project(_detail("ai", "1mo", 1.0), tree)
+        assert result == {"id": "ai", "stocks": [{"code": "7203.T"}, {"code": "6758.T"}]}
+
+    def test_parent_field_wins(self):
+        assert parse_fields("stocks.code,stocks") == {"stocks": None}
+        assert parse_fields("stocks,stocks.code") == {"stocks": None}
+
+    def test_no_fields_returns_input(self):
+        payload = _detail("ai", "1mo", 1.0)
+        assert parse_fields(None) is None
+        assert project(payload, parse_fields("")) is payload
+
+    def test_invalid_field_rejected(self):
+        with pytest.raises(HTTPException):
+            parse_fields("id,../etc")
+
+
+# ---------------------------------------------------------------------------
+# Batch endpoint
+# ---------------------------------------------------------------------------
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(themes_router, "PRECOMPUTED_DIR", tmp_path)
+    app = FastAPI(default_response_class=FastJSONResponse)
+    app.include_router(themes_router.router)
+    theme_ids = list(themes_router.THEMES)[:2]
+    for theme_id in theme_ids:
+        for period, change in (("1mo", 1.5), ("1y", 10.0)):
+            write_json_file(tmp_path / f"theme_{theme_id}_{period}.json", _detail(theme_id, period, change))
+    return TestClient(app), tmp_path, theme_ids
+
+
+class TestThemesBatch:
+    def test_all_combinations_in_one_response(self, client):
+        test_client, _, theme_ids = client
+        response = test_client.get(
+            f"/api/themes/batch?ids={','.join(theme_ids)}&periods=1mo,1y&fields=id,period,change_percent"
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data["missing"] == []
+        assert data["results"][theme_ids[1]]["1y"] == {"id": theme_ids[1], "period": "1y", "change_percent": 10.0}
+
+    def test_missing_combinations_are_listed(self, client):
+        test_client, _, theme_ids = client
+        data = test_client.get(f"/api/themes/batch?ids={theme_ids[0]}&periods=1mo,5d").json()
+        assert data["missing"] == [{"theme_id": theme_ids[0], "period": "5d"}]
+        assert set(data["results"][theme_ids[0]]) == {"1mo"}
+
+    def test_sparkline_points_use_precomputed_variant(self, client):
+        test_client, directory, theme_ids = client
+        variant = downsample_payload(_detail(theme_ids[0], "1mo", 1.5), 30)
+        variant["change_percent"] = 99.0
+        write_json_file(directory / f"theme_{theme_ids[0]}_1mo_p30.json", variant)
+        data = test_client.get(
+            f"/api/themes/batch?ids={theme_ids[0]}&periods=1mo&points=30&fields=change_percent,sparkline"
+        ).json()
+        detail = data["results"][theme_ids[0]]["1mo"]
+        assert detail["change_percent"] == 99.0
+        assert len(detail["sparkline"]["data"]) == 30
+
+    def test_snapshot_payload_is_not_mutated(self, client):
+        test_client, directory, theme_ids = client
+        test_client.get(f"/api/themes/batch?ids={theme_ids[0]}&periods=1mo&points=45&fields=id")
+        cached = snapshot.get(directory / f"theme_{theme_ids[0]}_1mo.json")
+        assert len(cached["sparkline"]["data"]) == 100
+        assert "sparkline_points" not in cached
+
+    @pytest.mark.parametrize("query, status", [
+        ("ids=&periods=1mo", 400),
+        ("ids=unknown_theme&periods=1mo", 404),
+        ("ids=ai&periods=2y", 400),
+        ("ids=ai&periods=1mo&fields=a..b", 400),
+    ])
+    def test_invalid_requests(self, client, query, status):
+        test_client, _, _ = client
+        assert test_client.get(f"/api/themes/batch?{query}").status_code == status
+
+    def test_batch_route_is_not_shadowed_by_detail(self, client):
+        test_client, _, theme_ids = client
+        assert "results" in test_client.get(f"/api/themes/batch?ids={theme_ids[0]}").json()
@@ -6,15 +6,20 @@ from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
+import pytest
+
 from data.themes import (
     THEMES,
+    build_registry,
     get_all_tickers,
+    get_registry,
     get_theme_by_id,
     get_theme_names,
     get_theme_tickers,
     get_ticker_description,
     get_ticker_info,
     get_ticker_name,
+    get_ticker_themes,
 )
 
 # ---------------------------------------------------------------------------
@@ -181,3 +186,57 @@ class TestGetTickerInfo:
 
     def test_unknown_ticker(self):
         assert get_ticker_info("0000.T") is None
+
+    def test_lists_all_memberships(self):
+        expected = [theme_id for theme_id, theme in THEMES.items() if "7203.T" in theme["tickers"]]
+        info = get_ticker_info("7203.T")
+        assert info["theme_ids"] == expected
+        assert info["theme_id"] == expected[0]
+        assert get_ticker_themes("7203.T") == tuple(expected)
+        assert get_ticker_themes("0000.T") == ()
+
+
+# ---------------------------------------------------------------------------
+# registry
+# ---------------------------------------------------------------------------
+
+SAMPLE_THEMES = {
+    "a": {
+        "name": "A",
+        "tickers": ["1111.T", "2222.T"],
+        "ticker_names": {"1111.T": "一", "2222.T": "二"},
+        "ticker_descriptions": {"1111.T": "説明一"},
+    },
+    "b": {
+        "name": "B",
+        "tickers": ["2222.T", "3333.T"],
+        "ticker_names": {"2222.T": "二（B）", "3333.T": "三"},
+    },
+}
+
+
+class TestRegistry:
+    def test_indexes(self):
+        registry = build_registry(SAMPLE_THEMES)
+        assert registry.tickers == ("1111.T", "2222.T", "3333.T")
+        assert registry.ticker_themes["2222.T"] == ("a", "b")
+        assert registry.ticker_names["2222.T"] == "二"
+        assert registry.ticker_descriptions["1111.T"] == "説明一"
+        assert registry.ticker_descriptions["3333.T"] is None
+        assert registry.theme_ticker_indices["b"].tolist() == [1, 2]
+        assert [registry.tickers[i] for i in registry.theme_ticker_indices["a"]] == SAMPLE_THEMES["a"]["tickers"]
+
+    def test_is_read_only(self):
+        registry = build_registry(SAMPLE_THEMES)
+        with pytest.raises(TypeError):
+            registry.ticker_themes["4444.T"] = ("a",)
+        with pytest.raises(ValueError):
+            registry.theme_ticker_indices["a"][0] = 5
+        with pytest.raises(AttributeError):
+            registry.tickers = ()
+
+    def test_matches_theme_definitions(self):
+        registry = get_registry()
+        assert list(registry.tickers) == get_all_tickers()
+        for theme_id, theme in THEMES.items():
+            assert [registry.tickers[i] for i in registry.theme_ticker_indices[theme_id]] == theme["tickers"]
@@ -0,0 +1,186 @@
+"""Tests for utils/wire_format.py content negotiation (JSON / MessagePack / Arrow IPC)"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routers import stocks as stocks_router
+from routers import themes as themes_router
+from schemas import HeatmapStock, SparklineData, StockListItem, ThemeStock
+from utils import wire_format
+from utils.serialization import FastJSONResponse, write_json_file
+from utils.wire_format import (
+    ARROW_MEDIA_TYPE,
+    MSGPACK_MEDIA_TYPE,
+    arrow_schema,
+    decode_arrow,
+    decode_msgpack,
+    encode_msgpack,
+    negotiate,
+)
+
+pa = pytest.importorskip("pyarrow")
+pytest.importorskip("msgpack")
+
+JSON = "application/json"
+
+
+def _theme_detail() -> dict:
+    return {
+        "id": "ai",
+        "name": "AI",
+        "period": "1mo",
+        "change_percent": 1.5,
+        "sparkline": {"data": [0.0, 1.0], "period_start_index": 0},
+        "stocks": [
+            {
+                "code": "7203.T",
+                "name": "トヨタ",
+                "change_percent": 2.5,
+                "beta": None,
+                "market_cap": 40_000_000_000_000,
+                "market_cap_category": {"id": "mega", "label": "超大型"},
+                "sparkline": {"data": [0.0, 1.25, 2.5], "period_start_index": 1},
+            },
+        ],
+    }
+
+
+def _heatmap() -> dict:
+    stock = {
+        "code": "7203.T",
+        "name": "トヨタ",
+        "theme_id": "ev",
+        "theme_name": "EV",
+        "change_percent": 2.5,
+        "market_cap": 40_000_000_000_000,
+        "market_cap_category": {"id": "mega", "label": "超大型"},
+    }
+    return {
+        "period": "1mo",
+        "categories": {
+            "mega": {"id": "mega", "label": "超大型", "stocks": [stock], "count": 1},
+            "micro": {"id": "micro", "label": "超小型", "stocks": [], "count": 0},
+        },
+    }
+
+
+# ---------------------------------------------------------------------------
+# negotiate
+# ---------------------------------------------------------------------------
+
+class TestNegotiate:
+    @pytest.mark.parametrize("accept", [None, "", "*/*", "application/json", "text/html"])
+    def test_defaults_to_json(self, accept):
+        assert negotiate(accept, tabular=True) == JSON
+
+    def test_msgpack_and_alias(self):
+        assert negotiate("application/msgpack") == MSGPACK_MEDIA_TYPE
+        assert negotiate("application/x-msgpack") == MSGPACK_MEDIA_TYPE
+
+    def test_arrow_only_for_tabular_endpoints(self):
+        assert negotiate(ARROW_MEDIA_TYPE, tabular=True) == ARROW_MEDIA_TYPE
+        assert negotiate(ARROW_MEDIA_TYPE, tabular=False) == JSON
+
+    def test_quality_and_specificity(self):
+        assert negotiate("application/json;q=0.5, application/msgpack") == MSGPACK_MEDIA_TYPE
+        assert negotiate("*/*, application/msgpack") == MSGPACK_MEDIA_TYPE
+        assert negotiate("application/msgpack;q=0, */*") == JSON
+
+    def test_missing_dependency_falls_back_to_json(self, monkeypatch):
+        monkeypatch.setattr(wire_format, "msgpack", None)
+        assert negotiate("application/msgpack") == JSON
+
+
+# ---------------------------------------------------------------------------
+# Schemas
+# ---------------------------------------------------------------------------
+
+class TestArrowSchema:
+    def test_fields_follow_pydantic_models(self):
+        for model in (ThemeStock, HeatmapStock, StockListItem):
+            assert arrow_schema(model).names == list(model.model_fields)
+
+    def test_types(self):
+        schema = arrow_schema(ThemeStock)
+        assert schema.field("code").type == pa.string()
+        assert schema.field("change_percent").type == pa.float64()
+        assert schema.field("market_cap").type == pa.int64()
+        assert schema.field("sparkline").type == pa.struct(arrow_schema(SparklineData))
+        assert arrow_schema(SparklineData).field("data").type == pa.list_(pa.float32())
+
+
+class TestMsgpack:
+    def test_numpy_roundtrip(self):
+        payload = {"value": np.int64(3), "items": np.array([1.5, 2.5]), "ok": np.bool_(True)}
+        assert decode_msgpack(encode_msgpack(payload)) == {"value": 3, "items": [1.5, 2.5], "ok": True}
+
+
+# ---------------------------------------------------------------------------
+# Routers
+# ---------------------------------------------------------------------------
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(themes_router, "PRECOMPUTED_DIR", tmp_path)
+    app = FastAPI(default_response_class=FastJSONResponse)
+    app.include_router(themes_router.router)
+    app.include_router(stocks_router.router)
+    return TestClient(app), tmp_path
+
+
+class TestNegotiatedEndpoints:
+    def test_theme_detail_msgpack_matches_json(self, client):
+        test_client, directory = client
+        write_json_file(directory / "theme_ai_1mo.json", _theme_detail())
+        as_json = test_client.get("/api/themes/ai?period=1mo")
+        as_msgpack = test_client.get("/api/themes/ai?period=1mo", headers={"Accept": MSGPACK_MEDIA_TYPE})
+        assert as_msgpack.headers["content-type"] == MSGPACK_MEDIA_TYPE
+        assert as_msgpack.headers["vary"] == "Accept"
+        assert as_json.headers["vary"] == "Accept"
+        assert decode_msgpack(as_msgpack.content) == as_json.json()
+
+    def test_theme_detail_arrow(self, client):
+        test_client, directory = client
+        write_json_file(directory / "theme_ai_1mo.json", _theme_detail())
+        response = test_client.get("/api/themes/ai?period=1mo", headers={"Accept": ARROW_MEDIA_TYPE})
+        table, metadata = decode_arrow(response.content)
+        row = table.to_pylist()[0]
+        assert row["code"] == "7203.T"
+        assert row["market_cap_category"] == "mega"
+        assert row["sparkline"]["data"] == [0.0, 1.25, 2.5]
+        assert metadata["id"] == "ai"
+        assert "stocks" not in metadata
+
+    def test_heatmap_arrow_flattens_categories(self, client):
+        test_client, directory = client
+        write_json_file(directory / "heatmap_1mo.json", _heatmap())
+        response = test_client.get("/api/heatmap?period=1mo", headers={"Accept": ARROW_MEDIA_TYPE})
+        assert response.headers["content-type"] == ARROW_MEDIA_TYPE
+        table, metadata = decode_arrow(response.content)
+        assert table.num_rows == 1
+        assert table.column("market_cap_category").to_pylist() == ["mega"]
+        assert metadata["categories"]["mega"]["count"] == 1
+        assert "stocks" not in metadata["categories"]["mega"]
+
+    def test_stock_list_arrow(self, client):
+        test_client, _ = client
+        response = test_client.get("/api/stocks?q=7203", headers={"Accept": ARROW_MEDIA_TYPE})
+        table, metadata = decode_arrow(response.content)
+        assert table.schema.names == list(StockListItem.model_fields)
+        assert metadata["total"] == table.num_rows
+        assert metadata["query"] == "7203"
+
+    def test_themes_list_rejects_arrow_with_json(self, client):
+        test_client, directory = client
+        write_json_file(directory / "themes_1mo.json", {"period": "1mo", "themes": []})
+        response = test_client.get("/api/themes?period=1mo", headers={"Accept": ARROW_MEDIA_TYPE})
+        assert response.headers["content-type"] == JSON
+        assert response.json() == {"period": "1mo", "themes": []}
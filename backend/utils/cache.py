@@ -1,8 +1,12 @@
 """シンプルなメモリキャッシュユーティリティ"""
 
+import os
 import threading
 from datetime import datetime, timedelta
-from typing import Any, Optional
+from pathlib import Path
+from typing import Any, Callable, Generic, Optional, TypeVar
+
+T = TypeVar("T")
 
 
 class MemoryCache:
@@ -66,3 +70,63 @@ class MemoryCache:
 
 # グローバルインスタンス
 cache = MemoryCache()
+
+
+def file_stamp(path: Path) -> Optional[tuple[int, int]]:
+    """ファイルの更新判定用スタンプ（mtime_ns, size）。存在しなければNone"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class FileCache(Generic[T]):
+    """ファイルから読み込んだ値のキャッシュ（ファイルの mtime・サイズが変わったときだけ読み直す）
+
+    事前計算データ（JSON・終値行列・相関行列）の読み込みで共有する。
+    """
+
+    def __init__(self, loader: Callable[[Path], Optional[T]]):
+        """
+        Args:
+            loader: ファイルを読み込んで値を返す（読めない場合はNone）
+        """
+        self._loader = loader
+        self._entries: dict[Path, tuple[tuple[int, int], T]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, path: Path) -> Optional[T]:
+        """最新の値を取得（ファイルが更新されていれば読み直す。存在しなければNone）"""
+        stamp = file_stamp(path)
+        if stamp is None:
+            with self._lock:
+                self._entries.pop(path, None)
+            return None
+
+        cached = self._entries.get(path)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+
+        value = self._loader(path)
+        if value is None:
+            return None
+        with self._lock:
+            self._entries[path] = (stamp, value)
+        return value
+
+    def put(self, path: Path, value: T) -> None:
+        """書き込み済みファイルの値を登録（同一プロセスでの読み直しを省略）"""
+        stamp = file_stamp(path)
+        if stamp is None:
+            return
+        with self._lock:
+            self._entries[path] = (stamp, value)
+
+    def values(self) -> list[T]:
+        with self._lock:
+            return [value for _, value in self._entries.values()]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,94 @@
+"""フィールド射影（sparse fieldsets）
+
+`fields=id,name,stocks.code,stocks.change_percent` のようなカンマ区切りの
+ドット記法で、レスポンスに含めるフィールドを絞り込む。
+- ドットで区切ったパスはネストしたdict、またはdictのリストの各要素に適用される
+- 親フィールドを指定した場合（例: stocks）は配下をすべて含める
+- 存在しないフィールドは無視する
+"""
+
+import re
+from typing import Any, Optional
+
+from fastapi import HTTPException, status
+
+# フィールドパス（英数字・アンダースコアをドットで連結）
+FIELD_PATH_PATTERN = re.compile(r"^[a-zA-Z0-9_]+(\.[a-zA-Z0-9_]+)*$")
+
+# 1リクエストで指定できるフィールド数の上限
+MAX_FIELDS = 64
+
+# 射影ツリー: フィールド名 -> 子ツリー（Noneは配下をすべて含める）
+FieldTree = dict[str, Optional["FieldTree"]]
+
+
+def parse_fields(fields: Optional[str]) -> Optional[FieldTree]:
+    """カンマ区切りのフィールド指定を射影ツリーに変換
+
+    Args:
+        fields: フィールド指定（省略時はNone = 全フィールド）
+
+    Returns:
+        射影ツリー（指定なしならNone）
+
+    Raises:
+        HTTPException: 不正なフィールド指定の場合
+    """
+    if fields is None or not fields.strip():
+        return None
+
+    paths = [path.strip() for path in fields.split(",") if path.strip()]
+    if len(paths) > MAX_FIELDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Too many fields: {len(paths)} (max {MAX_FIELDS})",
+        )
+
+    tree: FieldTree = {}
+    for path in paths:
+        if not FIELD_PATH_PATTERN.match(path):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid field: {path}",
+            )
+        node = tree
+        parts = path.split(".")
+        for i, part in enumerate(parts):
+            if part in node and node[part] is None:
+                # 親フィールドが全体指定済み
+                break
+            if i == len(parts) - 1:
+                node[part] = None
+            else:
+                node = node.setdefault(part, {})
+    return tree
+
+
+def project(value: Any, tree: Optional[FieldTree]) -> Any:
+    """射影ツリーに従ってフィールドを絞り込んだコピーを返す（元の値は変更しない）"""
+    if tree is None:
+        return value
+    if isinstance(value, list):
+        return [project(item, tree) for item in value]
+    if not isinstance(value, dict):
+        return value
+    return {
+        key: project(value[key], subtree)
+        for key, subtree in tree.items()
+        if key in value
+    }
+
+
+def wants(tree: Optional[FieldTree], *path: str) -> bool:
+    """射影ツリーがフィールドパスを含むか（指定なし・親フィールド指定なら常にTrue）
+
+    計算の省略判定に使う（例: wants(tree, "stocks", "sparkline")）
+    """
+    node = tree
+    for part in path:
+        if node is None:
+            return True
+        if part not in node:
+            return False
+        node = node[part]
+    return True
@@ -0,0 +1,74 @@
+"""JSONドキュメント間の差分（RFC 6902 JSON Patch 形式）
+
+diff(old, new) は old を new に変換する操作列を返す。
+- dict はキーごとに再帰的に比較し、add / remove / replace を出す
+- list・スカラーは値が異なれば丸ごと replace する（並び順の変化も1操作で表す）
+- パスは JSON Pointer（RFC 6901）で、キー中の "~" と "/" はエスケープする
+
+apply_patch() は diff() の出力を適用する最小実装（テスト・クライアント実装の参照用）。
+"""
+
+import copy
+from typing import Any
+
+
+def escape_pointer(key: str) -> str:
+    """JSON Pointer のトークンをエスケープ（~ → ~0, / → ~1）"""
+    return str(key).replace("~", "~0").replace("/", "~1")
+
+
+def unescape_pointer(token: str) -> str:
+    """escape_pointer の逆変換"""
+    return token.replace("~1", "/").replace("~0", "~")
+
+
+def diff(old: Any, new: Any, path: str = "") -> list[dict]:
+    """old を new に変換する JSON Patch 操作列（差分がなければ空リスト）"""
+    ops: list[dict] = []
+    _diff(old, new, path, ops)
+    return ops
+
+
+def _diff(old: Any, new: Any, path: str, ops: list[dict]) -> None:
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key, value in old.items():
+            if key not in new:
+                ops.append({"op": "remove", "path": f"{path}/{escape_pointer(key)}"})
+            else:
+                _diff(value, new[key], f"{path}/{escape_pointer(key)}", ops)
+        for key, value in new.items():
+            if key not in old:
+                ops.append({"op": "add", "path": f"{path}/{escape_pointer(key)}", "value": value})
+        return
+    # 型の違い（True と 1 など）も変更として扱う
+    if type(old) is not type(new) or old != new:
+        ops.append({"op": "replace", "path": path, "value": new})
+
+
+def apply_patch(doc: Any, ops: list[dict]) -> Any:
+    """JSON Patch（add / remove / replace）を適用した新しいドキュメントを返す"""
+    doc = copy.deepcopy(doc)
+    for op in ops:
+        tokens = [unescape_pointer(t) for t in op["path"].split("/")[1:]]
+        if not tokens:
+            if op["op"] == "remove":
+                raise ValueError("Cannot remove the document root")
+            doc = copy.deepcopy(op["value"])
+            continue
+
+        parent = doc
+        for token in tokens[:-1]:
+            parent = parent[int(token)] if isinstance(parent, list) else parent[token]
+        key: Any = tokens[-1]
+        if isinstance(parent, list):
+            key = len(parent) if key == "-" else int(key)
+
+        if op["op"] == "remove":
+            del parent[key]
+        elif op["op"] == "add" and isinstance(parent, list):
+            parent.insert(key, copy.deepcopy(op["value"]))
+        elif op["op"] in ("add", "replace"):
+            parent[key] = copy.deepcopy(op["value"])
+        else:
+            raise ValueError(f"Unsupported op: {op['op']}")
+    return doc
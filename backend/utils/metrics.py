@@ -0,0 +1,166 @@
+"""リクエストメトリクス（レイテンシのヒストグラム・リクエスト数・レスポンスサイズ・処理中の数）
+
+ASGI ミドルウェア（middleware.RequestMetricsMiddleware）がイベントループ上で記録し、
+/metrics が Prometheus のテキスト形式で出力する。
+
+- ラベルはメソッドとルートのテンプレート（/api/themes/{theme_id}）。ルートに一致しない
+  リクエストは "unmatched" にまとめるため、系列の数はルート数で頭打ちになる
+- レイテンシは固定バケットのヒストグラム。p50 / p95 / p99 はバケット内の線形補間で求める
+  （Prometheus の histogram_quantile と同じ考え方）
+- 記録はイベントループ上で行う。読み取り（summary / render_prometheus）もイベントループ上で
+  呼ぶこと（/metrics のハンドラは async def）。スレッドプールから読むと記録中の dict を
+  走査して RuntimeError になりうる。ロックは使わない
+"""
+
+from bisect import bisect_left
+from typing import Iterable, Optional
+
+# レイテンシのバケット上限（秒）
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+# 出力する分位点
+QUANTILES = (0.5, 0.95, 0.99)
+
+# ルートに一致しなかったリクエストのラベル
+UNMATCHED_ROUTE = "unmatched"
+
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    """固定バケットのヒストグラム（バケットごとの件数・合計・件数）"""
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # 最後は +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """分位点（観測がなければNone。最後のバケットに入る場合は最大の上限を返す）"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                if i == len(self.bounds):
+                    return self.bounds[-1]
+                lower = self.bounds[i - 1] if i else 0.0
+                return lower + (self.bounds[i] - lower) * (rank - seen) / count
+            seen += count
+        return self.bounds[-1]
+
+    def cumulative(self) -> list[int]:
+        """Prometheus の le バケット（累積件数、最後は +Inf）"""
+        total, result = 0, []
+        for count in self.counts:
+            total += count
+            result.append(total)
+        return result
+
+
+class RequestMetrics:
+    """HTTPリクエストのメトリクス"""
+
+    def __init__(self, bounds: tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self.bounds = bounds
+        self.reset()
+
+    def reset(self) -> None:
+        self.latency: dict[tuple[str, str], Histogram] = {}
+        self.requests: dict[tuple[str, str, int], int] = {}
+        self.response_bytes: dict[tuple[str, str], int] = {}
+        self.in_flight: dict[str, int] = {}
+
+    def start(self, method: str) -> None:
+        """リクエストの処理開始"""
+        self.in_flight[method] = self.in_flight.get(method, 0) + 1
+
+    def finish(self, method: str, route: str, status: int, duration: float, size: int) -> None:
+        """リクエストの処理完了（ストリーミングは最後のチャンクの送信後）"""
+        self.in_flight[method] -= 1
+        key = (method, route)
+        histogram = self.latency.get(key)
+        if histogram is None:
+            histogram = self.latency[key] = Histogram(self.bounds)
+        histogram.observe(duration)
+        self.requests[(method, route, status)] = self.requests.get((method, route, status), 0) + 1
+        self.response_bytes[key] = self.response_bytes.get(key, 0) + size
+
+    def summary(self) -> list[dict]:
+        """ルートごとの件数・分位点（ミリ秒）・レスポンスサイズ"""
+        rows = []
+        for (method, route), histogram in sorted(self.latency.items()):
+            row = {"method": method, "route": route, "count": histogram.count, "bytes": self.response_bytes[(method, route)]}
+            for q in QUANTILES:
+                value = histogram.quantile(q)
+                row[f"p{round(q * 100)}_ms"] = round(value * 1000, 3) if value is not None else None
+            rows.append(row)
+        return rows
+
+    def render_prometheus(self, gauges: Iterable[tuple[str, str, float]] = ()) -> str:
+        """Prometheus のテキスト形式（gauges は (名前, 説明, 値) の追加ゲージ）"""
+        lines = [
+            "# HELP http_requests_total Total HTTP requests.",
+            "# TYPE http_requests_total counter",
+        ]
+        for (method, route, status), count in sorted(self.requests.items()):
+            lines.append(f'http_requests_total{{method="{method}",route="{_escape(route)}",status="{status}"}} {count}')
+
+        lines += [
+            "# HELP http_request_duration_seconds HTTP request latency.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for (method, route), histogram in sorted(self.latency.items()):
+            labels = f'method="{method}",route="{_escape(route)}"'
+            for bound, count in zip([*map(repr, self.bounds), "+Inf"], histogram.cumulative()):
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f"http_request_duration_seconds_sum{{{labels}}} {histogram.sum:.6f}")
+            lines.append(f"http_request_duration_seconds_count{{{labels}}} {histogram.count}")
+
+        lines += [
+            "# HELP http_request_duration_quantile_seconds Estimated latency quantiles from the histogram.",
+            "# TYPE http_request_duration_quantile_seconds gauge",
+        ]
+        for (method, route), histogram in sorted(self.latency.items()):
+            for q in QUANTILES:
+                value = histogram.quantile(q)
+                lines.append(
+                    f'http_request_duration_quantile_seconds{{method="{method}",route="{_escape(route)}",quantile="{q}"}} {value:.6f}'
+                )
+
+        lines += [
+            "# HELP http_response_size_bytes_total Total response body bytes.",
+            "# TYPE http_response_size_bytes_total counter",
+        ]
+        for (method, route), size in sorted(self.response_bytes.items()):
+            lines.append(f'http_response_size_bytes_total{{method="{method}",route="{_escape(route)}"}} {size}')
+
+        lines += [
+            "# HELP http_requests_in_flight HTTP requests currently being processed.",
+            "# TYPE http_requests_in_flight gauge",
+        ]
+        for method, count in sorted(self.in_flight.items()):
+            lines.append(f'http_requests_in_flight{{method="{method}"}} {count}')
+
+        for name, description, value in gauges:
+            lines += [f"# HELP {name} {description}", f"# TYPE {name} gauge", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# プロセス全体で共有するメトリクス
+request_metrics = RequestMetrics()
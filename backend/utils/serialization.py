@@ -0,0 +1,149 @@
+"""高速JSONシリアライズユーティリティ
+
+アプリ全体で共通のJSONエンコード/デコードを提供する。
+- orjsonが利用可能ならorjson、なければ標準jsonにフォールバック
+- NumPyスカラー・配列、datetime/date、set、pydanticモデルをそのまま扱える
+- NaN/Infinity は null として出力（標準jsonのような不正なJSONを出さない）
+
+用途:
+- FastAPIのデフォルトレスポンスクラス（FastJSONResponse）
+- 事前計算JSONファイルの書き込み（update_data.py）
+- Redisキャッシュの値（RedisCache / CacheService）
+"""
+
+import json
+import math
+import os
+import threading
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+from fastapi.responses import JSONResponse, Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjsonは任意依存
+    orjson = None
+
+JSON_MEDIA_TYPE = "application/json"
+
+
+def to_jsonable(obj: Any) -> Any:
+    """orjson/標準json/msgpackが直接扱えない型の変換"""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, Path):
+        return str(obj)
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _sanitize(obj: Any) -> Any:
+    """標準jsonフォールバック用: NaN/Infinity を None に置換しつつ変換"""
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {str(k): _sanitize(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_sanitize(v) for v in obj]
+    if isinstance(obj, (str, int, bool)) or obj is None:
+        return obj
+    return _sanitize(to_jsonable(obj))
+
+
+def dumps(content: Any, *, indent: bool = False) -> bytes:
+    """JSONバイト列にエンコード
+
+    Args:
+        content: エンコード対象
+        indent: Trueなら2スペースインデント（デバッグ用）
+
+    Returns:
+        UTF-8のJSONバイト列
+    """
+    if orjson is not None:
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(content, default=to_jsonable, option=option)
+
+    return json.dumps(
+        _sanitize(content),
+        ensure_ascii=False,
+        indent=2 if indent else None,
+        separators=None if indent else (",", ":"),
+    ).encode("utf-8")
+
+
+def loads(data: bytes | str) -> Any:
+    """JSONをデコード"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def write_json_file(path: Path, content: Any, *, indent: bool = False) -> int:
+    """JSONファイルをアトミックに書き込む（一時ファイル→置換）
+
+    書き込み途中のファイルをAPIが読むことはない
+
+    Returns:
+        書き込んだバイト数
+    """
+    return write_json_bytes(path, dumps(content, indent=indent))
+
+
+def write_json_bytes(path: Path, body: bytes) -> int:
+    """エンコード済みJSONをアトミックに書き込む
+
+    Returns:
+        書き込んだバイト数
+    """
+    return write_bytes_atomic(path, body)
+
+
+def temp_path(path: Path) -> Path:
+    """アトミックな書き込み用の一時ファイル名（同じディレクトリ・プロセスとスレッドごとに別名）"""
+    return path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+
+def write_bytes_atomic(path: Path, body: bytes) -> int:
+    """バイト列をアトミックに書き込む（一時ファイル→置換）
+
+    Returns:
+        書き込んだバイト数
+    """
+    tmp_path = temp_path(path)
+    tmp_path.write_bytes(body)
+    tmp_path.replace(path)
+    return len(body)
+
+
+def read_json_file(path: Path) -> Any:
+    """JSONファイルを読み込む"""
+    return loads(path.read_bytes())
+
+
+class FastJSONResponse(JSONResponse):
+    """orjsonでエンコードするJSONレスポンス（アプリのデフォルトレスポンスクラス）"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def raw_json_response(
+    body: bytes,
+    status_code: int = 200,
+    headers: dict[str, str] | None = None,
+) -> Response:
+    """エンコード済みJSONをそのまま返すレスポンス（再エンコードしない）"""
+    return Response(content=body, status_code=status_code, headers=headers, media_type=JSON_MEDIA_TYPE)
@@ -0,0 +1,206 @@
+"""レスポンスのワイヤーフォーマット（JSON / MessagePack / Arrow IPC）
+
+Acceptヘッダーでレスポンス形式を切り替える（コンテントネゴシエーション）。
+- application/json（デフォルト）
+- application/msgpack: JSONと同じ構造をMessagePackでエンコード
+- application/vnd.apache.arrow.stream: 表形式のエンドポイントのみ。
+  行を schemas.py のモデルから導出したスキーマで列指向にエンコードし、
+  表以外のフィールドはスキーマメタデータの "payload" にJSONで格納する
+
+msgpack / pyarrow は任意依存。未インストールの形式は選択されず、JSONで応答する。
+"""
+
+import types
+from functools import lru_cache
+from typing import Any, Callable, Union, get_args, get_origin
+
+from fastapi import Header
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+from utils.serialization import JSON_MEDIA_TYPE, FastJSONResponse, dumps, loads, to_jsonable
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - msgpackは任意依存
+    msgpack = None
+
+try:
+    import pyarrow as pa
+except ImportError:  # pragma: no cover - pyarrowは任意依存
+    pa = None
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+# Acceptヘッダーで受け付ける別名
+MSGPACK_ALIASES = frozenset([MSGPACK_MEDIA_TYPE, "application/x-msgpack"])
+
+# Arrowスキーマメタデータ内の表以外のフィールド
+ARROW_PAYLOAD_KEY = b"payload"
+
+# ネゴシエーション対象のレスポンスに付与するヘッダー（キャッシュの取り違え防止）
+VARY_HEADERS = {"Vary": "Accept"}
+
+ACCEPT_HEADER = Header(
+    None,
+    description=(
+        "レスポンス形式: application/json（デフォルト）, application/msgpack, "
+        "application/vnd.apache.arrow.stream（表形式のエンドポイントのみ）"
+    ),
+)
+
+# payload -> (行のリスト, 行のスキーマモデル, 表以外のフィールド)
+TableBuilder = Callable[[dict], tuple[list[dict], type[BaseModel], dict]]
+
+
+# =============================================================================
+# ネゴシエーション
+# =============================================================================
+
+def _parse_accept(accept: str) -> list[str]:
+    """Acceptヘッダーをq値・具体性の高い順のメディアタイプ列に変換（q=0は除外）"""
+    entries = []
+    for index, part in enumerate(accept.split(",")):
+        media, *params = [p.strip() for p in part.split(";")]
+        if not media:
+            continue
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q <= 0:
+            continue
+        specificity = media.count("*")
+        entries.append((-q, specificity, index, media.lower()))
+    return [media for *_, media in sorted(entries)]
+
+
+def negotiate(accept: str | None, tabular: bool = False) -> str:
+    """Acceptヘッダーからレスポンスのメディアタイプを決定
+
+    Args:
+        accept: Acceptヘッダーの値
+        tabular: Arrow IPCに対応するエンドポイントか
+
+    Returns:
+        メディアタイプ（対応形式がなければ application/json）
+    """
+    if not accept:
+        return JSON_MEDIA_TYPE
+
+    for media in _parse_accept(accept):
+        if media in (JSON_MEDIA_TYPE, "*/*", "application/*"):
+            return JSON_MEDIA_TYPE
+        if media in MSGPACK_ALIASES and msgpack is not None:
+            return MSGPACK_MEDIA_TYPE
+        if media == ARROW_MEDIA_TYPE and tabular and pa is not None:
+            return ARROW_MEDIA_TYPE
+    return JSON_MEDIA_TYPE
+
+
+# =============================================================================
+# Arrowスキーマ（schemas.pyのモデルから導出）
+# =============================================================================
+
+def _arrow_type(annotation: Any, scalar_override: str | None = None) -> "pa.DataType":
+    """型注釈をArrowの型に変換
+
+    scalar_override はリスト要素などの末端のスカラー型を置き換える（例: "float32"）
+    """
+    origin = get_origin(annotation)
+    if origin in (Union, types.UnionType):
+        args = [arg for arg in get_args(annotation) if arg is not type(None)]
+        return _arrow_type(args[0], scalar_override)
+    if origin is list:
+        return pa.list_(_arrow_type(get_args(annotation)[0], scalar_override))
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return pa.struct(arrow_schema(annotation))
+    if scalar_override is not None:
+        return pa.type_for_alias(scalar_override)
+
+    scalar_types = {
+        str: pa.string(),
+        float: pa.float64(),
+        int: pa.int64(),
+        bool: pa.bool_(),
+    }
+    if annotation in scalar_types:
+        return scalar_types[annotation]
+    raise TypeError(f"Unsupported field type for Arrow schema: {annotation!r}")
+
+
+@lru_cache(maxsize=None)
+def arrow_schema(model: type[BaseModel]) -> "pa.Schema":
+    """pydanticモデルのフィールド定義からArrowスキーマを導出（全列nullable）
+
+    Field(json_schema_extra={"arrow_type": ...}) で列の型を縮小できる
+    """
+    fields = []
+    for name, field in model.model_fields.items():
+        extra = field.json_schema_extra if isinstance(field.json_schema_extra, dict) else {}
+        arrow_type = _arrow_type(field.annotation, extra.get("arrow_type"))
+        fields.append(pa.field(name, arrow_type, nullable=True))
+    return pa.schema(fields)
+
+
+# =============================================================================
+# エンコード / デコード
+# =============================================================================
+
+def encode_msgpack(payload: Any) -> bytes:
+    """MessagePackにエンコード（NumPy型・datetimeはJSONと同じ規則で変換）"""
+    return msgpack.packb(payload, default=to_jsonable, use_bin_type=True)
+
+
+def decode_msgpack(body: bytes) -> Any:
+    """MessagePackをデコード"""
+    return msgpack.unpackb(body, raw=False)
+
+
+def encode_arrow(rows: list[dict], model: type[BaseModel], metadata: dict) -> bytes:
+    """行をArrow IPCストリームにエンコード
+
+    スキーマにない行のキーは無視される。
+    """
+    schema = arrow_schema(model).with_metadata({ARROW_PAYLOAD_KEY: dumps(metadata)})
+    table = pa.Table.from_pylist(rows, schema=schema)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def decode_arrow(body: bytes) -> tuple["pa.Table", dict]:
+    """Arrow IPCストリームをデコードして (表, 表以外のフィールド) を返す"""
+    table = pa.ipc.open_stream(body).read_all()
+    metadata = table.schema.metadata or {}
+    payload = metadata.get(ARROW_PAYLOAD_KEY)
+    return table, loads(payload) if payload else {}
+
+
+def negotiated_response(
+    payload: dict,
+    media_type: str,
+    table: TableBuilder | None = None,
+) -> Response:
+    """ネゴシエーション結果の形式でレスポンスを生成"""
+    if media_type == ARROW_MEDIA_TYPE and table is not None:
+        rows, model, metadata = table(payload)
+        body = encode_arrow(rows, model, metadata)
+    elif media_type == MSGPACK_MEDIA_TYPE:
+        body = encode_msgpack(payload)
+    else:
+        return FastJSONResponse(payload, headers=VARY_HEADERS)
+    return Response(content=body, media_type=media_type, headers=VARY_HEADERS)
+
+
+def category_id(category: Any) -> str | None:
+    """時価総額カテゴリ（dictまたはID）をIDに変換（表形式用）"""
+    if isinstance(category, dict):
+        return category.get("id")
+    return category
@@ -38,15 +38,42 @@ export default function ComparePage() {
     const fetchAll = async () => {
       const results: Record<string, ThemeData[]> = {};
       for (const period of PERIODS) {
-        try {
-          const res = await fetch(`${API_BASE}/api/themes?period=${period}`);
-          const data = await res.json();
-          results[period] = (data.themes || []).filter((t: ThemeData) =>
-            selectedThemes.includes(t.id),
-          );
-        } catch {
-          results[period] = [];
+        results[period] = [];
+      }
+      try {
+        // 選択テーマ × 全期間を1リクエストで取得
+        const params = new URLSearchParams({
+          ids: selectedThemes.join(','),
+          periods: PERIODS.join(','),
+          fields: 'id,name,change_percent',
+        });
+        const res = await fetch(`${API_BASE}/api/themes/batch?${params}`);
+        const data = await res.json();
+        const found: Record<string, Record<string, ThemeData>> = data.results || {};
+
+        // 事前計算されていない組み合わせはテーマ詳細APIで取得（リアルタイム計算にフォールバック）
+        const missing: { theme_id: string; period: string }[] = data.missing || [];
+        await Promise.all(
+          missing.map(async ({ theme_id, period }) => {
+            const detailParams = new URLSearchParams({ period, fields: 'id,name,change_percent' });
+            try {
+              const detail = await fetch(`${API_BASE}/api/themes/${theme_id}?${detailParams}`);
+              if (!detail.ok) return;
+              found[theme_id] = { ...found[theme_id], [period]: await detail.json() };
+            } catch {
+              // 取得できなかった組み合わせは空欄のまま表示
+            }
+          }),
+        );
+
+        for (const themeId of selectedThemes) {
+          const byPeriod: Record<string, ThemeData> = found[themeId] || {};
+          for (const period of PERIODS) {
+            if (byPeriod[period]) results[period].push(byPeriod[period]);
+          }
         }
+      } catch {
+        // 取得失敗時は空のまま表示
       }
       setCompareData(results);
     };